@@ -0,0 +1,125 @@
+"""
+Time the Galactic War graph algorithms on generated galaxies, and compare
+the isolated planet check against the networkx implementation it replaced.
+
+Usage:
+    python -m benchmarks.galactic_war_graph [PLANETS]
+"""
+
+import copy
+import random
+import sys
+import time
+
+from server.galactic_war.state import GalacticWarState
+
+try:
+    import networkx
+except ImportError:  # pragma: no cover
+    networkx = None
+
+
+def generate_galaxy(planets, seed=0):
+    """
+    A grid of planets with some extra diagonal jump gates. Arm's capital is
+    in one corner and Core's in the opposite one, and the planets in between
+    are controlled at random so that there are many isolated pockets.
+    """
+    rng = random.Random(seed)
+    width = max(2, int(planets ** 0.5))
+    nodes, edges = [], []
+    for pid in range(planets):
+        x = pid % width
+        node = {"id": pid, "label": f"planet{pid}", "map": "SHERWOOD", "mod": "tacc"}
+        roll = rng.random()
+        if roll < 0.45:
+            node["controlled_by"] = "arm"
+        elif roll < 0.9:
+            node["controlled_by"] = "core"
+        nodes.append(node)
+
+        if x + 1 < width and pid + 1 < planets:
+            edges.append({"source": pid, "target": pid + 1})
+        if pid + width < planets:
+            edges.append({"source": pid, "target": pid + width})
+        if x + 1 < width and pid + width + 1 < planets and rng.random() < 0.2:
+            edges.append({"source": pid, "target": pid + width + 1})
+
+    nodes[0].update(capital_of="arm", controlled_by="arm")
+    nodes[-1].update(capital_of="core", controlled_by="core")
+    return {"label": "generated", "node": nodes, "edge": edges}
+
+
+def networkx_isolated_planets(state):
+    """
+    The isolated planets as the networkx implementation found them: a
+    subgraph per faction and a max-flow from the capital to every planet.
+    """
+    isolated = set()
+    planets_by_faction = state._get_planets_by_controlling_faction()
+    jump_gates = [(edge["source"], edge["target"]) for edge in state.get_data()["edge"]]
+    for faction, capital in state._capitals_by_faction.items():
+        planet_ids = [p.get_id() for p in planets_by_faction[faction]]
+        graph = networkx.Graph()
+        graph.add_nodes_from(planet_ids)
+        graph.add_edges_from([(id1, id2) for id1, id2 in jump_gates
+                              if id1 in planet_ids and id2 in planet_ids])
+        for pid in planet_ids:
+            if pid == capital.get_id():
+                continue
+            if capital.get_id() not in planet_ids or networkx.node_connectivity(graph, capital.get_id(), pid) == 0:
+                isolated.add(pid)
+    return isolated
+
+
+def timed(func, repeat=1):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = func()
+    return result, (time.perf_counter() - start) / repeat
+
+
+def main(args):
+    planets = int(args[0]) if args else 1000
+    data = generate_galaxy(planets)
+    print(f"{planets} planets, {len(data['edge'])} jump gates\n")
+
+    state, seconds = timed(lambda: GalacticWarState(copy.deepcopy(data)))
+    print(f"{'load state':<28}{seconds * 1000:>10.2f} ms")
+
+    def capture():
+        s = GalacticWarState(copy.deepcopy(data))
+        before = {p.get_id(): p.get_controlled_by() for p in s._planets}
+        s.capture_isolated_planets()
+        return {pid for pid, faction in before.items()
+                if faction is not None and s._planets_by_id[pid].get_controlled_by() != faction}
+
+    isolated, seconds = timed(capture, repeat=10)
+    print(f"{'capture isolated planets':<28}{seconds * 1000:>10.2f} ms  ({len(isolated)} isolated)")
+
+    def update_to_fixpoint():
+        s = GalacticWarState(copy.deepcopy(data))
+        s.update_front_lines()
+        while s.capture_isolated_planets() + s.capture_uncontested_planets() > 0:
+            pass
+
+    _, seconds = timed(update_to_fixpoint, repeat=10)
+    print(f"{'update state to fixpoint':<28}{seconds * 1000:>10.2f} ms")
+
+    def initialise():
+        s = GalacticWarState(copy.deepcopy(data))
+        s.assign_two_capitals()
+        s = GalacticWarState(s.get_data())
+        s.distribute_planets_to_factions()
+
+    _, seconds = timed(initialise)
+    print(f"{'assign capitals, distribute':<28}{seconds * 1000:>10.2f} ms")
+
+    if networkx is not None:
+        expected, seconds = timed(lambda: networkx_isolated_planets(GalacticWarState(copy.deepcopy(data))))
+        print(f"{'networkx isolated planets':<28}{seconds * 1000:>10.2f} ms  ({len(expected)} isolated)")
+        assert expected == isolated, "results differ from networkx"
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,67 @@
+"""
+Time the evaluation of the achievement rules on the armies of
+`tests/data/game_stats_full_example.json`, and compare counting in a single
+pass against looking up the units of every counter one by one as the
+hand written evaluator did.
+
+Usage:
+    python -m benchmarks.game_stats_rules [REPEAT]
+"""
+
+import json
+import sys
+import time
+
+from server.stats import rules
+
+EXAMPLE = "tests/data/game_stats_full_example.json"
+
+
+def per_counter_count(blueprint_stats, unit_stats):
+    counters = {}
+    for counter, (field, units) in rules.UNIT_COUNTERS.items():
+        counters[counter] = sum(
+            blueprint_stats[unit.value].get(field, 0)
+            for unit in units if unit.value in blueprint_stats
+        )
+    for counter, (category, field) in rules.CATEGORY_COUNTERS.items():
+        counters[counter] = unit_stats.get(category, {}).get(field, 0)
+    return counters
+
+
+def timed(func, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = func()
+    return result, (time.perf_counter() - start) / repeat
+
+
+def main(args):
+    repeat = int(args[0]) if args else 10000
+    with open(EXAMPLE) as fp:
+        armies = json.load(fp)["stats"]
+    rule_count = sum(len(group) for group in rules.RULES.values())
+    print(f"{len(armies)} armies, {rule_count} rules, {len(rules.UNIT_INDEX)} indexed units\n")
+
+    def single_pass():
+        return [rules.count(a["blueprints"], a["units"]) for a in armies]
+
+    def per_counter():
+        return [per_counter_count(a["blueprints"], a["units"]) for a in armies]
+
+    counters, seconds = timed(single_pass, repeat)
+    print(f"{'count, single pass':<28}{seconds * 1e6:>10.2f} us")
+    expected, seconds = timed(per_counter, repeat)
+    print(f"{'count, per counter':<28}{seconds * 1e6:>10.2f} us")
+    assert counters == expected, "counters differ"
+
+    contexts = [
+        rules.ArmyContext(c, a.get("faction"), True, True, False, len(armies))
+        for c, a in zip(counters, armies)
+    ]
+    updates, seconds = timed(lambda: [rules.evaluate(ctx) for ctx in contexts], repeat)
+    print(f"{'evaluate rules':<28}{seconds * 1e6:>10.2f} us  ({sum(map(len, updates))} updates)")
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,92 @@
+"""
+ICE messages per second relayed to a peer through `IceRelay`, compared with
+sending each of them through `Protocol.send_message` and waiting for drain.
+
+Both write to a real local socket, read by a client that discards the data.
+
+Usage:
+    python -m benchmarks.ice_relay [MESSAGES]
+"""
+
+import asyncio
+import sys
+import time
+from types import SimpleNamespace
+
+from server.config import config
+from server.ice_relay import IceRelay, IceRelayStats
+from server.protocol import QDataStreamProtocol
+
+PAYLOAD = {
+    "type": "candidate",
+    "candidate": {
+        "foundation": "842163049",
+        "component": 1,
+        "protocol": "udp",
+        "priority": 1677729535,
+        "address": "203.0.113.7",
+        "port": 6112,
+        "type": "srflx"
+    }
+}
+
+
+async def discard(reader, writer):
+    while await reader.read(65536):
+        pass
+    writer.close()
+
+
+async def send_each(protocol, count):
+    for _ in range(count):
+        await protocol.send_message({
+            "command": "IceMsg",
+            "args": [1, PAYLOAD],
+            "target": "game"
+        })
+
+
+async def relay_all(protocol, count):
+    connection = SimpleNamespace(
+        protocol=protocol,
+        player=SimpleNamespace(id=2),
+        game=SimpleNamespace(ice_relay_stats=IceRelayStats())
+    )
+    relay = IceRelay(connection)
+    for i in range(count):
+        relay.relay(1, PAYLOAD)
+        # Candidates arrive one message at a time
+        if i % 8 == 7:
+            await asyncio.sleep(0)
+    relay.flush()
+    await protocol.drain()
+
+
+async def rate(send, count):
+    server = await asyncio.start_server(discard, "127.0.0.1", 0)
+    port = server.sockets[0].getsockname()[1]
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    protocol = QDataStreamProtocol(reader, writer)
+
+    start = time.perf_counter()
+    await send(protocol, count)
+    elapsed = time.perf_counter() - start
+
+    await protocol.close()
+    server.close()
+    await server.wait_closed()
+    return count / elapsed
+
+
+async def main(args):
+    count = int(args[0]) if args else 50000
+    config.ICE_RELAY_BATCH_WINDOW = 0
+    config.ICE_RELAY_MAX_BUFFERED_BYTES = 1 << 30
+
+    print(f"{'path':<14}{'msg/s':>12}")
+    print(f"{'send_message':<14}{await rate(send_each, count):>12,.0f}")
+    print(f"{'IceRelay':<14}{await rate(relay_all, count):>12,.0f}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main(sys.argv[1:]))
@@ -0,0 +1,165 @@
+"""
+Connection setup, message throughput and latency of a lobby `ServerContext`
+for every event loop and transport.
+
+The server runs `LobbyConnection` with mocked services in a process of its
+own using the event loop under test. Clients connect and ask for a session,
+then every connection pings the server and waits for the pong, keeping one
+message in flight. uvloop is skipped if it is not installed.
+
+Usage:
+    python -m benchmarks.lobby_transport [--protocol qdatastream|json]
+        [--connections N] [--messages N]
+"""
+
+import argparse
+import asyncio
+import logging
+import multiprocessing
+import socket
+import time
+from types import SimpleNamespace
+from unittest import mock
+
+from server import asyncio_extensions
+from server.asyncio_extensions import (
+    EVENT_LOOP_ASYNCIO,
+    EVENT_LOOP_UVLOOP,
+    install_event_loop_policy
+)
+from server.lobbyconnection import LobbyConnection
+from server.protocol import QDataStreamProtocol, SimpleJsonProtocol
+from server.servercontext import (
+    TRANSPORT_PROTOCOL,
+    TRANSPORT_STREAMS,
+    ServerContext
+)
+from tests.integration_tests.conftest import (
+    connect_client,
+    get_session,
+    read_until_command
+)
+
+PROTOCOLS = {
+    "qdatastream": QDataStreamProtocol,
+    "json": SimpleJsonProtocol,
+}
+
+
+def make_connection() -> LobbyConnection:
+    return LobbyConnection(
+        database=mock.Mock(),
+        game_service=mock.Mock(),
+        players=mock.Mock(),
+        nts_client=mock.Mock(),
+        geoip=mock.Mock(),
+        ladder_service=mock.Mock(),
+        party_service=mock.Mock(),
+        tada_service=mock.Mock(),
+        policy_service=mock.Mock(),
+        catalog_service=mock.Mock()
+    )
+
+
+async def serve(protocol: str, transport: str, port: int, ready):
+    ctx = ServerContext(
+        "Benchmark", make_connection, [], PROTOCOLS[protocol], transport
+    )
+    await ctx.listen("127.0.0.1", port)
+    ready.set()
+    await asyncio.Future()
+
+
+def run_server(loop: str, protocol: str, transport: str, port: int, ready):
+    # Disconnecting clients are logged as errors by some protocols
+    logging.disable(logging.ERROR)
+    install_event_loop_policy(loop)
+    asyncio.run(serve(protocol, transport, port, ready))
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+async def ping(proto, messages: int, latencies: list):
+    for _ in range(messages):
+        start = time.perf_counter()
+        await proto.send_message({"command": "ping"})
+        await read_until_command(proto, "pong")
+        latencies.append(time.perf_counter() - start)
+
+
+async def run_clients(port: int, args):
+    # Stands in for the ServerContext the integration test helpers expect
+    server = SimpleNamespace(
+        sockets=[SimpleNamespace(getsockname=lambda: ("127.0.0.1", port))],
+        protocol_class=PROTOCOLS[args.protocol]
+    )
+
+    async def connect():
+        proto = await connect_client(server)
+        await get_session(proto)
+        return proto
+
+    start = time.perf_counter()
+    protos = await asyncio.gather(*(connect() for _ in range(args.connections)))
+    connect_rate = args.connections / (time.perf_counter() - start)
+
+    latencies = []
+    start = time.perf_counter()
+    await asyncio.gather(*(ping(p, args.messages, latencies) for p in protos))
+    message_rate = len(latencies) / (time.perf_counter() - start)
+
+    for proto in protos:
+        await proto.close()
+
+    latencies.sort()
+    p99 = latencies[int(len(latencies) * 0.99) - 1]
+    return connect_rate, message_rate, p99
+
+
+async def measure(loop: str, transport: str, args):
+    context = multiprocessing.get_context("spawn")
+    port = free_port()
+    ready = context.Event()
+    process = context.Process(
+        target=run_server,
+        args=(loop, args.protocol, transport, port, ready)
+    )
+    process.start()
+    await asyncio.get_running_loop().run_in_executor(None, ready.wait)
+
+    try:
+        return await run_clients(port, args)
+    finally:
+        process.terminate()
+        process.join()
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--protocol", choices=PROTOCOLS, default="qdatastream")
+    parser.add_argument("--connections", type=int, default=200)
+    parser.add_argument("--messages", type=int, default=100)
+    args = parser.parse_args()
+
+    loops = [EVENT_LOOP_ASYNCIO]
+    if asyncio_extensions.uvloop is not None:
+        loops.append(EVENT_LOOP_UVLOOP)
+    else:
+        print("uvloop is not installed, skipping it")
+
+    print(f"{'loop':<10}{'transport':<12}{'conn/s':>10}{'msg/s':>10}{'p99 ms':>10}")
+    for loop in loops:
+        for transport in (TRANSPORT_STREAMS, TRANSPORT_PROTOCOL):
+            connect_rate, message_rate, p99 = await measure(loop, transport, args)
+            print(
+                f"{loop:<10}{transport:<12}{connect_rate:>10,.0f}"
+                f"{message_rate:>10,.0f}{p99 * 1000:>10.2f}"
+            )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,140 @@
+"""
+Compare archive size and read time of the replay store against zip archives.
+
+Usage:
+    python -m benchmarks.replay_store [REPLAY_FILE ...]
+
+Without arguments synthetic replays are generated.
+"""
+
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+import zipfile
+
+from server.replay_archive_service import archive_replay, get_archive_dir
+from server.replay_store import (
+    COMPRESSION_ZLIB,
+    COMPRESSION_ZSTD,
+    ReplayStore,
+    compress_replay,
+    zstandard
+)
+
+
+def synthetic_replays(directory, count=20):
+    rng = random.Random(0)
+    paths = []
+    for game_id in range(count):
+        # Replays are mostly repetitive unit orders with some noise
+        chunks = [
+            rng.randbytes(64) if rng.random() < 0.1 else b"\x00\x01move" * 12
+            for _ in range(20000)
+        ]
+        path = os.path.join(directory, f"{game_id}.tad")
+        with open(path, "wb") as f:
+            f.write(b"".join(chunks))
+        paths.append(path)
+    return paths
+
+
+def copy_replays(paths, directory):
+    copies = []
+    for game_id, path in enumerate(paths):
+        copy = os.path.join(directory, f"{game_id}.tad")
+        shutil.copyfile(path, copy)
+        copies.append((game_id, copy))
+    return copies
+
+
+def directory_size(directory):
+    return sum(
+        os.path.getsize(os.path.join(root, name))
+        for root, _, names in os.walk(directory)
+        for name in names
+    )
+
+
+def bench_zip(paths, workdir):
+    replays = copy_replays(paths, workdir)
+    start = time.perf_counter()
+    for game_id, path in replays:
+        archive_replay(path, get_archive_dir(workdir, game_id), game_id)
+    write_time = time.perf_counter() - start
+    size = directory_size(workdir)
+
+    # What TadaService used to do: extract to disk, then read the file
+    start = time.perf_counter()
+    for game_id, _ in replays:
+        archive_dir = get_archive_dir(workdir, game_id)
+        shutil.unpack_archive(os.path.join(archive_dir, f"{game_id}.zip"), archive_dir)
+        tad_path = os.path.join(archive_dir, f"{game_id}.tad")
+        with open(tad_path, "rb") as f:
+            f.read()
+        os.remove(tad_path)
+    extract_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for game_id, _ in replays:
+        archive_dir = get_archive_dir(workdir, game_id)
+        with zipfile.ZipFile(os.path.join(archive_dir, f"{game_id}.zip")) as archive:
+            with archive.open(f"{game_id}.tad") as f:
+                f.read()
+    read_time = time.perf_counter() - start
+
+    return size, write_time, extract_time, read_time
+
+
+def bench_store(paths, workdir, compression):
+    replays = copy_replays(paths, workdir)
+    store = ReplayStore(os.path.join(workdir, "store"))
+    start = time.perf_counter()
+    for game_id, path in replays:
+        store.add(game_id, compress_replay(path, compression))
+        os.remove(path)
+    write_time = time.perf_counter() - start
+    size = directory_size(os.path.join(workdir, "store"))
+
+    start = time.perf_counter()
+    for game_id, _ in replays:
+        with store.open(store.get(game_id)) as f:
+            f.read()
+    read_time = time.perf_counter() - start
+    store.close()
+
+    return size, write_time, None, read_time
+
+
+def main(args):
+    with tempfile.TemporaryDirectory() as tmp:
+        if args:
+            paths = args
+        else:
+            source = os.path.join(tmp, "source")
+            os.makedirs(source)
+            paths = synthetic_replays(source)
+
+        raw_size = sum(os.path.getsize(path) for path in paths)
+        print(f"{len(paths)} replays, {raw_size / 1e6:.1f} MB uncompressed\n")
+        print(f"{'format':<14}{'size MB':>10}{'ratio':>8}{'write s':>10}{'extract s':>11}{'read s':>9}")
+
+        benches = [("zip", bench_zip), ("store zlib", lambda p, w: bench_store(p, w, COMPRESSION_ZLIB))]
+        if zstandard is not None:
+            benches.append(("store zstd", lambda p, w: bench_store(p, w, COMPRESSION_ZSTD)))
+
+        for name, bench in benches:
+            workdir = os.path.join(tmp, name.replace(" ", "_"))
+            os.makedirs(workdir)
+            size, write_time, extract_time, read_time = bench(paths, workdir)
+            extract = f"{extract_time:>11.3f}" if extract_time is not None else f"{'-':>11}"
+            print(
+                f"{name:<14}{size / 1e6:>10.2f}{raw_size / size:>8.1f}"
+                f"{write_time:>10.3f}{extract}{read_time:>9.3f}"
+            )
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,10 @@
+-- Game results waiting to be published to RabbitMQ, see
+-- server/game_results_outbox_service.py
+CREATE TABLE `game_results_outbox` (
+    `id` INT NOT NULL AUTO_INCREMENT PRIMARY KEY,
+    `message_id` VARCHAR(36) NOT NULL UNIQUE,
+    `game_id` INT NOT NULL,
+    `routing_key` VARCHAR(255) NOT NULL,
+    `payload` TEXT NOT NULL,
+    `create_time` TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
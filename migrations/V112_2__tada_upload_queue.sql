@@ -0,0 +1,9 @@
+-- Replays waiting to be uploaded to TADA, see server/tada_service.py
+CREATE TABLE `tada_upload_queue` (
+    `game_id` INT NOT NULL PRIMARY KEY,
+    -- Player to tell if the upload fails
+    `requester_id` INT NULL,
+    `attempts` INT NOT NULL DEFAULT 0,
+    `next_attempt` TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    `create_time` TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
@@ -18,9 +18,12 @@ from docopt import docopt
 
 import server
 from server.api.api_accessor import ApiAccessor
+from server.asyncio_extensions import install_event_loop_policy
 from server.config import config
 from server.game_service import GameService
+from server.http_client_service import HttpClientService
 from server.ice_servers.nts import TwilioNTS
+from server.loop_monitor import LoopMonitor
 from server.player_service import PlayerService
 from server.profiler import Profiler
 from server.protocol import SimpleJsonProtocol
@@ -47,7 +50,11 @@ async def main():
         port=int(config.DB_PORT),
         user=config.DB_LOGIN,
         password=config.DB_PASSWORD,
-        db=config.DB_NAME
+        db=config.DB_NAME,
+        pool_size=int(config.DB_POOL_SIZE),
+        max_overflow=int(config.DB_MAX_OVERFLOW),
+        pool_timeout=config.DB_POOL_TIMEOUT,
+        pool_recycle=config.DB_POOL_RECYCLE
     )
 
     # Set up services
@@ -60,25 +67,34 @@ async def main():
             "Twilio is not set up. You must set TWILIO_ACCOUNT_SID and TWILIO_TOKEN to use the Twilio ICE servers."
         )
 
-    api_accessor = ApiAccessor()
+    http_client_service = HttpClientService()
+    api_accessor = ApiAccessor(http_client_service)
 
     instance = server.ServerInstance(
         "LobbyServer",
         database,
         api_accessor,
         twilio_nts,
-        loop
+        loop,
+        http_client_service=http_client_service
     )
     player_service: PlayerService = instance.services["player_service"]
     game_service: GameService = instance.services["game_service"]
 
-    profiler = Profiler(player_service)
+    profiler = Profiler()
     profiler.refresh()
-    config.register_callback("PROFILING_COUNT", profiler.refresh)
-    config.register_callback("PROFILING_DURATION", profiler.refresh)
-    config.register_callback("PROFILING_INTERVAL", profiler.refresh)
+    config.register_callback("PROFILING_HZ", profiler.refresh)
+    config.register_callback("PROFILING_MAX_STACKS", profiler.refresh)
 
-    ctrl_server = await server.run_control_server(player_service, game_service)
+    loop_monitor = LoopMonitor()
+    loop_monitor.refresh()
+    config.register_callback("LOOP_MONITOR_INTERVAL", loop_monitor.refresh)
+    config.register_callback("LOOP_MONITOR_SLOW_CALLBACK_THRESHOLD", loop_monitor.refresh)
+    config.register_callback("LOOP_MONITOR_SLOW_CALLBACK_COUNT", loop_monitor.refresh)
+
+    ctrl_server = await server.run_control_server(
+        player_service, game_service, profiler, loop_monitor
+    )
 
     async def restart_control_server():
         nonlocal ctrl_server
@@ -86,7 +102,9 @@ async def main():
         await ctrl_server.shutdown()
         ctrl_server = await server.run_control_server(
             player_service,
-            game_service
+            game_service,
+            profiler,
+            loop_monitor
         )
     config.register_callback("CONTROL_SERVER_PORT", restart_control_server)
 
@@ -105,6 +123,8 @@ async def main():
     # Cleanup
     await instance.shutdown()
     await ctrl_server.shutdown()
+    profiler.stop()
+    loop_monitor.stop()
 
     # Close DB connections
     await database.close()
@@ -126,5 +146,6 @@ if __name__ == "__main__":
     )
     logger.addHandler(stderr_handler)
     logger.setLevel(config.LOG_LEVEL)
+    logger.info("Using the %s event loop", install_event_loop_policy(config.EVENT_LOOP))
 
     asyncio.run(main())
@@ -17,23 +17,29 @@ import server.metrics as metrics
 
 from .api.api_accessor import ApiAccessor
 from .asyncio_extensions import synchronizedmethod
+from .catalog_service import CatalogService
 from .config import TRACE, config
 from .configuration_service import ConfigurationService
 from .control import run_control_server
 from .core import Service, create_services
 from .db import FAFDatabase
+from .game_results_outbox_service import GameResultsOutboxService
 from .game_service import GameService
 from .gameconnection import GameConnection
 from .games import GameState
 from .geoip_service import GeoIpService
+from .http_client_service import HttpClientService
 from .ice_servers.nts import TwilioNTS
 from .ladder_service import LadderService
 from .lobbyconnection import LobbyConnection
+from .login_admission import LoginAdmissionController
 from .message_queue_service import MessageQueueService
 from .party_service import PartyService
 from .player_service import PlayerService
+from .policy_service import PolicyService
 from .protocol import Protocol, QDataStreamProtocol
 from .rating_service.rating_service import RatingService
+from .replay_archive_service import ReplayArchiveService
 from .servercontext import ServerContext
 from .stats.game_stats_service import GameStatsService
 from .tada_service import TadaService
@@ -46,16 +52,21 @@ __license__ = "GPLv3"
 __copyright__ = "Copyright (c) 2011-2015 " + __author__
 
 __all__ = (
+    "CatalogService",
     "ConfigurationService",
     "GameConnection",
+    "GameResultsOutboxService",
     "GameService",
     "GameStatsService",
     "GeoIpService",
+    "HttpClientService",
     "LadderService",
     "MessageQueueService",
     "PartyService",
+    "PolicyService",
     "RatingService",
     "RatingService",
+    "ReplayArchiveService",
     "ServerInstance",
     "abc",
     "control",
@@ -88,6 +99,7 @@ class ServerInstance(object):
         api_accessor: Optional[ApiAccessor],
         twilio_nts: Optional[TwilioNTS],
         loop: asyncio.BaseEventLoop,
+        http_client_service: Optional[HttpClientService] = None,
         # For testing
         _override_services: Optional[Dict[str, Service]] = None
     ):
@@ -102,11 +114,19 @@ class ServerInstance(object):
 
         self.contexts: Set[ServerContext] = set()
 
-        self.services = _override_services or create_services({
+        injectables = {
             "database": self.database,
             "api_accessor": self.api_accessor,
             "loop": self.loop,
-        })
+        }
+        if http_client_service is not None:
+            # Shared with the ApiAccessor which is created before the services
+            injectables["http_client_service"] = http_client_service
+
+        self.services = _override_services or create_services(injectables)
+
+        # Shared by all contexts so the handshake limit is global
+        self.login_admission = LoginAdmissionController()
 
         self.connection_factory = lambda: LobbyConnection(
             database=database,
@@ -116,7 +136,10 @@ class ServerInstance(object):
             players=self.services["player_service"],
             ladder_service=self.services["ladder_service"],
             party_service=self.services["party_service"],
-            tada_service=self.services["tada_service"]
+            tada_service=self.services["tada_service"],
+            policy_service=self.services["policy_service"],
+            login_admission=self.login_admission,
+            catalog_service=self.services["catalog_service"]
         )
 
     def write_broadcast(self, message, predicate=lambda conn: conn.authenticated):
@@ -153,6 +176,7 @@ class ServerInstance(object):
             dirty_queues = game_service.dirty_queues
             dirty_players = player_service.dirty_players
             dirty_replay_uploads = tada_service.dirty_uploads
+            failed_replay_uploads = tada_service.failed_uploads
             dirty_galactic_war = galactic_war_service.get_dirty()
             game_service.clear_dirty()
             player_service.clear_dirty()
@@ -216,6 +240,19 @@ class ServerInstance(object):
                     lambda lobby_conn: lobby_conn.authenticated
                 )
 
+            for taf_replay_id, requester_id in failed_replay_uploads:
+                self.write_broadcast(
+                    {
+                        "command": "notice",
+                        "style": "error",
+                        "text": f"Replay {taf_replay_id} could not be uploaded to TADA",
+                        "i18n_key": "tada.server.upload.failed"
+                    },
+                    lambda lobby_conn, requester_id=requester_id: (
+                        lobby_conn.authenticated and lobby_conn.player.id == requester_id
+                    )
+                )
+
         @at_interval(45, loop=self.loop)
         def ping_broadcast():
             self.write_broadcast({"command": "ping"})
@@ -237,7 +274,8 @@ class ServerInstance(object):
             f"{self.name}[{protocol_class.__name__}]",
             self.connection_factory,
             list(self.services.values()),
-            protocol_class
+            protocol_class,
+            transport=config.LOBBY_TRANSPORT
         )
         self.contexts.add(ctx)
 
@@ -8,6 +8,7 @@ from oauthlib.oauth2.rfc6749.errors import (
 
 from server.config import config
 from server.decorators import with_logger
+from server.http_client_service import HttpClientService
 
 from .oauth_session import OAuth2Session
 
@@ -17,7 +18,8 @@ class SessionManager:
     """
     Garantor for API access
     """
-    def __init__(self):
+    def __init__(self, http_client_service: Optional[HttpClientService] = None):
+        self.http_client_service = http_client_service
         self.session = None  # Instance of session
 
     async def get_session(self) -> Optional[OAuth2Session]:
@@ -25,7 +27,8 @@ class SessionManager:
             self.session = OAuth2Session(
                 client_id=config.API_CLIENT_ID,
                 client_secret=config.API_CLIENT_SECRET,
-                token_url=config.API_TOKEN_URI
+                token_url=config.API_TOKEN_URI,
+                http_client_service=self.http_client_service
             )
         if not self.session.is_expired():
             return self.session
@@ -58,14 +61,17 @@ class SessionManager:
 
 @with_logger
 class ApiAccessor:
-    def __init__(self):
-        self.api_session = SessionManager()
-
-    async def update_achievements(self, achievements_data, player_id):
-
+    def __init__(self, http_client_service: Optional[HttpClientService] = None):
+        self.api_session = SessionManager(http_client_service)
+
+    async def update_achievements(self, achievements_data, player_id=None):
+        """
+        Updates may be for several players if they carry their own
+        `player_id`, otherwise they are all for `player_id`.
+        """
         # Converting the achievements to a format the jAPI can understand
         for achievement in achievements_data:
-            achievement["playerId"] = player_id
+            achievement["playerId"] = achievement.pop("player_id", player_id)
             achievement["achievementId"] = achievement.pop("achievement_id")
             achievement["operation"] = achievement.pop("update_type")
 
@@ -73,11 +79,14 @@ class ApiAccessor:
 
         return await self.api_patch("achievements/update", achievements_data)
 
-    async def update_events(self, events_data, player_id):
-
+    async def update_events(self, events_data, player_id=None):
+        """
+        Updates may be for several players if they carry their own
+        `player_id`, otherwise they are all for `player_id`.
+        """
         # Converting the events to a format the jAPI can understand
         for event in events_data:
-            event["playerId"] = player_id
+            event["playerId"] = event.pop("player_id", player_id)
             event["eventId"] = event.pop("event_id")
 
         self._logger.debug("Sending event data: %s", events_data)
@@ -1,13 +1,14 @@
 import os
 import time
-from typing import Dict
+from typing import Dict, Optional
 
-import aiohttp
 from oauthlib.oauth2.rfc6749.errors import (
     InsecureTransportError,
     MissingTokenError
 )
 
+from ..http_client_service import HttpClientService
+
 
 class OAuth2Session(object):
     def __init__(
@@ -15,7 +16,9 @@ class OAuth2Session(object):
         client_id,
         client_secret: str,
         token_url: str,
+        http_client_service: Optional[HttpClientService] = None
     ) -> None:
+        self.http_client_service = http_client_service or HttpClientService()
         self.client_id = client_id
         self.client_secret = client_secret
         self.token_url = token_url
@@ -66,9 +69,10 @@ class OAuth2Session(object):
         self.token_time = time.time()
 
     async def _make_request(self, data: Dict[str, str]) -> Dict[str, str]:
-        async with aiohttp.ClientSession(raise_for_status=True) as session:
-            async with session.post(self.token_url, data=data) as resp:
-                return await resp.json()
+        async with self.http_client_service.request(
+            "api", "POST", self.token_url, data=data, raise_for_status=True
+        ) as resp:
+            return await resp.json()
 
     async def request(self, method: str, url: str, raise_for_status=False, **kwargs):
         if self.token is None:
@@ -78,6 +82,7 @@ class OAuth2Session(object):
                 "Authorization": f"Bearer {self.token}"
             }
         })
-        async with aiohttp.ClientSession(raise_for_status=raise_for_status) as session:
-            async with session.request(method, url, **kwargs) as resp:
-                return resp.status, await resp.json()
+        async with self.http_client_service.request(
+            "api", method, url, raise_for_status=raise_for_status, **kwargs
+        ) as resp:
+            return resp.status, await resp.json()
@@ -17,8 +17,16 @@ from typing import (
     overload
 )
 
+try:
+    import uvloop
+except ImportError:  # pragma: no cover
+    uvloop = None
+
 logger = logging.getLogger(__name__)
 
+EVENT_LOOP_ASYNCIO = "asyncio"
+EVENT_LOOP_UVLOOP = "uvloop"
+
 AsyncFunc = Callable[..., Coroutine[Any, Any, Any]]
 AsyncDecorator = Callable[[AsyncFunc], AsyncFunc]
 
@@ -46,6 +54,25 @@ async def gather_without_exceptions(
     return results
 
 
+def install_event_loop_policy(preferred: str) -> str:
+    """
+    Make `asyncio.run` use the `preferred` event loop, falling back to the
+    asyncio loop if the `uvloop` package is not installed.
+
+    :return: the name of the event loop that will be used
+    """
+    if preferred == EVENT_LOOP_UVLOOP:
+        if uvloop is not None:
+            asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+            return EVENT_LOOP_UVLOOP
+        logger.warning("uvloop is not installed, using the asyncio event loop")
+    elif preferred != EVENT_LOOP_ASYNCIO:
+        logger.warning("Unknown event loop %r, using the asyncio event loop", preferred)
+
+    asyncio.set_event_loop_policy(None)
+    return EVENT_LOOP_ASYNCIO
+
+
 # Based on python3.8 asyncio.Lock
 # https://github.com/python/cpython/blob/6c6c256df3636ff6f6136820afaefa5a10a3ac33/Lib/asyncio/locks.py#L106
 class SpinLock(_ContextManagerMixin):
@@ -0,0 +1,165 @@
+"""
+Read-through cache for rarely changing catalog data
+"""
+
+import time
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+import aiocron
+
+from . import metrics
+from .config import config
+from .core import Service
+from .db import FAFDatabase
+from .decorators import with_logger
+
+MapKey = Tuple[str, str]
+
+
+class MapVersion(NamedTuple):
+    id: int
+    filename: str
+    ranked: bool
+
+
+@with_logger
+class CatalogService(Service):
+    """
+        Keeps map versions, coop maps and the mod vault front page in memory
+    so that selecting a map or listing coop maps and mods does not need a
+    database round trip. Everything is reloaded on the same schedule as
+    `GameService.update_data`.
+
+        Map versions that were added since the last reload are looked up in
+    the database on a cache miss. Maps that don't exist at all are remembered
+    for `CATALOG_NEGATIVE_CACHE_TTL` seconds.
+    """
+
+    def __init__(self, database: FAFDatabase):
+        self._db = database
+        self._map_versions: Dict[MapKey, MapVersion] = {}
+        self._missing_maps: Dict[MapKey, float] = {}
+        self._coop_maps: Optional[List] = None
+        self._top_mods: Optional[List] = None
+
+    async def initialize(self) -> None:
+        await self.update_data()
+        self._update_cron = aiocron.crontab(
+            "*/10 * * * *", func=self.update_data
+        )
+
+    async def update_data(self) -> None:
+        async with self._db.acquire() as conn:
+            result = await conn.execute(
+                "SELECT id, filename, ranked FROM map_version "
+                "ORDER BY version DESC"
+            )
+            map_versions = {}
+            for row in result:
+                key = self._map_key_from_filename(row.filename)
+                if key is not None:
+                    # Rows are ordered by version, so keep the first one
+                    map_versions.setdefault(key, MapVersion(*row))
+
+            self._coop_maps = await self._fetch_coop_maps(conn)
+            self._top_mods = await self._fetch_top_mods(conn)
+
+        self._map_versions = map_versions
+        self._missing_maps.clear()
+        self._logger.debug(
+            "Loaded %d map versions, %d coop maps and %d mods",
+            len(self._map_versions), len(self._coop_maps), len(self._top_mods)
+        )
+
+    async def get_map_version(
+        self,
+        map_name: str,
+        crc: str
+    ) -> Optional[MapVersion]:
+        """
+        Return the newest map version whose filename ends in `map_name/crc`.
+        """
+        key = (map_name.lower(), crc.lower())
+
+        version = self._map_versions.get(key)
+        if version is not None:
+            metrics.catalog_lookups.labels("map_version", "hit").inc()
+            return version
+
+        expires_at = self._missing_maps.get(key)
+        if expires_at is not None:
+            if time.monotonic() < expires_at:
+                metrics.catalog_lookups.labels("map_version", "negative").inc()
+                return None
+            del self._missing_maps[key]
+
+        metrics.catalog_lookups.labels("map_version", "miss").inc()
+        async with self._db.acquire() as conn:
+            result = await conn.execute(
+                "SELECT id, filename, ranked FROM map_version "
+                "WHERE filename like :map_path order by version desc limit 1",
+                map_path=f"%/{map_name}/{crc}"
+            )
+            row = result.fetchone()
+
+        if row is not None:
+            version = MapVersion(*row)
+            self._map_versions[key] = version
+        elif config.CATALOG_NEGATIVE_CACHE_TTL > 0:
+            self._missing_maps[key] = (
+                time.monotonic() + config.CATALOG_NEGATIVE_CACHE_TTL
+            )
+
+        return version
+
+    async def get_coop_maps(self) -> List:
+        if self._coop_maps is None:
+            async with self._db.acquire() as conn:
+                self._coop_maps = await self._fetch_coop_maps(conn)
+        else:
+            metrics.catalog_lookups.labels("coop_maps", "hit").inc()
+
+        return self._coop_maps
+
+    async def get_top_mods(self) -> List:
+        """
+        Return the 100 most liked mods for the mod vault front page.
+        """
+        if self._top_mods is None:
+            async with self._db.acquire() as conn:
+                self._top_mods = await self._fetch_top_mods(conn)
+        else:
+            metrics.catalog_lookups.labels("top_mods", "hit").inc()
+
+        return self._top_mods
+
+    def invalidate_top_mods(self) -> None:
+        self._top_mods = None
+
+    async def _fetch_coop_maps(self, conn) -> List:
+        metrics.catalog_lookups.labels("coop_maps", "miss").inc()
+        result = await conn.execute(
+            "SELECT id, type, name, description, filename FROM coop_map"
+        )
+        return result.fetchall()
+
+    async def _fetch_top_mods(self, conn) -> List:
+        metrics.catalog_lookups.labels("top_mods", "miss").inc()
+        result = await conn.execute(
+            "SELECT uid, name, version, author, ui, date, downloads, likes, "
+            "played, description, filename, icon FROM table_mod "
+            "ORDER BY likes DESC LIMIT 100"
+        )
+        return result.fetchall()
+
+    @staticmethod
+    def _map_key_from_filename(filename: Optional[str]) -> Optional[MapKey]:
+        if not filename:
+            return None
+
+        parts = filename.rsplit("/", 2)
+        if len(parts) < 3:
+            return None
+
+        # MySQL `LIKE` is case insensitive with the default collation
+        return (parts[1].lower(), parts[2].lower())
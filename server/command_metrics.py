@@ -0,0 +1,77 @@
+"""
+Per command metrics for lobby and GPGNet messages.
+
+Handler latency, message size and database time are labelled by command
+name. Only names of commands the server handles, or sends itself, are used as
+labels so that clients can't create arbitrary many time series.
+"""
+
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Optional, Set
+
+from server import metrics
+
+UNKNOWN_COMMAND = "other"
+# Limit on the number of distinct outbound command labels
+MAX_SENT_COMMAND_LABELS = 200
+
+
+class CommandStats(object):
+    __slots__ = ("db_seconds", )
+
+    def __init__(self):
+        self.db_seconds = 0.0
+
+
+# Stats of the command being handled in the current context. Tasks started by
+# the handler share them, so their queries count towards the command as well.
+_current_command: ContextVar[Optional[CommandStats]] = ContextVar(
+    "current_command", default=None
+)
+_sent_command_labels: Set[str] = set()
+
+
+@contextmanager
+def measure_command(target: str, command: str, size: int):
+    """
+    Time handling a received message and the database queries made while
+    handling it.
+    """
+    stats = CommandStats()
+    token = _current_command.set(stats)
+    start = time.perf_counter()
+    try:
+        yield stats
+    finally:
+        elapsed = time.perf_counter() - start
+        _current_command.reset(token)
+        metrics.command_duration.labels(target, command).observe(elapsed)
+        metrics.command_db_duration.labels(target, command).observe(stats.db_seconds)
+        metrics.received_message_bytes.labels(target, command).observe(size)
+
+
+def add_db_time(seconds: float) -> None:
+    stats = _current_command.get()
+    if stats is not None:
+        stats.db_seconds += seconds
+
+
+def sent_command_label(command) -> str:
+    if command in _sent_command_labels:
+        return command
+    if (
+        isinstance(command, str)
+        and command.isidentifier()
+        and len(_sent_command_labels) < MAX_SENT_COMMAND_LABELS
+    ):
+        _sent_command_labels.add(command)
+        return command
+    return UNKNOWN_COMMAND
+
+
+def count_sent(protocol: str, command, size: int, recipients: int = 1) -> None:
+    label = sent_command_label(command)
+    metrics.sent_command_messages.labels(protocol, label).inc(recipients)
+    metrics.sent_command_bytes.labels(protocol, label).inc(size * recipients)
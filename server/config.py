@@ -31,11 +31,27 @@ class ConfigurationStore:
         """
         self.CONFIGURATION_REFRESH_TIME = 300
         self.LOG_LEVEL = "DEBUG"
-        self.PROFILING_COUNT = 300
-        self.PROFILING_DURATION = 2
-        self.PROFILING_INTERVAL = -1
+        # Stack samples of the event loop per second, 0 to disable
+        self.PROFILING_HZ = 0
+        # Distinct stacks kept, further ones are counted together
+        self.PROFILING_MAX_STACKS = 10000
+
+        # Seconds between event loop lag measurements, 0 to disable
+        self.LOOP_MONITOR_INTERVAL = 1
+        self.LOOP_MONITOR_SLOW_CALLBACK_THRESHOLD = 0.05
+        # Number of recent slow callbacks listed by the control server
+        self.LOOP_MONITOR_SLOW_CALLBACK_COUNT = 50
+
+        # "uvloop" falls back to "asyncio" if the uvloop package is missing.
+        # Only read at startup.
+        self.EVENT_LOOP = "asyncio"
+        # "streams" reads through asyncio streams, "protocol" decodes
+        # messages as they arrive, see server/protocol/transport.py
+        self.LOBBY_TRANSPORT = "streams"
 
         self.CONTROL_SERVER_PORT = 4000
+        # Number of games or players serialised between yields to the loop
+        self.CONTROL_SERVER_CHUNK_SIZE = 100
         self.METRICS_PORT = 8011
         self.ENABLE_METRICS = False
 
@@ -44,12 +60,29 @@ class ConfigurationStore:
         self.DB_LOGIN = "root"
         self.DB_PASSWORD = "banana"
         self.DB_NAME = "faf"
+        self.DB_POOL_SIZE = 10
+        self.DB_MAX_OVERFLOW = 10
+        self.DB_POOL_TIMEOUT = 30
+        # MySQL drops idle connections after `wait_timeout` (8 hours default)
+        self.DB_POOL_RECYCLE = 3600
+        # Queries taking longer than this many seconds are logged
+        self.DB_SLOW_QUERY_THRESHOLD = 0.5
 
         self.API_CLIENT_ID = "client_id"
         self.API_CLIENT_SECRET = "banana"
         self.API_TOKEN_URI = "https://api.test.taforever.com/oauth/token"
         self.API_BASE_URL = "https://api.test.taforever.com/"
         self.USE_API = True
+        # Achievement and event updates of all players are collected for this
+        # many seconds and sent to the API together
+        self.API_UPDATE_BATCH_WINDOW = 1.0
+
+        # Connection pool settings for each upstream of the HttpClientService
+        self.HTTP_CLIENT_POOL_SIZE = 100
+        self.HTTP_CLIENT_LIMIT_PER_HOST = 20
+        self.HTTP_CLIENT_KEEPALIVE_TIMEOUT = 60
+        self.HTTP_CLIENT_DNS_CACHE_TTL = 300
+        self.HTTP_CLIENT_TIMEOUT = 60
 
         self.MQ_USER = "faf-lobby"
         self.MQ_PASSWORD = "banana"
@@ -57,11 +90,68 @@ class ConfigurationStore:
         self.MQ_PORT = 5672
         self.MQ_VHOST = "/faf-lobby"
         self.MQ_EXCHANGE_NAME = "faf-rabbitmq"
+        # Messages published in one go before waiting for broker confirms
+        self.MQ_PUBLISH_BATCH_SIZE = 100
+        # Oldest messages are dropped when the outbound buffer is full
+        self.MQ_PUBLISH_BUFFER_SIZE = 10000
+        self.MQ_PUBLISH_RETRY_DELAY = 1
+        # If set, unpublished messages are written here on shutdown and
+        # published again on the next start
+        self.MQ_PUBLISH_SPOOL_FILE = None
+        # Game results are relayed from the outbox table at least this often
+        self.GAME_RESULTS_OUTBOX_RELAY_INTERVAL = 10
+        self.GAME_RESULTS_OUTBOX_BATCH_SIZE = 100
+        # Seconds to wait for RabbitMQ to confirm a batch before retrying it
+        self.GAME_RESULTS_OUTBOX_CONFIRM_TIMEOUT = 30
 
         self.WWW_URL = "https://www.taforever.com"
         self.CONTENT_URL = "http://content.taforever.com"
+        self.REPLAY_DIR = "/content/replays"
+        self.REPLAY_ARCHIVE_POLL_INTERVAL = 5
+        # Number of processes compressing replays
+        self.REPLAY_ARCHIVE_WORKERS = 2
+        # Maximum number of replays being compressed at the same time
+        self.REPLAY_ARCHIVE_CONCURRENCY = 4
+        # Store replays in deduplicated pack files instead of one zip each
+        self.REPLAY_STORE_ENABLED = False
+        self.REPLAY_STORE_DIR = "/content/replays/store"
+        # "zstd" falls back to "zlib" if the zstandard package is missing
+        self.REPLAY_STORE_COMPRESSION = "zstd"
+        self.REPLAY_STORE_COMPRESSION_LEVEL = None
+        self.REPLAY_STORE_PACK_SIZE = 1 << 30
+        self.REPLAY_METADATA_BATCH_SIZE = 200
+        # Metadata is processed once a minute, so give up on games that were
+        # not persisted within a day
+        self.REPLAY_METADATA_MAX_ATTEMPTS = 1440
+        # Seconds after it was last written that an unreadable metadata file
+        # is moved to REPLAY_DIR/rejected
+        self.REPLAY_METADATA_REJECT_AGE = 300
         self.FAF_POLICY_SERVER_BASE_URL = "http://faf-policy-server"
         self.USE_POLICY_SERVER = True
+        self.POLICY_SERVER_TIMEOUT = 5
+        # Consecutive failures after which the policy server is not called for
+        # POLICY_SERVER_RESET_TIMEOUT seconds
+        self.POLICY_SERVER_FAILURE_THRESHOLD = 5
+        self.POLICY_SERVER_RESET_TIMEOUT = 30
+        # Whether to let players in while the policy server is unavailable.
+        # Off by default so that VM and multi-account detection can't be
+        # bypassed by an outage.
+        self.POLICY_SERVER_FAIL_OPEN = False
+        self.POLICY_VERDICT_CACHE_TTL = 60 * 60
+        self.POLICY_VERDICT_CACHE_SIZE = 20000
+        # How long to remember that a map version does not exist
+        self.CATALOG_NEGATIVE_CACHE_TTL = 60
+
+        # Login handshakes processed concurrently. The rest are queued.
+        self.LOGIN_MAX_CONCURRENT_HANDSHAKES = 50
+        # Login handshakes allowed to wait for admission before new ones are rejected
+        self.LOGIN_MAX_QUEUED_HANDSHAKES = 10000
+
+        # ICE messages to the same peer within this many seconds are written
+        # together, 0 to write them on the next loop iteration
+        self.ICE_RELAY_BATCH_WINDOW = 0.005
+        # ICE messages are dropped while a peer has this many unsent bytes
+        self.ICE_RELAY_MAX_BUFFERED_BYTES = 256 * 1024
 
         self.FORCE_STEAM_LINK_AFTER_DATE = 1536105599  # 5 september 2018 by default
         self.FORCE_STEAM_LINK = False
@@ -71,6 +161,9 @@ class ConfigurationStore:
         self.START_RATING_MEAN = 1500
         self.START_RATING_DEV = 500
         self.TOP_PLAYER_MIN_RATING = 1600
+        # Games with at least this many players are rated in a worker process
+        self.RATING_WORKER_MIN_PLAYERS = 8
+        self.RATING_WORKERS = 1
 
         self.TWILIO_ACCOUNT_SID = ""
         self.TWILIO_TOKEN = ""
@@ -101,6 +194,16 @@ class ConfigurationStore:
         self.TADA_API_URL = 'https://tademos.xyz'
         self.TADA_UPLOAD_ENABLE = True
         self.TADA_UPLOAD_MAX_SIZE_MB = 164
+        self.TADA_UPLOAD_CONCURRENCY = 2
+        self.TADA_UPLOAD_POLL_INTERVAL = 60
+        self.TADA_UPLOAD_MAX_ATTEMPTS = 5
+        # Retries back off exponentially from TADA_UPLOAD_RETRY_DELAY seconds
+        self.TADA_UPLOAD_RETRY_DELAY = 60
+        self.TADA_UPLOAD_MAX_RETRY_DELAY = 3600
+        self.TADA_LATEST_GAMES_CACHE_TTL = 5
+        # How to look for an uploaded game in the list of latest TADA games
+        self.TADA_FIND_UPLOAD_ATTEMPTS = 3
+        self.TADA_FIND_UPLOAD_DELAY = 5
 
         self.GALACTIC_WAR_STATE_FILE = "/content/galactic_war/galactic_war.json"
         self.GALACTIC_WAR_SCENARIO_PATH = "/content/galactic_war/scenarios"
@@ -118,6 +221,7 @@ class ConfigurationStore:
         self.GALACTIC_WAR_INITIALISE_ENSURE_RANKED_MAPS = True
         self.GALACTIC_WAR_DEFAULT_PLANET_SIZE = 100
         self.GALACTIC_WAR_MANUAL_CAPTURE = ""           # capture a planet for debugging purposes. eg "Core Prime:arm;Empyrrean:arm"
+        self.GALACTIC_WAR_STATE_COMPACT_EVENTS = 100    # planet changes logged before the state file is rewritten
         self.ENABLE_FACTION_LOOKUP_FROM_REPLAY_META = True
 
         self.PUBLISH_GAME_INFO_WITH_PINGS_ONLY = False
@@ -2,15 +2,20 @@
 Tiny local-only http server for getting stats and performing various tasks
 """
 
+import asyncio
 import socket
+import uuid
 from json import dumps
+from typing import Callable, Iterable, Optional, Set
 
 from aiohttp import web
 
 from .config import config
 from .decorators import with_logger
 from .game_service import GameService
+from .loop_monitor import LoopMonitor
 from .player_service import PlayerService
+from .profiler import Profiler
 
 
 @with_logger
@@ -20,19 +25,30 @@ class ControlServer:
         game_service: GameService,
         player_service: PlayerService,
         host: str,
-        port: int
+        port: int,
+        profiler: Optional[Profiler] = None,
+        loop_monitor: Optional[LoopMonitor] = None
     ):
         self.game_service = game_service
         self.player_service = player_service
+        self.profiler = profiler
+        self.loop_monitor = loop_monitor
         self.host = host
         self.port = port
 
+        # Distinguishes the versions of this process from those of a previous
+        # one, which start counting from zero again
+        self._etag_prefix = uuid.uuid4().hex[:8]
+
         self.app = web.Application()
         self.runner = web.AppRunner(self.app)
 
         self.app.add_routes([
             web.get("/games", self.games),
-            web.get("/players", self.players)
+            web.get("/players", self.players),
+            web.get("/profile", self.profile),
+            web.get("/slow_callbacks", self.slow_callbacks),
+            web.get("/ice_relay", self.ice_relay)
         ])
 
     async def start(self) -> None:
@@ -47,17 +63,155 @@ class ControlServer:
         await self.runner.cleanup()
 
     async def games(self, request):
-        body = dumps(to_dict_list(self.game_service.all_games))
-        return web.Response(body=body.encode(), content_type="application/json")
+        """
+        Query parameters:
+            state: game state, e.g. `live`
+            mod: featured mod
+            queue: matchmaker queue id
+            player: id of a player in the game
+            after: only games with a higher id
+            limit: maximum number of games
+        """
+        states = _query_set(request, "state")
+        mods = _query_set(request, "mod")
+        queues = _query_set(request, "queue", int)
+        player_ids = _query_set(request, "player", int)
+
+        def match(game) -> bool:
+            return (
+                (states is None or game.state.name.lower() in states)
+                and (mods is None or game.game_mode in mods)
+                and (queues is None or game.matchmaker_queue_id in queues)
+                and (player_ids is None or any(p.id in player_ids for p in game.players))
+            )
+
+        return await self._stream(
+            request, self.game_service.version, self.game_service.all_games, match
+        )
 
     async def players(self, request):
-        body = dumps(to_dict_list(self.player_service.all_players))
-        return web.Response(body=body.encode(), content_type="application/json")
+        """
+        Query parameters:
+            state: player state, e.g. `playing`
+            player: player id
+            after: only players with a higher id
+            limit: maximum number of players
+        """
+        states = _query_set(request, "state")
+        player_ids = _query_set(request, "player", int)
+
+        def match(player) -> bool:
+            return (
+                (states is None or player.state.name.lower() in states)
+                and (player_ids is None or player.id in player_ids)
+            )
+
+        return await self._stream(
+            request, self.player_service.version, self.player_service.all_players, match
+        )
+
+    async def profile(self, request):
+        """
+        The stacks sampled by the profiler in folded format, for flamegraph.pl
+        or speedscope.
+
+        Query parameters:
+            reset: start a new profile after this one
+        """
+        if self.profiler is None:
+            raise web.HTTPNotFound(text="profiler not available")
+
+        body, samples = self.profiler.snapshot(reset="reset" in request.query)
+        return web.Response(text=body, headers={
+            "X-Profile-Samples": str(samples),
+            "X-Profile-Running": str(self.profiler.running).lower()
+        })
+
+    async def slow_callbacks(self, request):
+        """
+        The slowest recent event loop callbacks.
+
+        Query parameters:
+            limit: maximum number of callbacks
+        """
+        if self.loop_monitor is None:
+            raise web.HTTPNotFound(text="loop monitor not available")
+
+        slowest = self.loop_monitor.slowest(_query_int(request, "limit"))
+        return web.json_response([c.to_dict() for c in slowest])
+
+    async def ice_relay(self, request):
+        """
+        ICE relay counters of the games that relayed the most messages.
+
+        Query parameters:
+            limit: maximum number of games
+        """
+        games = sorted(
+            (g for g in self.game_service.all_games if g.ice_relay_stats.relayed),
+            key=lambda g: g.ice_relay_stats.relayed,
+            reverse=True
+        )
+        limit = _query_int(request, "limit")
+        if limit is not None:
+            games = games[:limit]
+        return web.json_response([
+            {"game_id": g.id, **g.ice_relay_stats.to_dict()} for g in games
+        ])
+
+    async def _stream(
+        self,
+        request: web.Request,
+        version: int,
+        objects: Iterable,
+        match: Callable[[object], bool]
+    ) -> web.StreamResponse:
+        """
+        Write the matching objects as a JSON list ordered by id, a chunk at a
+        time. If there are more objects than `limit`, the `Link` header has
+        the url of the next page.
+        """
+        etag = f"{self._etag_prefix}-{version}"
+        if any(e.value in (etag, "*") for e in request.if_none_match or ()):
+            raise web.HTTPNotModified(headers={"ETag": f'"{etag}"'})
+
+        after = _query_int(request, "after")
+        limit = _query_int(request, "limit")
+        if limit is not None and limit < 1:
+            raise web.HTTPBadRequest(text="limit must be positive")
+
+        # Select up front, the objects may change while the response is sent
+        selected = sorted(
+            (o for o in objects if (after is None or o.id > after) and match(o)),
+            key=lambda o: o.id
+        )
+        response = web.StreamResponse()
+        response.content_type = "application/json"
+        response.etag = etag
+        if limit is not None and len(selected) > limit:
+            selected = selected[:limit]
+            next_url = request.rel_url.update_query(after=selected[-1].id)
+            response.headers["Link"] = f'<{next_url}>; rel="next"'
+        response.enable_chunked_encoding()
+        await response.prepare(request)
+
+        await response.write(b"[")
+        chunk_size = config.CONTROL_SERVER_CHUNK_SIZE
+        for i in range(0, len(selected), chunk_size):
+            body = ", ".join(dumps(o.to_dict()) for o in selected[i:i + chunk_size])
+            await response.write((", " + body if i else body).encode())
+            # Let the lobby run between chunks of a large response
+            await asyncio.sleep(0)
+        await response.write(b"]")
+        await response.write_eof()
+        return response
 
 
 async def run_control_server(
     player_service: PlayerService,
-    game_service: GameService
+    game_service: GameService,
+    profiler: Optional[Profiler] = None,
+    loop_monitor: Optional[LoopMonitor] = None
 ) -> ControlServer:
     """
     Initialize the http control server
@@ -65,7 +219,9 @@ async def run_control_server(
     host = socket.gethostbyname(socket.gethostname())
     port = config.CONTROL_SERVER_PORT
 
-    ctrl_server = ControlServer(game_service, player_service, host, port)
+    ctrl_server = ControlServer(
+        game_service, player_service, host, port, profiler, loop_monitor
+    )
     await ctrl_server.start()
 
     return ctrl_server
@@ -73,3 +229,30 @@ async def run_control_server(
 
 def to_dict_list(list_):
     return list(map(lambda p: p.to_dict(), list_))
+
+
+def _query_set(request: web.Request, key: str, type_=str) -> Optional[Set]:
+    """
+    :return: the values of a query parameter, which may be repeated or comma
+    separated, or None if it was not given
+    """
+    values = [
+        value for param in request.query.getall(key, ())
+        for value in param.split(",") if value
+    ]
+    if not values:
+        return None
+    try:
+        return set(map(type_, values))
+    except ValueError:
+        raise web.HTTPBadRequest(text=f"invalid {key}")
+
+
+def _query_int(request: web.Request, key: str) -> Optional[int]:
+    value = request.query.get(key)
+    if value is None:
+        return None
+    try:
+        return int(value)
+    except ValueError:
+        raise web.HTTPBadRequest(text=f"invalid {key}")
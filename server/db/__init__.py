@@ -4,18 +4,39 @@ Database interaction
 
 import asyncio
 import logging
+import re
+import time
 from contextlib import contextmanager
+from functools import lru_cache
 
-from sqlalchemy import create_engine, text
+from sqlalchemy import (
+    Delete,
+    Insert,
+    Select,
+    TextClause,
+    Update,
+    create_engine,
+    text
+)
 from sqlalchemy.exc import DBAPIError, OperationalError
 from sqlalchemy.ext.asyncio import AsyncConnection as _AsyncConnection
 from sqlalchemy.ext.asyncio import AsyncEngine as _AsyncEngine
+from sqlalchemy.sql import Join
 from sqlalchemy.util import EMPTY_DICT
 
-from server.metrics import db_exceptions
+from server.command_metrics import add_db_time
+from server.config import config
+from server.metrics import (
+    db_exceptions,
+    db_pool_checkout_duration,
+    db_query_duration,
+    db_slow_queries
+)
 
 logger = logging.getLogger(__name__)
 
+_TABLE_RE = re.compile(r"\b(?:from|into|update)\s+`?(\w+)", re.IGNORECASE)
+
 
 @contextmanager
 def stat_db_errors():
@@ -29,6 +50,66 @@ def stat_db_errors():
         raise e
 
 
+def query_name(statement, execution_options=EMPTY_DICT) -> str:
+    """
+    Return a stable name for a statement to label metrics with, e.g.
+    `"select:login"`. A name can also be given explicitly by passing the
+    `query_name` execution option.
+    """
+    name = execution_options.get("query_name")
+    if name is not None:
+        return name
+
+    if isinstance(statement, str):
+        return _text_query_name(statement)
+    if isinstance(statement, TextClause):
+        return _text_query_name(statement.text)
+    if isinstance(statement, (Insert, Update, Delete)):
+        return f"{statement.__visit_name__}:{_table_name(statement.table)}"
+    if isinstance(statement, Select):
+        froms = statement.get_final_froms()
+        table = _table_name(froms[0]) if froms else "none"
+        return f"select:{table}"
+
+    return statement.__class__.__name__.lower()
+
+
+@lru_cache(maxsize=1024)
+def _text_query_name(sql: str) -> str:
+    words = sql.split(maxsplit=1)
+    verb = words[0].lower() if words else "none"
+    match = _TABLE_RE.search(sql)
+    table = match.group(1) if match else "none"
+    return f"{verb}:{table}"
+
+
+def _table_name(clause) -> str:
+    while isinstance(clause, Join):
+        clause = clause.left
+    return getattr(clause, "name", None) or "anonymous"
+
+
+@contextmanager
+def stat_db_query(statement, execution_options=EMPTY_DICT):
+    """
+    Collect timing metrics on a query and log it if it was slow
+    """
+    name = query_name(statement, execution_options)
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        db_query_duration.labels(name).observe(elapsed)
+        add_db_time(elapsed)
+        if elapsed >= config.DB_SLOW_QUERY_THRESHOLD:
+            db_slow_queries.labels(name).inc()
+            logger.warning(
+                "Slow query %s took %.3fs: %.500s",
+                name, elapsed, statement
+            )
+
+
 class FAFDatabase:
     def __init__(
             self,
@@ -67,6 +148,16 @@ class AsyncEngine(_AsyncEngine):
 
 
 class AsyncConnection(_AsyncConnection):
+    async def start(self, is_ctxmanager=False):
+        """
+        Time how long it takes to check out a connection from the pool.
+        """
+        start = time.perf_counter()
+        try:
+            return await super().start(is_ctxmanager=is_ctxmanager)
+        finally:
+            db_pool_checkout_duration.observe(time.perf_counter() - start)
+
     async def execute(
             self,
             statement,
@@ -74,7 +165,7 @@ class AsyncConnection(_AsyncConnection):
             execution_options=EMPTY_DICT,
             **kwargs
     ):
-        with stat_db_errors():
+        with stat_db_errors(), stat_db_query(statement, execution_options):
             return await self._execute(
                 statement,
                 parameters=parameters,
@@ -112,7 +203,11 @@ class AsyncConnection(_AsyncConnection):
             execution_options=EMPTY_DICT,
             **kwargs
     ):
-        with stat_db_errors():
+        """
+        Note that the query timing only covers the time until the first rows
+        are available, not the time spent iterating over the result.
+        """
+        with stat_db_errors(), stat_db_query(statement, execution_options):
             return await self._stream(
                 statement,
                 parameters=parameters,
@@ -151,7 +246,7 @@ class AsyncConnection(_AsyncConnection):
             max_attempts=3,
             **kwargs
     ):
-        with stat_db_errors():
+        with stat_db_errors(), stat_db_query(statement, execution_options):
             return await self._deadlock_retry_execute(
                 statement,
                 parameters=parameters,
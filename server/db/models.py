@@ -11,7 +11,8 @@ from sqlalchemy import (
     MetaData,
     String,
     Table,
-    Text
+    Text,
+    text
 )
 
 from ..games.game_results import GameOutcome
@@ -133,6 +134,16 @@ game_player_stats = Table(
     Column("result",        Enum(GameOutcome)),
 )
 
+game_results_outbox = Table(
+    "game_results_outbox", metadata,
+    Column("id",            Integer,        primary_key=True),
+    Column("message_id",    String(36),     nullable=False, unique=True),
+    Column("game_id",       Integer,        nullable=False),
+    Column("routing_key",   String(255),    nullable=False),
+    Column("payload",       Text,           nullable=False),
+    Column("create_time",   TIMESTAMP,      nullable=False, server_default=text("CURRENT_TIMESTAMP"))
+)
+
 game_stats = Table(
     "game_stats", metadata,
     Column("id",        Integer,        primary_key=True),
@@ -317,6 +328,15 @@ matchmaker_queue_map_pool = Table(
     Column("max_rating",            Integer),
 )
 
+tada_upload_queue = Table(
+    "tada_upload_queue", metadata,
+    Column("game_id",       Integer,    primary_key=True, autoincrement=False),
+    Column("requester_id",  Integer),
+    Column("attempts",      Integer,    nullable=False, server_default="0"),
+    Column("next_attempt",  TIMESTAMP,  nullable=False, server_default=text("CURRENT_TIMESTAMP")),
+    Column("create_time",   TIMESTAMP,  nullable=False, server_default=text("CURRENT_TIMESTAMP"))
+)
+
 teamkills = Table(
     "teamkills", metadata,
     Column("id",            Integer, primary_key=True),
@@ -1,6 +1,7 @@
 import logging
 import time
 from functools import wraps
+from typing import Callable, NamedTuple, Optional, Tuple
 
 _logger = logging.getLogger(__name__)
 
@@ -30,3 +31,49 @@ def timed(*args, **kwargs):
         return _timed_decorator(args[0])
     else:
         return lambda f: _timed_decorator(f, *args, **kwargs)
+
+
+class CommandHandler(NamedTuple):
+    func: Callable
+    requires_auth: bool
+    # (name, type) of the fields a message must have, type None for any
+    fields: Tuple[Tuple[str, Optional[type]], ...]
+
+    def invalid_field(self, message: dict) -> Optional[str]:
+        """
+        :return: the name of the first missing or mistyped field, if any
+        """
+        for name, type_ in self.fields:
+            if name not in message:
+                return name
+            if type_ is not None and not isinstance(message[name], type_):
+                return name
+        return None
+
+
+def command(requires_auth: bool = True, **fields: Optional[type]):
+    """
+    Declare what a `command_*` handler needs: whether the connection must be
+    authenticated and which fields, of which type, the message must have.
+    """
+    def decorator(f):
+        f._command_spec = (requires_auth, tuple(fields.items()))
+        return f
+    return decorator
+
+
+def with_dispatch_table(cls):
+    """
+    Collect the `command_*` handlers of a class into a dict of command name to
+    `CommandHandler`, so dispatching a message is a single lookup.
+    """
+    prefix = "command_"
+    table = {}
+    for name in dir(cls):
+        if not name.startswith(prefix):
+            continue
+        func = getattr(cls, name)
+        requires_auth, fields = getattr(func, "_command_spec", (True, ()))
+        table[name[len(prefix):]] = CommandHandler(func, requires_auth, fields)
+    cls._dispatch_table = table
+    return cls
@@ -0,0 +1,73 @@
+from collections import deque
+from typing import Callable, Iterable, List, Optional, Tuple
+
+UNREACHABLE = -1
+
+
+class GalaxyGraph(object):
+    """
+    :brief undirected graph of planets connected by jump gates. Planets are addressed by their index in `node_ids`
+    and the neighbours of each planet are kept in an adjacency list, so traversals don't need any hashing
+    """
+
+    def __init__(self, node_ids: Iterable[int], edges: Iterable[Tuple[int, int]]):
+        self.node_ids = list(node_ids)
+        self.index_of = {node_id: idx for idx, node_id in enumerate(self.node_ids)}
+        self.adjacency: List[List[int]] = [[] for _ in self.node_ids]
+        for source_id, target_id in edges:
+            source, target = self.index_of[source_id], self.index_of[target_id]
+            if source == target or target in self.adjacency[source]:
+                continue
+            self.adjacency[source].append(target)
+            self.adjacency[target].append(source)
+
+    def __len__(self):
+        return len(self.node_ids)
+
+    def neighbours(self, idx: int) -> List[int]:
+        return self.adjacency[idx]
+
+    def distances(self, source: int, allowed: Optional[Callable[[int], bool]] = None) -> List[int]:
+        """
+        :brief breadth first search from `source`, only passing through nodes for which `allowed` is true
+        :return: number of jumps from `source` to each node, or UNREACHABLE
+        """
+        distances, _ = self._breadth_first(source, allowed)
+        return distances
+
+    def _breadth_first(self, source: int, allowed: Optional[Callable[[int], bool]] = None) -> Tuple[List[int], List[int]]:
+        """
+        :return: the distances from `source` and the nodes in the order they were reached
+        """
+        distances = [UNREACHABLE] * len(self.node_ids)
+        if allowed is not None and not allowed(source):
+            return distances, []
+
+        distances[source] = 0
+        order = [source]
+        queue = deque([source])
+        while queue:
+            idx = queue.popleft()
+            next_distance = distances[idx] + 1
+            for neighbour in self.adjacency[idx]:
+                if distances[neighbour] == UNREACHABLE and (allowed is None or allowed(neighbour)):
+                    distances[neighbour] = next_distance
+                    order.append(neighbour)
+                    queue.append(neighbour)
+        return distances, order
+
+    def reachable(self, source: int, allowed: Optional[Callable[[int], bool]] = None) -> List[bool]:
+        return [d != UNREACHABLE for d in self.distances(source, allowed)]
+
+    def farthest_pair(self) -> Tuple[int, int]:
+        """
+        :brief the two nodes with the longest shortest path between them. Ties go to the last source and
+        the last node its search reached, the same pair the sorted networkx all pairs shortest paths ended with
+        """
+        best = (0, 0, -1)
+        for source in range(len(self.node_ids)):
+            distances, order = self._breadth_first(source)
+            target = order[-1]
+            if distances[target] >= best[2]:
+                best = (source, target, distances[target])
+        return best[0], best[1]
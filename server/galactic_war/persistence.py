@@ -0,0 +1,122 @@
+"""
+Galactic War state files.
+
+The state is kept as a compact JSON snapshot plus an append-only log of the
+planets that changed since. Every log entry holds the full data of one planet
+and a sequence number, and the snapshot records the last sequence number it
+includes, so replaying the log on top of a snapshot is idempotent.
+
+These functions block, so the service runs them in an executor.
+"""
+
+import json
+import os
+import pickle
+from pathlib import Path
+from typing import Dict, List, NamedTuple
+
+from . import gml
+
+SEQUENCE_KEY = "log_sequence"
+
+
+class LoadedState(NamedTuple):
+    data: Dict
+    sequence: int       # sequence number of the last change included in data
+    log_entries: int    # number of log entries applied on top of the snapshot
+
+
+def get_log_path(path: Path) -> Path:
+    return path.with_suffix(".log")
+
+
+def copy_data(data: Dict) -> Dict:
+    """
+    :brief deep copy of state data, so it can be serialised in another thread while the original keeps changing
+    """
+    return pickle.loads(pickle.dumps(data, pickle.HIGHEST_PROTOCOL))
+
+
+def load_state(path: Path) -> LoadedState:
+    if path.suffix == ".gml":
+        with open(path, "rb") as fp:
+            return LoadedState(gml.read_gml(fp), 0, 0)
+
+    elif path.suffix == ".json":
+        with open(path, "r") as fp:
+            data = json.load(fp)
+        sequence = data.pop(SEQUENCE_KEY, 0)
+        sequence, log_entries = _replay_log(get_log_path(path), data, sequence)
+        return LoadedState(data, sequence, log_entries)
+
+    else:
+        raise ValueError(f"Unsupported Galactic War file type: {path}")
+
+
+def write_snapshot(path: Path, data: Dict, sequence: int) -> None:
+    """
+    :brief atomically replace the state file with `data`, which must be a private copy, and discard the log
+    """
+    if path.suffix != ".json":
+        raise ValueError(f"Unsupported Galactic War file type: {path}")
+
+    data[SEQUENCE_KEY] = sequence
+    temp_path = path.with_suffix(".temp")
+    with open(temp_path, "w") as fp:
+        json.dump(data, fp, separators=(",", ":"))
+        fp.flush()
+        os.fsync(fp.fileno())
+    temp_path.replace(path)
+
+    try:
+        get_log_path(path).unlink()
+    except FileNotFoundError:
+        pass
+
+
+def append_log(path: Path, entries: List[Dict]) -> None:
+    """
+    :brief append planet changes to the log of the state file at `path`
+    """
+    lines = "".join(json.dumps(entry, separators=(",", ":")) + "\n" for entry in entries)
+    with open(get_log_path(path), "a") as fp:
+        fp.write(lines)
+        fp.flush()
+        os.fsync(fp.fileno())
+
+
+def remove_state(path: Path) -> None:
+    for p in (path, get_log_path(path)):
+        try:
+            p.unlink()
+        except FileNotFoundError:
+            pass
+
+
+def _replay_log(log_path: Path, data: Dict, sequence: int):
+    try:
+        with open(log_path, "r") as fp:
+            lines = fp.readlines()
+    except FileNotFoundError:
+        return sequence, 0
+
+    nodes_by_id = {node["id"]: node for node in data["node"]}
+    log_entries = 0
+    for line in lines:
+        try:
+            entry = json.loads(line)
+        except json.JSONDecodeError:
+            # a write was interrupted, so this is the end of the log
+            break
+
+        if entry["seq"] <= sequence:
+            continue
+
+        node = nodes_by_id.get(entry["planet"]["id"])
+        if node is not None:
+            node.clear()
+            node.update(entry["planet"])
+        sequence = entry["seq"]
+        log_entries += 1
+
+    return sequence, log_entries
@@ -1,8 +1,8 @@
 from trueskill import Rating
 
+from .graph import GalaxyGraph
 from .planet import Planet
 from collections import defaultdict
-import networkx
 from typing import List, Dict
 
 from .. import config
@@ -12,10 +12,9 @@ from ..games.game_results import GameOutcome
 from ..games.typedefs import EndedGameInfo, ValidityState, OutcomeLikelihoods
 from ..matchmaker import MatchmakerQueue
 from ..rating import RatingType
+from ..rating_service.rating_math import norm_cdf
 from ..rating_service.typedefs import PlayerID, TeamID, RankedRating
 
-import scipy.stats
-
 class InvalidGalacticWarGame(Exception):
     """ raised by validate_game when illegal game settings are found """
 
@@ -27,20 +26,15 @@ class GalacticWarState(object):
             data["label"] = default_scenario_name
 
         self._data = data
-        self._planets_by_id = {p.get_id(): p for p in [Planet(v) for v in data["node"]]}
-        self._planets_by_name = {p.get_name(): p for p in [Planet(v) for v in data["node"]]}
-        self._jump_gates = [(edge["source"], edge["target"]) for edge in data["edge"]]
+        self._planets = [Planet(v) for v in data["node"]]
+        self._planets_by_id = {p.get_id(): p for p in self._planets}
+        self._planets_by_name = {p.get_name(): p for p in self._planets}
+        self._graph = GalaxyGraph([p.get_id() for p in self._planets],
+                                  [(edge["source"], edge["target"]) for edge in data["edge"]])
         self._capitals_by_faction = {planet.get_capital_of(): planet
-                                     for planet in self._planets_by_id.values()
+                                     for planet in self._planets
                                      if planet.get_capital_of() is not None}
 
-        self._neighbours_by_name = {planet_label: [] for planet_label in self._planets_by_name.keys()}
-        for edge in data["edge"]:
-            source_planet = self._planets_by_id[edge["source"]]
-            target_planet = self._planets_by_id[edge["target"]]
-            self._neighbours_by_name[source_planet.get_name()] += [target_planet]
-            self._neighbours_by_name[target_planet.get_name()] += [source_planet]
-
     def get_data(self):
         return self._data
 
@@ -81,7 +75,7 @@ class GalacticWarState(object):
         if planet.get_controlled_by() is not None:
             raise InvalidGalacticWarGame(f"{planet.get_name()} ({planet.get_controlled_by().name} controlled) is not contested")
 
-        neighbouring_planet_factions = [p.get_controlled_by() for p in self._neighbours_by_name[planet.get_name()]]
+        neighbouring_planet_factions = [p.get_controlled_by() for p in self._neighbours(planet)]
         for faction in team_factions:
             if planet.get_capital_of() != faction and faction not in neighbouring_planet_factions:
                 raise InvalidGalacticWarGame(f"{faction.name} does not have connectivity to planet '{planet.get_name()}'")
@@ -169,8 +163,8 @@ class GalacticWarState(object):
 
                 else:
                     rank_difference = (old_ratings[pid2].rank - old_ratings[pid1].rank) / old_ratings[pid1].leaderboard_size
-                    stakes[pid1] += scipy.stats.norm.cdf(rank_difference / config.GALACTIC_WAR_STAKES_RANK_FACTOR) * max_stake_per_opponent
-                    stakes[pid2] += scipy.stats.norm.cdf(-rank_difference / config.GALACTIC_WAR_STAKES_RANK_FACTOR) * max_stake_per_opponent
+                    stakes[pid1] += norm_cdf(rank_difference / config.GALACTIC_WAR_STAKES_RANK_FACTOR) * max_stake_per_opponent
+                    stakes[pid2] += norm_cdf(-rank_difference / config.GALACTIC_WAR_STAKES_RANK_FACTOR) * max_stake_per_opponent
 
         return stakes
 
@@ -188,7 +182,7 @@ class GalacticWarState(object):
             if dominant_faction is not None:
                 self._logger.info(f"[update_front_lines] capturing {planet.get_name()} for {dominant_faction.name} because is dominating")
                 planet.set_controlled_by(dominant_faction)
-                for p in self._neighbours_by_name[planet.get_name()]:
+                for p in self._neighbours(planet):
                     f = p.get_dominant_faction()
                     c = p.get_controlled_by()
                     if (f is not None and f != dominant_faction):
@@ -211,7 +205,7 @@ class GalacticWarState(object):
         for planet in self._planets_by_id.values():
             if planet.get_controlled_by() is None and planet.get_capital_of() is None:
                 factions = list(set([p.get_controlled_by()
-                                     for p in self._neighbours_by_name[planet.get_name()]
+                                     for p in self._neighbours(planet)
                                      if p.get_controlled_by() is not None]))
                 if len(factions) == 1:
                     self._logger.info(f"[capture_uncontested_planets] capturing {planet.get_name()} for {factions[0].name} because no one else is neighbouring")
@@ -231,27 +225,19 @@ class GalacticWarState(object):
             # too difficult to work out who to give the isolated planets too
             return changes_made
 
+        # control at the start of the pass, so planets captured below don't affect the other faction's supply lines
+        controlled_by = [p.get_controlled_by() for p in self._planets]
         for faction, capital in self._capitals_by_faction.items():
-            planet_ids = [p.get_id() for p in planets_by_faction[faction]]
-            g = self._make_sub_graph(planet_ids)
-            for pid in planet_ids:
-                if pid == capital.get_id():
+            connected = self._graph.reachable(self._graph.index_of[capital.get_id()],
+                                              lambda idx: controlled_by[idx] == faction)
+            for idx, isolated_planet in enumerate(self._planets):
+                if controlled_by[idx] != faction or connected[idx] or isolated_planet is capital:
                     continue
 
-                try:
-                    connectivity = 0
-                    if capital.get_id() in planet_ids:
-                        connectivity = networkx.node_connectivity(g, capital.get_id(), pid)
-
-                    if connectivity == 0:
-                        other_faction = [f for f in self._capitals_by_faction.keys() if f != faction][0]
-                        isolated_planet = self._planets_by_id[pid]
-                        self._logger.info(f"[capture_isolated_planets] capturing {isolated_planet.get_name()} for {other_faction.name} because is isolated from {faction.name}'s capital")
-                        isolated_planet.set_controlled_by(other_faction)
-                        changes_made += 1
-
-                except networkx.NetworkXError as e:
-                    self._logger.warning(f"[capture_isolated_planets] unable to find connectivity from capital={capital.get_id()} to pid={pid}: {str(e)}")
+                other_faction = [f for f in self._capitals_by_faction.keys() if f != faction][0]
+                self._logger.info(f"[capture_isolated_planets] capturing {isolated_planet.get_name()} for {other_faction.name} because is isolated from {faction.name}'s capital")
+                isolated_planet.set_controlled_by(other_faction)
+                changes_made += 1
 
         return changes_made
 
@@ -266,14 +252,8 @@ class GalacticWarState(object):
                 if planet.get_controlled_by() is not None]
 
     def assign_two_capitals(self):
-        pids = [pid for pid in self._planets_by_id.keys()]
-        G = self._make_sub_graph(pids)
-        all_pairs_shortest_path = networkx.all_pairs_shortest_path(G)
-        all_pairs_path_length = [(pid1, pid2, len(path12))
-                                 for pid1, paths1 in all_pairs_shortest_path
-                                 for pid2, path12 in paths1.items()]
-        all_pairs_path_length.sort(key=lambda x: x[2])
-        capital1_id, capital2_id, _ = all_pairs_path_length[-1]
+        idx1, idx2 = self._graph.farthest_pair()
+        capital1_id, capital2_id = self._graph.node_ids[idx1], self._graph.node_ids[idx2]
 
         for pid, planet in self._planets_by_id.items():
             if pid == capital1_id:
@@ -286,33 +266,28 @@ class GalacticWarState(object):
                 planet.set_capital_of(None)
 
     def distribute_planets_to_factions(self):
-        pids = [pid for pid in self._planets_by_id.keys()]
-        G = self._make_sub_graph(pids)
-        shortest_paths_by_capital_id = {
-            capital.get_id(): networkx.single_source_shortest_path(G, capital.get_id())
+        distances_by_capital = [
+            (capital, self._graph.distances(self._graph.index_of[capital.get_id()]))
             for capital in self.get_capitals()
-        }
+        ]
 
-        distance_to_capitals_by_pid = {}
-        for capital_id, shortest_paths in shortest_paths_by_capital_id.items():
-            for planet_id, path in shortest_paths.items():
-                try:
-                   distance_to_capitals_by_pid[planet_id] += [(capital_id, len(path))]
-                except KeyError:
-                    distance_to_capitals_by_pid[planet_id] = [(capital_id, len(path))]
+        for idx, planet in enumerate(self._planets):
+            distance_to_capitals = [(capital, distances[idx])
+                                    for capital, distances in distances_by_capital
+                                    if distances[idx] >= 0]
+            if len(distance_to_capitals) == 0:
+                continue
 
-        for planet_id, distance_to_capitals in distance_to_capitals_by_pid.items():
             distance_to_capitals.sort(key=lambda x: x[1])
-            if distance_to_capitals[0][1] == distance_to_capitals[1][1]:
-                self._planets_by_id[planet_id].set_controlled_by(None)
-                self._planets_by_id[planet_id].reset_scores()
+            if len(distance_to_capitals) > 1 and distance_to_capitals[0][1] == distance_to_capitals[1][1]:
+                planet.set_controlled_by(None)
+                planet.reset_scores()
             else:
-                closest_capital_planet = self._planets_by_id[distance_to_capitals[0][0]]
-                self._planets_by_id[planet_id].set_controlled_by(closest_capital_planet.get_controlled_by())
+                planet.set_controlled_by(distance_to_capitals[0][0].get_controlled_by())
 
     def seperate_abutting_factions(self):
-        for name, planet in self._planets_by_name.items():
-            for neighbour in self._neighbours_by_name[name]:
+        for planet in self._planets:
+            for neighbour in self._neighbours(planet):
                 if planet.get_controlled_by() is not None and neighbour.get_controlled_by() is not None and planet.get_controlled_by() != neighbour.get_controlled_by():
                     planet.set_controlled_by(None)
                     planet.reset_scores()
@@ -344,10 +319,5 @@ class GalacticWarState(object):
                 planets_by_faction[faction] += [planet]
         return planets_by_faction
 
-    def _make_sub_graph(self, planet_ids: List[int]):
-        graph = networkx.Graph()
-        graph.add_nodes_from(planet_ids)
-        graph.add_edges_from([(id1, id2)
-                              for id1, id2 in self._jump_gates
-                              if id1 in planet_ids and id2 in planet_ids])
-        return graph
+    def _neighbours(self, planet: Planet) -> List[Planet]:
+        return [self._planets[idx] for idx in self._graph.neighbours(self._graph.index_of[planet.get_id()])]
@@ -1,8 +1,6 @@
-import io
-import json
+import asyncio
 
 import aiocron
-import aiofiles
 from trueskill import Rating
 
 from . import PlayerService, LadderService
@@ -11,7 +9,7 @@ from .config import config
 from .core import Service
 from pathlib import Path
 from server.decorators import with_logger
-from server.galactic_war import gml
+from server.galactic_war import persistence
 from server.galactic_war.state import GalacticWarState, InvalidGalacticWarGame
 from typing import Dict, List
 
@@ -30,6 +28,9 @@ class GalacticWarService(Service):
         self._state = None
         self._dirty = False
         self._update_state_cron = None
+        self._save_lock = asyncio.Lock()
+        self._log_sequence = 0
+        self._log_entries = 0
 
     async def initialize(self):
         await self._load_state()
@@ -56,10 +57,9 @@ class GalacticWarService(Service):
 
     async def reset(self):
         self._logger.info(f"[reset] resetting ...")
-        try:
-            Path(config.GALACTIC_WAR_STATE_FILE).unlink()
-        except FileNotFoundError:
-            pass
+        async with self._save_lock:
+            await asyncio.get_running_loop().run_in_executor(
+                None, persistence.remove_state, Path(config.GALACTIC_WAR_STATE_FILE))
         await self._load_state()
         self.set_dirty(True)
 
@@ -104,15 +104,20 @@ class GalacticWarService(Service):
                 self._state.validate_game(game_info)
                 self._logger.info(f"[on_game_rating] game_id={game_info.game_id} validated OK")
 
-                old_scores = self._state._planets_by_name[game_info.galactic_war_planet_name].get_ro_scores()
+                planet = self._state._planets_by_name[game_info.galactic_war_planet_name]
+                old_scores = planet.get_ro_scores()
                 self._state.update_scores(game_info, old_ratings, new_ratings, team_outcome_likelihoods)
-                new_scores = self._state._planets_by_name[game_info.galactic_war_planet_name].get_ro_scores()
+                new_scores = planet.get_ro_scores()
                 self._logger.info(f"[update_scores] game_id={game_info.game_id}, planet={game_info.galactic_war_planet_name}, old_scores={old_scores}, new_scores={new_scores}")
 
+                changes_made = 0
                 if self._update_state_cron is None:
-                    await self.update_state()
+                    changes_made = await self.update_state()
 
-                await self._save_state()
+                if changes_made > 0:
+                    await self._save_state()
+                else:
+                    await self._save_planets([planet])
                 self.set_dirty(True)
 
             except InvalidGalacticWarGame as e:
@@ -187,7 +192,11 @@ class GalacticWarService(Service):
 
         if state_path.exists():
             self._logger.info(f"[_load_state] existing state: {state_path}")
-            self._state = await self._do_load_state(state_path)
+            loaded = await self._do_load(state_path)
+            self._state = GalacticWarState(loaded.data, state_path.name)
+            if path is None:
+                self._log_sequence = loaded.sequence
+                self._log_entries = loaded.log_entries
 
         else:
             new_scenario_path = Path(config.GALACTIC_WAR_SCENARIO_PATH) / config.GALACTIC_WAR_INITIAL_SCENARIO
@@ -197,36 +206,43 @@ class GalacticWarService(Service):
             await self._save_state()
 
     async def _save_state(self):
-        state_path = Path(config.GALACTIC_WAR_STATE_FILE)
-        self._logger.info(f"[_save_state] scenario={self._state.get_label()}, {state_path}")
-        await self._do_save_state(state_path, self._state)
+        """
+        :brief write a snapshot of the whole galaxy, which replaces the log of planet changes
+        """
+        async with self._save_lock:
+            await self._write_snapshot()
+
+    async def _save_planets(self, planets: List[Planet]):
+        """
+        :brief append the planets to the log of changes, compacting it into a new snapshot once it is long enough
+        """
+        async with self._save_lock:
+            entries = []
+            for planet in planets:
+                self._log_sequence += 1
+                entries.append({"seq": self._log_sequence, "planet": planet._data})
+            entries = persistence.copy_data(entries)
 
-    @staticmethod
-    async def _do_load_state(path: Path) -> GalacticWarState:
-        if path.suffix == ".gml":
-            async with aiofiles.open(path, "rb") as fp:
-                contents = await fp.read()
-            with io.BytesIO(contents) as fp:
-                data = gml.read_gml(fp)
+            state_path = Path(config.GALACTIC_WAR_STATE_FILE)
+            await asyncio.get_running_loop().run_in_executor(None, persistence.append_log, state_path, entries)
+            self._log_entries += len(entries)
 
-        elif path.suffix == ".json":
-            async with aiofiles.open(path, "r") as fp:
-                contents = await fp.read()
-            data = json.loads(contents)
+            if self._log_entries >= config.GALACTIC_WAR_STATE_COMPACT_EVENTS:
+                await self._write_snapshot()
 
-        else:
-            raise ValueError(f"Unsupported Galactic War file type: {path}")
-
-        return GalacticWarState(data, Path(path).name)
+    async def _write_snapshot(self):
+        state_path = Path(config.GALACTIC_WAR_STATE_FILE)
+        self._logger.info(f"[_save_state] scenario={self._state.get_label()}, {state_path}")
+        data = persistence.copy_data(self._state.get_data())
+        await asyncio.get_running_loop().run_in_executor(
+            None, persistence.write_snapshot, state_path, data, self._log_sequence)
+        self._log_entries = 0
 
     @staticmethod
-    async def _do_save_state(path: Path, state: GalacticWarState):
-        if path.suffix == ".json":
-            temp_state_path = path.with_suffix(".temp")
-            contents = json.dumps(state.get_data(), indent=2)
-            async with aiofiles.open(temp_state_path, "w") as fp:
-                await fp.write(contents)
-            temp_state_path.replace(path)
+    async def _do_load(path: Path) -> persistence.LoadedState:
+        return await asyncio.get_running_loop().run_in_executor(None, persistence.load_state, path)
 
-        else:
-            raise ValueError(f"Unsupported Galactic War file type: {path}")
+    @staticmethod
+    async def _do_load_state(path: Path) -> GalacticWarState:
+        loaded = await GalacticWarService._do_load(path)
+        return GalacticWarState(loaded.data, Path(path).name)
@@ -0,0 +1,167 @@
+"""
+Transactional outbox for game results
+"""
+
+import asyncio
+import json
+import uuid
+from typing import List, Set
+
+from sqlalchemy import bindparam, text
+
+from . import metrics
+from .config import config
+from .core import Service
+from .db import FAFDatabase
+from .decorators import with_logger
+from .games.typedefs import EndedGameInfo
+from .message_queue_service import MessageQueueService
+from .timing import at_interval
+
+GAME_RESULTS_ROUTING_KEY = "success.gameResults.create"
+
+# Queries use plain SQL because `server.db.models` can't be imported this
+# early without a circular import through `server.games`. The table is
+# created by migrations/V112_1__game_results_outbox.sql
+
+
+@with_logger
+class GameResultsOutboxService(Service):
+    """
+        Game results are written to the `game_results_outbox` table in the
+    same transaction that persists the scores of a game, so they are not lost
+    while RabbitMQ is unavailable. A relay publishes them to the exchange in
+    batches once it is connected.
+
+        Rows are only deleted after the broker confirmed them, which makes
+    delivery at-least-once. Every message carries the `message_id` of its row
+    so that consumers can discard duplicates.
+    """
+
+    def __init__(
+        self,
+        database: FAFDatabase,
+        message_queue_service: MessageQueueService
+    ):
+        self._db = database
+        self._message_queue_service = message_queue_service
+        self._timer = None
+        self._lock = asyncio.Lock()
+        self._relay_again = False
+        self._tasks: Set[asyncio.Task] = set()
+
+    async def initialize(self) -> None:
+        await self._message_queue_service.declare_exchange(
+            config.MQ_EXCHANGE_NAME
+        )
+        self._timer = at_interval(
+            config.GAME_RESULTS_OUTBOX_RELAY_INTERVAL,
+            func=self.relay
+        )
+
+    async def shutdown(self) -> None:
+        if self._timer is not None:
+            self._timer.stop()
+        # Rows that are not relayed yet stay in the outbox for the next start
+        for task in self._tasks:
+            task.cancel()
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    async def add(self, conn, game_results: EndedGameInfo) -> None:
+        """
+        Write game results to the outbox using the caller's connection, so
+        they are committed together with the rest of its transaction.
+        """
+        await conn.execute(
+            "INSERT INTO `game_results_outbox` "
+            "(`message_id`, `game_id`, `routing_key`, `payload`) "
+            "VALUES (:message_id, :game_id, :routing_key, :payload)",
+            message_id=str(uuid.uuid4()),
+            game_id=game_results.game_id,
+            routing_key=GAME_RESULTS_ROUTING_KEY,
+            payload=json.dumps(game_results.to_dict())
+        )
+
+    def relay_soon(self) -> None:
+        """
+        Relay the outbox without waiting for the next interval.
+        """
+        task = asyncio.create_task(self.relay())
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def relay(self) -> None:
+        # Rows may have been added after the running relay looked for them
+        if self._lock.locked():
+            self._relay_again = True
+            return
+
+        async with self._lock:
+            self._relay_again = True
+            while self._relay_again:
+                self._relay_again = False
+                try:
+                    await self._relay()
+                except Exception:
+                    self._logger.exception("Unable to relay game results")
+
+    async def _relay(self) -> None:
+        while self._message_queue_service.is_ready:
+            async with self._db.acquire() as conn:
+                backlog = await conn.scalar(
+                    "SELECT COUNT(*) FROM `game_results_outbox`"
+                )
+                metrics.game_results_outbox_backlog.set(backlog)
+                if not backlog:
+                    return
+
+                result = await conn.execute(
+                    "SELECT `id`, `message_id`, `routing_key`, `payload` "
+                    "FROM `game_results_outbox` ORDER BY `id` LIMIT :limit",
+                    limit=config.GAME_RESULTS_OUTBOX_BATCH_SIZE
+                )
+                rows = result.fetchall()
+                if not rows:
+                    return
+
+            futures = [
+                await self._message_queue_service.publish(
+                    config.MQ_EXCHANGE_NAME,
+                    row.routing_key,
+                    json.loads(row.payload),
+                    message_id=row.message_id
+                )
+                for row in rows
+            ]
+            # Unconfirmed messages are published again on the next interval
+            done, _ = await asyncio.wait(
+                futures, timeout=config.GAME_RESULTS_OUTBOX_CONFIRM_TIMEOUT
+            )
+            confirmed = [future in done and future.result() for future in futures]
+
+            published = [row.id for row, ok in zip(rows, confirmed) if ok]
+            if published:
+                await self._delete(published)
+            metrics.game_results_relayed.labels("success").inc(len(published))
+
+            failed = len(rows) - len(published)
+            if failed:
+                # Try again on the next interval
+                self._logger.warning(
+                    "%d game results were not confirmed by RabbitMQ", failed
+                )
+                metrics.game_results_relayed.labels("failed").inc(failed)
+                return
+
+            if len(rows) < config.GAME_RESULTS_OUTBOX_BATCH_SIZE:
+                return
+
+    async def _delete(self, ids: List[int]) -> None:
+        async with self._db.acquire() as conn:
+            await conn.execute(
+                text(
+                    "DELETE FROM `game_results_outbox` WHERE `id` IN :ids"
+                ).bindparams(bindparam("ids", expanding=True)),
+                ids=ids
+            )
@@ -1,21 +1,25 @@
+import asyncio
 from collections import Counter
 from contextlib import asynccontextmanager
-from typing import Dict, List, Optional, Type, Union, ValuesView
+from typing import Dict, List, NamedTuple, Optional, Set, Tuple, Type, Union, ValuesView
 
 import aiocron
-import glob
 import json
 import os
-import shutil
+import sqlalchemy
 import sqlalchemy.sql
+import time
+from sqlalchemy.exc import OperationalError
 
 from server.config import config
 
 from . import metrics
+from .catalog_service import CatalogService
 from .core import Service
 from .db import FAFDatabase
 from .decorators import with_logger
 from .factions import Faction
+from .game_results_outbox_service import GameResultsOutboxService
 from .games import (
     FeaturedMod,
     Game,
@@ -23,7 +27,7 @@ from .games import (
     ValidityState,
     VisibilityState
 )
-from .games.typedefs import EndedGameInfo, ReplayInfo
+from .games.typedefs import EndedGameInfo, ReplayInfo, ReplayMetadata
 from .matchmaker import MatchmakerQueue
 from .message_queue_service import MessageQueueService
 from .players import Player
@@ -31,6 +35,88 @@ from .rating_service import RatingService
 from .types import Map
 
 
+# Subdirectory of REPLAY_DIR that metadata files which can't be processed are
+# moved to
+REJECTED_REPLAY_METADATA_DIR = "rejected"
+
+
+class ReadReplayMetadataResult(NamedTuple):
+    metadata: List[ReplayMetadata]
+    # Files that can't be read yet, they may still be being written
+    errors: List[Tuple[str, Exception]]
+    # Files that still can't be read `reject_age` seconds after they were
+    # last written
+    rejected: List[Tuple[str, Exception]]
+
+
+class ReplayMetadataWrite(NamedTuple):
+    metadata: ReplayMetadata
+    replay_meta: Dict
+    featured_mod_version: Optional[Dict]
+    map_hash: Optional[Dict]
+
+
+def read_replay_metadata(
+    replays_path: str,
+    known_paths: Set[str],
+    reject_age: float
+) -> ReadReplayMetadataResult:
+    """
+    Read and parse every metadata file in `replays_path` which is not in
+    `known_paths`. Runs in a thread.
+    """
+    result = ReadReplayMetadataResult([], [], [])
+    try:
+        entries = os.scandir(replays_path)
+    except FileNotFoundError:
+        return result
+
+    with entries:
+        for entry in entries:
+            if not entry.name.endswith(".json") or entry.path in known_paths:
+                continue
+            try:
+                with open(entry.path, "rb") as fp:
+                    raw = fp.read().decode("utf-8")
+                data = json.loads(raw)
+                result.metadata.append(
+                    ReplayMetadata(entry.path, int(data["gameId"]), raw, data)
+                )
+            except (OSError, ValueError, KeyError, TypeError) as e:
+                try:
+                    age = time.time() - entry.stat().st_mtime
+                except FileNotFoundError:
+                    continue
+                if age > reject_age:
+                    result.rejected.append((entry.path, e))
+                else:
+                    result.errors.append((entry.path, e))
+    return result
+
+
+def remove_files(paths: List[str]) -> None:
+    for path in paths:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+def reject_files(paths: List[str], rejected_dir: str) -> None:
+    """
+    Move files out of the way into `rejected_dir`, or remove them if that
+    is not possible.
+    """
+    os.makedirs(rejected_dir, exist_ok=True)
+    for path in paths:
+        try:
+            os.replace(path, os.path.join(rejected_dir, os.path.basename(path)))
+        except FileNotFoundError:
+            pass
+        except OSError:
+            remove_files([path])
+
+
 @with_logger
 class GameService(Service):
     """
@@ -43,11 +129,21 @@ class GameService(Service):
             player_service,
             game_stats_service,
             rating_service: RatingService,
-            message_queue_service: MessageQueueService
+            message_queue_service: MessageQueueService,
+            catalog_service: Optional[CatalogService] = None,
+            game_results_outbox_service: Optional[GameResultsOutboxService] = None
     ):
         self._db = database
+        self.catalog_service = catalog_service or CatalogService(database)
+        self.game_results_outbox_service = (
+            game_results_outbox_service
+            or GameResultsOutboxService(database, message_queue_service)
+        )
         self._dirty_games = set()
         self._dirty_queues = set()
+        # Incremented on every change to a game, so readers can tell whether
+        # anything changed since they last looked
+        self._version = 0
         self.player_service = player_service
         self.game_stats_service = game_stats_service
         self._rating_service = rating_service
@@ -64,19 +160,13 @@ class GameService(Service):
         # The set of active games
         self._games: Dict[int, Game] = dict()
 
-    def get_archive_dir_for_game_id(self, replay_id: int):
-        replays_path = "/content/replays"
-        mm = replay_id // 100000000
-        nn = (replay_id // 1000000) % 100
-        oo = (replay_id // 10000) % 100
-        pp = (replay_id // 100) % 100
-        return f"{replays_path}/{mm}/{nn}/{oo}/{pp}"
+        # Replay metadata waiting for its game to be persisted, by file path
+        self._pending_replay_metadata: Dict[str, ReplayMetadata] = dict()
 
     async def initialize(self) -> None:
         await self.initialise_game_counter()
         await self.update_data()
         self._update_cron = aiocron.crontab("*/10 * * * *", func=self.update_data)
-        self._archive_replays_cron = aiocron.crontab("* * * * *", func=self.archive_new_replays)
         self._process_replay_metadata = aiocron.crontab("* * * * *", func=self.process_replay_metadata)
         await self._message_queue_service.declare_exchange(config.MQ_EXCHANGE_NAME)
 
@@ -116,106 +206,185 @@ class GameService(Service):
             # Turn resultset into a list of uids
             self.ranked_mods = set(map(lambda x: x[0], rows))
 
-    async def archive_new_replays(self):
-        """
-        looks for /content/replays/mmnnooppqq.tad and archive them into /content/replays/mm/nn/oo/pp/mmnnooppqq.tad
-        """
-        replays_path = "/content/replays"
-        for file_path in glob.glob(f"{replays_path}/*.tad"):
-            file_name = os.path.basename(file_path)
-            game_id = int(os.path.splitext(file_name)[0])
-            archive_dir = self.get_archive_dir_for_game_id(game_id)
-
-            self._logger.info("[archive_new_replays] archiving replay %s to %s", file_path, archive_dir)
-            os.makedirs(archive_dir, exist_ok=True)
-            shutil.make_archive(os.path.join(archive_dir, str(game_id)), "zip", replays_path, f"{game_id}.tad")
-            os.remove(file_path)
-
-            async with self._db.acquire() as conn:
-                await conn.execute(sqlalchemy.sql.text(
-                    "UPDATE `game_stats` SET `game_stats`.`replay_available` = 1 WHERE `game_stats`.`id` = :game_id"),
-                    game_id=game_id)
-
     async def process_replay_metadata(self):
         """
-        Looks for /content/replays/*.json and processes the meta data recorded in there by the demo compiler.
+        Looks for REPLAY_DIR/*.json and processes the meta data recorded in there by the demo compiler.
         It informs TAF about map and mod hashes so they can be used to install the correct map and mod versions
-        when users later want to watch replays
-        :return:
-        """
-        replays_path = "/content/replays"
-        for file_path in glob.glob(f"{replays_path}/*.json"):
-            self._logger.info("[process_replay_metadata] processing metadata for %s", file_path)
-            with open(file_path, "rb") as fp:
-                file_content = fp.read()
-                data = json.loads(file_content)
-                file_content = file_content.decode("utf-8")
-
-            game_id = data.get("gameId")
-            ta_version = "{}.{}".format(data.get("taVersionMajor"), data.get("taVersionMinor"))
-            units_hash = data.get("unitsHash")
-            map_hash = data.get("taMapHash")
-
-            if data.get("cheatsEnabled", False):
-                try:
-                    game = self._games[game_id]
-                    game.gameOptions["CheatsEnabled"] = "true"
-                    await game.mark_invalid(ValidityState.CHEATS_ENABLED)
-
-                except KeyError as e:
-                    self._logger.warn(f"[process_replay_metadata] unable to update 'cheatsEnabled' from replay meta: {str(e)}")
+        when users later want to watch replays.
 
-            if config.ENABLE_FACTION_LOOKUP_FROM_REPLAY_META and game_id in self._games:
-                try:
-                    game = self._games[game_id]
-                    for game_player in game.players:
-                        for replay_player in data["players"]:
-                            if game_player.alias == replay_player["name"]:
-                                self._logger.info(f"[process_replay_metadata] updating {game_player.alias}({game_player.id}) for game {game_id} to faction={replay_player['side']}")
-                                game_player.faction = Faction.from_value(replay_player["side"])
-                                break
+        New files are read in a thread and kept in memory until their game has been persisted, so
+        each file is only read once. Pending metadata is written to the database in batches.
+        Files that can't be read or written are moved to REPLAY_DIR/rejected.
+        """
+        loop = asyncio.get_running_loop()
+        rejected_dir = os.path.join(config.REPLAY_DIR, REJECTED_REPLAY_METADATA_DIR)
+        new_metadata = await loop.run_in_executor(
+            None, read_replay_metadata, config.REPLAY_DIR, set(self._pending_replay_metadata),
+            config.REPLAY_METADATA_REJECT_AGE
+        )
+        for path, error in new_metadata.errors:
+            self._logger.debug("[process_replay_metadata] unable to read %s yet: %s", path, error)
+        for path, error in new_metadata.rejected:
+            self._logger.warning("[process_replay_metadata] rejecting %s, unable to read it: %s", path, error)
+            metrics.replay_metadata_processed.labels("unreadable").inc()
+        if new_metadata.rejected:
+            await loop.run_in_executor(
+                None, reject_files, [path for path, _ in new_metadata.rejected], rejected_dir
+            )
+        for metadata in new_metadata.metadata:
+            await self._apply_replay_metadata_to_game(metadata)
+            self._pending_replay_metadata[metadata.path] = metadata
+
+        pending = list(self._pending_replay_metadata.values())
+        metrics.replay_metadata_pending.set(len(pending))
+        batch_size = config.REPLAY_METADATA_BATCH_SIZE
+        for i in range(0, len(pending), batch_size):
+            processed, rejected = await self._persist_replay_metadata(pending[i:i + batch_size])
+            await loop.run_in_executor(None, remove_files, processed)
+            if rejected:
+                await loop.run_in_executor(None, reject_files, rejected, rejected_dir)
+            for path in processed + rejected:
+                del self._pending_replay_metadata[path]
+
+        metrics.replay_metadata_pending.set(len(self._pending_replay_metadata))
+
+    async def _apply_replay_metadata_to_game(self, metadata: ReplayMetadata):
+        data = metadata.data
+        game_id = metadata.game_id
+
+        if data.get("cheatsEnabled", False):
+            try:
+                game = self._games[game_id]
+                game.gameOptions["CheatsEnabled"] = "true"
+                await game.mark_invalid(ValidityState.CHEATS_ENABLED)
+
+            except KeyError as e:
+                self._logger.warn(f"[process_replay_metadata] unable to update 'cheatsEnabled' from replay meta: {str(e)}")
+
+        if config.ENABLE_FACTION_LOOKUP_FROM_REPLAY_META and game_id in self._games:
+            try:
+                game = self._games[game_id]
+                for game_player in game.players:
+                    for replay_player in data["players"]:
+                        if game_player.alias == replay_player["name"]:
+                            self._logger.info(f"[process_replay_metadata] updating {game_player.alias}({game_player.id}) for game {game_id} to faction={replay_player['side']}")
+                            game_player.faction = Faction.from_value(replay_player["side"])
+                            break
+
+            except (KeyError, ValueError) as e:
+                self._logger.warn(f"[process_replay_metadata] unable to update player faction from replay meta: {str(e)}")
+
+    async def _persist_replay_metadata(self, batch: List[ReplayMetadata]) -> Tuple[List[str], List[str]]:
+        """
+        Write a batch of replay metadata to the database in a single transaction. If that fails,
+        the files are written one at a time so that a bad one doesn't hold up the rest.
 
-                except (KeyError, ValueError) as e:
-                    self._logger.warn(f"[process_replay_metadata] unable to update player faction from replay meta: {str(e)}")
+        :return: The paths of the files that are done with, and of the files that could not be
+            written. Files whose game has not been persisted yet are kept for the next cycle.
+        """
+        processed = []
+        writes = []
 
-            async with self._db.acquire() as conn:
-                result = await conn.execute(sqlalchemy.sql.text(
-                    "SELECT `gameMod`, `mapId` from `game_stats` WHERE id = :game_id"), game_id=game_id)
-                row = result.fetchone()
-                if row is None:
-                    if game_id not in self._games:
-                        self._logger.info(
-                            f"[process_replay_metadata] ditching {file_path} because game_id {game_id} not known")
-                        os.remove(file_path)
-                        return
-                    else:
-                        # try again later
-                        continue
-
-                await conn.execute(sqlalchemy.sql.text(
-                    "UPDATE `game_stats` SET replay_meta = :replay_meta WHERE id = :game_id"),
-                    replay_meta=file_content, game_id=game_id)
-
-                os.remove(file_path)
-                if row[1] is None:
-                    self._logger.info(
-                        f"[process_replay_metadata] ditching {file_path} because row[1] is None (unknown map)")
+        async with self._db.acquire() as conn:
+            result = await conn.execute(
+                sqlalchemy.sql.text(
+                    "SELECT `id`, `gameMod`, `mapId` from `game_stats` WHERE id IN :game_ids"
+                ).bindparams(sqlalchemy.bindparam("game_ids", expanding=True)),
+                game_ids=list({metadata.game_id for metadata in batch})
+            )
+            rows = {row.id: row for row in result}
+
+        for metadata in batch:
+            game_id = metadata.game_id
+            row = rows.get(game_id)
+            if row is None:
+                metadata.attempts += 1
+                if game_id in self._games and metadata.attempts < config.REPLAY_METADATA_MAX_ATTEMPTS:
+                    # try again later
                     continue
-
-                featured_mod_id = int(row[0])
-                map_version_id = int(row[1])
                 self._logger.info(
-                    f"[process_replay_metadata] game_id={game_id}, ta_version={ta_version}, units_hash={units_hash}, map_hash={map_hash}, featured_mod_id={featured_mod_id}, map_version_id={map_version_id}")
+                    f"[process_replay_metadata] ditching {metadata.path} because game_id {game_id} not known")
+                metrics.replay_metadata_processed.labels("unknown_game").inc()
+                processed.append(metadata.path)
+                continue
 
-                sql = sqlalchemy.sql.text("""
-                    INSERT INTO `game_featuredMods_version` (`game_featuredMods_id`, `version`, `ta_hash`, `observation_count`)
-                    VALUES (:featured_mod_id, :ta_version, :units_hash, 1)
-                    ON DUPLICATE KEY UPDATE observation_count = observation_count+1
-                    """)
-                await conn.execute(sql, featured_mod_id=featured_mod_id, ta_version=ta_version, units_hash=units_hash)
+            replay_meta = {"replay_meta": metadata.raw, "game_id": game_id}
+            if row.mapId is None:
+                self._logger.info(
+                    f"[process_replay_metadata] not updating hashes for {metadata.path} because the map is unknown")
+                writes.append(ReplayMetadataWrite(metadata, replay_meta, None, None))
+                continue
 
-                sql = sqlalchemy.sql.text("UPDATE `map_version` SET ta_hash = :map_hash WHERE id = :map_version_id")
-                await conn.execute(sql, map_hash=map_hash, map_version_id=map_version_id)
+            data = metadata.data
+            ta_version = "{}.{}".format(data.get("taVersionMajor"), data.get("taVersionMinor"))
+            self._logger.info(
+                f"[process_replay_metadata] game_id={game_id}, ta_version={ta_version}, units_hash={data.get('unitsHash')}, map_hash={data.get('taMapHash')}, featured_mod_id={row.gameMod}, map_version_id={row.mapId}")
+            writes.append(ReplayMetadataWrite(
+                metadata,
+                replay_meta,
+                {
+                    "featured_mod_id": int(row.gameMod),
+                    "ta_version": ta_version,
+                    "units_hash": data.get("unitsHash")
+                },
+                {
+                    "map_hash": data.get("taMapHash"),
+                    "map_version_id": int(row.mapId)
+                }
+            ))
+
+        if not writes:
+            return processed, []
+
+        try:
+            async with self._db.acquire() as conn:
+                await self._write_replay_metadata(conn, writes)
+            written, rejected = writes, []
+        except Exception:
+            self._logger.exception(
+                "[process_replay_metadata] unable to write a batch of %d, writing them one at a time", len(writes))
+            written, rejected = [], []
+            for write in writes:
+                try:
+                    async with self._db.acquire() as conn:
+                        await self._write_replay_metadata(conn, [write])
+                    written.append(write)
+                except OperationalError:
+                    # The database may be unavailable, so try again on the next cycle
+                    self._logger.exception(
+                        f"[process_replay_metadata] unable to write {write.metadata.path}, trying again later")
+                except Exception:
+                    self._logger.exception(
+                        f"[process_replay_metadata] rejecting {write.metadata.path}, unable to write it")
+                    metrics.replay_metadata_processed.labels("failed").inc()
+                    rejected.append(write.metadata.path)
+
+        for write in written:
+            metrics.replay_metadata_processed.labels(
+                "success" if write.map_hash is not None else "unknown_map"
+            ).inc()
+            processed.append(write.metadata.path)
+
+        return processed, rejected
+
+    async def _write_replay_metadata(self, conn, writes: List[ReplayMetadataWrite]):
+        await conn.execute(sqlalchemy.sql.text(
+            "UPDATE `game_stats` SET replay_meta = :replay_meta WHERE id = :game_id"),
+            [write.replay_meta for write in writes])
+
+        featured_mod_versions = [write.featured_mod_version for write in writes if write.featured_mod_version]
+        if featured_mod_versions:
+            await conn.execute(sqlalchemy.sql.text("""
+                INSERT INTO `game_featuredMods_version` (`game_featuredMods_id`, `version`, `ta_hash`, `observation_count`)
+                VALUES (:featured_mod_id, :ta_version, :units_hash, 1)
+                ON DUPLICATE KEY UPDATE observation_count = observation_count+1
+                """), featured_mod_versions)
+
+        map_hashes = [write.map_hash for write in writes if write.map_hash]
+        if map_hashes:
+            await conn.execute(sqlalchemy.sql.text(
+                "UPDATE `map_version` SET ta_hash = :map_hash WHERE id = :map_version_id"),
+                map_hashes)
 
     async def get_replay_info(self, db_connection, game_id: int):
         result = await db_connection.execute(sqlalchemy.sql.text("""
@@ -228,8 +397,9 @@ class GameService(Service):
         if row is None:
             raise ValueError(f"Unable to find any information about replay id={game_id}")
         replay_meta = json.loads(row[0]) if row[0] is not None else None
-        replay_meta["datestamp"] = row[2].date().isoformat()
-        replay_meta["file_extension"] = row[3]
+        if replay_meta is not None:
+            replay_meta["datestamp"] = row[2].date().isoformat()
+            replay_meta["file_extension"] = row[3]
         return ReplayInfo(replay_meta=replay_meta, tada_available=row[1])
 
     async def set_game_tada_available(self, db_connection, game_id: int, available: bool):
@@ -257,9 +427,14 @@ class GameService(Service):
     def dirty_queues(self):
         return self._dirty_queues
 
+    @property
+    def version(self) -> int:
+        return self._version
+
     def mark_dirty(self, obj: Union[Game, MatchmakerQueue], only_to_peers=False, pings_only=False):
         if isinstance(obj, Game):
             self._dirty_games.add((obj, only_to_peers, pings_only))
+            self._version += 1
         elif isinstance(obj, MatchmakerQueue):
             self._dirty_queues.add((obj, only_to_peers, pings_only))
 
@@ -352,6 +527,7 @@ class GameService(Service):
     def remove_game(self, game: Game):
         if game.id in self._games:
             del self._games[game.id]
+            self._version += 1
 
     def __getitem__(self, item: int) -> Game:
         return self._games[item]
@@ -360,12 +536,8 @@ class GameService(Service):
         return item in self._games
 
     async def publish_game_results(self, game_results: EndedGameInfo):
-        result_dict = game_results.to_dict()
-        await self._message_queue_service.publish(
-            config.MQ_EXCHANGE_NAME,
-            "success.gameResults.create",
-            result_dict,
-        )
+        # The results were written to the outbox together with the scores
+        self.game_results_outbox_service.relay_soon()
 
         # TODO: Remove when rating service starts listening to message queue
         if game_results.validity is ValidityState.VALID and game_results.rating_type is not None:
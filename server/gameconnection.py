@@ -11,6 +11,7 @@ from .db.models import coop_leaderboard, coop_map, teamkills
 from .decorators import with_logger
 from .game_service import GameService
 from .games import Game, GameError, GameState, ValidityState, Victory
+from .ice_relay import IceRelay
 from .player_service import PlayerService
 from .players import Player, PlayerState
 from .protocol import DisconnectedError, GpgNetServerProtocol, Protocol
@@ -49,6 +50,7 @@ class GameConnection(GpgNetServerProtocol):
         self._player = player
         player.game_connection = self  # Set up weak reference to self
         self._game = game
+        self.ice_relay = IceRelay(self)
 
         self.finished_sim = False
 
@@ -445,15 +447,10 @@ class GameConnection(GpgNetServerProtocol):
             )
             return
 
-        try:
-            await game_connection.send({
-                "command": "IceMsg",
-                "args": [int(self.player.id), ice_msg]
-            })
-        except DisconnectedError:
+        if not game_connection.ice_relay.relay(self.player.id, ice_msg):
             self._logger.debug(
-                "Failed to send ICE message to player due to a disconnect: %s",
-                receiver_id
+                "Dropped ICE message for player that is disconnected or "
+                "not keeping up: %s", receiver_id
             )
 
     async def handle_game_state(self, state):
@@ -568,6 +565,7 @@ class GameConnection(GpgNetServerProtocol):
                 await self.disconnect_all_peers()
 
             self._state = GameConnectionState.ENDED
+            self.ice_relay.cancel()
             await self.game.remove_game_connection(self)
             self._mark_dirty()
             self.player_service.set_player_state(self.player, PlayerState.IDLE)
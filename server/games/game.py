@@ -5,7 +5,6 @@ import time
 from collections import defaultdict
 from typing import Any, Dict, List, Optional, Set, Tuple, Iterable
 
-import sqlalchemy
 from sqlalchemy.exc import DBAPIError
 from sqlalchemy import and_, bindparam, text
 from sqlalchemy.sql.functions import now as sql_now
@@ -25,6 +24,7 @@ from server.games.game_results import (
     GameResultReports,
     resolve_game
 )
+from server.ice_relay import IceRelayStats
 from server.rating import InclusiveRange, RatingType
 
 from ..abc.base_game import GameConnectionState, InitMode
@@ -127,6 +127,7 @@ class Game():
         }
         self.player_pings = {}
         self.mods = {}
+        self.ice_relay_stats = IceRelayStats()
 
         self.map_pool_map_ids = None
         if map_pool_map_ids is not None:
@@ -492,9 +493,14 @@ class Game():
             await self.mark_invalid(ValidityState.UNKNOWN_RESULT)
             return
 
-        await self.persist_results()
+        try:
+            game_results = await self.resolve_game_results()
+        except Exception:
+            # Keep the reported scores even if the results can't be resolved
+            await self.persist_results()
+            raise
 
-        game_results = await self.resolve_game_results()
+        await self.persist_results(game_results)
         await self.game_service.publish_game_results(game_results)
 
     async def resolve_game_results(self) -> EndedGameInfo:
@@ -542,11 +548,13 @@ class Game():
         """
         self._results = await GameResultReports.from_db(self._db, self.id)
 
-    async def persist_results(self):
+    async def persist_results(self, game_results: Optional[EndedGameInfo] = None):
         """
         Persist game results into the database
 
         Requires the game to have been launched and the appropriate rows to exist in the database.
+        :param game_results: if given, also written to the game results outbox
+            in the same transaction
         :return:
         """
 
@@ -590,6 +598,11 @@ class Game():
             )
             await conn.deadlock_retry_execute(update_statement, rows)
 
+            if game_results is not None:
+                await self.game_service.game_results_outbox_service.add(
+                    conn, game_results
+                )
+
     def get_basic_info(self) -> BasicGameInfo:
         return BasicGameInfo(
             self.id,
@@ -846,12 +859,7 @@ class Game():
         self.map_ranked = ranked
 
     async def fetch_map_file_path(self, default_hpi, map_name, crc):
-        async with self._db.acquire() as conn:
-            result = await conn.execute(sqlalchemy.sql.text(
-                "SELECT id, filename, ranked FROM map_version " \
-                "WHERE filename like :map_path order by version desc limit 1"),
-                map_path="%/{}/{}".format(map_name, crc))
-            row = result.fetchone()
+        row = await self.game_service.catalog_service.get_map_version(map_name, crc)
 
         if row:
             self.set_map(row.id, row.filename, row.ranked)
@@ -209,6 +209,18 @@ class EndedGameInfo(NamedTuple):
         }
 
 
+@dataclass
+class ReplayMetadata:
+    """
+    Contents of a replay metadata file written by the demo compiler
+    """
+    path: str
+    game_id: int
+    raw: str
+    data: Dict[str, Any]
+    attempts: int = 0
+
+
 @dataclass
 class OutcomeLikelihoods:
     pwin: float
@@ -4,16 +4,16 @@ import os
 import shutil
 import tarfile
 from datetime import datetime
-from typing import IO
+from typing import IO, Optional
 
 import aiocron
-import aiohttp
 import geoip2.database
 from maxminddb.errors import InvalidDatabaseError
 
 from .config import config
 from .core import Service
 from .decorators import with_logger
+from .http_client_service import HttpClientService
 from .timing import Timer
 
 
@@ -27,7 +27,8 @@ class GeoIpService(Service):
         Provides an interface for getting data out of the database.
     """
 
-    def __init__(self):
+    def __init__(self, http_client_service: Optional[HttpClientService] = None):
+        self._http_client = http_client_service or HttpClientService()
         self.refresh_file_path()
         config.register_callback("GEO_IP_DATABASE_PATH", self.refresh_file_path)
 
@@ -149,16 +150,19 @@ class GeoIpService(Service):
             "suffix": "tar.gz"
         }
 
-        async def get_checksum(session):
-            async with session.get(url, params={
+        async def get_checksum():
+            async with self._http_client.request("geoip", "GET", url, params={
                 **params,
                 "suffix": params["suffix"] + ".md5"
-            }, timeout=60 * 20) as resp:
+            }, timeout=60 * 20, raise_for_status=True) as resp:
                 return await resp.text()
 
-        async def get_db_file_with_checksum(session):
+        async def get_db_file_with_checksum():
             hasher = hashlib.md5()
-            async with session.get(url, params=params, timeout=60 * 20) as resp:
+            async with self._http_client.request(
+                "geoip", "GET", url,
+                params=params, timeout=60 * 20, raise_for_status=True
+            ) as resp:
                 with open(file_path, "wb") as f:
                     while True:
                         chunk = await resp.content.read(chunk_size)
@@ -169,11 +173,10 @@ class GeoIpService(Service):
 
             return hasher.hexdigest()
 
-        async with aiohttp.ClientSession(raise_for_status=True) as session:
-            checksum, our_hash = await asyncio.gather(
-                get_checksum(session),
-                get_db_file_with_checksum(session)
-            )
+        checksum, our_hash = await asyncio.gather(
+            get_checksum(),
+            get_db_file_with_checksum()
+        )
 
         if checksum != our_hash:
             raise Exception(
@@ -0,0 +1,98 @@
+"""
+Shared HTTP client for all outbound requests
+"""
+
+import time
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Dict
+
+import aiohttp
+
+import server.metrics as metrics
+
+from .config import config
+from .core import Service
+from .decorators import with_logger
+
+USER_AGENT = "Total Annihilation Forever"
+
+
+@with_logger
+class HttpClientService(Service):
+    """
+        Owns one long lived `aiohttp.ClientSession` per upstream, so that
+    requests to the same upstream reuse pooled keep-alive connections instead
+    of paying for a new connector, DNS lookup and TLS handshake every time.
+
+        Upstreams are identified by a short name such as `"policy_server"` or
+    `"tada"`, which is also used to label the metrics. Sessions are created
+    lazily on first use.
+    """
+
+    def __init__(self):
+        self._sessions: Dict[str, aiohttp.ClientSession] = {}
+
+    def session(self, upstream: str) -> aiohttp.ClientSession:
+        """
+        Return the pooled session for an upstream, creating it if needed.
+        """
+        session = self._sessions.get(upstream)
+        if session is None or session.closed:
+            session = self._make_session()
+            self._sessions[upstream] = session
+            self._logger.debug("Created HTTP session for %s", upstream)
+        return session
+
+    def _make_session(self) -> aiohttp.ClientSession:
+        connector = aiohttp.TCPConnector(
+            limit=config.HTTP_CLIENT_POOL_SIZE,
+            limit_per_host=config.HTTP_CLIENT_LIMIT_PER_HOST,
+            keepalive_timeout=config.HTTP_CLIENT_KEEPALIVE_TIMEOUT,
+            ttl_dns_cache=config.HTTP_CLIENT_DNS_CACHE_TTL,
+        )
+        return aiohttp.ClientSession(
+            connector=connector,
+            timeout=aiohttp.ClientTimeout(total=config.HTTP_CLIENT_TIMEOUT),
+            headers={"User-Agent": USER_AGENT},
+        )
+
+    @asynccontextmanager
+    async def request(
+        self,
+        upstream: str,
+        method: str,
+        url: str,
+        **kwargs
+    ) -> AsyncIterator[aiohttp.ClientResponse]:
+        """
+        Perform a request on the upstream's pooled session. Accepts the same
+        keyword arguments as `aiohttp.ClientSession.request`.
+
+        # Example
+        ```
+        async with http_client.request("api", "GET", url) as resp:
+            data = await resp.json()
+        ```
+        """
+        session = self.session(upstream)
+        status = "error"
+        in_flight = metrics.http_client_requests_in_flight.labels(upstream)
+        in_flight.inc()
+        start = time.monotonic()
+        try:
+            async with session.request(method, url, **kwargs) as resp:
+                status = str(resp.status)
+                yield resp
+        except aiohttp.ClientResponseError as e:
+            status = str(e.status)
+            raise
+        finally:
+            in_flight.dec()
+            metrics.http_client_request_duration.labels(
+                upstream, method.upper(), status
+            ).observe(time.monotonic() - start)
+
+    async def shutdown(self) -> None:
+        sessions, self._sessions = self._sessions, {}
+        for session in sessions.values():
+            await session.close()
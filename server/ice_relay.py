@@ -0,0 +1,166 @@
+"""
+Relay of ICE messages between the peers of a game.
+
+While a lobby is set up every peer sends its candidates to every other peer,
+so ICE messages outnumber all other messages. They skip `GameConnection.send`:
+the payload is JSON encoded once straight into the envelope, messages for the
+same peer within `ICE_RELAY_BATCH_WINDOW` are written together and the write
+buffer is not drained for each of them. Relay counters are kept per game to
+find the games whose peers keep renegotiating.
+"""
+
+import asyncio
+import time
+from collections import Counter
+from typing import TYPE_CHECKING, List, Optional, Tuple
+
+from server import metrics
+from server.command_metrics import sent_command_label
+from server.config import config
+from server.decorators import with_logger
+from server.protocol import DisconnectedError
+from server.protocol.protocol import json_encoder
+
+if TYPE_CHECKING:
+    from server.gameconnection import GameConnection
+
+ICE_ENVELOPE = '{"command":"IceMsg","args":[%d,%s],"target":"game"}'
+# Number of sender, receiver pairs listed as the busiest of a game
+BUSIEST_PAIRS = 5
+
+_relayed = metrics.ice_messages.labels("relayed")
+_dropped = metrics.ice_messages.labels("dropped")
+
+
+class IceRelayStats(object):
+    """
+    ICE relay counters of one game
+    """
+    __slots__ = ("relayed", "dropped", "batches", "bytes", "pairs", "first", "last")
+
+    def __init__(self):
+        # Messages queued for a peer, including those that are dropped later
+        # because the peer disconnected before they were written
+        self.relayed = 0
+        self.dropped = 0
+        self.batches = 0
+        self.bytes = 0
+        # (sender id, receiver id) -> messages relayed
+        self.pairs: Counter = Counter()
+        self.first: Optional[float] = None
+        self.last: Optional[float] = None
+
+    def record(self, sender_id: int, receiver_id: int, size: int) -> None:
+        now = time.time()
+        if self.first is None:
+            self.first = now
+        self.last = now
+        self.relayed += 1
+        self.bytes += size
+        self.pairs[sender_id, receiver_id] += 1
+
+    def busiest_pairs(self, count: int = BUSIEST_PAIRS) -> List[Tuple[int, int, int]]:
+        return [
+            (sender, receiver, messages)
+            for (sender, receiver), messages in self.pairs.most_common(count)
+        ]
+
+    def to_dict(self):
+        return {
+            "relayed": self.relayed,
+            "dropped": self.dropped,
+            "batches": self.batches,
+            "bytes": self.bytes,
+            "first": self.first,
+            "last": self.last,
+            "busiest_pairs": self.busiest_pairs()
+        }
+
+
+@with_logger
+class IceRelay(object):
+    """
+    Buffers the ICE messages for one game connection until they are written
+    """
+
+    def __init__(self, connection: "GameConnection"):
+        self.connection = connection
+        self._pending: List[bytes] = []
+        self._flush_handle: Optional[asyncio.Handle] = None
+
+    @property
+    def pending(self) -> int:
+        return len(self._pending)
+
+    def relay(self, sender_id: int, payload) -> bool:
+        """
+        Queue an ICE message from `sender_id` for this connection's player.
+
+        :return: False if the message was dropped because the peer is gone or
+        is not reading fast enough
+        """
+        protocol = self.connection.protocol
+        stats = self.connection.game.ice_relay_stats
+        if (
+            not protocol.is_connected()
+            or protocol.buffered_bytes() > config.ICE_RELAY_MAX_BUFFERED_BYTES
+        ):
+            stats.dropped += 1
+            _dropped.inc()
+            return False
+
+        data = protocol.encode_json(
+            ICE_ENVELOPE % (sender_id, json_encoder.encode(payload))
+        )
+        self._pending.append(data)
+        stats.record(sender_id, self.connection.player.id, len(data))
+
+        if self._flush_handle is None:
+            loop = asyncio.get_running_loop()
+            window = config.ICE_RELAY_BATCH_WINDOW
+            if window > 0:
+                self._flush_handle = loop.call_later(window, self.flush)
+            else:
+                self._flush_handle = loop.call_soon(self.flush)
+        return True
+
+    def flush(self) -> None:
+        """
+        Write the queued messages without waiting for them to be sent
+        """
+        self._flush_handle = None
+        pending, self._pending = self._pending, []
+        if not pending:
+            return
+
+        stats = self.connection.game.ice_relay_stats
+        protocol = self.connection.protocol
+        data = b"".join(pending)
+        try:
+            protocol.write_raw(data)
+        except DisconnectedError:
+            self._logger.debug(
+                "Dropped %d ICE messages for disconnected player: %s",
+                len(pending), self.connection.player.id
+            )
+            stats.dropped += len(pending)
+            _dropped.inc(len(pending))
+            return
+
+        # Counted per batch rather than per message, like a broadcast
+        stats.batches += 1
+        _relayed.inc(len(pending))
+        metrics.ice_relay_batch_size.observe(len(pending))
+        label = sent_command_label("IceMsg")
+        protocol_name = protocol.__class__.__name__
+        metrics.sent_command_messages.labels(protocol_name, label).inc(len(pending))
+        metrics.sent_command_bytes.labels(protocol_name, label).inc(len(data))
+
+    def cancel(self) -> None:
+        """
+        Discard the queued messages
+        """
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        self._pending = []
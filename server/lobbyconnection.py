@@ -7,9 +7,8 @@ import urllib.parse
 import urllib.request
 from datetime import datetime
 from functools import wraps
-from typing import Optional
+from typing import Optional, Tuple
 
-import aiohttp
 from sqlalchemy import and_, func, select
 from sqlalchemy.exc import DBAPIError, OperationalError, ProgrammingError
 
@@ -17,27 +16,31 @@ import server.metrics as metrics
 from server.db import FAFDatabase
 
 from .abc.base_game import GameConnectionState, InitMode
+from .catalog_service import CatalogService
+from .command_metrics import UNKNOWN_COMMAND
 from .config import TRACE, config
 from .db.models import (
     avatars,
     avatars_list,
     ban,
-    coop_map,
     friends_and_foes,
     lobby_ban
 )
 from .db.models import login as t_login
-from .decorators import timed, with_logger
+from .decorators import command, timed, with_dispatch_table, with_logger
 from .exceptions import AuthenticationError, BanError, ClientError
 from .factions import Faction
 from .game_service import GameService
-from .gameconnection import GameConnection
+from .gameconnection import COMMAND_HANDLERS, GameConnection
 from .games import FeaturedModType, GameState, VisibilityState, CustomGame
 from .geoip_service import GeoIpService
+from .http_client_service import HttpClientService
 from .ice_servers.coturn import CoturnHMAC
 from .ice_servers.nts import TwilioNTS
 from .ladder_service import LadderService
+from .login_admission import LoginAdmissionController
 from .party_service import PartyService
+from .policy_service import PolicyService
 from .player_service import PlayerService
 from .tada_service import TadaService
 from .players import Player, PlayerState
@@ -46,6 +49,12 @@ from .rating import InclusiveRange, RatingType
 from .types import Address, GameLaunchOptions
 from .tada_service import TadaFileTooLargeException
 
+# Game messages accepted before login. Bottleneck is sent by the game during
+# reconnect. GameMetrics is sent by gpgnet4ta periodically.
+UNAUTHENTICATED_GAME_COMMANDS = frozenset(("Bottleneck", "GameMetrics"))
+
+
+@with_dispatch_table
 @with_logger
 class LobbyConnection:
     @timed()
@@ -58,7 +67,10 @@ class LobbyConnection:
         geoip: GeoIpService,
         ladder_service: LadderService,
         party_service: PartyService,
-        tada_service: TadaService
+        tada_service: TadaService,
+        policy_service: Optional[PolicyService] = None,
+        login_admission: Optional[LoginAdmissionController] = None,
+        catalog_service: Optional[CatalogService] = None
     ):
         self._db = database
         self.geoip_service = geoip
@@ -69,6 +81,9 @@ class LobbyConnection:
         self.ladder_service = ladder_service
         self.party_service = party_service
         self.tada_service = tada_service
+        self.policy_service = policy_service or PolicyService(HttpClientService())
+        self.login_admission = login_admission
+        self.catalog_service = catalog_service or CatalogService(database)
         self._authenticated = False
         self.player = None  # type: Player
         self.game_connection = None  # type: GameConnection
@@ -111,39 +126,65 @@ class LobbyConnection:
 
         await self.protocol.close()
 
-    async def ensure_authenticated(self, cmd):
-        if not self._authenticated:
-            # Bottleneck is sent by the game during reconnect.  GameMetrics is sent by gpgnet4ta periodically
-            if cmd not in ["hello", "ask_session", "create_account", "ping", "pong", "Bottleneck", "GameMetrics"]:
-                metrics.unauth_messages.labels(cmd).inc()
-                await self.abort("Message invalid for unauthenticated connection: %s" % cmd)
-                return False
-        return True
+    async def reject_unauthenticated(self, cmd):
+        metrics.unauth_messages.labels(cmd).inc()
+        await self.abort("Message invalid for unauthenticated connection: %s" % cmd)
+
+    def command_label(self, message) -> Tuple[str, str]:
+        """
+        :return: the target and command of a message to label metrics with,
+        the command being UNKNOWN_COMMAND if it is not handled
+        """
+        if not isinstance(message, dict):
+            return "lobby", UNKNOWN_COMMAND
+
+        cmd = message.get("command")
+        if message.get("target") == "game":
+            return "game", cmd if cmd in COMMAND_HANDLERS else UNKNOWN_COMMAND
+
+        if isinstance(cmd, str) and cmd in self._dispatch_table:
+            return "lobby", cmd
+        return "lobby", UNKNOWN_COMMAND
 
     async def on_message_received(self, message):
         """
         Dispatches incoming messages
         """
-        self._logger.log(TRACE, "<< %s: %s", self.get_user_identifier(), message)
+        if self._logger.isEnabledFor(TRACE):
+            self._logger.log(TRACE, "<< %s: %s", self.get_user_identifier(), message)
 
         try:
             cmd = message["command"]
-            if not await self.ensure_authenticated(cmd):
-                return
             target = message.get("target")
             if target == "game":
-                if not self.game_connection:
-                    return
+                # Fast path for the ICE and metrics messages relayed during
+                # games, which make up most of the traffic
+                if not self._authenticated and cmd not in UNAUTHENTICATED_GAME_COMMANDS:
+                    await self.reject_unauthenticated(cmd)
+                elif self.game_connection:
+                    await self.game_connection.handle_action(cmd, message.get("args", []))
+                return
 
-                await self.game_connection.handle_action(cmd, message.get("args", []))
+            handler = self._dispatch_table.get(cmd) if isinstance(cmd, str) else None
+            if not self._authenticated and (handler is None or handler.requires_auth):
+                await self.reject_unauthenticated(cmd)
                 return
 
-            if target == "connectivity" and message.get("command") == "InitiateTest":
+            if target == "connectivity" and cmd == "InitiateTest":
                 self._attempted_connectivity_test = True
                 raise ClientError("Your client version is no longer supported. Please update to the newest version: https://taforever.com")
 
-            handler = getattr(self, "command_{}".format(cmd))
-            await handler(message)
+            if handler is None:
+                self._logger.warning("Unknown command %s", cmd)
+                await self.send({"command": "invalid"})
+                await self.abort("Error processing command")
+                return
+
+            invalid_field = handler.invalid_field(message)
+            if invalid_field is not None:
+                raise ValueError(f"Invalid field {invalid_field!r}")
+
+            await handler.func(self, message)
 
         except AuthenticationError as ex:
             await self.send({
@@ -177,10 +218,9 @@ class LobbyConnection:
             self._logger.exception(ex)
             await self.abort("Error processing command")
 
+    @command(replay_id=None)
     async def command_upload_replay_to_tada(self, msg):
         replay_id = msg["replay_id"]
-        archive_dir = self.game_service.get_archive_dir_for_game_id(replay_id)
-        archive_path = f"{archive_dir}/{replay_id}.zip"
 
         async with self._db.acquire() as conn:
             replay_info = await self.game_service.get_replay_info(conn, replay_id)
@@ -204,7 +244,7 @@ class LobbyConnection:
         })
 
         try:
-            await self.tada_service.upload(replay_id, replay_info.replay_meta, archive_path, 2)
+            await self.tada_service.upload(replay_id, self.player.id)
 
         except TadaFileTooLargeException:
             await self.send({
@@ -214,43 +254,43 @@ class LobbyConnection:
                 "i18n_key": "tada.server.upload.too_large"
             })
 
+    @command(requires_auth=False)
     async def command_ping(self, msg):
         if "afk_seconds" in msg and self.player is not None:
             self.player_service.set_player_afk_seconds(self.player, int(msg["afk_seconds"]))
         await self.send({"command": "pong"})
 
+    @command(requires_auth=False)
     async def command_pong(self, msg):
         pass
 
+    @command(requires_auth=False)
     async def command_create_account(self, message):
         raise ClientError("FAF no longer supports direct registration. Please use the website to register.", recoverable=True)
 
     async def command_coop_list(self, message):
         """ Request for coop map list"""
-        async with self._db.acquire() as conn:
-            result = await conn.execute(select(coop_map))
-
-            maps = []
-            campaigns = [
-                "Arm Campaign",
-                "Core Campaign"
-            ]
-            for row in result:
-                json_to_send = {
-                    "command": "coop_info",
-                    "name": row.name,
-                    "description": row.description,
-                    "filename": row.filename,
-                    "featured_mod": "coop"
-                }
-                if row.type < len(campaigns):
-                    json_to_send["type"] = campaigns[row.type]
-                else:
-                    # Don't sent corrupt data to the client...
-                    self._logger.error("Unknown coop type!")
-                    continue
-                json_to_send["uid"] = row.id
-                maps.append(json_to_send)
+        maps = []
+        campaigns = [
+            "Arm Campaign",
+            "Core Campaign"
+        ]
+        for row in await self.catalog_service.get_coop_maps():
+            json_to_send = {
+                "command": "coop_info",
+                "name": row.name,
+                "description": row.description,
+                "filename": row.filename,
+                "featured_mod": "coop"
+            }
+            if row.type < len(campaigns):
+                json_to_send["type"] = campaigns[row.type]
+            else:
+                # Don't sent corrupt data to the client...
+                self._logger.error("Unknown coop type!")
+                continue
+            json_to_send["uid"] = row.id
+            maps.append(json_to_send)
 
         await self.protocol.send_messages(maps)
 
@@ -470,25 +510,12 @@ class LobbyConnection:
         if not config.USE_POLICY_SERVER:
             return True
 
-        url = config.FAF_POLICY_SERVER_BASE_URL + "/verify"
-        payload = {
-            "player_id": player_id,
-            "uid_hash": uid_hash,
-            "session": session
-        }
-        headers = {
-            "content-type": "application/json",
-            "cache-control": "no-cache"
-        }
-
-        async with aiohttp.ClientSession(raise_for_status=True) as session:
-            async with session.post(url, json=payload, headers=headers) as resp:
-                response = await resp.json()
+        result = await self.policy_service.verify(player_id, uid_hash, session)
 
         if ignore_result:
             return True
 
-        if response.get("result", "") == "vm":
+        if result == "vm":
             self._logger.debug("Using VM: %d: %s", player_id, uid_hash)
             await self.send({
                 "command": "notice",
@@ -506,7 +533,7 @@ class LobbyConnection:
                                     config.WWW_URL + "/account/link</a>.<br>If you need an exception, please contact an "
                                                      "admin or moderator on the forums", fatal=True)
 
-        if response.get("result", "") == "already_associated":
+        if result == "already_associated":
             self._logger.warning("UID hit: %d: %s", player_id, uid_hash)
             await self.send_warning("Your computer is already associated with another FAF account.<br><br>In order to "
                                     "log in with an additional account, you have to link it to Steam: <a href='" +
@@ -515,7 +542,7 @@ class LobbyConnection:
                                                      "admin or moderator on the forums", fatal=True)
             return False
 
-        if response.get("result", "") == "fraudulent":
+        if result == "fraudulent":
             self._logger.info("Banning player %s for fraudulent looking login.", player_id)
             await self.send_warning("Fraudulent login attempt detected. As a precautionary measure, your account has been "
                                     "banned permanently. Please contact an admin or moderator on the forums if you feel this is "
@@ -539,9 +566,30 @@ class LobbyConnection:
 
             return False
 
-        return response.get("result", "") == "honest"
+        return result == "honest"
 
+    @command(requires_auth=False, login=str, password=str)
     async def command_hello(self, message):
+        if self.login_admission is None:
+            await self._handle_hello(message)
+            return
+
+        async with self.login_admission.admit(self._send_login_queue_position):
+            # The client may have given up while waiting in the queue
+            if not self.protocol.is_connected():
+                return
+            await self._handle_hello(message)
+
+    async def _send_login_queue_position(self, position: int):
+        await self.send({
+            "command": "notice",
+            "style": "info",
+            "text": f"The server is busy. You are queued for login at position {position}.",
+            "i18n_key": "login.queued",
+            "position": position
+        })
+
+    async def _handle_hello(self, message):
         login = message["login"].strip()
         password = message["password"]
 
@@ -553,45 +601,54 @@ class LobbyConnection:
             player_id, login, steamid = await self.check_user_login(conn, login, password)
             metrics.user_logins.labels("success").inc()
 
-            await conn.execute(
-                t_login.update().where(
-                    t_login.c.id == player_id
-                ).values(
-                    ip=self.peer_address.host,
-                    user_agent=self.user_agent,
-                    last_login=func.now()
-                )
-            )
-
-            conforms_policy = await self.check_policy_conformity(
+            # The policy server doesn't depend on the rest of the handshake, so
+            # let it do its work while we talk to the database.
+            policy_check = asyncio.create_task(self.check_policy_conformity(
                 player_id, message["unique_id"], self.session,
                 ignore_result=(
                     steamid is not None or
                     self.player_service.is_uniqueid_exempt(player_id)
                 )
-            )
-            if not conforms_policy:
-                return
-
-            # Update the user's IRC registration (why the fuck is this here?!)
-            m = hashlib.md5()
-            m.update(password.encode())
-            passwordmd5 = m.hexdigest()
-            m = hashlib.md5()
-            # Since the password is hashed on the client, what we get at this point is really
-            # md5(md5(sha256(password))). This is entirely insane.
-            m.update(passwordmd5.encode())
-            irc_pass = "md5:" + str(m.hexdigest())
-
+            ))
             try:
                 await conn.execute(
-                    "UPDATE anope.anope_db_NickCore "
-                    "SET pass = :passwd WHERE display = :display",
-                    passwd=irc_pass,
-                    display=login
+                    t_login.update().where(
+                        t_login.c.id == player_id
+                    ).values(
+                        ip=self.peer_address.host,
+                        user_agent=self.user_agent,
+                        last_login=func.now()
+                    )
                 )
-            except (OperationalError, ProgrammingError) as e:
-                self._logger.error("Failure updating NickServ password for %s. (Probably no entry exists to be updated for the given login)", login)
+
+                # Update the user's IRC registration (why the fuck is this here?!)
+                m = hashlib.md5()
+                m.update(password.encode())
+                passwordmd5 = m.hexdigest()
+                m = hashlib.md5()
+                # Since the password is hashed on the client, what we get at this point is really
+                # md5(md5(sha256(password))). This is entirely insane.
+                m.update(passwordmd5.encode())
+                irc_pass = "md5:" + str(m.hexdigest())
+
+                try:
+                    await conn.execute(
+                        "UPDATE anope.anope_db_NickCore "
+                        "SET pass = :passwd WHERE display = :display",
+                        passwd=irc_pass,
+                        display=login
+                    )
+                except (OperationalError, ProgrammingError) as e:
+                    self._logger.error("Failure updating NickServ password for %s. (Probably no entry exists to be updated for the given login)", login)
+            except BaseException:
+                policy_check.cancel()
+                raise
+
+        # Awaited outside of the transaction because a fraudulent login will
+        # need a connection of its own to write the ban.
+        conforms_policy = await policy_check
+        if not conforms_policy:
+            return
 
         self.player = Player(
             login=str(login),
@@ -716,6 +773,7 @@ class LobbyConnection:
         self.player_service.set_player_state(self.player, PlayerState.PLAYING)
         self.player.game = game
 
+    @command(requires_auth=False)
     async def command_ask_session(self, message):
         user_agent = message.get("user_agent")
         version = message.get("version")
@@ -723,6 +781,7 @@ class LobbyConnection:
         await self._check_user_agent()
         await self.send({"command": "session", "session": self.session})
 
+    @command(action=str)
     async def command_avatar(self, message):
         action = message["action"]
 
@@ -830,6 +889,7 @@ class LobbyConnection:
 
     @ice_only
     @player_idle("join a game")
+    @command(uid=None)
     async def command_game_join(self, message):
         """
         We are going to join a game.
@@ -901,6 +961,7 @@ class LobbyConnection:
         await self.launch_game(game, is_host=False)
 
     @ice_only
+    @command(state=None)
     async def command_game_matchmaking(self, message):
         queue_name = str(
             message.get("queue_name") or message.get("mod", "ladder1v1")
@@ -954,6 +1015,7 @@ class LobbyConnection:
 
     @ice_only
     @player_idle("host a game")
+    @command(visibility=str)
     async def command_game_host(self, message):
         assert isinstance(self.player, Player)
 
@@ -1040,30 +1102,30 @@ class LobbyConnection:
 
         await self.send({k: v for k, v in cmd.items() if v is not None})
 
+    @command(type=str)
     async def command_modvault(self, message):
         type = message["type"]
 
-        async with self._db.acquire() as conn:
-            if type == "start":
-                result = await conn.execute("SELECT uid, name, version, author, ui, date, downloads, likes, played, description, filename, icon FROM table_mod ORDER BY likes DESC LIMIT 100")
+        if type == "start":
+            for row in await self.catalog_service.get_top_mods():
+                uid, name, version, author, ui, date, downloads, likes, played, description, filename, icon = (row[i] for i in range(12))
+                try:
+                    link = urllib.parse.urljoin(config.CONTENT_URL, "taf/vault/" + filename)
+                    thumbstr = ""
+                    if icon:
+                        thumbstr = urllib.parse.urljoin(config.CONTENT_URL, "taf/vault/mods_thumbs/" + urllib.parse.quote(icon))
+
+                    out = dict(command="modvault_info", thumbnail=thumbstr, link=link, bugreports=[],
+                               comments=[], description=description, played=played, likes=likes,
+                               downloads=downloads, date=int(date.timestamp()), uid=uid, name=name, version=version, author=author,
+                               ui=ui)
+                    await self.send(out)
+                except:
+                    self._logger.error("Error handling table_mod row (uid: {})".format(uid), exc_info=True)
+            return
 
-                for row in result:
-                    uid, name, version, author, ui, date, downloads, likes, played, description, filename, icon = (row[i] for i in range(12))
-                    try:
-                        link = urllib.parse.urljoin(config.CONTENT_URL, "taf/vault/" + filename)
-                        thumbstr = ""
-                        if icon:
-                            thumbstr = urllib.parse.urljoin(config.CONTENT_URL, "taf/vault/mods_thumbs/" + urllib.parse.quote(icon))
-
-                        out = dict(command="modvault_info", thumbnail=thumbstr, link=link, bugreports=[],
-                                   comments=[], description=description, played=played, likes=likes,
-                                   downloads=downloads, date=int(date.timestamp()), uid=uid, name=name, version=version, author=author,
-                                   ui=ui)
-                        await self.send(out)
-                    except:
-                        self._logger.error("Error handling table_mod row (uid: {})".format(uid), exc_info=True)
-
-            elif type == "like":
+        async with self._db.acquire() as conn:
+            if type == "like":
                 canLike = True
                 uid = message["uid"]
                 result = await conn.execute("SELECT uid, name, version, author, ui, date, downloads, likes, played, description, filename, icon, likers FROM `table_mod` WHERE uid = %s LIMIT 1", (uid,))
@@ -1096,6 +1158,7 @@ class LobbyConnection:
                         "JOIN mod_version v ON v.mod_id = s.mod_id "
                         "SET s.likes = s.likes + 1, likers=%s WHERE v.uid = %s",
                         json.dumps(likers), uid)
+                    self.catalog_service.invalidate_top_mods()
                     await self.send(out)
 
             elif type == "download":
@@ -1127,6 +1190,7 @@ class LobbyConnection:
         })
 
     @player_idle("invite a player")
+    @command(recipient_id=None)
     async def command_invite_to_party(self, message):
         recipient = self.player_service.get_player(message["recipient_id"])
         if recipient is None:
@@ -1139,6 +1203,7 @@ class LobbyConnection:
         self.party_service.invite_player_to_party(self.player, recipient)
 
     @player_idle("join a party")
+    @command(sender_id=None)
     async def command_accept_party_invite(self, message):
         sender = self.player_service.get_player(message["sender_id"])
         if sender is None:
@@ -1148,6 +1213,7 @@ class LobbyConnection:
         await self.party_service.accept_invite(self.player, sender)
 
     @player_idle("kick a player")
+    @command(kicked_player_id=None)
     async def command_kick_player_from_party(self, message):
         kicked_player = self.player_service.get_player(message["kicked_player_id"])
         if kicked_player is None:
@@ -1160,6 +1226,7 @@ class LobbyConnection:
         self.ladder_service.cancel_search(self.player)
         await self.party_service.leave_party(self.player)
 
+    @command(factions=list)
     async def command_set_party_factions(self, message):
         factions = set(Faction.from_value(v) for v in message["factions"])
 
@@ -1171,6 +1238,7 @@ class LobbyConnection:
 
         self.party_service.set_factions(self.player, list(factions))
 
+    @command(alias=None)
     async def command_set_player_alias(self, message):
         self.party_service.set_player_alias(self.player, message["alias"])
 
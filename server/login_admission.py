@@ -0,0 +1,144 @@
+"""
+Admission control for login handshakes
+"""
+
+import asyncio
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Awaitable, Callable, Deque, Optional
+
+import server.metrics as metrics
+
+from .config import config
+from .decorators import with_logger
+from .exceptions import ClientError
+
+QueuedCallback = Callable[[int], Awaitable[None]]
+
+
+@with_logger
+class LoginAdmissionController:
+    """
+        Bounds the number of `hello` handshakes that are processed concurrently.
+    After a server restart every client reconnects at once, and each handshake
+    hits the database, the policy server and causes a `player_info` broadcast.
+    Only `LOGIN_MAX_CONCURRENT_HANDSHAKES` of them are allowed to run at the
+    same time, the rest wait in arrival order. Once more than
+    `LOGIN_MAX_QUEUED_HANDSHAKES` are waiting, new handshakes are rejected.
+
+        One instance is shared by all `ServerContext`s of a `ServerInstance`.
+    """
+
+    def __init__(
+        self,
+        max_concurrent: Optional[int] = None,
+        max_queued: Optional[int] = None
+    ):
+        # For testing. If not set the limits are read from the config every
+        # time so they can be changed at runtime.
+        self._max_concurrent = max_concurrent
+        self._max_queued = max_queued
+
+        self._active = 0
+        self._waiters: Deque[asyncio.Future] = deque()
+
+    @property
+    def max_concurrent(self) -> int:
+        if self._max_concurrent is not None:
+            return self._max_concurrent
+        return config.LOGIN_MAX_CONCURRENT_HANDSHAKES
+
+    @property
+    def max_queued(self) -> int:
+        if self._max_queued is not None:
+            return self._max_queued
+        return config.LOGIN_MAX_QUEUED_HANDSHAKES
+
+    @property
+    def active(self) -> int:
+        """Number of handshakes that are currently being processed"""
+        return self._active
+
+    def __len__(self) -> int:
+        """Number of handshakes waiting to be admitted"""
+        return len(self._waiters)
+
+    @asynccontextmanager
+    async def admit(self, on_queued: Optional[QueuedCallback] = None):
+        """
+        Wait for a free handshake slot and hold it for the duration of the
+        context.
+
+        :param on_queued: Awaited with the queue position (starting at 1) if
+            the handshake can not be admitted immediately.
+        :raises: ClientError if the queue is full
+        """
+        enqueued_at = time.monotonic()
+        await self._acquire(on_queued)
+        admitted_at = time.monotonic()
+        metrics.login_queue_wait.observe(admitted_at - enqueued_at)
+
+        try:
+            yield
+        finally:
+            metrics.login_handshake_duration.observe(
+                time.monotonic() - admitted_at
+            )
+            self._release()
+
+    async def _acquire(self, on_queued: Optional[QueuedCallback]) -> None:
+        if self._active < self.max_concurrent and not self._waiters:
+            self._active += 1
+            metrics.login_admissions.labels("admitted").inc()
+            return
+
+        if len(self._waiters) >= self.max_queued:
+            metrics.login_admissions.labels("rejected").inc()
+            self._logger.warning(
+                "Rejecting login, %d handshakes are already queued",
+                len(self._waiters)
+            )
+            raise ClientError(
+                "The server is currently very busy. Please try again in a "
+                "few moments.",
+                recoverable=False
+            )
+
+        fut = asyncio.get_running_loop().create_future()
+        self._waiters.append(fut)
+        metrics.login_admissions.labels("queued").inc()
+        metrics.login_queue_length.set(len(self._waiters))
+
+        try:
+            if on_queued is not None:
+                await on_queued(len(self._waiters))
+            await fut
+        except BaseException:
+            if fut.done() and not fut.cancelled():
+                # We were handed a slot but will not use it
+                self._release()
+            else:
+                fut.cancel()
+                self._remove_waiter(fut)
+            raise
+
+    def _release(self) -> None:
+        # Hand the slot directly to the next waiter so that newly arriving
+        # handshakes can't overtake the queue
+        while self._waiters:
+            fut = self._waiters.popleft()
+            if not fut.done():
+                fut.set_result(None)
+                metrics.login_queue_length.set(len(self._waiters))
+                return
+
+        self._active -= 1
+        metrics.login_queue_length.set(len(self._waiters))
+
+    def _remove_waiter(self, fut: asyncio.Future) -> None:
+        try:
+            self._waiters.remove(fut)
+        except ValueError:
+            pass
+        metrics.login_queue_length.set(len(self._waiters))
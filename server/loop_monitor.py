@@ -0,0 +1,160 @@
+"""
+Event loop health instrumentation.
+
+A heartbeat task measures how late the loop wakes it up, which is the time
+any ready callback has to wait before it runs. Every callback the loop runs,
+including every step of every task, is also timed, and those that take
+longer than `LOOP_MONITOR_SLOW_CALLBACK_THRESHOLD` are recorded by the name
+of their coroutine or function together with a snippet of where they were.
+"""
+
+import asyncio
+import time
+from collections import deque
+from typing import Deque, List, NamedTuple, Optional
+
+from server import metrics
+from server.config import config
+from server.decorators import with_logger
+
+STACK_LIMIT = 5
+
+
+class SlowCallback(NamedTuple):
+    name: str
+    duration: float
+    time: float
+    stack: List[str]
+
+    def to_dict(self):
+        return self._asdict()
+
+
+def describe_callback(callback) -> str:
+    """
+    :return: the name to report a callback by, for task steps the qualified
+    name of the task's coroutine
+    """
+    task = getattr(callback, "__self__", None)
+    if isinstance(task, asyncio.Task):
+        coro = task.get_coro()
+        return getattr(coro, "__qualname__", type(coro).__name__)
+
+    callback = getattr(callback, "func", callback)    # functools.partial
+    return getattr(callback, "__qualname__", type(callback).__name__)
+
+
+def callback_stack(callback) -> List[str]:
+    """
+    :return: where a task is suspended after its step, or where a plain
+    callback is defined
+    """
+    task = getattr(callback, "__self__", None)
+    if isinstance(task, asyncio.Task):
+        frames = task.get_stack(limit=STACK_LIMIT)
+        return [
+            f"{f.f_code.co_filename}:{f.f_lineno} in {f.f_code.co_qualname}"
+            for f in frames
+        ]
+
+    code = getattr(getattr(callback, "func", callback), "__code__", None)
+    if code is None:
+        return []
+    return [f"{code.co_filename}:{code.co_firstlineno} in {code.co_qualname}"]
+
+
+@with_logger
+class LoopMonitor:
+    def __init__(self):
+        self.interval = config.LOOP_MONITOR_INTERVAL
+        self.threshold = config.LOOP_MONITOR_SLOW_CALLBACK_THRESHOLD
+        self.slow_callbacks: Deque[SlowCallback] = deque(
+            maxlen=config.LOOP_MONITOR_SLOW_CALLBACK_COUNT
+        )
+
+        self._heartbeat_task: Optional[asyncio.Task] = None
+        self._original_run = None
+
+    @property
+    def running(self) -> bool:
+        return self._heartbeat_task is not None
+
+    def refresh(self):
+        self.stop()
+        self.interval = config.LOOP_MONITOR_INTERVAL
+        self.threshold = config.LOOP_MONITOR_SLOW_CALLBACK_THRESHOLD
+        self.slow_callbacks = deque(
+            self.slow_callbacks, maxlen=config.LOOP_MONITOR_SLOW_CALLBACK_COUNT
+        )
+        if self.interval > 0:
+            self.start()
+
+    def start(self):
+        if self.running:
+            return
+
+        self._heartbeat_task = asyncio.create_task(self._heartbeat())
+        # Other loops, like uvloop, run callbacks without `Handle._run`
+        if isinstance(asyncio.get_running_loop(), asyncio.BaseEventLoop):
+            self._patch_handle()
+        else:
+            self._logger.info(
+                "Slow callbacks aren't recorded on %s",
+                type(asyncio.get_running_loop()).__name__
+            )
+
+    def stop(self):
+        if not self.running:
+            return
+
+        self._heartbeat_task.cancel()
+        self._heartbeat_task = None
+        self._unpatch_handle()
+
+    def slowest(self, count: Optional[int] = None) -> List[SlowCallback]:
+        """
+        :return: the recently recorded slow callbacks, slowest first
+        """
+        return sorted(
+            self.slow_callbacks, key=lambda c: c.duration, reverse=True
+        )[:count]
+
+    async def _heartbeat(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            expected = loop.time() + self.interval
+            await asyncio.sleep(self.interval)
+            metrics.event_loop_lag.observe(max(0.0, loop.time() - expected))
+
+    def _patch_handle(self):
+        """
+        Time every callback by wrapping `Handle._run`, which the loop calls
+        for every ready callback and task step.
+        """
+        original_run = self._original_run = asyncio.events.Handle._run
+        monitor = self
+
+        def _run(handle):
+            start = time.perf_counter()
+            try:
+                original_run(handle)
+            finally:
+                duration = time.perf_counter() - start
+                if duration >= monitor.threshold:
+                    monitor._record(handle, duration)
+
+        asyncio.events.Handle._run = _run
+
+    def _unpatch_handle(self):
+        if self._original_run is not None:
+            asyncio.events.Handle._run = self._original_run
+            self._original_run = None
+
+    def _record(self, handle: asyncio.Handle, duration: float):
+        callback = handle._callback
+        name = describe_callback(callback)
+        metrics.event_loop_slow_callbacks.labels(name).observe(duration)
+        self.slow_callbacks.append(
+            SlowCallback(name, duration, time.time(), callback_stack(callback))
+        )
+        self._logger.debug("Slow callback %s took %.3f s", name, duration)
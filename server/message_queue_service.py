@@ -1,11 +1,15 @@
 import asyncio
 import json
-from typing import Dict
+import os
+import time
+from collections import deque
+from typing import Deque, Dict, List, NamedTuple, Optional
 
 import aio_pika
 from aio_pika import DeliveryMode, ExchangeType
-from aio_pika.exceptions import ProbableAuthenticationError
+from aio_pika.exceptions import DeliveryError, ProbableAuthenticationError
 
+from . import metrics
 from .asyncio_extensions import synchronizedmethod
 from .config import TRACE, config
 from .core import Service
@@ -16,12 +20,28 @@ class ConnectionAttemptFailed(ConnectionError):
     pass
 
 
+class OutboundMessage(NamedTuple):
+    exchange_name: str
+    routing: str
+    body: bytes
+    delivery_mode: DeliveryMode
+    message_id: Optional[str]
+    # Resolves to True once the broker confirmed the message, or False if it
+    # was rejected or dropped
+    confirmed: asyncio.Future
+    enqueued_at: float
+
+
 @with_logger
 class MessageQueueService(Service):
     def __init__(self) -> None:
         """
         Service handling connection to the message queue
         and providing an interface to publish messages.
+
+        Published messages are buffered and sent in batches by a background
+        task using publisher confirms. Messages that could not be sent are
+        kept in the buffer and retried once the connection is back.
         """
         self._logger.debug("Message queue service created.")
         self._connection = None
@@ -29,6 +49,12 @@ class MessageQueueService(Service):
         self._exchanges = {}
         self._exchange_types = {}
         self._is_ready = False
+        self._buffer: Deque[OutboundMessage] = deque()
+        self._in_flight = 0
+        self._wakeup = asyncio.Event()
+        self._idle = asyncio.Event()
+        self._idle.set()
+        self._publisher_task = None
 
         config.register_callback("MQ_USER", self.reconnect)
         config.register_callback("MQ_PASSWORD", self.reconnect)
@@ -36,8 +62,16 @@ class MessageQueueService(Service):
         config.register_callback("MQ_SERVER", self.reconnect)
         config.register_callback("MQ_PORT", self.reconnect)
 
+    @property
+    def is_ready(self) -> bool:
+        return self._is_ready
+
     @synchronizedmethod("initialization_lock")
     async def initialize(self) -> None:
+        if self._publisher_task is None:
+            self._load_spool()
+            self._publisher_task = asyncio.create_task(self._run_publisher())
+
         if self._is_ready:
             return
 
@@ -46,6 +80,7 @@ class MessageQueueService(Service):
         except ConnectionAttemptFailed:
             return
         self._is_ready = True
+        self._wakeup.set()
 
     async def _connect(self) -> None:
         try:
@@ -77,13 +112,16 @@ class MessageQueueService(Service):
             )
             raise ConnectionAttemptFailed from e
 
-        self._channel = await self._connection.channel(publisher_confirms=False)
+        self._channel = await self._connection.channel(publisher_confirms=True)
         self._logger.debug("Connected to RabbitMQ %r", self._connection)
 
     async def declare_exchange(
         self, exchange_name: str, exchange_type: ExchangeType = ExchangeType.TOPIC
     ) -> None:
         await self.initialize()
+        # Remember the exchange so it is declared on reconnect and messages
+        # for it can be buffered in the meantime
+        self._exchange_types[exchange_name] = exchange_type
         if not self._is_ready:
             self._logger.warning(
                 "Not connected to RabbitMQ, unable to declare exchange."
@@ -104,7 +142,22 @@ class MessageQueueService(Service):
 
     @synchronizedmethod("initialization_lock")
     async def shutdown(self) -> None:
+        if self._is_ready and not self._idle.is_set():
+            try:
+                await asyncio.wait_for(self._idle.wait(), 5)
+            except asyncio.TimeoutError:
+                pass
+
         self._is_ready = False
+        if self._publisher_task is not None:
+            self._publisher_task.cancel()
+            try:
+                await self._publisher_task
+            except asyncio.CancelledError:
+                pass
+            self._publisher_task = None
+
+        self._save_spool()
         await self._shutdown()
 
     async def _shutdown(self) -> None:
@@ -122,27 +175,197 @@ class MessageQueueService(Service):
         routing: str,
         payload: Dict,
         delivery_mode: DeliveryMode = DeliveryMode.PERSISTENT,
-    ) -> None:
+        message_id: Optional[str] = None,
+    ) -> asyncio.Future:
+        """
+        Queue a message for publishing. Returns without waiting for the
+        broker; await the returned future to find out whether the message was
+        confirmed.
+
+        :param message_id: AMQP message id, which consumers can use to
+            discard messages that were delivered more than once
+        """
+        if exchange_name not in self._exchange_types:
+            raise KeyError(f"Unknown exchange {exchange_name}.")
+
         if not self._is_ready:
             self._logger.warning(
-                "Not connected to RabbitMQ, unable to publish message."
+                "Not connected to RabbitMQ, buffering message."
             )
-            return
 
-        exchange = self._exchanges.get(exchange_name)
-        if exchange is None:
-            raise KeyError(f"Unknown exchange {exchange_name}.")
+        message = OutboundMessage(
+            exchange_name,
+            routing,
+            json.dumps(payload).encode(),
+            delivery_mode,
+            message_id,
+            asyncio.get_running_loop().create_future(),
+            time.monotonic()
+        )
+        self._enqueue(message)
+        self._logger.log(
+            TRACE, "Queued message %s to %s/%s", payload, exchange_name, routing
+        )
+        return message.confirmed
+
+    def _enqueue(self, message: OutboundMessage) -> None:
+        if len(self._buffer) >= config.MQ_PUBLISH_BUFFER_SIZE:
+            dropped = self._buffer.popleft()
+            self._logger.warning(
+                "Outbound message buffer is full, dropping message to %s/%s",
+                dropped.exchange_name, dropped.routing
+            )
+            self._resolve(dropped, False, "dropped")
+
+        self._buffer.append(message)
+        self._idle.clear()
+        self._wakeup.set()
+        self._update_backlog()
+
+    def _update_backlog(self) -> None:
+        metrics.mq_publish_backlog.set(len(self._buffer) + self._in_flight)
+
+    @staticmethod
+    def _resolve(message: OutboundMessage, confirmed: bool, result: str) -> None:
+        metrics.mq_published_messages.labels(result).inc()
+        if confirmed:
+            metrics.mq_publish_latency.observe(
+                time.monotonic() - message.enqueued_at
+            )
+        if not message.confirmed.done():
+            message.confirmed.set_result(confirmed)
 
-        message = aio_pika.Message(
-            json.dumps(payload).encode(), delivery_mode=delivery_mode
+    async def _run_publisher(self) -> None:
+        while True:
+            await self._wakeup.wait()
+            self._wakeup.clear()
+
+            while self._buffer and self._is_ready:
+                try:
+                    retry = await self._publish_batch()
+                except Exception:
+                    self._logger.exception("Unexpected error publishing messages")
+                    retry = True
+
+                if retry:
+                    await asyncio.sleep(config.MQ_PUBLISH_RETRY_DELAY)
+
+            if not self._buffer and not self._in_flight:
+                self._idle.set()
+
+    async def _publish_batch(self) -> bool:
+        """
+        Publish up to `MQ_PUBLISH_BATCH_SIZE` messages without waiting for
+        each confirm in turn. Messages that failed to send are put back at the
+        front of the buffer in their original order.
+
+        :return: whether any messages need to be retried
+        """
+        batch_size = min(len(self._buffer), config.MQ_PUBLISH_BATCH_SIZE)
+        batch = [self._buffer.popleft() for _ in range(batch_size)]
+        self._in_flight = len(batch)
+
+        try:
+            results = await asyncio.gather(
+                *(self._publish_message(message) for message in batch),
+                return_exceptions=True
+            )
+        except asyncio.CancelledError:
+            # We don't know which messages made it, so send them all again
+            self._buffer.extendleft(reversed(batch))
+            raise
+        finally:
+            self._in_flight = 0
+
+        retry: List[OutboundMessage] = []
+        for message, result in zip(batch, results):
+            if isinstance(result, DeliveryError):
+                self._logger.warning(
+                    "RabbitMQ rejected message to %s/%s",
+                    message.exchange_name, message.routing
+                )
+                self._resolve(message, False, "rejected")
+            elif isinstance(result, BaseException):
+                retry.append(message)
+            else:
+                self._logger.log(
+                    TRACE, "Published message to %s/%s",
+                    message.exchange_name, message.routing
+                )
+                self._resolve(message, True, "success")
+
+        if retry:
+            self._logger.warning(
+                "Unable to publish %d messages, retrying: %s",
+                len(retry), results[batch.index(retry[0])]
+            )
+            metrics.mq_published_messages.labels("retry").inc(len(retry))
+            self._buffer.extendleft(reversed(retry))
+        self._update_backlog()
+        return bool(retry)
+
+    async def _publish_message(self, message: OutboundMessage) -> None:
+        exchange = self._exchanges[message.exchange_name]
+        await exchange.publish(
+            aio_pika.Message(
+                message.body,
+                delivery_mode=message.delivery_mode,
+                message_id=message.message_id
+            ),
+            routing_key=message.routing
+        )
+
+    def _load_spool(self) -> None:
+        path = config.MQ_PUBLISH_SPOOL_FILE
+        if not path or not os.path.exists(path):
+            return
+
+        loop = asyncio.get_running_loop()
+        with open(path) as f:
+            for line in f:
+                data = json.loads(line)
+                self._enqueue(OutboundMessage(
+                    data["exchange_name"],
+                    data["routing"],
+                    data["body"].encode(),
+                    DeliveryMode(data["delivery_mode"]),
+                    data.get("message_id"),
+                    loop.create_future(),
+                    time.monotonic()
+                ))
+        os.remove(path)
+        self._logger.info(
+            "Loaded %d unpublished messages from %s", len(self._buffer), path
         )
 
-        async with self._channel.transaction():
-            await exchange.publish(message, routing_key=routing)
-            self._logger.log(
-                TRACE, "Published message %s to %s/%s", payload, exchange_name, routing
+    def _save_spool(self) -> None:
+        if not self._buffer:
+            return
+
+        path = config.MQ_PUBLISH_SPOOL_FILE
+        if not path:
+            self._logger.warning(
+                "Dropping %d unpublished messages", len(self._buffer)
+            )
+        else:
+            with open(path, "a") as f:
+                for message in self._buffer:
+                    f.write(json.dumps({
+                        "exchange_name": message.exchange_name,
+                        "routing": message.routing,
+                        "body": message.body.decode(),
+                        "delivery_mode": int(message.delivery_mode),
+                        "message_id": message.message_id
+                    }) + "\n")
+            self._logger.info(
+                "Saved %d unpublished messages to %s", len(self._buffer), path
             )
 
+        result = "spooled" if path else "dropped"
+        while self._buffer:
+            self._resolve(self._buffer.popleft(), False, result)
+        self._update_backlog()
+
     @synchronizedmethod("initialization_lock")
     async def reconnect(self) -> None:
         self._is_ready = False
@@ -153,8 +376,9 @@ class MessageQueueService(Service):
         except ConnectionAttemptFailed:
             return
 
-        for exchange_name in list(self._exchanges.keys()):
+        for exchange_name in list(self._exchange_types.keys()):
             await self._declare_exchange(
                 exchange_name, self._exchange_types[exchange_name]
             )
         self._is_ready = True
+        self._wakeup.set()
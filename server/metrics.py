@@ -61,6 +61,40 @@ players_online = Gauge(
     "Number of users currently online as per lobbyconnection.player_service",
 )
 
+policy_verdicts = Counter(
+    "server_user_policy_verdicts_total",
+    "Total number of policy server verdicts by source",
+    ["source", "result"],
+)
+
+policy_server_circuit_state = Gauge(
+    "server_user_policy_server_circuit_state",
+    "State of the policy server circuit breaker (0 closed, 1 open, 2 half open)",
+)
+
+login_admissions = Counter(
+    "server_user_login_admissions_total",
+    "Total number of login handshakes by admission result",
+    ["result"],
+)
+
+login_queue_length = Gauge(
+    "server_user_login_queue_length",
+    "Number of login handshakes waiting to be admitted",
+)
+
+login_queue_wait = Histogram(
+    "server_user_login_queue_wait_seconds",
+    "Time spent waiting for admission before a login handshake is processed",
+    buckets=[0.01, 0.05, 0.1, 0.5, 1, 5, 10, 30, 60, 120, 300],
+)
+
+login_handshake_duration = Histogram(
+    "server_user_login_handshake_seconds",
+    "Time spent processing an admitted login handshake",
+    buckets=[0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10],
+)
+
 
 # ========================
 # Connections and Messages
@@ -86,17 +120,148 @@ server_broadcasts = Counter(
     "server_broadcasts_total", "Total number of broadcasts"
 )
 
+event_loop_lag = Histogram(
+    "server_event_loop_lag_seconds",
+    "How late the event loop ran a heartbeat scheduled to run on time",
+    buckets=[0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 10],
+)
+
+event_loop_slow_callbacks = Histogram(
+    "server_event_loop_slow_callback_seconds",
+    "Duration of event loop callbacks and task steps longer than "
+    "LOOP_MONITOR_SLOW_CALLBACK_THRESHOLD",
+    ["name"],
+    buckets=[0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30],
+)
+
 connection_on_message_received = Histogram(
     "server_on_message_received_seconds",
     "Seconds spent in 'connection.on_message_received'",
 )
 
+command_duration = Histogram(
+    "server_command_seconds",
+    "Seconds spent handling a received message, by command",
+    ["target", "command"],
+    buckets=[0.0005, 0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 5],
+)
+
+command_db_duration = Histogram(
+    "server_command_db_seconds",
+    "Seconds spent in database queries while handling a received message, by command",
+    ["target", "command"],
+    buckets=[0, 0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 5],
+)
+
+received_message_bytes = Histogram(
+    "server_received_message_bytes",
+    "Size of received messages, by command",
+    ["target", "command"],
+    buckets=[64, 128, 256, 512, 1024, 4096, 16384, 65536, 262144],
+)
+
+sent_command_messages = Counter(
+    "server_sent_command_messages_total",
+    "Number of messages sent, by command. A broadcast counts once per recipient",
+    ["protocol", "command"],
+)
+
+sent_command_bytes = Counter(
+    "server_sent_command_bytes_total",
+    "Number of bytes sent, by command",
+    ["protocol", "command"],
+)
+
+ice_messages = Counter(
+    "server_ice_messages_total",
+    "Number of ICE messages relayed between peers",
+    ["result"],
+)
+
+ice_relay_batch_size = Histogram(
+    "server_ice_relay_batch_messages",
+    "Number of ICE messages written to a peer at once",
+    buckets=[1, 2, 4, 8, 16, 32, 64, 128],
+)
+
 db_exceptions = Counter(
     "db_exceptions_total",
     "Total number of database exceptions when executing queries",
     ["class", "code"]
 )
 
+db_pool_checkout_duration = Histogram(
+    "db_pool_checkout_seconds",
+    "Time spent waiting for a connection from the database pool",
+    buckets=[0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 5, 30],
+)
+
+db_query_duration = Histogram(
+    "db_query_seconds",
+    "Time spent executing database queries",
+    ["query"],
+    buckets=[0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 10],
+)
+
+db_slow_queries = Counter(
+    "db_slow_queries_total",
+    "Number of queries that took longer than DB_SLOW_QUERY_THRESHOLD",
+    ["query"]
+)
+
+catalog_lookups = Counter(
+    "server_catalog_lookups_total",
+    "Number of lookups in the catalog cache",
+    ["catalog", "result"]
+)
+
+# ============
+# HTTP clients
+# ============
+http_client_request_duration = Histogram(
+    "server_http_client_request_seconds",
+    "Time spent on outbound HTTP requests",
+    ["upstream", "method", "status"],
+    buckets=[0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30],
+)
+
+http_client_requests_in_flight = Gauge(
+    "server_http_client_requests_in_flight",
+    "Number of outbound HTTP requests currently holding a pooled connection",
+    ["upstream"],
+)
+
+# =============
+# Message queue
+# =============
+mq_published_messages = Counter(
+    "server_mq_published_messages_total",
+    "Number of messages handed to RabbitMQ",
+    ["result"]
+)
+
+mq_publish_backlog = Gauge(
+    "server_mq_publish_backlog",
+    "Number of messages waiting to be published or confirmed",
+)
+
+mq_publish_latency = Histogram(
+    "server_mq_publish_latency_seconds",
+    "Time from publish() until the broker confirmed the message",
+    buckets=[0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 5, 30, 300],
+)
+
+game_results_outbox_backlog = Gauge(
+    "server_game_results_outbox_backlog",
+    "Number of game results waiting in the outbox to be published",
+)
+
+game_results_relayed = Counter(
+    "server_game_results_relayed_total",
+    "Number of game results relayed from the outbox",
+    ["result"]
+)
+
 # =====
 # Games
 # =====
@@ -109,6 +274,48 @@ active_games = Gauge(
 )
 
 
+# ================
+# Replay archiving
+# ================
+replays_archived = Counter(
+    "server_replays_archived_total",
+    "Number of replays archived",
+    ["result"]
+)
+
+replay_archive_queue_depth = Gauge(
+    "server_replay_archive_queue_depth",
+    "Number of replays waiting to be archived in the current cycle",
+)
+
+replay_archive_duration = Histogram(
+    "server_replay_archive_seconds",
+    "Time spent archiving a single replay, including time queued for a worker",
+    buckets=[0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30],
+)
+
+replay_metadata_pending = Gauge(
+    "server_replay_metadata_pending",
+    "Number of replay metadata files waiting for their game to be persisted",
+)
+
+replay_metadata_processed = Counter(
+    "server_replay_metadata_processed_total",
+    "Number of replay metadata files processed",
+    ["result"]
+)
+
+tada_uploads = Counter(
+    "server_tada_uploads_total",
+    "Number of replay upload attempts to TADA",
+    ["result"]
+)
+
+tada_upload_queue_length = Gauge(
+    "server_tada_upload_queue_length",
+    "Number of replays waiting to be uploaded to TADA",
+)
+
 # ==============
 # Rating Service
 # ==============
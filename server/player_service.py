@@ -39,6 +39,9 @@ class PlayerService(Service):
         # Static-ish data fields.
         self.uniqueid_exempt = {}
         self._dirty_players = set()
+        # Incremented on every change to a player, so readers can tell
+        # whether anything changed since they last looked
+        self._version = 0
 
     async def initialize(self) -> None:
         await self.update_data()
@@ -57,6 +60,7 @@ class PlayerService(Service):
 
     def __setitem__(self, player_id: int, player: Player):
         self._players[player_id] = player
+        self._version += 1
         metrics.players_online.set(len(self._players))
 
     def set_player_afk_seconds(self, player: Player, seconds: int):
@@ -74,8 +78,13 @@ class PlayerService(Service):
     def dirty_players(self) -> Set[Player]:
         return self._dirty_players
 
+    @property
+    def version(self) -> int:
+        return self._version
+
     def mark_dirty(self, player: Player):
         self._dirty_players.add(player)
+        self._version += 1
 
     def clear_dirty(self):
         self._dirty_players = set()
@@ -156,6 +165,7 @@ class PlayerService(Service):
     def remove_player(self, player: Player):
         if player.id in self._players:
             del self._players[player.id]
+            self._version += 1
             metrics.players_online.set(len(self._players))
 
     async def has_permission_role(self, player: Player, role_name: str) -> bool:
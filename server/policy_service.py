@@ -0,0 +1,203 @@
+"""
+Client for the FAF policy server
+"""
+
+import time
+from collections import OrderedDict
+from enum import Enum
+from typing import Optional, Tuple
+
+import server.metrics as metrics
+
+from .config import config
+from .core import Service
+from .decorators import with_logger
+from .exceptions import ClientError
+from .http_client_service import HttpClientService
+
+VerdictKey = Tuple[int, str]
+
+
+class CircuitState(Enum):
+    CLOSED = 0
+    OPEN = 1
+    HALF_OPEN = 2
+
+
+class CircuitBreaker(object):
+    """
+        Stops calling an upstream that keeps failing. After `failure_threshold`
+    consecutive failures the circuit opens and `allow_request` returns False
+    until `reset_timeout` seconds have passed. Then a single trial request is
+    let through, which closes the circuit again if it succeeds.
+    """
+
+    def __init__(self, failure_threshold: int, reset_timeout: float):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = CircuitState.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+
+    def allow_request(self) -> bool:
+        if self.state is CircuitState.CLOSED:
+            return True
+
+        # Only one trial request per `reset_timeout` while open. If a trial
+        # never reports back (e.g. it was cancelled) another one is allowed
+        # after the next timeout.
+        now = time.monotonic()
+        if now - self._opened_at >= self.reset_timeout:
+            self.state = CircuitState.HALF_OPEN
+            self._opened_at = now
+            return True
+        return False
+
+    def record_success(self) -> None:
+        self.state = CircuitState.CLOSED
+        self._failures = 0
+
+    def record_failure(self) -> None:
+        self._failures += 1
+        if (
+            self.state is CircuitState.HALF_OPEN
+            or self._failures >= self.failure_threshold
+        ):
+            self.state = CircuitState.OPEN
+            self._opened_at = time.monotonic()
+
+
+@with_logger
+class PolicyService(Service):
+    """
+        Verifies logins against the policy server. Verdicts for a
+    `(player_id, uid_hash)` pair are cached so that a reconnecting player does
+    not have to wait for the policy server again. Only "honest" verdicts are
+    cached since every other verdict has consequences that must be re-checked.
+
+    If the policy server keeps failing, the circuit breaker stops calling
+    it and logins are either let through or rejected depending on
+    `POLICY_SERVER_FAIL_OPEN`.
+    """
+
+    def __init__(self, http_client_service: HttpClientService):
+        self._http_client = http_client_service
+        self._verdicts: "OrderedDict[VerdictKey, Tuple[float, str]]" = OrderedDict()
+        self.circuit_breaker = CircuitBreaker(
+            config.POLICY_SERVER_FAILURE_THRESHOLD,
+            config.POLICY_SERVER_RESET_TIMEOUT
+        )
+        config.register_callback(
+            "POLICY_SERVER_FAILURE_THRESHOLD", self.refresh_circuit_breaker
+        )
+        config.register_callback(
+            "POLICY_SERVER_RESET_TIMEOUT", self.refresh_circuit_breaker
+        )
+
+    def refresh_circuit_breaker(self) -> None:
+        self.circuit_breaker.failure_threshold = config.POLICY_SERVER_FAILURE_THRESHOLD
+        self.circuit_breaker.reset_timeout = config.POLICY_SERVER_RESET_TIMEOUT
+
+    async def verify(self, player_id: int, uid_hash: str, session: int) -> str:
+        """
+        Return the policy server verdict for a login, e.g. "honest", "vm",
+        "already_associated" or "fraudulent".
+
+        :raises: ClientError if the policy server is unavailable and
+            `POLICY_SERVER_FAIL_OPEN` is not set
+        """
+        key = (player_id, uid_hash)
+        verdict = self._get_cached(key)
+        if verdict is not None:
+            metrics.policy_verdicts.labels("cache", verdict).inc()
+            return verdict
+
+        if not self.circuit_breaker.allow_request():
+            return self._fallback_verdict(player_id)
+
+        try:
+            verdict = await self._request_verdict(player_id, uid_hash, session)
+        except Exception:
+            self.circuit_breaker.record_failure()
+            metrics.policy_server_circuit_state.set(
+                self.circuit_breaker.state.value
+            )
+            self._logger.warning(
+                "Policy server request failed for player %d", player_id,
+                exc_info=True
+            )
+            return self._fallback_verdict(player_id)
+
+        self.circuit_breaker.record_success()
+        metrics.policy_server_circuit_state.set(self.circuit_breaker.state.value)
+        metrics.policy_verdicts.labels("server", verdict).inc()
+
+        if verdict == "honest":
+            self._store(key, verdict)
+        else:
+            self._verdicts.pop(key, None)
+
+        return verdict
+
+    async def _request_verdict(
+        self,
+        player_id: int,
+        uid_hash: str,
+        session: int
+    ) -> str:
+        url = config.FAF_POLICY_SERVER_BASE_URL + "/verify"
+        payload = {
+            "player_id": player_id,
+            "uid_hash": uid_hash,
+            "session": session
+        }
+        headers = {
+            "content-type": "application/json",
+            "cache-control": "no-cache"
+        }
+
+        async with self._http_client.request(
+            "policy_server", "POST", url,
+            json=payload,
+            headers=headers,
+            timeout=config.POLICY_SERVER_TIMEOUT,
+            raise_for_status=True
+        ) as resp:
+            response = await resp.json()
+
+        return response.get("result", "")
+
+    def _fallback_verdict(self, player_id: int) -> str:
+        if config.POLICY_SERVER_FAIL_OPEN:
+            self._logger.info(
+                "Policy server unavailable, letting player %d in", player_id
+            )
+            metrics.policy_verdicts.labels("fallback", "honest").inc()
+            return "honest"
+
+        metrics.policy_verdicts.labels("fallback", "unavailable").inc()
+        raise ClientError(
+            "Your login could not be verified at the moment. Please try "
+            "again in a few minutes.",
+            recoverable=False
+        )
+
+    def _get_cached(self, key: VerdictKey) -> Optional[str]:
+        entry = self._verdicts.get(key)
+        if entry is None:
+            return None
+
+        expires_at, verdict = entry
+        if time.monotonic() >= expires_at:
+            del self._verdicts[key]
+            return None
+
+        return verdict
+
+    def _store(self, key: VerdictKey, verdict: str) -> None:
+        self._verdicts[key] = (
+            time.monotonic() + config.POLICY_VERDICT_CACHE_TTL, verdict
+        )
+        self._verdicts.move_to_end(key)
+        while len(self._verdicts) > config.POLICY_VERDICT_CACHE_SIZE:
+            self._verdicts.popitem(last=False)
@@ -1,89 +1,136 @@
-import asyncio
-import cProfile
-from asyncio import CancelledError
+"""
+Sampling profiler for the event loop thread.
+
+A background thread looks at the Python stack of the loop thread
+`PROFILING_HZ` times a second and counts how often every stack was seen. The
+loop itself does no extra work, so the overhead does not grow with load.
+
+The counts are kept as folded stacks, one line per stack with its frames
+separated by `;` followed by the number of samples, which is the input format
+of flamegraph.pl and speedscope.
+"""
+
+import os
+import sys
+import threading
+from collections import Counter
+from types import CodeType, FrameType
+from typing import Dict, Optional, Tuple
 
 from server.config import config
 from server.decorators import with_logger
 
+MAX_DEPTH = 128
+OTHER_STACKS = "[other]"
+
 
 @with_logger
 class Profiler:
     def __init__(
         self,
-        player_service,
-        interval=config.PROFILING_INTERVAL,
-        duration=config.PROFILING_DURATION,
-        max_count=config.PROFILING_COUNT,
-        outfile="server.profile",
+        hz: float = config.PROFILING_HZ,
+        max_stacks: int = config.PROFILING_MAX_STACKS
     ):
-        self.profiler = None
-        self.interval = interval
-        self.duration = duration
-        self.profile_count = 0
-        self.max_count = max_count
+        self.hz = hz
+        self.max_stacks = max_stacks
+        self.samples = 0
 
-        self._player_service = player_service
-        self._outfile = outfile
+        self._stacks: Counter = Counter()
+        self._frame_names: Dict[CodeType, str] = {}
+        self._lock = threading.Lock()
+        self._target_thread_id: Optional[int] = None
+        self._thread: Optional[threading.Thread] = None
+        self._stop_event = threading.Event()
 
-        self._running = False
-        self._task = None
+    @property
+    def running(self) -> bool:
+        return self._thread is not None
 
     def refresh(self):
-        self.interval = config.PROFILING_INTERVAL
-        self.duration = config.PROFILING_DURATION
-        self.max_count = config.PROFILING_COUNT
-        self.profile_count = 0
-
-        self.cancel()
-        if self.interval > 0 and self.duration > 0 and self.max_count > 0:
-            self._start()
-
-    def _start(self):
-        self._running = True
-        if self.profiler is None:
-            self.profiler = cProfile.Profile()
-        if self._task is None:
-            self._task = asyncio.create_task(self._next_run())
-
-    async def _next_run(self):
-        await asyncio.sleep(self.interval)
-
-        if self._running:
-            try:
-                await self._run()
-            except CancelledError:
-                pass
-
-        if self.profile_count < self.max_count and self._running:
-            self._task = asyncio.create_task(self._next_run())
-        else:
-            self.cancel()
-
-    async def _run(self):
-        if len(self._player_service) > 1500:
-            self._logger.info(
-                "Refusing to profile under high load %i/%i",
-                self.profile_count,
-                self.max_count,
-            )
+        self.hz = config.PROFILING_HZ
+        self.max_stacks = config.PROFILING_MAX_STACKS
+
+        self.stop()
+        if self.hz > 0:
+            self.start()
+
+    def start(self, thread_id: Optional[int] = None):
+        """
+        Start sampling the thread with id `thread_id`, by default the calling
+        thread.
+        """
+        if self._thread is not None:
             return
 
-        self.profile_count += 1
+        self._target_thread_id = thread_id or threading.get_ident()
+        self._stop_event.clear()
+        self._thread = threading.Thread(
+            target=self._sample_forever, name="profiler", daemon=True
+        )
+        self._thread.start()
+        self._logger.info("Started sampling profiler at %s Hz", self.hz)
 
-        self._logger.info("Starting profiler")
-        self.profiler.enable()
-        await asyncio.sleep(self.duration)
-        self.profiler.disable()
-
-        self._logger.info("Done profiling %i/%i", self.profile_count, self.max_count)
-        if self._outfile is not None:
-            self.profiler.dump_stats(self._outfile)
-
-    def cancel(self):
-        self._running = False
-        if self._task is not None:
-            self._task.cancel()
-            self._task = None
+    def stop(self):
+        if self._thread is None:
+            return
 
-        del self.profiler
-        self.profiler = None
+        self._stop_event.set()
+        self._thread.join()
+        self._thread = None
+        self._logger.info("Stopped sampling profiler")
+
+    def folded(self, reset: bool = False) -> str:
+        """
+        :return: the folded stacks sampled so far, most frequent first
+        """
+        folded, _ = self.snapshot(reset)
+        return folded
+
+    def snapshot(self, reset: bool = False) -> Tuple[str, int]:
+        """
+        :return: the folded stacks and the number of samples they were made
+        of, taken at the same time
+        """
+        with self._lock:
+            stacks = self._stacks.copy()
+            samples = self.samples
+            if reset:
+                self._stacks = Counter()
+                self.samples = 0
+
+        folded = "".join(
+            f"{stack} {count}\n" for stack, count in stacks.most_common()
+        )
+        return folded, samples
+
+    def _sample_forever(self):
+        interval = 1 / self.hz
+        while not self._stop_event.wait(interval):
+            frame = sys._current_frames().get(self._target_thread_id)
+            if frame is None:
+                continue
+            self._record(self._fold(frame))
+            # Don't keep the frames of the loop thread alive
+            del frame
+
+    def _fold(self, frame: FrameType) -> str:
+        names = []
+        while frame is not None and len(names) < MAX_DEPTH:
+            names.append(self._frame_name(frame.f_code))
+            frame = frame.f_back
+        names.reverse()
+        return ";".join(names)
+
+    def _frame_name(self, code: CodeType) -> str:
+        name = self._frame_names.get(code)
+        if name is None:
+            name = f"{code.co_qualname} ({os.path.basename(code.co_filename)})"
+            self._frame_names[code] = name
+        return name
+
+    def _record(self, stack: str):
+        with self._lock:
+            self.samples += 1
+            if stack not in self._stacks and len(self._stacks) >= self.max_stacks:
+                stack = OTHER_STACKS
+            self._stacks[stack] += 1
@@ -2,11 +2,13 @@ import contextlib
 import json
 from abc import ABCMeta, abstractmethod
 from asyncio import StreamReader, StreamWriter
-from typing import List
+from typing import List, Optional, Tuple
 
 import server.metrics as metrics
 
 from ..asyncio_extensions import synchronizedmethod
+from ..command_metrics import count_sent
+from .transport import MessageReader
 
 json_encoder = json.JSONEncoder(separators=(",", ":"))
 
@@ -19,8 +21,13 @@ class Protocol(metaclass=ABCMeta):
     def __init__(self, reader: StreamReader, writer: StreamWriter):
         self.reader = reader
         self.writer = writer
+        # Size of the last message returned by `read_message`
+        self.received_bytes = 0
         # Force calls to drain() to only return once the data has been sent
         self.writer.transport.set_write_buffer_limits(high=0)
+        # Over a `MessageTransport` messages are decoded as data arrives
+        if isinstance(reader, MessageReader):
+            self.read_message = self._read_decoded_message
 
     @staticmethod
     @abstractmethod
@@ -30,6 +37,15 @@ class Protocol(metaclass=ABCMeta):
         """
         pass  # pragma: no cover
 
+    @staticmethod
+    @abstractmethod
+    def encode_json(text: str) -> bytes:
+        """
+        Frame a message that is already JSON encoded. Lets callers that build
+        the JSON themselves skip encoding the message as a dictionary.
+        """
+        pass  # pragma: no cover
+
     def is_connected(self) -> bool:
         """
         Return whether or not the connection is still alive
@@ -46,6 +62,22 @@ class Protocol(metaclass=ABCMeta):
         """
         pass  # pragma: no cover
 
+    @staticmethod
+    @abstractmethod
+    def decode_frame(buffer: bytearray) -> Tuple[Optional[dict], int]:
+        """
+        Decode the first message in a buffer of received bytes.
+
+        :raises: ValueError if the data is malformed
+        :return: the message and its size in bytes, or None and 0 if the
+        buffer doesn't hold a whole message yet
+        """
+        pass  # pragma: no cover
+
+    async def _read_decoded_message(self) -> dict:
+        message, self.received_bytes = await self.reader.read_decoded_message()
+        return message
+
     async def send_message(self, message: dict) -> None:
         """
         Send a single message in the form of a dictionary
@@ -53,7 +85,9 @@ class Protocol(metaclass=ABCMeta):
         :param message: Message to send
         :raises: DisconnectedError
         """
-        await self.send_raw(self.encode_message(message))
+        data = self.encode_message(message)
+        count_sent(self.__class__.__name__, message.get("command"), len(data))
+        await self.send_raw(data)
 
     async def send_messages(self, messages: List[dict]) -> None:
         """
@@ -88,7 +122,9 @@ class Protocol(metaclass=ABCMeta):
         if not self.is_connected():
             raise DisconnectedError("Protocol is not connected!")
 
-        self.write_raw(self.encode_message(message))
+        data = self.encode_message(message)
+        count_sent(self.__class__.__name__, message.get("command"), len(data))
+        self.write_raw(data)
 
     def write_messages(self, messages: List[dict]) -> None:
         """
@@ -100,7 +136,12 @@ class Protocol(metaclass=ABCMeta):
         if not self.is_connected():
             raise DisconnectedError("Protocol is not connected!")
 
-        self.writer.writelines([self.encode_message(msg) for msg in messages])
+        data = []
+        for message in messages:
+            encoded = self.encode_message(message)
+            count_sent(self.__class__.__name__, message.get("command"), len(encoded))
+            data.append(encoded)
+        self.writer.writelines(data)
 
     def write_raw(self, data: bytes) -> None:
         """
@@ -114,6 +155,12 @@ class Protocol(metaclass=ABCMeta):
 
         self.writer.write(data)
 
+    def buffered_bytes(self) -> int:
+        """
+        Number of bytes written but not yet sent
+        """
+        return self.writer.transport.get_write_buffer_size()
+
     async def close(self) -> None:
         """
         Close the underlying writer as soon as the buffer has emptied.
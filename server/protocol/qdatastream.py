@@ -1,7 +1,7 @@
 import base64
 import json
 import struct
-from typing import Tuple
+from typing import Optional, Tuple
 
 from server.decorators import with_logger
 
@@ -78,7 +78,11 @@ class QDataStreamProtocol(Protocol):
         elif command == "pong":
             return PONG_MSG
 
-        return QDataStreamProtocol.pack_message(json_encoder.encode(message))
+        return QDataStreamProtocol.encode_json(json_encoder.encode(message))
+
+    @staticmethod
+    def encode_json(text: str) -> bytes:
+        return QDataStreamProtocol.pack_message(text)
 
     async def read_message(self):
         """
@@ -89,18 +93,37 @@ class QDataStreamProtocol(Protocol):
         :return dict: Parsed message
         """
         (block_length, ) = struct.unpack("!I", (await self.reader.readexactly(4)))
+        QDataStreamProtocol.check_block_length(block_length)
+        block = await self.reader.readexactly(block_length)
+        self.received_bytes = block_length + 4
+        return QDataStreamProtocol.decode_block(block)
+
+    @staticmethod
+    def decode_frame(buffer: bytearray) -> Tuple[Optional[dict], int]:
+        if len(buffer) < 4:
+            return None, 0
+        (block_length, ) = struct.unpack_from("!I", buffer)
+        QDataStreamProtocol.check_block_length(block_length)
+        end = block_length + 4
+        if len(buffer) < end:
+            return None, 0
+        return QDataStreamProtocol.decode_block(bytes(buffer[4:end])), end
+
+    @staticmethod
+    def check_block_length(block_length: int) -> None:
         if block_length > QDATASTREAM_PROTOCOL_MAX_BLOCK_LENGTH:
             raise ValueError(f"block_length={block_length} exceeds maximum {QDATASTREAM_PROTOCOL_MAX_BLOCK_LENGTH}")
-        block = await self.reader.readexactly(block_length)
-        # FIXME: New protocol will remove the need for this
 
-        pos, action = self.read_qstring(block)
+    @staticmethod
+    def decode_block(block: bytes) -> dict:
+        # FIXME: New protocol will remove the need for this
+        pos, action = QDataStreamProtocol.read_qstring(block)
         if action in ("PING", "PONG"):
             return {"command": action.lower()}
 
         message = json.loads(action)
         try:
-            for part in self.read_block(block):
+            for part in QDataStreamProtocol.read_block(block):
                 try:
                     message_part = json.loads(part)
                     if part != action:
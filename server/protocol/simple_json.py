@@ -1,13 +1,31 @@
 import json
+from typing import Optional, Tuple
 
 from .protocol import Protocol, json_encoder
 
+# Same as the limit of StreamReader.readline
+SIMPLE_JSON_PROTOCOL_MAX_LINE_LENGTH = 2 ** 16
+
 
 class SimpleJsonProtocol(Protocol):
     @staticmethod
     def encode_message(message: dict) -> bytes:
-        return (json_encoder.encode(message) + "\n").encode()
+        return SimpleJsonProtocol.encode_json(json_encoder.encode(message))
+
+    @staticmethod
+    def encode_json(text: str) -> bytes:
+        return (text + "\n").encode()
 
     async def read_message(self) -> dict:
         line = await self.reader.readline()
+        self.received_bytes = len(line)
         return json.loads(line.strip())
+
+    @staticmethod
+    def decode_frame(buffer: bytearray) -> Tuple[Optional[dict], int]:
+        end = buffer.find(b"\n") + 1
+        if not end:
+            if len(buffer) > SIMPLE_JSON_PROTOCOL_MAX_LINE_LENGTH:
+                raise ValueError("Line exceeds maximum length")
+            return None, 0
+        return json.loads(bytes(buffer[:end]).strip()), end
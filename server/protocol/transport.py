@@ -0,0 +1,195 @@
+"""
+`asyncio.Protocol` based transport for the lobby protocols.
+
+Over streams every frame is read by awaiting a `StreamReader`, twice per
+message for `QDataStreamProtocol`. `MessageTransport` instead decodes whole
+messages with the lobby protocol's `decode_frame` as data arrives and queues
+them, so reading a message that already arrived doesn't suspend. It provides
+the parts of `StreamReader` and `StreamWriter` that `Protocol` and
+`ServerContext` use.
+"""
+
+import asyncio
+from collections import deque
+from typing import Awaitable, Callable, Deque, Optional, Tuple
+
+# Reading from the socket is paused while this many messages wait to be read
+MAX_PENDING_MESSAGES = 64
+
+DecodeFrame = Callable[[bytearray], Tuple[Optional[dict], int]]
+
+
+class MessageReader(object):
+    def __init__(self, decode_frame: DecodeFrame, transport: asyncio.Transport):
+        self._decode_frame = decode_frame
+        self._transport = transport
+        self._buffer = bytearray()
+        self._messages: Deque[Tuple[dict, int]] = deque()
+        self._waiter: Optional[asyncio.Future] = None
+        self._exception: Optional[BaseException] = None
+        self._eof = False
+        self._paused = False
+
+    def at_eof(self) -> bool:
+        return self._eof and not self._messages and not self._buffer
+
+    def feed_data(self, data: bytes) -> None:
+        if self._exception is not None:
+            return
+
+        buffer = self._buffer
+        buffer += data
+        try:
+            while buffer:
+                message, size = self._decode_frame(buffer)
+                if not size:
+                    break
+                del buffer[:size]
+                self._messages.append((message, size))
+        except Exception as e:
+            self.set_exception(e)
+            return
+
+        if self._messages:
+            self._wakeup()
+        if len(self._messages) >= MAX_PENDING_MESSAGES and not self._paused:
+            self._paused = True
+            self._transport.pause_reading()
+
+    def feed_eof(self) -> None:
+        self._eof = True
+        self._wakeup()
+
+    def set_exception(self, exc: BaseException) -> None:
+        self._exception = exc
+        self._wakeup()
+
+    async def read_decoded_message(self) -> Tuple[dict, int]:
+        """
+        :raises: IncompleteReadError once the connection is closed
+        :return: the next message and its size in bytes
+        """
+        while not self._messages:
+            if self._exception is not None:
+                raise self._exception
+            if self._eof:
+                raise asyncio.IncompleteReadError(bytes(self._buffer), None)
+
+            self._waiter = asyncio.get_running_loop().create_future()
+            try:
+                await self._waiter
+            finally:
+                self._waiter = None
+
+        item = self._messages.popleft()
+        if self._paused and len(self._messages) <= MAX_PENDING_MESSAGES // 2:
+            self._paused = False
+            self._transport.resume_reading()
+        return item
+
+    def _wakeup(self) -> None:
+        if self._waiter is not None and not self._waiter.done():
+            self._waiter.set_result(None)
+
+
+class TransportWriter(object):
+    def __init__(self, transport: asyncio.Transport, protocol: "MessageTransport"):
+        self.transport = transport
+        self._protocol = protocol
+
+    def write(self, data: bytes) -> None:
+        self.transport.write(data)
+
+    def writelines(self, data) -> None:
+        self.transport.writelines(data)
+
+    def is_closing(self) -> bool:
+        return self.transport.is_closing()
+
+    def close(self) -> None:
+        self.transport.close()
+
+    async def wait_closed(self) -> None:
+        await asyncio.shield(self._protocol.closed)
+
+    def get_extra_info(self, name, default=None):
+        return self.transport.get_extra_info(name, default)
+
+    async def drain(self) -> None:
+        """
+        :raises: ConnectionResetError if the connection is lost
+        """
+        if self.transport.is_closing():
+            # Give connection_lost a chance to be called, like StreamWriter
+            await asyncio.sleep(0)
+        await self._protocol.wait_writable()
+
+
+class MessageTransport(asyncio.Protocol):
+    def __init__(
+        self,
+        decode_frame: DecodeFrame,
+        client_connected: Callable[[MessageReader, TransportWriter], Awaitable]
+    ):
+        self._decode_frame = decode_frame
+        self._client_connected = client_connected
+        self.reader: Optional[MessageReader] = None
+        self.writer: Optional[TransportWriter] = None
+        self.closed = asyncio.get_running_loop().create_future()
+        self._task: Optional[asyncio.Task] = None
+        self._paused = False
+        self._connection_lost = False
+        self._drain_waiters: Deque[asyncio.Future] = deque()
+
+    def connection_made(self, transport: asyncio.Transport) -> None:
+        self.reader = MessageReader(self._decode_frame, transport)
+        self.writer = TransportWriter(transport, self)
+        self._task = asyncio.create_task(
+            self._client_connected(self.reader, self.writer)
+        )
+
+    def data_received(self, data: bytes) -> None:
+        self.reader.feed_data(data)
+
+    def eof_received(self) -> bool:
+        self.reader.feed_eof()
+        # Let the transport close itself
+        return False
+
+    def connection_lost(self, exc: Optional[Exception]) -> None:
+        self._connection_lost = True
+        if exc is None:
+            self.reader.feed_eof()
+        else:
+            self.reader.set_exception(exc)
+        if not self.closed.done():
+            self.closed.set_result(None)
+
+        for waiter in self._drain_waiters:
+            if not waiter.done():
+                if exc is None:
+                    waiter.set_result(None)
+                else:
+                    waiter.set_exception(exc)
+
+    def pause_writing(self) -> None:
+        self._paused = True
+
+    def resume_writing(self) -> None:
+        self._paused = False
+        for waiter in self._drain_waiters:
+            if not waiter.done():
+                waiter.set_result(None)
+
+    async def wait_writable(self) -> None:
+        if self._connection_lost:
+            raise ConnectionResetError("Connection lost")
+        if not self._paused:
+            return
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._drain_waiters.append(waiter)
+        try:
+            await waiter
+        finally:
+            self._drain_waiters.remove(waiter)
@@ -0,0 +1,292 @@
+"""
+Recompute a leaderboard from the history of rated games.
+
+Games rated for the leaderboard are streamed from `leaderboard_rating_journal`
+in the order they ended and rated again in memory, starting every player from
+the default rating. The results are written to a shadow table with the same
+layout as `leaderboard_rating`, so they can be compared with the live
+leaderboard before being swapped in.
+
+Usage:
+    python -m server.rating_service.backfill LEADERBOARD [options]
+
+Options:
+    --configuration-file FILE   Load config variables from FILE
+    --shadow-table TABLE        Table to write ratings to [default: leaderboard_rating_shadow]
+    --batch-size N              Rows per bulk insert [default: 1000]
+"""
+
+import asyncio
+import logging
+import os
+import re
+import time
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List, NamedTuple, Optional
+
+from docopt import docopt
+from trueskill import Rating
+
+from server.config import config
+from server.db import FAFDatabase
+from server.decorators import with_logger
+from server.factions import Faction
+from server.games.game_results import GameOutcome
+from server.games.typedefs import EndedGamePlayerSummary
+
+from .game_rater import GameRater, GameRatingError
+from .typedefs import PlayerID
+
+HISTORY_SQL = """
+SELECT gps.gameId AS game_id, gps.playerId AS player_id, gps.team,
+    gps.result, gfm.gamemod AS game_mode
+FROM leaderboard_rating_journal journal
+JOIN game_player_stats gps ON gps.id = journal.game_player_stats_id
+JOIN game_stats gs ON gs.id = gps.gameId
+JOIN game_featuredMods gfm ON gfm.id = gs.gameMod
+WHERE journal.leaderboard_id = :leaderboard_id
+ORDER BY gs.endTime, gs.id
+"""
+
+# Rows from the history are fetched from the server side cursor in chunks
+STREAM_CHUNK_SIZE = 5000
+PROGRESS_INTERVAL = 10000
+
+TABLE_NAME = re.compile(r"^\w+$")
+
+
+class HistoryRow(NamedTuple):
+    game_id: int
+    player_id: int
+    team: int
+    result: Optional[str]
+    game_mode: str
+
+
+class BackfillResult(NamedTuple):
+    games: int
+    skipped: int
+    players: int
+    seconds: float
+
+    @property
+    def games_per_second(self) -> float:
+        return self.games / self.seconds if self.seconds else 0.0
+
+
+@dataclass
+class PlayerStats:
+    """
+    Mirrors the bookkeeping that `RatingService` does on `leaderboard_rating`
+    """
+    rating: Rating
+    total_games: int = 0
+    won_games: int = 0
+    lost_games: int = 0
+    drawn_games: int = 0
+    streak: int = 0
+    best_streak: int = 0
+    recent_scores: str = ""
+    recent_mod: Optional[str] = field(default=None)
+
+    def record(self, outcome: GameOutcome, rating: Rating, game_mode: str) -> None:
+        score = (
+            1 if outcome is GameOutcome.VICTORY else
+            0 if outcome is GameOutcome.DRAW else
+            -1
+        )
+        self.rating = rating
+        self.total_games += 1
+        self.won_games += outcome is GameOutcome.VICTORY
+        self.drawn_games += outcome is GameOutcome.DRAW
+        self.lost_games += outcome is GameOutcome.DEFEAT
+        self.streak = self.streak + score if self.streak * score >= 0 else score
+        self.best_streak = max(self.best_streak, self.streak)
+        self.recent_scores = (str(score + 1) + self.recent_scores)[:10]
+        self.recent_mod = game_mode
+
+
+@with_logger
+class LeaderboardBackfill:
+    def __init__(
+        self,
+        database: FAFDatabase,
+        leaderboard: str,
+        shadow_table: str = "leaderboard_rating_shadow",
+        batch_size: int = 1000
+    ):
+        if not TABLE_NAME.match(shadow_table) or shadow_table == "leaderboard_rating":
+            raise ValueError(f"Invalid shadow table {shadow_table!r}")
+
+        self._db = database
+        self.leaderboard = leaderboard
+        self.shadow_table = shadow_table
+        self.batch_size = batch_size
+        self.players: Dict[PlayerID, PlayerStats] = {}
+        self.games = 0
+        self.skipped = 0
+        self._game_rows: List[HistoryRow] = []
+        self._last_progress = 0
+
+    async def run(self) -> BackfillResult:
+        start = time.perf_counter()
+
+        async with self._db.acquire() as conn:
+            result = await conn.execute(
+                "SELECT id FROM leaderboard WHERE technical_name = :name",
+                name=self.leaderboard
+            )
+            leaderboard_id = result.scalar()
+            if leaderboard_id is None:
+                raise ValueError(f"Unknown leaderboard {self.leaderboard!r}")
+
+            result = await conn.stream(HISTORY_SQL, leaderboard_id=leaderboard_id)
+            async for rows in result.partitions(STREAM_CHUNK_SIZE):
+                self.rate_rows(HistoryRow(*row) for row in rows)
+                self._log_progress(start)
+            self.flush()
+
+        async with self._db.acquire() as conn:
+            await self._write_shadow(conn, leaderboard_id)
+
+        result = BackfillResult(
+            self.games, self.skipped, len(self.players),
+            time.perf_counter() - start
+        )
+        self._logger.info(
+            "Rated %d games (%d skipped) for %d players in %.1fs, %.0f games/s",
+            result.games, result.skipped, result.players, result.seconds,
+            result.games_per_second
+        )
+        return result
+
+    def rate_rows(self, rows: Iterable[HistoryRow]) -> None:
+        """
+        Rate games from history rows ordered by game. The rows of a game may
+        be split across calls, so `flush` must be called after the last rows.
+        """
+        for row in rows:
+            if self._game_rows and self._game_rows[0].game_id != row.game_id:
+                self.flush()
+            self._game_rows.append(row)
+
+    def flush(self) -> None:
+        rows, self._game_rows = self._game_rows, []
+        if rows:
+            self.rate_game(rows)
+
+    def rate_game(self, rows: List[HistoryRow]) -> None:
+        try:
+            player_data = [
+                EndedGamePlayerSummary(
+                    row.player_id, row.team, Faction.arm, GameOutcome(row.result)
+                )
+                for row in rows
+            ]
+        except ValueError:
+            self.skipped += 1
+            return
+
+        for pd in player_data:
+            if pd.player_id not in self.players:
+                self.players[pd.player_id] = PlayerStats(
+                    Rating(config.START_RATING_MEAN, config.START_RATING_DEV)
+                )
+        old_ratings = {
+            pd.player_id: self.players[pd.player_id].rating
+            for pd in player_data
+        }
+
+        try:
+            new_ratings, _ = GameRater.compute_rating(player_data, old_ratings)
+        except (GameRatingError, FloatingPointError):
+            self._logger.debug("Skipping game %d", rows[0].game_id, exc_info=True)
+            self.skipped += 1
+            return
+
+        for pd in player_data:
+            self.players[pd.player_id].record(
+                pd.outcome, new_ratings[pd.player_id], rows[0].game_mode
+            )
+        self.games += 1
+
+    def _log_progress(self, start: float) -> None:
+        rated = self.games + self.skipped
+        if rated // PROGRESS_INTERVAL == self._last_progress:
+            return
+        self._last_progress = rated // PROGRESS_INTERVAL
+        elapsed = time.perf_counter() - start
+        self._logger.info(
+            "Rated %d games, %.0f games/s", rated, rated / elapsed
+        )
+
+    async def _write_shadow(self, conn, leaderboard_id: int) -> None:
+        await conn.execute(
+            f"CREATE TABLE IF NOT EXISTS `{self.shadow_table}` LIKE `leaderboard_rating`"
+        )
+        await conn.execute(
+            f"DELETE FROM `{self.shadow_table}` WHERE leaderboard_id = :leaderboard_id",
+            leaderboard_id=leaderboard_id
+        )
+
+        insert_sql = (
+            f"INSERT INTO `{self.shadow_table}` (login_id, mean, deviation, "
+            "total_games, won_games, lost_games, drawn_games, streak, "
+            "best_streak, recent_scores, recent_mod, leaderboard_id) VALUES "
+            "(:login_id, :mean, :deviation, :total_games, :won_games, "
+            ":lost_games, :drawn_games, :streak, :best_streak, "
+            ":recent_scores, :recent_mod, :leaderboard_id)"
+        )
+        rows = [
+            {
+                "login_id": player_id,
+                "mean": stats.rating.mu,
+                "deviation": stats.rating.sigma,
+                "total_games": stats.total_games,
+                "won_games": stats.won_games,
+                "lost_games": stats.lost_games,
+                "drawn_games": stats.drawn_games,
+                "streak": stats.streak,
+                "best_streak": stats.best_streak,
+                "recent_scores": stats.recent_scores,
+                "recent_mod": stats.recent_mod,
+                "leaderboard_id": leaderboard_id
+            }
+            for player_id, stats in self.players.items()
+        ]
+        for i in range(0, len(rows), self.batch_size):
+            await conn.execute(insert_sql, rows[i:i + self.batch_size])
+
+
+async def main(args) -> None:
+    database = FAFDatabase(
+        host=config.DB_SERVER,
+        port=int(config.DB_PORT),
+        user=config.DB_LOGIN,
+        password=config.DB_PASSWORD,
+        db=config.DB_NAME
+    )
+    try:
+        await LeaderboardBackfill(
+            database,
+            args["LEADERBOARD"],
+            args["--shadow-table"],
+            int(args["--batch-size"])
+        ).run()
+    finally:
+        await database.close()
+
+
+if __name__ == "__main__":
+    args = docopt(__doc__)
+    config_file = args.get("--configuration-file")
+    if config_file:
+        os.environ["CONFIGURATION_FILE"] = config_file
+        config.refresh()
+
+    logging.basicConfig(
+        format="%(levelname)-8s %(asctime)s %(name)-30s %(message)s",
+        datefmt="%b %d  %H:%M:%S",
+        level=config.LOG_LEVEL
+    )
+    asyncio.run(main(args))
@@ -1,12 +1,12 @@
-from typing import Dict, List, Tuple
+from typing import Dict, List, Optional, Tuple
 import math
-import scipy.stats
 import trueskill
 from trueskill import Rating
 
 from server.games.game_results import GameOutcome
 
 from ..decorators import with_logger
+from . import rating_math
 from .typedefs import PlayerID, TeamID
 from ..games.typedefs import EndedGamePlayerSummary, OutcomeLikelihoods
 
@@ -39,13 +39,8 @@ class GameRater:
         else:
             raise GameRatingError("Sorry multiteam/ffa not implemented")
 
-        new_rating_groups: List[Dict[PlayerID, Rating]] = trueskill.rate(list(rating_groups.values()), ranks)
-        new_ratings = {
-            player_id: new_rating
-            for team in new_rating_groups
-            for player_id, new_rating in team.items()
-        }
-        cls._logger.debug("New Ratings (canonical): %s", new_rating_groups)
+        new_ratings = cls._rate_two_teams(list(rating_groups.values()), ranks)
+        cls._logger.debug("New Ratings (canonical): %s", new_ratings)
 
         def penis_points(rating: Rating):
             return rating.mu - 3. * rating.sigma
@@ -77,6 +72,20 @@ class GameRater:
         cls._logger.info("settled ratings:%s, likelihood:%s", new_ratings, team_outcome_likelihoods)
         return new_ratings, team_outcome_likelihoods
 
+    @staticmethod
+    def _rate_two_teams(rating_groups: List[Dict[PlayerID, Rating]],
+                        ranks: List[int]) -> Dict[PlayerID, Rating]:
+        """
+        Equivalent to `trueskill.rate(rating_groups, ranks)` for two teams
+        """
+        winners, losers = rating_groups if ranks != [1, 0] else reversed(rating_groups)
+        new_winners, new_losers = rating_math.rate_two_teams(
+            list(winners.values()), list(losers.values()), drawn=ranks == [0, 0])
+
+        new_ratings = dict(zip(winners.keys(), new_winners))
+        new_ratings.update(zip(losers.keys(), new_losers))
+        return new_ratings
+
     @staticmethod
     def _ranks_from_two_team_outcomes(outcomes: List[GameOutcome]) -> List[int]:
         if outcomes == [GameOutcome.DRAW, GameOutcome.DRAW]:
@@ -98,7 +107,7 @@ class GameRater:
 
     @staticmethod
     def likelihood(r1: Rating, outcome1: GameOutcome, r2: Rating, outcome2,
-                   env: trueskill.TrueSkill = trueskill.global_env()) -> float:
+                   env: Optional[trueskill.TrueSkill] = None) -> float:
         if outcome1 == outcome2:
             return GameRater.likelihood_draw_1v1(r1, r2, env)
         elif outcome1 == GameOutcome.VICTORY:
@@ -107,26 +116,29 @@ class GameRater:
             return GameRater.likelihood_lose_1v1(r1, r2, env)
 
     @staticmethod
-    def likelihood_draw_1v1(r1: Rating, r2: Rating, env: trueskill.TrueSkill = trueskill.global_env()) -> float:
+    def likelihood_draw_1v1(r1: Rating, r2: Rating, env: Optional[trueskill.TrueSkill] = None) -> float:
+        env = env or trueskill.global_env()
         eps = GameRater.draw_margin(env)
         mu = r1.mu - r2.mu
         sigma = math.sqrt(r1.sigma*r1.sigma + r2.sigma*r2.sigma + 2.0*env.beta*env.beta)
-        return scipy.stats.norm.cdf((eps-mu)/sigma) - scipy.stats.norm.cdf((-eps-mu)/sigma)
+        return rating_math.norm_cdf((eps-mu)/sigma) - rating_math.norm_cdf((-eps-mu)/sigma)
 
     @staticmethod
-    def likelihood_win_1v1(r1: Rating, r2: Rating, env: trueskill.TrueSkill = trueskill.global_env()) -> float:
+    def likelihood_win_1v1(r1: Rating, r2: Rating, env: Optional[trueskill.TrueSkill] = None) -> float:
+        env = env or trueskill.global_env()
         eps = GameRater.draw_margin(env)
         mu = r1.mu - r2.mu
         sigma = math.sqrt(r1.sigma*r1.sigma + r2.sigma*r2.sigma + 2.0*env.beta*env.beta)
-        return 1.0 - scipy.stats.norm.cdf((eps-mu)/sigma)
+        return 1.0 - rating_math.norm_cdf((eps-mu)/sigma)
 
     @staticmethod
-    def likelihood_lose_1v1(r1: Rating, r2: Rating, env: trueskill.TrueSkill = trueskill.global_env()) -> float:
+    def likelihood_lose_1v1(r1: Rating, r2: Rating, env: Optional[trueskill.TrueSkill] = None) -> float:
+        env = env or trueskill.global_env()
         eps = GameRater.draw_margin(env)
         mu = r1.mu - r2.mu
         sigma = math.sqrt(r1.sigma*r1.sigma + r2.sigma*r2.sigma + 2.0*env.beta*env.beta)
-        return scipy.stats.norm.cdf((-eps-mu)/sigma)
+        return rating_math.norm_cdf((-eps-mu)/sigma)
 
     @staticmethod
-    def draw_margin(env: trueskill.TrueSkill = trueskill.global_env()) -> float:
-        return scipy.stats.norm.ppf(0.5*(env.draw_probability+1.0)) * math.sqrt(2.0) * env.beta
+    def draw_margin(env: Optional[trueskill.TrueSkill] = None) -> float:
+        return rating_math.draw_margin(2, env)
@@ -0,0 +1,124 @@
+"""
+Closed form TrueSkill math for two team games.
+
+Only depends on `math`, so it is cheap to import and safe to run in a worker
+process. For two teams the TrueSkill factor graph needs no iteration, and the
+update reduces to the formulas from the TrueSkill paper (Herbrich et al.,
+2007) which are implemented here directly.
+"""
+
+import math
+from typing import List, Optional, Tuple
+
+import trueskill
+from trueskill import Rating
+
+SQRT2 = math.sqrt(2.0)
+INV_SQRT_2PI = 1.0 / math.sqrt(2.0 * math.pi)
+
+
+def norm_cdf(x: float) -> float:
+    return 0.5 * math.erfc(-x / SQRT2)
+
+
+def norm_pdf(x: float) -> float:
+    return INV_SQRT_2PI * math.exp(-0.5 * x * x)
+
+
+def norm_ppf(p: float) -> float:
+    """
+    Inverse of `norm_cdf`, by Newton's method.
+    """
+    if not 0.0 < p < 1.0:
+        raise ValueError(f"p must be in (0, 1), got {p}")
+
+    x = 0.0
+    for _ in range(100):
+        step = (norm_cdf(x) - p) / norm_pdf(x)
+        x -= step
+        if abs(step) < 1e-12:
+            break
+    return x
+
+
+def draw_margin(size: int, env: Optional[trueskill.TrueSkill] = None) -> float:
+    """
+    Performance difference below which a game between teams with `size`
+    players in total is considered a draw.
+    """
+    env = env or trueskill.global_env()
+    return norm_ppf(0.5 * (env.draw_probability + 1.0)) * math.sqrt(size) * env.beta
+
+
+def v_win(t: float, eps: float) -> float:
+    x = t - eps
+    denom = norm_cdf(x)
+    return norm_pdf(x) / denom if denom else -x
+
+
+def w_win(t: float, eps: float) -> float:
+    x = t - eps
+    v = v_win(t, eps)
+    w = v * (v + x)
+    if 0.0 < w < 1.0:
+        return w
+    raise FloatingPointError(f"w_win({t}, {eps}) = {w} is out of range")
+
+
+def v_draw(t: float, eps: float) -> float:
+    abs_t = abs(t)
+    a, b = eps - abs_t, -eps - abs_t
+    denom = norm_cdf(a) - norm_cdf(b)
+    v = (norm_pdf(b) - norm_pdf(a)) / denom if denom else a
+    return -v if t < 0 else v
+
+
+def w_draw(t: float, eps: float) -> float:
+    abs_t = abs(t)
+    a, b = eps - abs_t, -eps - abs_t
+    denom = norm_cdf(a) - norm_cdf(b)
+    if not denom:
+        raise FloatingPointError(f"w_draw({t}, {eps}) is out of range")
+    v = v_draw(abs_t, eps)
+    return v * v + (a * norm_pdf(a) - b * norm_pdf(b)) / denom
+
+
+def rate_two_teams(
+    team1: List[Rating],
+    team2: List[Rating],
+    drawn: bool = False,
+    env: Optional[trueskill.TrueSkill] = None
+) -> Tuple[List[Rating], List[Rating]]:
+    """
+    Rate a game between two teams where `team1` won, or both teams drew.
+    Gives the same result as `trueskill.rate([team1, team2], [0, 0 if drawn
+    else 1])`.
+    """
+    env = env or trueskill.global_env()
+    tau2 = env.tau * env.tau
+
+    # Dynamics are added to every player's variance before the game
+    variances1 = [r.sigma * r.sigma + tau2 for r in team1]
+    variances2 = [r.sigma * r.sigma + tau2 for r in team2]
+
+    size = len(team1) + len(team2)
+    c2 = sum(variances1) + sum(variances2) + size * env.beta * env.beta
+    c = math.sqrt(c2)
+    t = (sum(r.mu for r in team1) - sum(r.mu for r in team2)) / c
+    eps = draw_margin(size, env) / c
+
+    if drawn:
+        v, w = v_draw(t, eps), w_draw(t, eps)
+    else:
+        v, w = v_win(t, eps), w_win(t, eps)
+
+    def update(team, variances, sign):
+        return [
+            Rating(
+                r.mu + sign * variance / c * v,
+                math.sqrt(variance * (1.0 - variance / c2 * w))
+            )
+            for r, variance in zip(team, variances)
+        ]
+
+    return update(team1, variances1, 1.0), update(team2, variances2, -1.0)
@@ -1,6 +1,7 @@
 import asyncio
+from concurrent.futures import Executor, ProcessPoolExecutor
 from contextlib import asynccontextmanager
-from typing import Dict, Callable, Coroutine, Awaitable, List, Set
+from typing import Dict, Callable, Coroutine, Awaitable, List, Optional, Set
 
 import aiocron
 from sqlalchemy import and_, case, func, select
@@ -54,6 +55,7 @@ class RatingService(Service):
         self._task = None
         self._rating_type_ids = None
         self._game_rating_callbacks = []
+        self._executor: Optional[Executor] = None
 
     def add_game_rating_callback(self, callback: Callable[[EndedGameInfo,
                                                            Dict[PlayerID, RankedRating],        # old_ratings
@@ -69,6 +71,7 @@ class RatingService(Service):
 
         await self.update_data()
         self._update_cron = aiocron.crontab("*/10 * * * *", func=self.update_data)
+        self._executor = ProcessPoolExecutor(max_workers=config.RATING_WORKERS)
         self._accept_input = True
         self._logger.debug("RatingService starting...")
         self._task = asyncio.create_task(self._handle_rating_queue())
@@ -138,13 +141,24 @@ class RatingService(Service):
         player_id_set = set([player_info.player_id for player_info in game_info.ended_game_player_summary])
         _old_ratings: Dict[PlayerID, RankedRating] = await self._get_player_ratings(player_id_set, game_info.rating_type)
         old_ratings: Dict[PlayerID, Rating] = {pid: r.rating for pid, r in _old_ratings.items()}
-        new_ratings, team_outcome_likelihoods = GameRater.compute_rating(game_info.ended_game_player_summary, old_ratings)
+        new_ratings, team_outcome_likelihoods = await self._compute_rating(game_info, old_ratings)
 
         for f in self._game_rating_callbacks:
             await f(game_info, _old_ratings, new_ratings, team_outcome_likelihoods)
 
         await self._persist_rating_changes(game_info, old_ratings, new_ratings)
 
+    async def _compute_rating(self, game_info: EndedGameInfo, old_ratings: Dict[PlayerID, Rating]):
+        player_data = game_info.ended_game_player_summary
+        if self._executor is None or len(player_data) < config.RATING_WORKER_MIN_PLAYERS:
+            return GameRater.compute_rating(player_data, old_ratings)
+
+        # Keep the event loop free while rating large games
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self._executor, GameRater.compute_rating, player_data, old_ratings
+        )
+
     async def _get_player_ratings(self, player_ids: Set[int], rating_type: str, conn=None) -> Dict[PlayerID, RankedRating]:
         if self._rating_type_ids is None:
             self._logger.warning(
@@ -318,6 +332,9 @@ class RatingService(Service):
         await self._queue.join()
         self._task = None
         self._logger.debug("Queue emptied: %s", self._queue)
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
 
     def kill(self) -> None:
         """
@@ -327,3 +344,6 @@ class RatingService(Service):
         if self._task is not None:
             self._task.cancel()
             self._task = None
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
@@ -0,0 +1,264 @@
+"""
+Archives finished replays off the event loop
+"""
+
+import asyncio
+import os
+import time
+import zipfile
+from concurrent.futures import Executor, ProcessPoolExecutor
+from typing import BinaryIO, List, NamedTuple, Optional, Tuple
+
+from sqlalchemy import bindparam, text
+
+from . import metrics
+from .config import config
+from .core import Service
+from .db import FAFDatabase
+from .decorators import with_logger
+from .replay_store import (
+    CompressedReplay,
+    ReplayStore,
+    compress_replay,
+    get_compression
+)
+from .timing import at_interval
+
+
+class ArchivedReplay(NamedTuple):
+    file: BinaryIO
+    size: int
+    archived_at: float
+
+
+def get_archive_dir(replays_path: str, replay_id: int) -> str:
+    """
+    Replay 1234567890 is archived into `replays_path/12/34/56/78/`.
+    """
+    mm = replay_id // 100000000
+    nn = (replay_id // 1000000) % 100
+    oo = (replay_id // 10000) % 100
+    pp = (replay_id // 100) % 100
+    return f"{replays_path}/{mm}/{nn}/{oo}/{pp}"
+
+
+def scan_replays(replays_path: str) -> List[Tuple[int, str]]:
+    """
+    Return `(game_id, path)` for every unarchived replay in `replays_path`.
+    """
+    replays = []
+    try:
+        entries = os.scandir(replays_path)
+    except FileNotFoundError:
+        return replays
+
+    with entries:
+        for entry in entries:
+            name, ext = os.path.splitext(entry.name)
+            if ext != ".tad" or not entry.is_file():
+                continue
+            try:
+                replays.append((int(name), entry.path))
+            except ValueError:
+                continue
+    return replays
+
+
+def archive_replay(file_path: str, archive_dir: str, game_id: int) -> int:
+    """
+    Compress a replay into `archive_dir/<game_id>.zip` and remove the
+    original. Runs in a worker process.
+
+    The archive is written to a temporary file first so that a half written
+    zip is never visible under its final name.
+    """
+    os.makedirs(archive_dir, exist_ok=True)
+    archive_path = os.path.join(archive_dir, f"{game_id}.zip")
+    tmp_path = f"{archive_path}.tmp"
+
+    with zipfile.ZipFile(tmp_path, "w", zipfile.ZIP_DEFLATED) as archive:
+        archive.write(file_path, arcname=f"{game_id}.tad")
+    os.replace(tmp_path, archive_path)
+    os.remove(file_path)
+
+    return game_id
+
+
+def store_replay(
+    store: ReplayStore,
+    game_id: int,
+    replay: CompressedReplay,
+    file_path: str
+) -> int:
+    store.add(game_id, replay)
+    os.remove(file_path)
+    return game_id
+
+
+def open_zip_archive(replays_path: str, game_id: int) -> Optional[ArchivedReplay]:
+    archive_dir = get_archive_dir(replays_path, game_id)
+    archive_path = os.path.join(archive_dir, f"{game_id}.zip")
+    try:
+        archive = zipfile.ZipFile(archive_path)
+    except FileNotFoundError:
+        return None
+
+    # The member stays readable after the archive itself is closed
+    with archive:
+        info = archive.getinfo(f"{game_id}.tad")
+        return ArchivedReplay(
+            archive.open(info),
+            info.file_size,
+            os.path.getctime(archive_path)
+        )
+
+
+@with_logger
+class ReplayArchiveService(Service):
+    """
+        Moves `REPLAY_DIR/<game_id>.tad` files written by the replay server
+    into zip archives under `REPLAY_DIR/mm/nn/oo/pp/` and marks them as
+    available. If `REPLAY_STORE_ENABLED` is set, replays are added to a
+    `ReplayStore` instead.
+
+        Scanning the directory happens in a thread and compression in a
+    process pool, so a burst of finished games does not block the event loop.
+    At most `REPLAY_ARCHIVE_CONCURRENCY` replays are compressed at once and
+    every cycle marks all archived replays with a single UPDATE.
+    """
+
+    def __init__(self, database: FAFDatabase):
+        self._db = database
+        self._executor: Optional[Executor] = None
+        self._timer = None
+        self._lock = asyncio.Lock()
+        self._store: Optional[ReplayStore] = None
+        self._compression = None
+
+    async def initialize(self) -> None:
+        if config.REPLAY_STORE_ENABLED:
+            self._store = ReplayStore(
+                config.REPLAY_STORE_DIR,
+                config.REPLAY_STORE_PACK_SIZE
+            )
+            self._compression = get_compression(config.REPLAY_STORE_COMPRESSION)
+            if self._compression != config.REPLAY_STORE_COMPRESSION:
+                self._logger.warning(
+                    "Compression %s is not available, using %s",
+                    config.REPLAY_STORE_COMPRESSION, self._compression
+                )
+        self._executor = ProcessPoolExecutor(
+            max_workers=config.REPLAY_ARCHIVE_WORKERS
+        )
+        self._timer = at_interval(
+            config.REPLAY_ARCHIVE_POLL_INTERVAL,
+            func=self.archive_new_replays
+        )
+
+    async def archive_new_replays(self) -> None:
+        # Skip this cycle if the previous one is still busy
+        if self._lock.locked():
+            return
+
+        async with self._lock:
+            await self._archive_new_replays()
+
+    async def _archive_new_replays(self) -> None:
+        loop = asyncio.get_running_loop()
+        replays_path = config.REPLAY_DIR
+        replays = await loop.run_in_executor(None, scan_replays, replays_path)
+        if not replays:
+            return
+
+        metrics.replay_archive_queue_depth.set(len(replays))
+        semaphore = asyncio.Semaphore(config.REPLAY_ARCHIVE_CONCURRENCY)
+
+        async def archive(game_id: int, file_path: str) -> Optional[int]:
+            async with semaphore:
+                archive_dir = get_archive_dir(replays_path, game_id)
+                self._logger.info(
+                    "Archiving replay %s to %s", file_path, archive_dir
+                )
+                start = time.perf_counter()
+                try:
+                    return await self._archive_replay(
+                        game_id, file_path, archive_dir
+                    )
+                except Exception:
+                    metrics.replays_archived.labels("error").inc()
+                    self._logger.exception(
+                        "Failed to archive replay %s", file_path
+                    )
+                    return None
+                finally:
+                    metrics.replay_archive_duration.observe(
+                        time.perf_counter() - start
+                    )
+                    metrics.replay_archive_queue_depth.dec()
+
+        results = await asyncio.gather(*(
+            archive(game_id, file_path) for game_id, file_path in replays
+        ))
+        archived = [game_id for game_id in results if game_id is not None]
+        if not archived:
+            return
+
+        async with self._db.acquire() as conn:
+            await conn.execute(
+                text(
+                    "UPDATE `game_stats` SET `game_stats`.`replay_available` = 1 "
+                    "WHERE `game_stats`.`id` IN :game_ids"
+                ).bindparams(bindparam("game_ids", expanding=True)),
+                game_ids=archived
+            )
+        metrics.replays_archived.labels("success").inc(len(archived))
+
+    async def _archive_replay(
+        self,
+        game_id: int,
+        file_path: str,
+        archive_dir: str
+    ) -> int:
+        loop = asyncio.get_running_loop()
+        if self._store is None:
+            return await loop.run_in_executor(
+                self._executor,
+                archive_replay, file_path, archive_dir, game_id
+            )
+
+        compressed = await loop.run_in_executor(
+            self._executor,
+            compress_replay, file_path, self._compression,
+            config.REPLAY_STORE_COMPRESSION_LEVEL
+        )
+        return await loop.run_in_executor(
+            None, store_replay, self._store, game_id, compressed, file_path
+        )
+
+    async def open_replay(self, game_id: int) -> Optional[ArchivedReplay]:
+        """
+        Open an archived replay for reading without extracting it to disk.
+        The caller is responsible for closing the returned file.
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, self._open_replay, game_id)
+
+    def _open_replay(self, game_id: int) -> Optional[ArchivedReplay]:
+        if self._store is not None:
+            entry = self._store.get(game_id)
+            if entry is not None:
+                return ArchivedReplay(
+                    self._store.open(entry),
+                    entry.size,
+                    entry.archived_at
+                )
+
+        return open_zip_archive(config.REPLAY_DIR, game_id)
+
+    async def shutdown(self) -> None:
+        if self._timer is not None:
+            self._timer.stop()
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+        if self._store is not None:
+            self._store.close()
@@ -0,0 +1,269 @@
+"""
+Content addressed storage for archived replays
+"""
+
+import hashlib
+import io
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from typing import BinaryIO, NamedTuple, Optional, Tuple
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover
+    zstandard = None
+
+COMPRESSION_ZLIB = "zlib"
+COMPRESSION_ZSTD = "zstd"
+
+CHUNK_SIZE = 1 << 16
+
+INDEX_SCHEMA = """
+CREATE TABLE IF NOT EXISTS blob (
+    digest TEXT PRIMARY KEY,
+    pack INTEGER NOT NULL,
+    offset INTEGER NOT NULL,
+    length INTEGER NOT NULL,
+    size INTEGER NOT NULL,
+    compression TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS replay (
+    game_id INTEGER PRIMARY KEY,
+    digest TEXT NOT NULL REFERENCES blob (digest),
+    archived_at REAL NOT NULL
+);
+"""
+
+
+class CompressedReplay(NamedTuple):
+    digest: str
+    size: int
+    compression: str
+    data: bytes
+
+
+class ReplayEntry(NamedTuple):
+    game_id: int
+    digest: str
+    pack: int
+    offset: int
+    length: int
+    size: int
+    compression: str
+    archived_at: float
+
+
+def get_compression(preferred: str) -> str:
+    """
+    Return `preferred` if it is supported, falling back to zlib if the
+    `zstandard` package is not installed.
+    """
+    if preferred == COMPRESSION_ZSTD and zstandard is not None:
+        return COMPRESSION_ZSTD
+    return COMPRESSION_ZLIB
+
+
+def compress_replay(
+    file_path: str,
+    compression: str,
+    level: Optional[int] = None
+) -> CompressedReplay:
+    """
+    Hash and compress a replay file. Meant to run in a worker process.
+    """
+    if compression == COMPRESSION_ZSTD:
+        compressor = zstandard.ZstdCompressor(level=level or 3).compressobj()
+    elif compression == COMPRESSION_ZLIB:
+        compressor = zlib.compressobj(level if level is not None else 6)
+    else:
+        raise ValueError(f"Unknown compression {compression!r}")
+
+    digest = hashlib.sha256()
+    size = 0
+    out = io.BytesIO()
+    with open(file_path, "rb") as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+            digest.update(chunk)
+            size += len(chunk)
+            out.write(compressor.compress(chunk))
+    out.write(compressor.flush())
+
+    return CompressedReplay(digest.hexdigest(), size, compression, out.getvalue())
+
+
+class ReplayStore(object):
+    """
+        Stores replays compressed in append-only pack files, deduplicated by
+    the SHA-256 of their contents. An SQLite index maps each game id to the
+    pack, offset and length of its blob, so a replay can be streamed straight
+    out of the pack without extracting anything to disk.
+
+        All methods do blocking IO and should be called from a thread.
+    Compression is done up front by `compress_replay` so that it can happen
+    in a process pool, while appending to the packs is serialized here.
+    """
+
+    def __init__(self, path: str, max_pack_size: int = 1 << 30):
+        self.path = path
+        self.max_pack_size = max_pack_size
+        os.makedirs(path, exist_ok=True)
+        self._lock = threading.Lock()
+        self._index = sqlite3.connect(
+            os.path.join(path, "index.sqlite"),
+            check_same_thread=False
+        )
+        with self._lock:
+            self._index.executescript(INDEX_SCHEMA)
+            self._pack = self._index.execute(
+                "SELECT COALESCE(MAX(pack), 0) FROM blob"
+            ).fetchone()[0]
+
+    def pack_path(self, pack: int) -> str:
+        return os.path.join(self.path, f"pack-{pack:06d}.dat")
+
+    def add(self, game_id: int, replay: CompressedReplay) -> ReplayEntry:
+        """
+        Add a compressed replay to the store. If a replay with the same
+        contents is already stored, only the index is updated.
+        """
+        with self._lock, self._index:
+            stored = self._index.execute(
+                "SELECT 1 FROM blob WHERE digest = ?", (replay.digest,)
+            ).fetchone()
+            if stored is None:
+                pack, offset = self._append(replay.data)
+                self._index.execute(
+                    "INSERT INTO blob VALUES (?, ?, ?, ?, ?, ?)",
+                    (
+                        replay.digest, pack, offset, len(replay.data),
+                        replay.size, replay.compression
+                    )
+                )
+            self._index.execute(
+                "INSERT OR REPLACE INTO replay VALUES (?, ?, ?)",
+                (game_id, replay.digest, time.time())
+            )
+
+        return self.get(game_id)
+
+    def _append(self, data: bytes) -> Tuple[int, int]:
+        path = self.pack_path(self._pack)
+        try:
+            pack_size = os.path.getsize(path)
+        except FileNotFoundError:
+            pack_size = 0
+
+        if pack_size > 0 and pack_size + len(data) > self.max_pack_size:
+            self._pack += 1
+            path = self.pack_path(self._pack)
+
+        with open(path, "ab") as f:
+            offset = f.tell()
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+
+        return self._pack, offset
+
+    def get(self, game_id: int) -> Optional[ReplayEntry]:
+        with self._lock:
+            row = self._index.execute(
+                "SELECT replay.game_id, blob.digest, pack, offset, length, "
+                "size, compression, archived_at "
+                "FROM replay JOIN blob ON blob.digest = replay.digest "
+                "WHERE game_id = ?",
+                (game_id,)
+            ).fetchone()
+
+        if row is None:
+            return None
+        return ReplayEntry(*row)
+
+    def __contains__(self, game_id: int) -> bool:
+        return self.get(game_id) is not None
+
+    def open(self, entry: ReplayEntry) -> BinaryIO:
+        """
+        Return a file object yielding the decompressed replay.
+        """
+        raw = _RangeReader(self.pack_path(entry.pack), entry.offset, entry.length)
+        if entry.compression == COMPRESSION_ZSTD:
+            reader = _ZstdReader(raw)
+        else:
+            reader = _ZlibReader(raw)
+        return io.BufferedReader(reader, CHUNK_SIZE)
+
+    def close(self) -> None:
+        with self._lock:
+            self._index.close()
+
+
+class _RangeReader(io.RawIOBase):
+    """
+    Reads `length` bytes starting at `offset` of a file.
+    """
+
+    def __init__(self, path: str, offset: int, length: int):
+        self._file = open(path, "rb")
+        self._file.seek(offset)
+        self._remaining = length
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        size = min(len(buffer), self._remaining)
+        if size <= 0:
+            return 0
+        data = self._file.read(size)
+        buffer[:len(data)] = data
+        self._remaining -= len(data)
+        return len(data)
+
+    def close(self) -> None:
+        self._file.close()
+        super().close()
+
+
+class _ZstdReader(io.RawIOBase):
+    def __init__(self, raw: io.RawIOBase):
+        self._reader = zstandard.ZstdDecompressor().stream_reader(raw)
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        return self._reader.readinto(buffer)
+
+    def close(self) -> None:
+        self._reader.close()
+        super().close()
+
+
+class _ZlibReader(io.RawIOBase):
+    def __init__(self, raw: io.RawIOBase):
+        self._raw = raw
+        self._decompressor = zlib.decompressobj()
+        self._buffer = b""
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        while not self._buffer and not self._decompressor.eof:
+            data = self._decompressor.unconsumed_tail or self._raw.read(CHUNK_SIZE)
+            if not data:
+                break
+            self._buffer = self._decompressor.decompress(data, CHUNK_SIZE)
+
+        size = min(len(buffer), len(self._buffer))
+        buffer[:size] = self._buffer[:size]
+        self._buffer = self._buffer[size:]
+        return size
+
+    def close(self) -> None:
+        self._raw.close()
+        super().close()
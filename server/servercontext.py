@@ -4,12 +4,17 @@ from typing import Callable, Dict, Iterable, Type
 
 import server.metrics as metrics
 
+from .command_metrics import count_sent, measure_command
 from .core import Service
 from .decorators import with_logger
 from .lobbyconnection import LobbyConnection
 from .protocol import Protocol, QDataStreamProtocol
+from .protocol.transport import MessageTransport
 from .types import Address
 
+TRANSPORT_STREAMS = "streams"
+TRANSPORT_PROTOCOL = "protocol"
+
 
 @with_logger
 class ServerContext:
@@ -23,6 +28,7 @@ class ServerContext:
         connection_factory: Callable[[], LobbyConnection],
         services: Iterable[Service],
         protocol_class: Type[Protocol] = QDataStreamProtocol,
+        transport: str = TRANSPORT_STREAMS,
     ):
         super().__init__()
         self.name = name
@@ -31,6 +37,9 @@ class ServerContext:
         self._services = services
         self.connections: Dict[LobbyConnection, Protocol] = {}
         self.protocol_class = protocol_class
+        if transport not in (TRANSPORT_STREAMS, TRANSPORT_PROTOCOL):
+            raise ValueError(f"Unknown transport: {transport}")
+        self.transport = transport
 
     def __repr__(self):
         return "ServerContext({})".format(self.name)
@@ -38,11 +47,21 @@ class ServerContext:
     async def listen(self, host, port):
         self._logger.debug("%s: listen(%s, %s)", self.name, host, port)
 
-        self._server = await asyncio.start_server(
-            self.client_connected,
-            host=host,
-            port=port
-        )
+        if self.transport == TRANSPORT_PROTOCOL:
+            loop = asyncio.get_running_loop()
+            self._server = await loop.create_server(
+                lambda: MessageTransport(
+                    self.protocol_class.decode_frame, self.client_connected
+                ),
+                host=host,
+                port=port
+            )
+        else:
+            self._server = await asyncio.start_server(
+                self.client_connected,
+                host=host,
+                port=port
+            )
 
         for sock in self.sockets:
             sock.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
@@ -64,20 +83,28 @@ class ServerContext:
         return connection in self.connections.keys()
 
     def write_broadcast(self, message, validate_fn=lambda _: True):
-        self.write_broadcast_raw(
-            self.protocol_class.encode_message(message),
-            validate_fn
+        data = self.protocol_class.encode_message(message)
+        recipients = self.write_broadcast_raw(data, validate_fn)
+        count_sent(
+            self.protocol_class.__name__, message.get("command"), len(data),
+            recipients
         )
 
-    def write_broadcast_raw(self, data, validate_fn=lambda _: True):
+    def write_broadcast_raw(self, data, validate_fn=lambda _: True) -> int:
+        """
+        :return: the number of connections the data was written to
+        """
+        recipients = 0
         for conn, proto in self.connections.items():
             try:
                 if proto.is_connected() and validate_fn(conn):
                     proto.write_raw(data)
+                    recipients += 1
             except Exception:
                 self._logger.exception(
                     "Encountered error in broadcast: %s", conn
                 )
+        return recipients
 
     async def client_connected(self, stream_reader, stream_writer):
         addr = Address(*stream_writer.get_extra_info("peername"))
@@ -91,8 +118,10 @@ class ServerContext:
             metrics.user_connections.labels("None", "None").inc()
             while protocol.is_connected():
                 message = await protocol.read_message()
+                target, command = connection.command_label(message)
                 with metrics.connection_on_message_received.time():
-                    await connection.on_message_received(message)
+                    with measure_command(target, command, protocol.received_bytes):
+                        await connection.on_message_received(message)
         except (ConnectionError, TimeoutError, asyncio.CancelledError):
             pass
         except asyncio.IncompleteReadError as ex:
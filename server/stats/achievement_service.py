@@ -1,7 +1,11 @@
+from typing import List, Optional
+
 from server.api.api_accessor import ApiAccessor
 from server.core import Service
 from server.decorators import with_logger
 
+from .update_batcher import ResultsByPlayer, UpdateBatcher, UpdatesByPlayer
+
 ACH_NOVICE = "c6e6039f-c543-424e-ab5f-b34df1336e81"
 ACH_JUNIOR = "d5c759fe-a1a8-4103-888d-3ba319562867"
 ACH_SENIOR = "6a37e2fc-1609-465e-9eca-91eeda4e63c4"
@@ -65,10 +69,15 @@ ACH_DONT_MESS_WITH_ME = "2103e0de-1c87-4fba-bc1b-0bba66669607"
 class AchievementService(Service):
     def __init__(self, api_accessor: ApiAccessor):
         self.api_accessor = api_accessor
+        self._batcher = UpdateBatcher(self._send_batch, key="achievement_id")
+
+    async def shutdown(self):
+        await self._batcher.shutdown()
 
     async def execute_batch_update(self, player_id, queue):
         """
-        Sends a batch of achievement updates.
+        Sends a batch of achievement updates. Updates of all players that
+        arrive within `API_UPDATE_BATCH_WINDOW` are sent to the API together.
 
         :param player_id: the player to update the achievements for
         :param queue: an array of achievement updates in the form::
@@ -95,18 +104,26 @@ class AchievementService(Service):
         Else, it returns None
         """
         self._logger.info("Updating %d achievements for player %d", len(queue), player_id)
+        return await self._batcher.submit(player_id, queue)
+
+    async def _send_batch(self, queues: UpdatesByPlayer) -> Optional[ResultsByPlayer]:
+        updates = _merge_updates(queues)
+        player_ids = [update["player_id"] for update in updates]
+        self._logger.info(
+            "Sending %d achievement updates for %d players", len(updates), len(queues)
+        )
         try:
-            response, content = await self.api_accessor.update_achievements(queue, player_id)
+            response, content = await self.api_accessor.update_achievements(updates)
         except ConnectionError:
             self._logger.error("Failed to update achievements: connection error")
             return None
         if response < 300:
             """
-            Converting the Java API data to the structure mentioned above
+            Converting the Java API data to the structure mentioned above.
+            The API answers every update in the order they were sent.
             """
-            api_data = content["data"]
-            achievements_data = []
-            for achievement in api_data:
+            achievements_data = {player_id: [] for player_id in queues}
+            for player_id, achievement in zip(player_ids, content["data"]):
                 converted_achievement = {
                     "achievement_id": achievement["attributes"]["achievementId"],
                     "current_state": achievement["attributes"]["state"],
@@ -115,7 +132,7 @@ class AchievementService(Service):
                 if "steps" in achievement["attributes"]:
                     converted_achievement["current_steps"] = achievement["attributes"]["steps"]
 
-                achievements_data.append(converted_achievement)
+                achievements_data[player_id].append(converted_achievement)
 
             return achievements_data
         return None
@@ -177,3 +194,23 @@ class AchievementService(Service):
             "update_type": "SET_STEPS_AT_LEAST",
             "steps": steps
         })
+
+
+def _merge_updates(queues: UpdatesByPlayer) -> List[dict]:
+    """
+    Combines the updates of the same achievement for the same player, keeping
+    the order in which they were first queued.
+    """
+    merged = {}
+    for player_id, queue in queues.items():
+        for update in queue:
+            key = (player_id, update["achievement_id"], update["update_type"])
+            existing = merged.get(key)
+            if existing is None:
+                merged[key] = dict(update, player_id=player_id)
+            elif update["update_type"] == "INCREMENT":
+                existing["steps"] += update["steps"]
+            elif update["update_type"] == "SET_STEPS_AT_LEAST":
+                existing["steps"] = max(existing["steps"], update["steps"])
+
+    return list(merged.values())
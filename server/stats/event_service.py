@@ -1,7 +1,11 @@
+from typing import List, Optional
+
 from server.api.api_accessor import ApiAccessor
 from server.core import Service
 from server.decorators import with_logger
 
+from .update_batcher import ResultsByPlayer, UpdateBatcher, UpdatesByPlayer
+
 EVENT_CUSTOM_GAMES_PLAYED = "cfa449a6-655b-48d5-9a27-6044804fe35c"
 EVENT_RANKED_1V1_GAMES_PLAYED = "4a929def-e347-45b4-b26d-4325a3115859"
 EVENT_LOST_ACUS = "d6a699b7-99bc-4a7f-b128-15e1e289a7b3"
@@ -34,10 +38,15 @@ EVENT_CORE_WINS = "7be6fdc5-7867-4467-98ce-f7244a66625a"
 class EventService(Service):
     def __init__(self, api_accessor: ApiAccessor):
         self.api_accessor = api_accessor
+        self._batcher = UpdateBatcher(self._send_batch, key="event_id")
+
+    async def shutdown(self):
+        await self._batcher.shutdown()
 
     async def execute_batch_update(self, player_id, queue):
         """
-        Sends a batch of event updates.
+        Sends a batch of event updates. Updates of all players that arrive
+        within `API_UPDATE_BATCH_WINDOW` are sent to the API together.
 
         :param player_id: the player to update the events for
         :param queue: an array of event updates in the form::
@@ -57,18 +66,27 @@ class EventService(Service):
         Else, returns None
         """
         self._logger.info("Recording %d events for player %d", len(queue), player_id)
+        return await self._batcher.submit(player_id, queue)
+
+    async def _send_batch(self, queues: UpdatesByPlayer) -> Optional[ResultsByPlayer]:
+        updates = _merge_updates(queues)
+        player_ids = [update["player_id"] for update in updates]
+        self._logger.info(
+            "Sending %d event updates for %d players", len(updates), len(queues)
+        )
         try:
-            response, content = await self.api_accessor.update_events(queue, player_id)
+            response, content = await self.api_accessor.update_events(updates)
         except ConnectionError:
             self._logger.error("Failed to update events: connection error")
             return None
         if response < 300:
             """
-            Converting the Java API data to the structure mentioned above
+            Converting the Java API data to the structure mentioned above.
+            The API answers every update in the order they were sent.
             """
-            events_data = []
-            for event in content["data"]:
-                events_data.append({
+            events_data = {player_id: [] for player_id in queues}
+            for player_id, event in zip(player_ids, content["data"]):
+                events_data[player_id].append({
                     "event_id": event["attributes"]["eventId"],
                     "count": event["attributes"]["currentCount"]
                 })
@@ -89,3 +107,21 @@ class EventService(Service):
             return
 
         queue.append({"event_id": event_id, "count": count})
+
+
+def _merge_updates(queues: UpdatesByPlayer) -> List[dict]:
+    """
+    Adds up the counts of the same event for the same player, keeping the
+    order in which they were first queued.
+    """
+    merged = {}
+    for player_id, queue in queues.items():
+        for update in queue:
+            key = (player_id, update["event_id"])
+            existing = merged.get(key)
+            if existing is None:
+                merged[key] = dict(update, player_id=player_id)
+            else:
+                existing["count"] += update["count"]
+
+    return list(merged.values())
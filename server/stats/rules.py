@@ -0,0 +1,288 @@
+"""
+Declarative rules mapping army stats to achievement and event updates.
+
+Counters are sums of a field of the blueprint stats of some units, or a field
+of a unit category from the army's unit stats. Rules turn counters and facts
+about the game into updates. Both tables are compiled once at import, so the
+stats of an army are read in a single pass however many rules there are.
+
+Supporting new units only needs new entries in `UNIT_COUNTERS` and `RULES`.
+"""
+
+from collections import defaultdict
+from typing import Callable, Dict, Iterable, List, NamedTuple, Tuple, Union
+
+from server.factions import Faction
+from server.stats.achievement_service import *
+from server.stats.event_service import *
+from server.stats.unit import *
+
+INCREMENT = "increment"
+UNLOCK = "unlock"
+SET_STEPS_AT_LEAST = "set_steps_at_least"
+RECORD_EVENT = "record_event"
+
+
+class ArmyContext(NamedTuple):
+    counters: Dict[str, float]
+    faction: int
+    survived: bool
+    ranked: bool
+    scored_highest: bool
+    humans: int
+
+
+Condition = Callable[[ArmyContext], bool]
+
+
+class Rule(NamedTuple):
+    action: str
+    target: str
+    # A constant, or the name of the counter to use
+    amount: Union[int, str] = 1
+    when: Tuple[Condition, ...] = ()
+
+
+class Update(NamedTuple):
+    action: str
+    target: str
+    amount: float
+
+
+# Conditions
+
+def survived(ctx: ArmyContext) -> bool:
+    return ctx.survived
+
+
+def ranked(ctx: ArmyContext) -> bool:
+    return ctx.ranked
+
+
+def scored_highest(ctx: ArmyContext) -> bool:
+    return ctx.scored_highest
+
+
+def humans_at_least(value: int) -> Condition:
+    return lambda ctx: ctx.humans >= value
+
+
+def faction_is(faction: Faction) -> Condition:
+    return lambda ctx: ctx.faction == faction
+
+
+def above(counter: str, value: float) -> Condition:
+    return lambda ctx: ctx.counters[counter] > value
+
+
+def at_least(counter: str, value: float) -> Condition:
+    return lambda ctx: ctx.counters[counter] >= value
+
+
+def between(counter: str, low: float, high: float) -> Condition:
+    """ exclusive of both bounds """
+    return lambda ctx: low < ctx.counters[counter] < high
+
+
+def most(counter: str, *others: str) -> Condition:
+    return lambda ctx: all(ctx.counters[counter] > ctx.counters[o] for o in others)
+
+
+# Counter name -> (category, field) of the army's unit stats
+CATEGORY_COUNTERS: Dict[str, Tuple[str, str]] = {
+    "built_air": ("air", "built"),
+    "lost_air": ("air", "lost"),
+    "built_land": ("land", "built"),
+    "lost_land": ("land", "lost"),
+    "built_naval": ("naval", "built"),
+    "lost_naval": ("naval", "lost"),
+    "lost_acus": ("cdr", "lost"),
+    "killed_acus": ("cdr", "kills"),
+    "built_tech1": ("tech1", "built"),
+    "lost_tech1": ("tech1", "lost"),
+    "built_tech2": ("tech2", "built"),
+    "lost_tech2": ("tech2", "lost"),
+    "built_tech3": ("tech3", "built"),
+    "lost_tech3": ("tech3", "lost"),
+    "built_experimentals": ("experimental", "built"),
+    "lost_experimentals": ("experimental", "lost"),
+    "built_engineers": ("engineer", "built"),
+    "lost_engineers": ("engineer", "lost"),
+    "built_transports": ("transportation", "built"),
+    "built_sacus": ("sacu", "built"),
+}
+
+# Counter name -> (field, units) summed over the army's blueprint stats
+UNIT_COUNTERS: Dict[str, Tuple[str, Iterable[Unit]]] = {
+    "built_mercies": ("built", [Unit.MERCY]),
+    "built_fire_beetles": ("built", [Unit.FIRE_BEETLE]),
+    "built_salvations": ("built", [Unit.SALVATION]),
+    "built_yolona_oss": ("built", [Unit.YOLONA_OSS]),
+    "built_paragons": ("built", [Unit.PARAGON]),
+    "built_atlantis": ("built", [Unit.ATLANTIS]),
+    "built_tempests": ("built", [Unit.TEMPEST]),
+    "built_scathis": ("built", [Unit.SCATHIS]),
+    "built_mavors": ("built", [Unit.MAVOR]),
+    "built_czars": ("built", [Unit.CZAR]),
+    "built_ahwassas": ("built", [Unit.AHWASSA]),
+    "built_ythothas": ("built", [Unit.YTHOTHA]),
+    "built_fatboys": ("built", [Unit.FATBOY]),
+    "built_monkeylords": ("built", [Unit.MONKEYLORD]),
+    "built_galactic_colossus": ("built", [Unit.GALACTIC_COLOSSUS]),
+    "built_soul_rippers": ("built", [Unit.SOUL_RIPPER]),
+    "built_megaliths": ("built", [Unit.MEGALITH]),
+    "built_asfs": ("built", ASFS),
+    "acu_lowest_health": ("lowest_health", ACUS),
+}
+
+# Rules by group, evaluated in this order
+RULES: Dict[str, List[Rule]] = {
+    "played": [
+        Rule(UNLOCK, ACH_FIRST_SUCCESS, when=(survived, ranked)),
+        Rule(INCREMENT, ACH_NOVICE),
+        Rule(INCREMENT, ACH_JUNIOR),
+        Rule(INCREMENT, ACH_SENIOR),
+        Rule(INCREMENT, ACH_VETERAN),
+        Rule(INCREMENT, ACH_ADDICT),
+    ],
+    "faction": [
+        Rule(RECORD_EVENT, EVENT_GOK_PLAYS, when=(faction_is(Faction.gok),)),
+        Rule(RECORD_EVENT, EVENT_GOK_WINS, when=(faction_is(Faction.gok), survived)),
+        Rule(INCREMENT, ACH_AURORA, when=(faction_is(Faction.gok), survived)),
+        Rule(INCREMENT, ACH_BLAZE, when=(faction_is(Faction.gok), survived)),
+        Rule(INCREMENT, ACH_SERENITY, when=(faction_is(Faction.gok), survived)),
+        Rule(RECORD_EVENT, EVENT_ARM_PLAYS, when=(faction_is(Faction.arm),)),
+        Rule(RECORD_EVENT, EVENT_ARM_WINS, when=(faction_is(Faction.arm), survived)),
+        Rule(INCREMENT, ACH_MANTIS, when=(faction_is(Faction.arm), survived)),
+        Rule(INCREMENT, ACH_WAGNER, when=(faction_is(Faction.arm), survived)),
+        Rule(INCREMENT, ACH_TREBUCHET, when=(faction_is(Faction.arm), survived)),
+        Rule(RECORD_EVENT, EVENT_CORE_PLAYS, when=(faction_is(Faction.core),)),
+        Rule(RECORD_EVENT, EVENT_CORE_WINS, when=(faction_is(Faction.core), survived)),
+        Rule(INCREMENT, ACH_MA12_STRIKER, when=(faction_is(Faction.core), survived)),
+        Rule(INCREMENT, ACH_RIPTIDE, when=(faction_is(Faction.core), survived)),
+        Rule(INCREMENT, ACH_DEMOLISHER, when=(faction_is(Faction.core), survived)),
+    ],
+    "category": [
+        Rule(RECORD_EVENT, EVENT_BUILT_AIR_UNITS, "built_air"),
+        Rule(RECORD_EVENT, EVENT_LOST_AIR_UNITS, "lost_air"),
+        Rule(RECORD_EVENT, EVENT_BUILT_LAND_UNITS, "built_land"),
+        Rule(RECORD_EVENT, EVENT_LOST_LAND_UNITS, "lost_land"),
+        Rule(RECORD_EVENT, EVENT_BUILT_NAVAL_UNITS, "built_naval"),
+        Rule(RECORD_EVENT, EVENT_LOST_NAVAL_UNITS, "lost_naval"),
+        Rule(RECORD_EVENT, EVENT_LOST_ACUS, "lost_acus"),
+        Rule(RECORD_EVENT, EVENT_BUILT_TECH_1_UNITS, "built_tech1"),
+        Rule(RECORD_EVENT, EVENT_LOST_TECH_1_UNITS, "lost_tech1"),
+        Rule(RECORD_EVENT, EVENT_BUILT_TECH_2_UNITS, "built_tech2"),
+        Rule(RECORD_EVENT, EVENT_LOST_TECH_2_UNITS, "lost_tech2"),
+        Rule(RECORD_EVENT, EVENT_BUILT_TECH_3_UNITS, "built_tech3"),
+        Rule(RECORD_EVENT, EVENT_LOST_TECH_3_UNITS, "lost_tech3"),
+        Rule(RECORD_EVENT, EVENT_BUILT_EXPERIMENTALS, "built_experimentals"),
+        Rule(RECORD_EVENT, EVENT_LOST_EXPERIMENTALS, "lost_experimentals"),
+        Rule(RECORD_EVENT, EVENT_BUILT_ENGINEERS, "built_engineers"),
+        Rule(RECORD_EVENT, EVENT_LOST_ENGINEERS, "lost_engineers"),
+        Rule(INCREMENT, ACH_WRIGHT_BROTHER, when=(survived, most("built_air", "built_land", "built_naval"))),
+        Rule(INCREMENT, ACH_WINGMAN, when=(survived, most("built_air", "built_land", "built_naval"))),
+        Rule(INCREMENT, ACH_KING_OF_THE_SKIES, when=(survived, most("built_air", "built_land", "built_naval"))),
+        Rule(INCREMENT, ACH_MILITIAMAN, when=(survived, most("built_land", "built_air", "built_naval"))),
+        Rule(INCREMENT, ACH_GRENADIER, when=(survived, most("built_land", "built_air", "built_naval"))),
+        Rule(INCREMENT, ACH_FIELD_MARSHAL, when=(survived, most("built_land", "built_air", "built_naval"))),
+        Rule(INCREMENT, ACH_LANDLUBBER, when=(survived, most("built_naval", "built_land", "built_air"))),
+        Rule(INCREMENT, ACH_SEAMAN, when=(survived, most("built_naval", "built_land", "built_air"))),
+        Rule(INCREMENT, ACH_ADMIRAL_OF_THE_FLEET, when=(survived, most("built_naval", "built_land", "built_air"))),
+        Rule(INCREMENT, ACH_DR_EVIL, "built_experimentals", when=(survived, above("built_experimentals", 0))),
+        Rule(INCREMENT, ACH_TECHIE, when=(survived, at_least("built_experimentals", 3))),
+        Rule(INCREMENT, ACH_I_LOVE_BIG_TOYS, when=(survived, at_least("built_experimentals", 3))),
+        Rule(INCREMENT, ACH_EXPERIMENTALIST, when=(survived, at_least("built_experimentals", 3))),
+    ],
+    "killed_acus": [
+        Rule(INCREMENT, ACH_DONT_MESS_WITH_ME, "killed_acus", when=(above("killed_acus", 0),)),
+        Rule(UNLOCK, ACH_HATTRICK, when=(survived, at_least("killed_acus", 3))),
+    ],
+    "units": [
+        Rule(INCREMENT, ACH_NO_MERCY, "built_mercies"),
+        Rule(INCREMENT, ACH_DEADLY_BUGS, "built_fire_beetles"),
+        Rule(UNLOCK, ACH_RAINMAKER, when=(survived, above("built_salvations", 0))),
+        Rule(UNLOCK, ACH_NUCLEAR_WAR, when=(survived, above("built_yolona_oss", 0))),
+        Rule(UNLOCK, ACH_SO_MUCH_RESOURCES, when=(survived, above("built_paragons", 0))),
+        Rule(INCREMENT, ACH_IT_AINT_A_CITY, "built_atlantis"),
+        Rule(INCREMENT, ACH_STORMY_SEA, "built_tempests"),
+        Rule(UNLOCK, ACH_MAKE_IT_HAIL, when=(survived, above("built_scathis", 0))),
+        Rule(UNLOCK, ACH_I_HAVE_A_CANON, when=(survived, above("built_mavors", 0))),
+        Rule(INCREMENT, ACH_DEATH_FROM_ABOVE, "built_czars"),
+        Rule(INCREMENT, ACH_ASS_WASHER, "built_ahwassas"),
+        Rule(INCREMENT, ACH_ALIEN_INVASION, "built_ythothas"),
+        Rule(INCREMENT, ACH_FATTER_IS_BETTER, "built_fatboys"),
+        Rule(INCREMENT, ACH_ARACHNOLOGIST, "built_monkeylords"),
+        Rule(INCREMENT, ACH_INCOMING_ROBOTS, "built_galactic_colossus"),
+        Rule(INCREMENT, ACH_FLYING_DEATH, "built_soul_rippers"),
+        Rule(INCREMENT, ACH_HOLY_CRAB, "built_megaliths"),
+        Rule(SET_STEPS_AT_LEAST, ACH_WHAT_A_SWARM, "built_asfs"),
+        Rule(INCREMENT, ACH_THE_TRANSPORTER, "built_transports"),
+        Rule(SET_STEPS_AT_LEAST, ACH_WHO_NEEDS_SUPPORT, "built_sacus"),
+        Rule(UNLOCK, ACH_THAT_WAS_CLOSE, when=(survived, between("acu_lowest_health", 0, 500))),
+    ],
+    "score": [
+        Rule(UNLOCK, ACH_TOP_SCORE, when=(scored_highest, humans_at_least(8))),
+        Rule(INCREMENT, ACH_UNBEATABLE, when=(scored_highest, humans_at_least(8))),
+    ],
+}
+
+
+def _compile_unit_index(unit_counters) -> Dict[str, List[Tuple[str, str]]]:
+    """
+    :return: unit id -> [(counter, field)] for every counter the unit adds to
+    """
+    index = defaultdict(list)
+    for counter, (field, units) in unit_counters.items():
+        for unit in units:
+            index[unit.value].append((counter, field))
+    return dict(index)
+
+
+UNIT_INDEX = _compile_unit_index(UNIT_COUNTERS)
+
+
+def count(blueprint_stats: Dict[str, Dict], unit_stats: Dict[str, Dict]) -> Dict[str, float]:
+    """
+    :brief compute all counters in one pass over the army's stats
+    """
+    counters = dict.fromkeys(UNIT_COUNTERS, 0)
+    for unit_id, stats in blueprint_stats.items():
+        for counter, field in UNIT_INDEX.get(unit_id, ()):
+            counters[counter] += stats.get(field, 0)
+
+    for counter, (category, field) in CATEGORY_COUNTERS.items():
+        counters[counter] = unit_stats.get(category, {}).get(field, 0)
+
+    return counters
+
+
+def _compile_rules(rules: Dict[str, List[Rule]]):
+    """
+    :return: group -> [(action, target, counter or None, constant amount, conditions)]
+    """
+    return {
+        group: [
+            (rule.action, rule.target) + (
+                (rule.amount, 0) if isinstance(rule.amount, str) else (None, rule.amount)
+            ) + (rule.when,)
+            for rule in group_rules
+        ]
+        for group, group_rules in rules.items()
+    }
+
+
+COMPILED_RULES = _compile_rules(RULES)
+
+
+def evaluate(ctx: ArmyContext, groups: Iterable[str] = RULES.keys()) -> List[Update]:
+    updates = []
+    counters = ctx.counters
+    for group in groups:
+        for action, target, counter, amount, conditions in COMPILED_RULES[group]:
+            for condition in conditions:
+                if not condition(ctx):
+                    break
+            else:
+                updates.append(Update(action, target, amount if counter is None else counters[counter]))
+    return updates
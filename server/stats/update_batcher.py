@@ -0,0 +1,115 @@
+"""
+Coalescing of player updates sent to the API
+"""
+
+import asyncio
+from typing import Awaitable, Callable, Dict, List, Optional, Set, Tuple
+
+from server.config import config
+
+UpdatesByPlayer = Dict[int, List[dict]]
+ResultsByPlayer = Dict[int, List[dict]]
+# The keys of the updates in one call to `submit` and the future it waits on
+Submission = Tuple[Set[str], asyncio.Future]
+
+
+class UpdateBatcher(object):
+    """
+    Collects the updates submitted for any number of players during
+    `API_UPDATE_BATCH_WINDOW` seconds and sends them with a single call to
+    `send_batch`. Every caller gets back the results for its own updates, or
+    None if the batch failed.
+
+    Updates and results are matched by their `key` field. When the same
+    player submits updates with the same key more than once in a window they
+    are sent as one update, and its result is only returned to the first of
+    those callers so that it is not reported twice.
+    """
+
+    def __init__(
+        self,
+        send_batch: Callable[[UpdatesByPlayer], Awaitable[Optional[ResultsByPlayer]]],
+        key: str
+    ):
+        self._send_batch = send_batch
+        self._key = key
+        self._updates: UpdatesByPlayer = {}
+        self._submissions: Dict[int, List[Submission]] = {}
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._tasks: Set[asyncio.Task] = set()
+
+    async def submit(self, player_id: int, updates: List[dict]) -> Optional[List[dict]]:
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._updates.setdefault(player_id, []).extend(updates)
+        self._submissions.setdefault(player_id, []).append(
+            ({update.get(self._key) for update in updates}, future)
+        )
+
+        if self._timer is None:
+            self._timer = loop.call_later(
+                config.API_UPDATE_BATCH_WINDOW, self._flush_later
+            )
+
+        return await asyncio.shield(future)
+
+    def _flush_later(self) -> None:
+        self._timer = None
+        task = asyncio.create_task(self.flush())
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def flush(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+        updates, submissions = self._updates, self._submissions
+        self._updates, self._submissions = {}, {}
+        if not submissions:
+            return
+
+        try:
+            results = await self._send_batch(updates)
+        except Exception as e:
+            for player_submissions in submissions.values():
+                for _, future in player_submissions:
+                    if not future.done():
+                        future.set_exception(e)
+            return
+
+        for player_id, player_submissions in submissions.items():
+            if results is None:
+                own_results = [None] * len(player_submissions)
+            else:
+                own_results = self._split_results(
+                    results.get(player_id, []), player_submissions
+                )
+            for (_, future), result in zip(player_submissions, own_results):
+                if not future.done():
+                    future.set_result(result)
+
+    def _split_results(
+        self,
+        results: List[dict],
+        submissions: List[Submission]
+    ) -> List[List[dict]]:
+        """
+        :return: the results for each submission, every result going to the
+        first submission with an update of the same key
+        """
+        if len(submissions) == 1:
+            return [results]
+
+        own_results: List[List[dict]] = [[] for _ in submissions]
+        for result in results:
+            for (keys, _), own in zip(submissions, own_results):
+                if result.get(self._key) in keys:
+                    own.append(result)
+                    break
+        return own_results
+
+    async def shutdown(self) -> None:
+        await self.flush()
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
@@ -1,18 +1,23 @@
 import asyncio
-from typing import Set, Dict, Union, List, Any
+import random
+import time
+from typing import Any, BinaryIO, Dict, List, Optional, Set, Tuple, Union
 
-import aiocron
 import aiohttp
 import datetime
 import lxml.html
-import os
-import shutil
 import sqlalchemy.sql
+from sqlalchemy import func, select
 
 from server.decorators import with_logger
+from . import metrics
 from .config import config
 from .core import Service
 from .db import FAFDatabase
+from .db.models import tada_upload_queue
+from .game_service import GameService
+from .http_client_service import HttpClientService
+from .replay_archive_service import ReplayArchiveService
 
 
 class TadaFileTooLargeException(ValueError):
@@ -30,72 +35,208 @@ class TadaUploadFailException(ValueError):
 
 @with_logger
 class TadaService(Service):
-    def __init__(self, database: FAFDatabase):
-        """
-        :param tada_endpoint: eg  'https://tademos.xyz'
-        """
+    """
+        Uploads replays to TADA. Upload requests are kept in the
+    `tada_upload_queue` table so they survive a restart, and are processed by
+    a background worker with at most `TADA_UPLOAD_CONCURRENCY` uploads in
+    flight. Failed uploads are retried with exponential backoff.
+
+        The list of latest TADA games, which is scraped to find the id of an
+    uploaded replay, is cached briefly and shared between concurrent uploads.
+    """
+
+    def __init__(
+        self,
+        database: FAFDatabase,
+        http_client_service: HttpClientService,
+        replay_archive_service: ReplayArchiveService,
+        game_service: GameService
+    ):
         self._db = database
+        self._http_client = http_client_service
+        self._replay_archive = replay_archive_service
+        self._game_service = game_service
         tada_api_url = config.TADA_API_URL
         self._upload_endpoint = f'{tada_api_url}/demos'
         self._games_endpoint = f'{tada_api_url}/demos'
         self._dirty_uploads = []
-        self._upload_queue = []
+        self._failed_uploads = []
+        self._in_flight: Set[int] = set()
+        self._upload_tasks: Set[asyncio.Task] = set()
+        self._wakeup = asyncio.Event()
+        self._worker_task = None
+        # (time fetched, games)
+        self._latest_games: Optional[Tuple[float, List]] = None
+        # (time started, task)
+        self._latest_games_fetch: Optional[Tuple[float, asyncio.Task]] = None
 
     @property
     def dirty_uploads(self):
         return self._dirty_uploads
 
+    @property
+    def failed_uploads(self):
+        return self._failed_uploads
+
     def clear_dirty(self):
         self._dirty_uploads = []
+        self._failed_uploads = []
 
     def mark_dirty(self, taf_id: int, tada_game_info: Dict[str, Union[List[Dict[str, Any]], Any]]):
         self._dirty_uploads.append((taf_id, tada_game_info))
 
+    def mark_failed(self, taf_id: int, requester_id: int):
+        self._failed_uploads.append((taf_id, requester_id))
+
     async def initialize(self) -> None:
-        self._upload_cron = aiocron.crontab("* * * * *", func=self._service_queue)
+        # The queue table is created by migrations/V112_2__tada_upload_queue.sql
+        self._worker_task = asyncio.create_task(self._run_worker())
 
     async def shutdown(self):
-        pass
+        # Interrupted uploads stay queued and are retried on the next start
+        tasks = [task for task in (self._worker_task, *self._upload_tasks) if task is not None]
+        for task in tasks:
+            task.cancel()
+        if tasks:
+            await asyncio.gather(*tasks, return_exceptions=True)
 
     def on_connection_lost(self, conn: "LobbyConnection") -> None:
         pass
 
-    async def upload(self, taf_replay_id: int, replay_meta: dict, zip_or_tad_file_path: str, retry_count: int):
-        try:
-            await self._upload(taf_replay_id, replay_meta, zip_or_tad_file_path)
+    async def upload(self, taf_replay_id: int, requester_id: Optional[int] = None):
+        """
+        Queue a replay for upload.
 
-        except Exception as e:
-            if retry_count <= 0 or isinstance(e, TadaFileTooLargeException):
-                self._logger.exception(e)
-                self._logger.info("[upload] giving up. restoring game_stats.tada_available=0")
-                async with self._db.acquire() as conn:
-                    await conn.execute(sqlalchemy.sql.text(
-                        "UPDATE `game_stats` SET `tada_available`=0 WHERE id = :taf_replay_id"),
-                        taf_replay_id=taf_replay_id)
-                raise e
+        :param requester_id: id of the player to tell if the upload fails
 
-            else:
-                self._logger.info(f"[upload] Exception uploading replay:{str(e)}. retry_count:{retry_count}")
-                self._upload_queue.append((taf_replay_id, replay_meta, zip_or_tad_file_path, retry_count-1))
+        :raises TadaFileTooLargeException: if the replay is too large for TADA
+        """
+        replay = await self._replay_archive.open_replay(taf_replay_id)
+        if replay is not None:
+            replay.file.close()
+            tad_file_size_mb = replay.size // 1024 // 1024
+            if tad_file_size_mb >= config.TADA_UPLOAD_MAX_SIZE_MB:
+                self._logger.info("[upload] not uploading replay {} because file size {}MB exceed maximum {}MB".format(
+                    taf_replay_id, tad_file_size_mb, config.TADA_UPLOAD_MAX_SIZE_MB))
+                metrics.tada_uploads.labels("too_large").inc()
+                await self._give_up(taf_replay_id)
+                raise TadaFileTooLargeException(tad_file_size_mb, config.TADA_UPLOAD_MAX_SIZE_MB)
 
-    async def _service_queue(self):
-        queue_items, self._upload_queue = self._upload_queue, []
-        for args in queue_items:
-            await self.upload(*args)
+        async with self._db.acquire() as conn:
+            await conn.execute(sqlalchemy.sql.text(
+                "INSERT IGNORE INTO `tada_upload_queue` (`game_id`, `requester_id`) "
+                "VALUES (:game_id, :requester_id)"),
+                game_id=taf_replay_id, requester_id=requester_id)
+        self._wakeup.set()
+
+    async def _run_worker(self):
+        while True:
+            self._wakeup.clear()
+            try:
+                await self._start_due_uploads()
+            except Exception:
+                self._logger.exception("[_run_worker] unable to service TADA upload queue")
+
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), config.TADA_UPLOAD_POLL_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
 
-    async def _upload(self, taf_replay_id: int, replay_meta: dict, zip_or_tad_file_path: str):
+    async def _start_due_uploads(self):
+        free_slots = config.TADA_UPLOAD_CONCURRENCY - len(self._in_flight)
+
+        async with self._db.acquire() as conn:
+            queue_length = await conn.scalar(
+                select(func.count()).select_from(tada_upload_queue))
+            metrics.tada_upload_queue_length.set(queue_length)
+            if free_slots <= 0:
+                return
+
+            result = await conn.execute(
+                select(
+                    tada_upload_queue.c.game_id,
+                    tada_upload_queue.c.requester_id,
+                    tada_upload_queue.c.attempts
+                )
+                .where(tada_upload_queue.c.next_attempt <= func.now())
+                .where(tada_upload_queue.c.game_id.notin_(self._in_flight))
+                .order_by(tada_upload_queue.c.next_attempt)
+                .limit(free_slots)
+            )
+            rows = result.fetchall()
+
+        for row in rows:
+            self._in_flight.add(row.game_id)
+            task = asyncio.create_task(
+                self._process_upload(row.game_id, row.attempts, row.requester_id))
+            self._upload_tasks.add(task)
+            task.add_done_callback(self._upload_tasks.discard)
+
+    async def _process_upload(self, taf_replay_id: int, attempts: int, requester_id: Optional[int] = None):
+        try:
+            try:
+                await self._upload(taf_replay_id)
+
+            except TadaFileTooLargeException:
+                metrics.tada_uploads.labels("too_large").inc()
+                await self._give_up(taf_replay_id, requester_id)
+
+            except Exception as e:
+                attempts += 1
+                if attempts >= config.TADA_UPLOAD_MAX_ATTEMPTS:
+                    self._logger.exception(e)
+                    self._logger.info(f"[_process_upload] giving up on replay {taf_replay_id} after {attempts} attempts")
+                    metrics.tada_uploads.labels("failed").inc()
+                    await self._give_up(taf_replay_id, requester_id)
+                else:
+                    delay = min(
+                        config.TADA_UPLOAD_RETRY_DELAY * 2 ** (attempts - 1),
+                        config.TADA_UPLOAD_MAX_RETRY_DELAY
+                    ) * random.uniform(1, 1.2)
+                    self._logger.info(f"[_process_upload] Exception uploading replay {taf_replay_id}: {str(e)}. retrying in {delay:.0f}s")
+                    metrics.tada_uploads.labels("retry").inc()
+                    await self._reschedule(taf_replay_id, attempts, delay)
 
-        if zip_or_tad_file_path.endswith(".zip"):
-            tad_file_path = os.path.splitext(zip_or_tad_file_path)[0] + ".tad"
-            def cleanup(): os.remove(tad_file_path)
-            shutil.unpack_archive(zip_or_tad_file_path, os.path.dirname(zip_or_tad_file_path) or './')
+            else:
+                metrics.tada_uploads.labels("success").inc()
+                async with self._db.acquire() as conn:
+                    await conn.execute(tada_upload_queue.delete().where(
+                        tada_upload_queue.c.game_id == taf_replay_id))
 
-        else:
-            def cleanup(): pass
-            tad_file_path = zip_or_tad_file_path
+        finally:
+            self._in_flight.discard(taf_replay_id)
+            self._wakeup.set()
+
+    async def _reschedule(self, taf_replay_id: int, attempts: int, delay: float):
+        async with self._db.acquire() as conn:
+            await conn.execute(sqlalchemy.sql.text(
+                "UPDATE `tada_upload_queue` SET `attempts` = :attempts, "
+                "`next_attempt` = NOW() + INTERVAL :delay SECOND WHERE `game_id` = :game_id"),
+                attempts=attempts, delay=int(delay), game_id=taf_replay_id)
+
+    async def _give_up(self, taf_replay_id: int, requester_id: Optional[int] = None):
+        self._logger.info(f"[_give_up] restoring game_stats.tada_available=0 for replay {taf_replay_id}")
+        async with self._db.acquire() as conn:
+            await conn.execute(tada_upload_queue.delete().where(
+                tada_upload_queue.c.game_id == taf_replay_id))
+            await conn.execute(sqlalchemy.sql.text(
+                "UPDATE `game_stats` SET `tada_available`=0 WHERE id = :taf_replay_id"),
+                taf_replay_id=taf_replay_id)
+        if requester_id is not None:
+            self.mark_failed(taf_replay_id, requester_id)
+
+    async def _upload(self, taf_replay_id: int):
+        async with self._db.acquire() as conn:
+            replay_info = await self._game_service.get_replay_info(conn, taf_replay_id)
+        replay_meta = replay_info.replay_meta
+
+        # The replay is streamed straight out of the archive
+        replay = await self._replay_archive.open_replay(taf_replay_id)
+        if replay is None:
+            raise FileNotFoundError(f"Replay {taf_replay_id} is not archived")
 
         try:
-            datestamp = datetime.date.fromtimestamp(os.path.getctime(zip_or_tad_file_path)).isoformat()
+            datestamp = datetime.date.fromtimestamp(replay.archived_at).isoformat()
             if replay_meta is None:
                 canonical_file_name = "{datestamp} - TAF-{replay_id}.tad".format(
                     datestamp=datestamp,
@@ -109,9 +250,9 @@ class TadaService(Service):
             self._logger.info(f"[_upload] canonical_file_name={canonical_file_name}")
 
             recent_tada_games = await self._get_latest_games()
-            recent_tada_id, _ = recent_tada_games[-1] if len(recent_tada_games) > 0 else 0
+            recent_tada_id, _ = recent_tada_games[-1] if len(recent_tada_games) > 0 else (0, None)
 
-            tad_file_size_mb = os.path.getsize(tad_file_path) // 1024 // 1024
+            tad_file_size_mb = replay.size // 1024 // 1024
             if tad_file_size_mb >= config.TADA_UPLOAD_MAX_SIZE_MB:
                 self._logger.info("[_upload] skipping actual upload to TADA because file size {}MB exceed maximum {}MB".format(
                     tad_file_size_mb, config.TADA_UPLOAD_MAX_SIZE_MB))
@@ -121,28 +262,29 @@ class TadaService(Service):
                 self._logger.info("[_upload] skipping actual upload to TADA because config.TADA_UPLOAD_ENABLE not set")
 
             else:
-                await self._do_upload(tad_file_path, canonical_file_name)
-
-            tada_game_info, map_name, players = None, None, None
-            if replay_meta is not None:
-                map_name = replay_meta["mapName"]
-                players = set(p["name"] for p in replay_meta["players"] if p["side"] < 2)
-
-            for n in range(3):
-                await asyncio.sleep(5)
-                latest_games = await self._get_latest_games()
-                tada_game_info = self._find_tada_game(latest_games, 1+recent_tada_id, datestamp, map_name, players)
-                if tada_game_info is not None:
-                    tada_id, tada_game_info = tada_game_info
-                    self._logger.info(f"game successfully uploaded. id={tada_id}")
-                    self.mark_dirty(taf_replay_id, tada_game_info)
-                    break
-
-            if tada_game_info is None:
-                self._logger.info(f"Unable to find uploaded game in TADA list of latest uploads")
+                await self._do_upload(replay.file, canonical_file_name)
+            uploaded_at = time.monotonic()
 
         finally:
-            cleanup()
+            replay.file.close()
+
+        tada_game_info, map_name, players = None, None, None
+        if replay_meta is not None:
+            map_name = replay_meta["mapName"]
+            players = set(p["name"] for p in replay_meta["players"] if p["side"] < 2)
+
+        for n in range(config.TADA_FIND_UPLOAD_ATTEMPTS):
+            await asyncio.sleep(config.TADA_FIND_UPLOAD_DELAY)
+            latest_games = await self._get_latest_games(fetched_after=uploaded_at)
+            tada_game_info = self._find_tada_game(latest_games, 1+recent_tada_id, datestamp, map_name, players)
+            if tada_game_info is not None:
+                tada_id, tada_game_info = tada_game_info
+                self._logger.info(f"game successfully uploaded. id={tada_id}")
+                self.mark_dirty(taf_replay_id, tada_game_info)
+                break
+
+        if tada_game_info is None:
+            self._logger.info(f"Unable to find uploaded game in TADA list of latest uploads")
 
     def _find_tada_game(self, tada_games, min_id: int, datestamp: str, map_name: str, players: Set[str]):
 
@@ -175,20 +317,46 @@ class TadaService(Service):
                     }
                 return id, tada_game_info
 
-    async def _do_upload(self, tad_file_path: str, upload_name: str) -> str:
-        with open(tad_file_path, "rb") as f:
-            async with aiohttp.ClientSession(headers={"User-Agent": "Total Annihilation Forever"}) as session:
-                self._logger.info(f"uploading file={tad_file_path} to endpoint={self._upload_endpoint}")
-                data = aiohttp.FormData()
-                data.add_field("demo[recording]", f, filename=upload_name, content_type='multipart/form-data')
-                async with session.post(self._upload_endpoint, data=data, verify_ssl=False) as r:
-                    if r.status != 200:
-                        raise TadaUploadFailException(r.reason)
-
-    async def _get_latest_games(self):
+    async def _do_upload(self, replay_file: BinaryIO, upload_name: str) -> str:
+        self._logger.info(f"uploading file={upload_name} to endpoint={self._upload_endpoint}")
+        data = aiohttp.FormData()
+        # aiohttp reads file objects in a thread while sending
+        data.add_field("demo[recording]", replay_file, filename=upload_name, content_type='multipart/form-data')
+        async with self._http_client.request(
+                "tada", "POST", self._upload_endpoint, data=data, ssl=False) as r:
+            if r.status != 200:
+                raise TadaUploadFailException(r.reason)
+
+    async def _get_latest_games(self, fetched_after: Optional[float] = None):
         """
+        Return the cached list of latest TADA games if it is recent enough,
+        otherwise fetch it. Concurrent callers share a single request.
+
+        :param fetched_after: only accept a list fetched after this
+            `time.monotonic()` timestamp
         :return: list of most recent (id, name) sorted ascending by id
         """
+        if self._latest_games is not None:
+            fetched_at, games = self._latest_games
+            if (
+                time.monotonic() - fetched_at < config.TADA_LATEST_GAMES_CACHE_TTL
+                and (fetched_after is None or fetched_at >= fetched_after)
+            ):
+                return games
+
+        fetch = self._latest_games_fetch
+        if (
+            fetch is None
+            or fetch[1].done()
+            or (fetched_after is not None and fetch[0] < fetched_after)
+        ):
+            started_at = time.monotonic()
+            fetch = (started_at, asyncio.create_task(self._fetch_latest_games(started_at)))
+            self._latest_games_fetch = fetch
+
+        return await asyncio.shield(fetch[1])
+
+    async def _fetch_latest_games(self, started_at: float):
         class AccumulateGames(object):
 
             def __init__(self):
@@ -220,14 +388,15 @@ class TadaService(Service):
                 self.games_list.sort(key=lambda x: x[0])
                 return "closed!"
 
-        async with aiohttp.ClientSession() as session:
-            async with session.get(self._games_endpoint, verify_ssl=False) as r:
-                if r.status != 200:
-                    raise ValueError(f"Got {r.status} from TADA endpoint!")
-                games = await r.text()
+        async with self._http_client.request("tada", "GET", self._games_endpoint, ssl=False) as r:
+            if r.status != 200:
+                raise ValueError(f"Got {r.status} from TADA endpoint!")
+            games = await r.text()
 
         games_accumulator = AccumulateGames()
         parser = lxml.html.HTMLParser(target = games_accumulator)
         lxml.html.fromstring(games, None, parser)
-        return games_accumulator.get()
+        games = games_accumulator.get()
+        self._latest_games = (started_at, games)
+        return games
 
@@ -20,6 +20,7 @@ from server.api.api_accessor import ApiAccessor
 from server.api.oauth_session import OAuth2Session
 from server.config import TRACE, config
 from server.db import FAFDatabase
+from server.game_results_outbox_service import GameResultsOutboxService
 from server.game_service import GameService
 from server.games import FeaturedModType
 from server.geoip_service import GeoIpService
@@ -261,13 +262,24 @@ async def message_queue_service():
     await service.shutdown()
 
 
+@pytest.fixture
+async def game_results_outbox_service(database, message_queue_service):
+    service = GameResultsOutboxService(database, message_queue_service)
+    await service.initialize()
+
+    yield service
+
+    await service.shutdown()
+
+
 @pytest.fixture
 async def game_service(
     database,
     player_service,
     game_stats_service,
     rating_service,
-    message_queue_service
+    message_queue_service,
+    game_results_outbox_service
 ):
     game_service = GameService(
         database,
@@ -275,6 +287,7 @@ async def game_service(
         game_stats_service,
         rating_service,
         message_queue_service,
+        game_results_outbox_service=game_results_outbox_service
     )
     await game_service.initialize()
     return game_service
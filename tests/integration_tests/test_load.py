@@ -5,7 +5,12 @@ import pytest
 
 from tests.utils import fast_forward
 
-from .conftest import connect_and_sign_in, read_until_command
+from .conftest import (
+    connect_and_sign_in,
+    connect_client,
+    perform_login,
+    read_until_command
+)
 
 # All test coroutines will be treated as marked.
 pytestmark = pytest.mark.asyncio
@@ -149,3 +154,50 @@ async def test_backpressure_handling(lobby_server, caplog):
             asyncio.shield(write_without_reading(proto)),
             timeout=10
         )
+
+
+@pytest.mark.slow
+async def test_login_storm(lobby_server, tmp_user, caplog, mocker):
+    """
+    Simulates every client reconnecting at once after a server restart. All
+    handshakes should eventually complete while the number of handshakes being
+    processed at the same time stays bounded.
+    """
+    # This test causes way too much logging output otherwise
+    caplog.set_level(logging.WARNING)
+
+    NUM_CLIENTS = 5000
+    MAX_CONCURRENT = 20
+    mocker.patch(
+        "server.login_admission.config.LOGIN_MAX_CONCURRENT_HANDSHAKES",
+        MAX_CONCURRENT
+    )
+
+    admission = lobby_server._connection_factory().login_admission
+    max_active = 0
+
+    async def watch_admission():
+        nonlocal max_active
+        while True:
+            max_active = max(max_active, admission.active)
+            await asyncio.sleep(0)
+
+    users = [await tmp_user("Storm") for _ in range(NUM_CLIENTS)]
+    protos = [await connect_client(lobby_server) for _ in users]
+
+    watcher = asyncio.create_task(watch_admission())
+    await asyncio.gather(*(
+        perform_login(proto, user) for proto, user in zip(protos, users)
+    ))
+    welcomes = await asyncio.gather(*(
+        read_until_command(proto, "welcome", timeout=600) for proto in protos
+    ))
+    watcher.cancel()
+
+    assert len(welcomes) == NUM_CLIENTS
+    assert 0 < max_active <= MAX_CONCURRENT
+    assert admission.active == 0
+    assert len(admission) == 0
+
+    for proto in protos:
+        await proto.close()
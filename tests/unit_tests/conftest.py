@@ -30,6 +30,9 @@ def ladder_and_game_service_context(
                     rating_service=mock.Mock(),
                     message_queue_service=mock.Mock(
                         declare_exchange=CoroutineMock()
+                    ),
+                    game_results_outbox_service=mock.Mock(
+                        add=CoroutineMock()
                     )
                 )
                 ladder_service = LadderService(database, game_service)
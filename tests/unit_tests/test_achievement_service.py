@@ -1,9 +1,11 @@
+import asyncio
 from unittest.mock import MagicMock, Mock
 
 import pytest
 from asynctest import CoroutineMock
 
 from server.api.api_accessor import ApiAccessor, SessionManager
+from server.config import config
 from server.stats.achievement_service import AchievementService
 
 pytestmark = pytest.mark.asyncio
@@ -18,7 +20,8 @@ def api_accessor():
 
 
 @pytest.fixture()
-def service(api_accessor: ApiAccessor):
+def service(api_accessor: ApiAccessor, monkeypatch):
+    monkeypatch.setattr(config, "API_UPDATE_BATCH_WINDOW", 0)
     return AchievementService(api_accessor)
 
 
@@ -89,7 +92,9 @@ async def test_update_multiple(service: AchievementService):
 
     assert result == achievements_data
 
-    service.api_accessor.update_achievements.assert_called_once_with(queue, 42)
+    service.api_accessor.update_achievements.assert_called_once_with([
+        dict(update, player_id=42) for update in queue
+    ])
 
 
 async def test_achievement_zero_steps_increment(service: AchievementService):
@@ -97,3 +102,55 @@ async def test_achievement_zero_steps_increment(service: AchievementService):
     assert service.increment(achievement_id="3-4-5", steps=0, queue=[]) is None
     assert service.set_steps_at_least(achievement_id="3-4-5", steps=2, queue=[]) is None
     assert service.set_steps_at_least(achievement_id="3-4-5", steps=0, queue=[]) is None
+
+
+async def test_updates_merged_across_players(service: AchievementService):
+    content = {
+        "data": [
+            {"attributes": {"achievementId": "1-2-3", "state": "LOCKED", "steps": 5, "newlyUnlocked": False}},
+            {"attributes": {"achievementId": "2-3-4", "state": "UNLOCKED", "steps": 4, "newlyUnlocked": True}},
+            {"attributes": {"achievementId": "1-2-3", "state": "LOCKED", "steps": 1, "newlyUnlocked": False}},
+        ]
+    }
+    service.api_accessor.update_achievements.return_value = (200, content)
+
+    results = await asyncio.gather(
+        service.execute_batch_update(1, [
+            dict(achievement_id="1-2-3", update_type="INCREMENT", steps=2),
+            dict(achievement_id="2-3-4", update_type="SET_STEPS_AT_LEAST", steps=4),
+            dict(achievement_id="1-2-3", update_type="INCREMENT", steps=3)
+        ]),
+        service.execute_batch_update(2, [
+            dict(achievement_id="1-2-3", update_type="INCREMENT", steps=1)
+        ]),
+        service.execute_batch_update(1, [
+            dict(achievement_id="2-3-4", update_type="SET_STEPS_AT_LEAST", steps=2)
+        ])
+    )
+
+    service.api_accessor.update_achievements.assert_called_once_with([
+        dict(achievement_id="1-2-3", update_type="INCREMENT", steps=5, player_id=1),
+        dict(achievement_id="2-3-4", update_type="SET_STEPS_AT_LEAST", steps=4, player_id=1),
+        dict(achievement_id="1-2-3", update_type="INCREMENT", steps=1, player_id=2)
+    ])
+    # The merged "2-3-4" update is only reported to the first caller
+    assert results == [
+        [
+            dict(achievement_id="1-2-3", current_state="LOCKED", current_steps=5, newly_unlocked=False),
+            dict(achievement_id="2-3-4", current_state="UNLOCKED", current_steps=4, newly_unlocked=True)
+        ],
+        [dict(achievement_id="1-2-3", current_state="LOCKED", current_steps=1, newly_unlocked=False)],
+        []
+    ]
+
+
+async def test_batch_failure_returned_to_all_players(service: AchievementService):
+    service.api_accessor.update_achievements = CoroutineMock(return_value=(500, None))
+
+    results = await asyncio.gather(
+        service.execute_batch_update(1, create_queue()),
+        service.execute_batch_update(2, create_queue())
+    )
+
+    assert results == [None, None]
+    service.api_accessor.update_achievements.assert_called_once()
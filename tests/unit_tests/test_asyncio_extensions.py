@@ -3,9 +3,11 @@ import asyncio
 import pytest
 from asynctest import CoroutineMock
 
+from server import asyncio_extensions
 from server.asyncio_extensions import (
     SpinLock,
     gather_without_exceptions,
+    install_event_loop_policy,
     synchronized,
     synchronizedmethod
 )
@@ -191,3 +193,14 @@ async def test_synchronizedmethod_attrname():
         [b.sleep_for_1s() for _ in range(500)],
         timeout=502
     )
+
+
+def test_install_event_loop_policy_fallback(monkeypatch):
+    monkeypatch.setattr(asyncio_extensions, "uvloop", None)
+
+    try:
+        assert install_event_loop_policy("uvloop") == "asyncio"
+        assert install_event_loop_policy("something") == "asyncio"
+        assert type(asyncio.get_event_loop_policy()) is asyncio.DefaultEventLoopPolicy
+    finally:
+        asyncio.set_event_loop_policy(None)
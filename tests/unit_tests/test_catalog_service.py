@@ -0,0 +1,102 @@
+from unittest import mock
+
+import pytest
+
+from server.catalog_service import CatalogService, MapVersion
+from server.config import config
+
+pytestmark = pytest.mark.asyncio
+
+
+@pytest.fixture
+async def catalog_service(database):
+    service = CatalogService(database)
+    await service.update_data()
+    return service
+
+
+def count_acquires(service):
+    acquire = mock.Mock(wraps=service._db.acquire)
+    service._db = mock.Mock(acquire=acquire)
+    return acquire
+
+
+async def test_get_map_version(catalog_service):
+    acquire = count_acquires(catalog_service)
+
+    version = await catalog_service.get_map_version("scmp_001", "12345678")
+
+    assert version == MapVersion(1, "maps.ufo/scmp_001/12345678", True)
+    acquire.assert_not_called()
+
+
+async def test_get_map_version_is_case_insensitive(catalog_service):
+    version = await catalog_service.get_map_version("SCMP_002", "ABCDEF0")
+
+    assert version.id == 2
+
+
+async def test_get_map_version_not_loaded(database):
+    service = CatalogService(database)
+
+    version = await service.get_map_version("scmp_015", "55555555")
+    assert version.id == 17
+
+    # Now cached
+    acquire = count_acquires(service)
+    assert await service.get_map_version("scmp_015", "55555555") == version
+    acquire.assert_not_called()
+
+
+async def test_get_map_version_negative_cache(catalog_service, monkeypatch):
+    monkeypatch.setattr(config, "CATALOG_NEGATIVE_CACHE_TTL", 60)
+    acquire = count_acquires(catalog_service)
+
+    assert await catalog_service.get_map_version("nope", "0000") is None
+    assert await catalog_service.get_map_version("nope", "0000") is None
+
+    acquire.assert_called_once()
+
+
+async def test_get_map_version_negative_cache_disabled(
+    catalog_service,
+    monkeypatch
+):
+    monkeypatch.setattr(config, "CATALOG_NEGATIVE_CACHE_TTL", 0)
+    acquire = count_acquires(catalog_service)
+
+    assert await catalog_service.get_map_version("nope", "0000") is None
+    assert await catalog_service.get_map_version("nope", "0000") is None
+
+    assert acquire.call_count == 2
+
+
+async def test_get_coop_maps(catalog_service):
+    acquire = count_acquires(catalog_service)
+
+    maps = await catalog_service.get_coop_maps()
+
+    assert [row.name for row in maps[:3]] == [
+        "GoK Campaign map",
+        "Arm Campaign map",
+        "CORE Campaign map"
+    ]
+    acquire.assert_not_called()
+
+
+async def test_invalidate_top_mods(catalog_service):
+    mods = await catalog_service.get_top_mods()
+    acquire = count_acquires(catalog_service)
+
+    catalog_service.invalidate_top_mods()
+
+    assert await catalog_service.get_top_mods() == mods
+    acquire.assert_called_once()
+
+
+def test_map_key_from_filename():
+    key = CatalogService._map_key_from_filename
+    assert key("maps.ufo/SCMP_001/ABCD1234") == ("scmp_001", "abcd1234")
+    assert key("maps/scmp_001") is None
+    assert key("") is None
+    assert key(None) is None
@@ -0,0 +1,98 @@
+import asyncio
+from unittest import mock
+
+import pytest
+from prometheus_client import REGISTRY
+
+from server import command_metrics
+from server.command_metrics import (
+    UNKNOWN_COMMAND,
+    add_db_time,
+    count_sent,
+    measure_command,
+    sent_command_label
+)
+from server.lobbyconnection import LobbyConnection
+
+pytestmark = pytest.mark.asyncio
+
+
+def sample(name, **labels):
+    return REGISTRY.get_sample_value(name, labels) or 0
+
+
+@pytest.fixture
+def lobbyconnection():
+    return LobbyConnection(
+        database=mock.Mock(),
+        game_service=mock.Mock(),
+        players=mock.Mock(),
+        nts_client=mock.Mock(),
+        geoip=mock.Mock(),
+        ladder_service=mock.Mock(),
+        party_service=mock.Mock(),
+        tada_service=mock.Mock()
+    )
+
+
+async def test_measure_command_db_time():
+    labels = dict(target="lobby", command="test_db")
+    before = sample("server_command_db_seconds_sum", **labels)
+
+    async def query():
+        add_db_time(0.5)
+
+    with measure_command("lobby", "test_db", 100):
+        add_db_time(0.25)
+        # Queries of tasks started by the handler count as well
+        await asyncio.create_task(query())
+    add_db_time(10)
+
+    assert sample("server_command_db_seconds_sum", **labels) - before == 0.75
+    assert sample("server_command_seconds_count", **labels) >= 1
+    assert sample("server_received_message_bytes_sum", **labels) >= 100
+
+
+async def test_measure_command_exception():
+    labels = dict(target="game", command="test_error")
+
+    with pytest.raises(ValueError):
+        with measure_command("game", "test_error", 10):
+            raise ValueError()
+
+    assert sample("server_command_seconds_count", **labels) == 1
+
+
+async def test_sent_command_label_bounded(monkeypatch):
+    monkeypatch.setattr(command_metrics, "_sent_command_labels", set())
+    monkeypatch.setattr(command_metrics, "MAX_SENT_COMMAND_LABELS", 2)
+
+    assert sent_command_label("game_info") == "game_info"
+    assert sent_command_label("not an identifier") == UNKNOWN_COMMAND
+    assert sent_command_label(None) == UNKNOWN_COMMAND
+    assert sent_command_label("player_info") == "player_info"
+    assert sent_command_label("notice") == UNKNOWN_COMMAND
+    assert sent_command_label("game_info") == "game_info"
+
+
+async def test_count_sent_broadcast():
+    labels = dict(protocol="TestProtocol", command="social")
+    before = sample("server_sent_command_bytes_total", **labels)
+
+    count_sent("TestProtocol", "social", 10, recipients=3)
+
+    assert sample("server_sent_command_messages_total", **labels) == 3
+    assert sample("server_sent_command_bytes_total", **labels) - before == 30
+
+
+async def test_command_label(lobbyconnection):
+    assert lobbyconnection.command_label({"command": "game_host"}) == ("lobby", "game_host")
+    assert lobbyconnection.command_label({"command": "junk"}) == ("lobby", UNKNOWN_COMMAND)
+    assert lobbyconnection.command_label({"command": ["junk"]}) == ("lobby", UNKNOWN_COMMAND)
+    assert lobbyconnection.command_label([]) == ("lobby", UNKNOWN_COMMAND)
+    assert lobbyconnection.command_label(
+        {"command": "GameOption", "target": "game"}
+    ) == ("game", "GameOption")
+    assert lobbyconnection.command_label(
+        {"command": "game_host", "target": "game"}
+    ) == ("game", UNKNOWN_COMMAND)
@@ -0,0 +1,169 @@
+from unittest import mock
+
+import aiohttp
+import pytest
+
+from server.config import config
+from server.control import ControlServer
+from server.games import GameState
+from server.ice_relay import IceRelayStats
+from server.loop_monitor import SlowCallback
+from server.players import PlayerState
+from server.profiler import Profiler
+
+pytestmark = pytest.mark.asyncio
+
+HOST = "127.0.0.1"
+PORT = 6084
+
+
+def make_game(id_, state=GameState.STAGING, mod="tacc", queue=None, players=()):
+    game = mock.Mock()
+    game.id = id_
+    game.state = state
+    game.game_mode = mod
+    game.matchmaker_queue_id = queue
+    game.players = [mock.Mock(id=p) for p in players]
+    game.to_dict.return_value = {"uid": id_}
+    game.ice_relay_stats = IceRelayStats()
+    return game
+
+
+def make_player(id_, state=PlayerState.IDLE):
+    player = mock.Mock()
+    player.id = id_
+    player.state = state
+    player.to_dict.return_value = {"id": id_}
+    return player
+
+
+@pytest.fixture
+async def control_server():
+    game_service = mock.Mock(version=0, all_games=[
+        make_game(3, GameState.LIVE, players=[1, 2]),
+        make_game(1, GameState.STAGING, mod="tavmod"),
+        make_game(2, GameState.LIVE, queue=1, players=[3, 4]),
+    ])
+    player_service = mock.Mock(version=0, all_players=[
+        make_player(id_) for id_ in range(1, 6)
+    ])
+    server = ControlServer(game_service, player_service, HOST, PORT)
+    await server.start()
+
+    yield server
+
+    await server.shutdown()
+
+
+async def get(path, headers=None):
+    async with aiohttp.ClientSession() as session:
+        async with session.get(f"http://{HOST}:{PORT}{path}", headers=headers) as resp:
+            data = await resp.json() if resp.status == 200 else None
+            return resp, data
+
+
+async def test_games_sorted_by_id(control_server, monkeypatch):
+    monkeypatch.setattr(config, "CONTROL_SERVER_CHUNK_SIZE", 2)
+
+    resp, data = await get("/games")
+
+    assert resp.status == 200
+    assert data == [{"uid": 1}, {"uid": 2}, {"uid": 3}]
+    assert "Link" not in resp.headers
+
+
+async def test_games_filters(control_server):
+    _, data = await get("/games?state=live")
+    assert data == [{"uid": 2}, {"uid": 3}]
+
+    _, data = await get("/games?mod=tavmod&mod=tacc&state=staging")
+    assert data == [{"uid": 1}]
+
+    _, data = await get("/games?queue=1")
+    assert data == [{"uid": 2}]
+
+    _, data = await get("/games?player=1,4")
+    assert data == [{"uid": 2}, {"uid": 3}]
+
+    resp, _ = await get("/games?player=foo")
+    assert resp.status == 400
+
+
+async def test_players_pagination(control_server):
+    resp, data = await get("/players?limit=2")
+    assert data == [{"id": 1}, {"id": 2}]
+    assert resp.links["next"]["url"].path_qs == "/players?limit=2&after=2"
+
+    resp, data = await get(resp.links["next"]["url"].path_qs)
+    assert data == [{"id": 3}, {"id": 4}]
+
+    resp, data = await get(resp.links["next"]["url"].path_qs)
+    assert data == [{"id": 5}]
+    assert "Link" not in resp.headers
+
+    resp, _ = await get("/players?limit=0")
+    assert resp.status == 400
+
+
+async def test_etag(control_server):
+    resp, _ = await get("/players?state=idle")
+    etag = resp.headers["ETag"]
+
+    resp, _ = await get("/players?state=idle", headers={"If-None-Match": etag})
+    assert resp.status == 304
+
+    control_server.player_service.version += 1
+    resp, data = await get("/players?state=idle", headers={"If-None-Match": etag})
+    assert resp.status == 200
+    assert len(data) == 5
+    assert resp.headers["ETag"] != etag
+
+
+async def test_profile(control_server):
+    resp, _ = await get("/profile")
+    assert resp.status == 404
+
+    control_server.profiler = Profiler(hz=1, max_stacks=10)
+    control_server.profiler._record("main;run")
+
+    async with aiohttp.ClientSession() as session:
+        async with session.get(f"http://{HOST}:{PORT}/profile?reset") as resp:
+            assert await resp.text() == "main;run 1\n"
+            assert resp.headers["X-Profile-Samples"] == "1"
+
+    assert control_server.profiler.folded() == ""
+
+
+async def test_slow_callbacks(control_server):
+    resp, _ = await get("/slow_callbacks")
+    assert resp.status == 404
+
+    control_server.loop_monitor = mock.Mock()
+    control_server.loop_monitor.slowest.return_value = [
+        SlowCallback("command_hello", 0.5, 100.0, ["lobbyconnection.py:1 in f"])
+    ]
+
+    _, data = await get("/slow_callbacks?limit=1")
+    assert data == [{
+        "name": "command_hello",
+        "duration": 0.5,
+        "time": 100.0,
+        "stack": ["lobbyconnection.py:1 in f"]
+    }]
+    control_server.loop_monitor.slowest.assert_called_once_with(1)
+
+
+async def test_ice_relay(control_server):
+    game_3, _, game_2 = control_server.game_service.all_games
+    game_3.ice_relay_stats.record(1, 2, 100)
+    for _ in range(2):
+        game_2.ice_relay_stats.record(3, 4, 50)
+
+    _, data = await get("/ice_relay")
+    assert [(g["game_id"], g["relayed"], g["bytes"]) for g in data] == [
+        (2, 2, 100), (3, 1, 100)
+    ]
+    assert data[0]["busiest_pairs"] == [[3, 4, 2]]
+
+    _, data = await get("/ice_relay?limit=1")
+    assert [g["game_id"] for g in data] == [2]
@@ -0,0 +1,56 @@
+import logging
+
+from sqlalchemy import select, text
+
+from server.config import config
+from server.db import query_name, stat_db_query
+from server.db.models import game_player_stats, game_stats, login
+
+
+def test_query_name_text():
+    assert query_name("SELECT id FROM login WHERE id = :id") == "select:login"
+    assert query_name(text("UPDATE `login` SET ip = :ip")) == "update:login"
+    assert query_name("INSERT INTO game_stats (id) VALUES (1)") == \
+        "insert:game_stats"
+    assert query_name("SELECT 1") == "select:none"
+
+
+def test_query_name_core():
+    assert query_name(login.update().values(ip="")) == "update:login"
+    assert query_name(game_stats.insert()) == "insert:game_stats"
+    assert query_name(game_stats.delete()) == "delete:game_stats"
+    assert query_name(
+        select(login.c.id).select_from(
+            login.join(
+                game_player_stats,
+                login.c.id == game_player_stats.c.playerId
+            )
+        )
+    ) == "select:login"
+
+
+def test_query_name_explicit():
+    assert query_name(
+        select(login.c.id),
+        {"query_name": "player_ids"}
+    ) == "player_ids"
+
+
+def test_stat_db_query_logs_slow_queries(monkeypatch, caplog):
+    monkeypatch.setattr(config, "DB_SLOW_QUERY_THRESHOLD", 0)
+
+    with caplog.at_level(logging.WARNING, logger="server.db"):
+        with stat_db_query("SELECT id FROM login"):
+            pass
+
+    assert "Slow query select:login" in caplog.text
+
+
+def test_stat_db_query_ignores_fast_queries(monkeypatch, caplog):
+    monkeypatch.setattr(config, "DB_SLOW_QUERY_THRESHOLD", 10)
+
+    with caplog.at_level(logging.WARNING, logger="server.db"):
+        with stat_db_query("SELECT id FROM login"):
+            pass
+
+    assert "Slow query" not in caplog.text
@@ -1,9 +1,11 @@
+import asyncio
 from unittest.mock import Mock
 
 import pytest
 from asynctest import CoroutineMock
 
 from server.api.api_accessor import ApiAccessor
+from server.config import config
 from server.stats.event_service import EventService
 
 pytestmark = pytest.mark.asyncio
@@ -15,7 +17,8 @@ def api_accessor():
 
 
 @pytest.fixture()
-def service(api_accessor: ApiAccessor):
+def service(api_accessor: ApiAccessor, monkeypatch):
+    monkeypatch.setattr(config, "API_UPDATE_BATCH_WINDOW", 0)
     return EventService(api_accessor)
 
 
@@ -75,4 +78,34 @@ async def test_record_multiple(service: EventService):
 
     assert result == events_data
 
-    service.api_accessor.update_events.assert_called_once_with(queue, 42)
+    service.api_accessor.update_events.assert_called_once_with([
+        dict(update, player_id=42) for update in queue
+    ])
+
+
+async def test_events_merged_across_players(service: EventService):
+    content = {
+        "data": [
+            {"attributes": {"eventId": "1-2-3", "currentCount": 10}},
+            {"attributes": {"eventId": "1-2-3", "currentCount": 4}},
+            {"attributes": {"eventId": "2-3-4", "currentCount": 7}}
+        ]
+    }
+    service.api_accessor.update_events = CoroutineMock(return_value=(200, content))
+
+    results = await asyncio.gather(
+        service.execute_batch_update(1, [dict(event_id="1-2-3", count=1)]),
+        service.execute_batch_update(2, [dict(event_id="1-2-3", count=4)]),
+        service.execute_batch_update(1, [dict(event_id="1-2-3", count=2)]),
+        service.execute_batch_update(3, [dict(event_id="2-3-4", count=7)])
+    )
+
+    service.api_accessor.update_events.assert_called_once_with([
+        dict(event_id="1-2-3", count=3, player_id=1),
+        dict(event_id="1-2-3", count=4, player_id=2),
+        dict(event_id="2-3-4", count=7, player_id=3)
+    ])
+    assert results[0] == [dict(event_id="1-2-3", count=10)]
+    assert results[2] == []
+    assert results[1] == [dict(event_id="1-2-3", count=4)]
+    assert results[3] == [dict(event_id="2-3-4", count=7)]
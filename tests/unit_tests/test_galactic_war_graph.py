@@ -0,0 +1,82 @@
+from server.factions import Faction
+from server.galactic_war.graph import UNREACHABLE, GalaxyGraph
+from server.galactic_war.state import GalacticWarState
+
+
+def line_galaxy(*controlled_by):
+    return GalacticWarState({
+        "node": [
+            dict({"id": 10 + i, "label": chr(ord("a") + i)}, **({"controlled_by": c} if c else {}))
+            for i, c in enumerate(controlled_by)
+        ],
+        "edge": [{"source": 10 + i, "target": 11 + i} for i in range(len(controlled_by) - 1)]
+    })
+
+
+def test_adjacency_ignores_duplicate_edges():
+    graph = GalaxyGraph([5, 6, 7], [(5, 6), (6, 5), (6, 7), (7, 7)])
+
+    assert graph.neighbours(graph.index_of[5]) == [graph.index_of[6]]
+    assert sorted(graph.neighbours(graph.index_of[6])) == [0, 2]
+    assert graph.neighbours(graph.index_of[7]) == [graph.index_of[6]]
+
+
+def test_distances():
+    graph = GalaxyGraph(range(5), [(0, 1), (1, 2), (0, 2), (2, 3)])
+
+    assert graph.distances(0) == [0, 1, 1, 2, UNREACHABLE]
+    assert graph.distances(0, allowed=lambda idx: idx != 2) == [0, 1, UNREACHABLE, UNREACHABLE, UNREACHABLE]
+    assert graph.reachable(4) == [False, False, False, False, True]
+    assert graph.reachable(0, allowed=lambda idx: idx != 0) == [False] * 5
+
+
+def test_farthest_pair():
+    graph = GalaxyGraph(range(6), [(0, 1), (1, 2), (2, 3), (1, 4), (4, 5)])
+
+    assert sorted(graph.farthest_pair()) in ([0, 3], [0, 5], [3, 5])
+
+
+def test_farthest_pair_tie_break():
+    # Same pair as the last of the networkx all pairs shortest paths sorted
+    # by length, so the capitals don't swap
+    assert GalaxyGraph(range(3), [(0, 1), (1, 2)]).farthest_pair() == (2, 0)
+    graph = GalaxyGraph(range(4), [(0, 1), (0, 2), (1, 3), (2, 3)])
+    assert graph.farthest_pair() == (3, 0)
+
+
+def test_capture_isolated_planets():
+    state = line_galaxy("arm", "arm", None, "arm", "core", "core")
+    state._planets_by_name["a"].set_capital_of(Faction.arm)
+    state._planets_by_name["f"].set_capital_of(Faction.core)
+    state = GalacticWarState(state.get_data())
+
+    assert state.capture_isolated_planets() == 1
+    assert state._planets_by_name["b"].get_controlled_by() == Faction.arm
+    assert state._planets_by_name["d"].get_controlled_by() == Faction.core
+    assert state.capture_isolated_planets() == 0
+
+
+def test_capture_isolated_planets_captured_capital():
+    state = line_galaxy("core", "arm", "arm", "core")
+    state._planets_by_name["a"].set_capital_of(Faction.arm)
+    state._planets_by_name["d"].set_capital_of(Faction.core)
+    state = GalacticWarState(state.get_data())
+
+    # arm lost its capital, and core's planet there is cut off by arm's planets
+    assert state.capture_isolated_planets() == 3
+    assert [p.get_controlled_by() for p in state._planets] == [
+        Faction.arm, Faction.core, Faction.core, Faction.core
+    ]
+
+
+def test_distribute_planets_to_factions():
+    state = line_galaxy("arm", None, None, None, "core")
+    state._planets_by_name["a"].set_capital_of(Faction.arm)
+    state._planets_by_name["e"].set_capital_of(Faction.core)
+    state = GalacticWarState(state.get_data())
+
+    state.distribute_planets_to_factions()
+
+    assert [p.get_controlled_by() for p in state._planets] == [
+        Faction.arm, Faction.arm, None, Faction.core, Faction.core
+    ]
@@ -0,0 +1,102 @@
+import json
+
+import pytest
+
+from server.galactic_war import persistence
+
+
+@pytest.fixture
+def data():
+    return {
+        "label": "scenario_0.gml",
+        "node": [
+            {"id": 0, "label": "a", "score": {"Arm": 100, "Core": 100}, "belligerents": {}},
+            {"id": 1, "label": "b", "score": {"Arm": 100, "Core": 100}, "belligerents": {}}
+        ],
+        "edge": [{"source": 0, "target": 1}]
+    }
+
+
+def planet(data, idx, **changes):
+    return dict(data["node"][idx], **changes)
+
+
+def test_snapshot_round_trip(tmp_path, data):
+    path = tmp_path / "state.json"
+
+    persistence.write_snapshot(path, persistence.copy_data(data), 7)
+    loaded = persistence.load_state(path)
+
+    assert loaded == (data, 7, 0)
+    assert "\n" not in path.read_text()
+    assert not path.with_suffix(".temp").exists()
+
+
+def test_copy_data_is_deep(data):
+    copy = persistence.copy_data(data)
+    data["node"][0]["score"]["Arm"] = 0
+
+    assert copy["node"][0]["score"]["Arm"] == 100
+
+
+def test_log_replayed_on_snapshot(tmp_path, data):
+    path = tmp_path / "state.json"
+    persistence.write_snapshot(path, persistence.copy_data(data), 2)
+    persistence.append_log(path, [
+        {"seq": 2, "planet": planet(data, 0, controlled_by="core")},
+        {"seq": 3, "planet": planet(data, 1, score={"Arm": 150, "Core": 50})}
+    ])
+    persistence.append_log(path, [
+        {"seq": 4, "planet": planet(data, 1, score={"Arm": 180, "Core": 20})}
+    ])
+
+    loaded = persistence.load_state(path)
+
+    # changes up to the snapshot's sequence number are already included
+    assert "controlled_by" not in loaded.data["node"][0]
+    assert loaded.data["node"][1]["score"] == {"Arm": 180, "Core": 20}
+    assert loaded.sequence == 4
+    assert loaded.log_entries == 2
+
+
+def test_torn_log_entry_ignored(tmp_path, data):
+    path = tmp_path / "state.json"
+    persistence.write_snapshot(path, persistence.copy_data(data), 0)
+    persistence.append_log(path, [
+        {"seq": 1, "planet": planet(data, 1, score={"Arm": 150, "Core": 50})}
+    ])
+    with open(persistence.get_log_path(path), "a") as fp:
+        fp.write(json.dumps({"seq": 2, "planet": planet(data, 1)})[:20])
+
+    loaded = persistence.load_state(path)
+
+    assert loaded.data["node"][1]["score"] == {"Arm": 150, "Core": 50}
+    assert loaded.sequence == 1
+
+
+def test_snapshot_discards_log(tmp_path, data):
+    path = tmp_path / "state.json"
+    persistence.append_log(path, [{"seq": 1, "planet": planet(data, 0)}])
+
+    persistence.write_snapshot(path, persistence.copy_data(data), 1)
+
+    assert not persistence.get_log_path(path).exists()
+
+
+def test_remove_state(tmp_path, data):
+    path = tmp_path / "state.json"
+    persistence.write_snapshot(path, persistence.copy_data(data), 0)
+    persistence.append_log(path, [{"seq": 1, "planet": planet(data, 0)}])
+
+    persistence.remove_state(path)
+    persistence.remove_state(path)
+
+    assert not path.exists()
+    assert not persistence.get_log_path(path).exists()
+
+
+def test_unsupported_file_type(tmp_path, data):
+    with pytest.raises(ValueError):
+        persistence.load_state(tmp_path / "state.yaml")
+    with pytest.raises(ValueError):
+        persistence.write_snapshot(tmp_path / "state.gml", data, 0)
@@ -8,6 +8,7 @@ from trueskill import Rating
 
 from server import GalacticWarService, config
 from server.factions import Faction
+from server.galactic_war import persistence
 from server.galactic_war.planet import Planet
 from server.galactic_war.state import InvalidGalacticWarGame, GalacticWarState
 from server.games.game_results import GameOutcome
@@ -44,10 +45,7 @@ async def galactic_war_service(rating_service, player_service, mock_ladder_servi
     config.GALACTIC_WAR_UPDATE_CRONTAB = ""
     config.GALACTIC_WAR_INITIALISE_ENSURE_RANKED_MAPS = False
     config.GALACTIC_WAR_MAX_SCORE = 20.
-    try:
-        Path(config.GALACTIC_WAR_STATE_FILE).unlink()
-    except IOError:
-        pass
+    persistence.remove_state(Path(config.GALACTIC_WAR_STATE_FILE))
 
     service = GalacticWarService(rating_service, player_service, mock_ladder_service)
     await service.initialize()
@@ -77,10 +75,7 @@ async def periodic_update_galactic_war_service(rating_service, player_service, m
     config.GALACTIC_WAR_UPDATE_CRONTAB = "* * * * * *"
     config.GALACTIC_WAR_INITIALISE_ENSURE_RANKED_MAPS = False
     config.GALACTIC_WAR_MAX_SCORE = 20.
-    try:
-        Path(config.GALACTIC_WAR_STATE_FILE).unlink()
-    except IOError:
-        pass
+    persistence.remove_state(Path(config.GALACTIC_WAR_STATE_FILE))
 
     service = GalacticWarService(rating_service, player_service, mock_ladder_service)
     await service.initialize()
@@ -309,6 +304,46 @@ async def test_process_game_still_contested(galactic_war_service, game_info):
     assert(service._state._planets_by_name["Gelidus"].get_controlled_by() == Faction.arm)
 
 
+async def test_process_game_appends_to_log(galactic_war_service, game_info, monkeypatch):
+    service = galactic_war_service
+    state_path = Path(config.GALACTIC_WAR_STATE_FILE)
+    snapshot = state_path.read_text()
+    old_ratings = {
+        1: RankedRating(1000., 10., 1, 100),
+        2: RankedRating(1000., 10., 4, 100),
+        3: RankedRating(1000., 10., 2, 100),
+        4: RankedRating(1000., 10., 3, 100)
+    }
+    new_ratings = {
+        1: Rating(1001., 10.),
+        2: Rating(1001., 10.),
+        3: Rating(999., 10.),
+        4: Rating(999., 10.)
+    }
+    team_outcome_likelihoods = {
+        1: OutcomeLikelihoods(0.45, 0.1, 0.45),
+        2: OutcomeLikelihoods(0.45, 0.1, 0.45),
+    }
+
+    await service.on_game_rating(game_info, old_ratings, new_ratings, team_outcome_likelihoods)
+
+    # the planet change is logged instead of rewriting the whole galaxy
+    assert(state_path.read_text() == snapshot)
+    assert(len(persistence.get_log_path(state_path).read_text().splitlines()) == 1)
+
+    saved_state = await service._do_load_state(state_path)
+    assert(saved_state._planets_by_name["Thalassean"].get_belligerent_score(1, Faction.core) > 0.)
+    assert(saved_state._planets_by_name["Thalassean"].get_belligerent_score(3, Faction.arm) < 0.)
+
+    monkeypatch.setattr(config, "GALACTIC_WAR_STATE_COMPACT_EVENTS", 2)
+    await service.on_game_rating(game_info, old_ratings, new_ratings, team_outcome_likelihoods)
+
+    assert(not persistence.get_log_path(state_path).exists())
+    saved_state = await service._do_load_state(state_path)
+    assert(saved_state._planets_by_name["Thalassean"].get_ro_scores() ==
+           service._state._planets_by_name["Thalassean"].get_ro_scores())
+
+
 async def test_process_game_captured(galactic_war_service, game_info):
     service = galactic_war_service
     old_ratings = {
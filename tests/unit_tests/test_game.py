@@ -682,6 +682,44 @@ async def test_persist_results_called_with_two_players(game, game_add_players):
             assert game.get_player_outcome(player) is ArmyOutcome.UNKNOWN
 
 
+async def test_results_persisted_when_game_not_live(game, game_add_players):
+    game.state = GameState.LOBBY
+    game_add_players(game, 2)
+    game.persist_results = CoroutineMock()
+    await game.add_result(0, 1, "victory", 5)
+
+    with pytest.raises(GameError):
+        await game.process_game_results()
+
+    game.persist_results.assert_called_once_with()
+
+
+async def test_game_results_written_to_outbox(game, game_add_players, mocker):
+    add = mocker.spy(game.game_service.game_results_outbox_service, "add")
+    game.state = GameState.LOBBY
+    game_add_players(game, 2)
+    await game.launch()
+    await game.add_result(0, 1, "victory", 5)
+    await game.on_game_end()
+
+    add.assert_called_once()
+    _, game_results = add.call_args.args
+    assert game_results.game_id == game.id
+
+
+async def test_game_results_persisted_with_scores(game, game_add_players):
+    game.state = GameState.LOBBY
+    game_add_players(game, 2)
+    await game.launch()
+    game.persist_results = CoroutineMock()
+    await game.add_result(0, 1, "victory", 5)
+    await game.on_game_end()
+
+    game.persist_results.assert_called_once()
+    game_results, = game.persist_results.call_args.args
+    assert game_results.game_id == game.id
+
+
 async def test_persist_results_called_for_unranked(game, game_add_players):
     game.state = GameState.LOBBY
     game_add_players(game, 2)
@@ -0,0 +1,170 @@
+import asyncio
+from unittest import mock
+
+import pytest
+from asynctest import CoroutineMock
+
+from server.config import config
+from server.game_results_outbox_service import GameResultsOutboxService
+from server.games.typedefs import EndedGameInfo, ValidityState
+
+pytestmark = pytest.mark.asyncio
+
+
+def make_game_results(game_id):
+    return EndedGameInfo(
+        game_id=game_id,
+        rating_type="global",
+        map_id=1,
+        map_name="SHERWOOD",
+        game_mode="tacc",
+        galactic_war_planet_name=None,
+        mods=[],
+        commander_kills={},
+        validity=ValidityState.VALID,
+        ended_game_player_summary=[]
+    )
+
+
+def confirmed(result):
+    future = asyncio.get_running_loop().create_future()
+    future.set_result(result)
+    return future
+
+
+@pytest.fixture
+def message_queue_service():
+    service = mock.Mock(is_ready=True)
+    service.publish = CoroutineMock(side_effect=lambda *args, **kwargs: confirmed(True))
+    service.declare_exchange = CoroutineMock()
+    return service
+
+
+@pytest.fixture
+async def outbox_service(database, message_queue_service):
+    service = GameResultsOutboxService(database, message_queue_service)
+    await service.initialize()
+    async with database.acquire() as conn:
+        await conn.execute("DELETE FROM game_results_outbox")
+
+    yield service
+
+    await service.shutdown()
+
+
+async def outbox_game_ids(database):
+    async with database.acquire() as conn:
+        result = await conn.execute(
+            "SELECT game_id FROM game_results_outbox ORDER BY id"
+        )
+        return [row.game_id for row in result.fetchall()]
+
+
+async def add(database, outbox_service, game_id):
+    async with database.acquire() as conn:
+        await outbox_service.add(conn, make_game_results(game_id))
+
+
+async def test_relay(database, outbox_service, message_queue_service):
+    for game_id in (1, 2):
+        await add(database, outbox_service, game_id)
+
+    await outbox_service.relay()
+
+    assert await outbox_game_ids(database) == []
+    assert message_queue_service.publish.call_count == 2
+    (_, routing, payload), kwargs = message_queue_service.publish.call_args
+    assert routing == "success.gameResults.create"
+    assert payload["game_id"] == 2
+    assert kwargs["message_id"]
+
+
+async def test_relay_keeps_unconfirmed(
+    database,
+    outbox_service,
+    message_queue_service
+):
+    message_queue_service.publish.side_effect = [
+        confirmed(True),
+        confirmed(False)
+    ]
+    for game_id in (1, 2):
+        await add(database, outbox_service, game_id)
+
+    await outbox_service.relay()
+
+    assert await outbox_game_ids(database) == [2]
+
+
+async def test_relay_gives_up_waiting_for_confirms(
+    database,
+    outbox_service,
+    message_queue_service,
+    monkeypatch
+):
+    monkeypatch.setattr(config, "GAME_RESULTS_OUTBOX_CONFIRM_TIMEOUT", 0.1)
+    message_queue_service.publish.side_effect = [
+        confirmed(True),
+        asyncio.get_running_loop().create_future()
+    ]
+    for game_id in (1, 2):
+        await add(database, outbox_service, game_id)
+
+    await asyncio.wait_for(outbox_service.relay(), 5)
+
+    assert await outbox_game_ids(database) == [2]
+
+
+async def test_relay_reuses_message_id(
+    database,
+    outbox_service,
+    message_queue_service
+):
+    message_queue_service.publish.side_effect = lambda *args, **kwargs: confirmed(False)
+    await add(database, outbox_service, 1)
+
+    await outbox_service.relay()
+    await outbox_service.relay()
+
+    first, second = message_queue_service.publish.call_args_list
+    assert first.kwargs["message_id"] == second.kwargs["message_id"]
+
+
+async def test_relay_waits_for_connection(
+    database,
+    outbox_service,
+    message_queue_service
+):
+    message_queue_service.is_ready = False
+    await add(database, outbox_service, 1)
+
+    await outbox_service.relay()
+
+    message_queue_service.publish.assert_not_called()
+    assert await outbox_game_ids(database) == [1]
+
+
+async def test_results_are_rolled_back_with_transaction(
+    database,
+    outbox_service
+):
+    with pytest.raises(RuntimeError):
+        async with database.acquire() as conn:
+            await outbox_service.add(conn, make_game_results(1))
+            raise RuntimeError()
+
+    assert await outbox_game_ids(database) == []
+
+
+async def test_shutdown_cancels_relay_soon(message_queue_service):
+    service = GameResultsOutboxService(mock.Mock(), message_queue_service)
+    service.relay = CoroutineMock(side_effect=lambda: asyncio.sleep(60))
+
+    service.relay_soon()
+    assert len(service._tasks) == 1
+    task, = service._tasks
+    await asyncio.sleep(0)
+    await service.shutdown()
+
+    assert task.cancelled()
+    assert not service._tasks
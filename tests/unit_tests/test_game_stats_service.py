@@ -15,6 +15,7 @@ from server.games.game_results import (
 from server.lobbyconnection import LobbyConnection
 from server.stats import achievement_service as ach
 from server.stats import event_service as ev
+from server.stats import rules
 from server.stats.game_stats_service import GameStatsService
 
 pytestmark = pytest.mark.asyncio
@@ -279,363 +280,201 @@ async def test_process_game_won_ladder1v1(
     achievement_service.unlock.assert_any_call(ach.ACH_FIRST_SUCCESS, [])
 
 
-async def test_category_stats_won_more_air(
-    game_stats_service, achievement_service, unit_stats
-):
+def army(survived=False, scored_highest=False, humans=2, faction=None, unit_stats=None, **counters):
+    return rules.ArmyContext(
+        dict(rules.count({}, unit_stats or {}), **counters), faction, survived, True, scored_highest, humans
+    )
+
+
+def unlocked(ctx, group="units"):
+    return [
+        target for action, target, _ in rules.evaluate(ctx, [group])
+        if action == rules.UNLOCK
+    ]
+
+
+def achievements(ctx, group):
+    return [update for update in rules.evaluate(ctx, [group]) if update.action != rules.RECORD_EVENT]
+
+
+def events(ctx, group):
+    return [update for update in rules.evaluate(ctx, [group]) if update.action == rules.RECORD_EVENT]
+
+
+async def test_category_stats_won_more_air(unit_stats):
     unit_stats["air"]["built"] = 3
     unit_stats["land"]["built"] = 2
     unit_stats["naval"]["built"] = 1
 
-    game_stats_service._category_stats(unit_stats, True, [], [])
-
-    achievement_service.increment.assert_any_call(
-        ach.ACH_WRIGHT_BROTHER, 1, []
-    )
-    achievement_service.increment.assert_any_call(ach.ACH_WINGMAN, 1, [])
-    achievement_service.increment.assert_any_call(
-        ach.ACH_KING_OF_THE_SKIES, 1, []
-    )
-    assert len(achievement_service.mock_calls) == 3
+    assert achievements(army(survived=True, unit_stats=unit_stats), "category") == [
+        rules.Update(rules.INCREMENT, ach.ACH_WRIGHT_BROTHER, 1),
+        rules.Update(rules.INCREMENT, ach.ACH_WINGMAN, 1),
+        rules.Update(rules.INCREMENT, ach.ACH_KING_OF_THE_SKIES, 1)
+    ]
 
 
-async def test_category_stats_won_more_land(
-    game_stats_service, achievement_service, unit_stats
-):
+async def test_category_stats_won_more_land(unit_stats):
     unit_stats["air"]["built"] = 2
     unit_stats["land"]["built"] = 3
     unit_stats["naval"]["built"] = 1
 
-    game_stats_service._category_stats(unit_stats, True, [], [])
-
-    achievement_service.increment.assert_any_call(ach.ACH_MILITIAMAN, 1, [])
-    achievement_service.increment.assert_any_call(ach.ACH_GRENADIER, 1, [])
-    achievement_service.increment.assert_any_call(ach.ACH_FIELD_MARSHAL, 1, [])
-    assert len(achievement_service.mock_calls) == 3
+    assert achievements(army(survived=True, unit_stats=unit_stats), "category") == [
+        rules.Update(rules.INCREMENT, ach.ACH_MILITIAMAN, 1),
+        rules.Update(rules.INCREMENT, ach.ACH_GRENADIER, 1),
+        rules.Update(rules.INCREMENT, ach.ACH_FIELD_MARSHAL, 1)
+    ]
 
 
-async def test_category_stats_won_more_naval(
-    game_stats_service, achievement_service, unit_stats
-):
+async def test_category_stats_won_more_naval(unit_stats):
     unit_stats["air"]["built"] = 2
     unit_stats["land"]["built"] = 1
     unit_stats["naval"]["built"] = 3
 
-    game_stats_service._category_stats(unit_stats, True, [], [])
-
-    achievement_service.increment.assert_any_call(ach.ACH_LANDLUBBER, 1, [])
-    achievement_service.increment.assert_any_call(ach.ACH_SEAMAN, 1, [])
-    achievement_service.increment.assert_any_call(
-        ach.ACH_ADMIRAL_OF_THE_FLEET, 1, []
-    )
-    assert len(achievement_service.mock_calls) == 3
+    assert achievements(army(survived=True, unit_stats=unit_stats), "category") == [
+        rules.Update(rules.INCREMENT, ach.ACH_LANDLUBBER, 1),
+        rules.Update(rules.INCREMENT, ach.ACH_SEAMAN, 1),
+        rules.Update(rules.INCREMENT, ach.ACH_ADMIRAL_OF_THE_FLEET, 1)
+    ]
 
 
-async def test_category_stats_won_more_naval_and_one_experimental(
-    game_stats_service, achievement_service, unit_stats
-):
+async def test_category_stats_won_more_naval_and_one_experimental(unit_stats):
     unit_stats["air"]["built"] = 2
     unit_stats["land"]["built"] = 1
     unit_stats["naval"]["built"] = 3
     unit_stats["experimental"]["built"] = 1
 
-    game_stats_service._category_stats(unit_stats, True, [], [])
-
-    achievement_service.increment.assert_any_call(ach.ACH_LANDLUBBER, 1, [])
-    achievement_service.increment.assert_any_call(ach.ACH_SEAMAN, 1, [])
-    achievement_service.increment.assert_any_call(
-        ach.ACH_ADMIRAL_OF_THE_FLEET, 1, []
-    )
-    achievement_service.increment.assert_any_call(ach.ACH_DR_EVIL, 1, [])
-
-    assert len(achievement_service.mock_calls) == 4
+    assert achievements(army(survived=True, unit_stats=unit_stats), "category") == [
+        rules.Update(rules.INCREMENT, ach.ACH_LANDLUBBER, 1),
+        rules.Update(rules.INCREMENT, ach.ACH_SEAMAN, 1),
+        rules.Update(rules.INCREMENT, ach.ACH_ADMIRAL_OF_THE_FLEET, 1),
+        rules.Update(rules.INCREMENT, ach.ACH_DR_EVIL, 1)
+    ]
 
 
-async def test_category_stats_won_more_naval_and_three_experimentals(
-    game_stats_service, achievement_service, unit_stats
-):
+async def test_category_stats_won_more_naval_and_three_experimentals(unit_stats):
     unit_stats["air"]["built"] = 2
     unit_stats["land"]["built"] = 1
     unit_stats["naval"]["built"] = 3
     unit_stats["experimental"]["built"] = 3
 
-    game_stats_service._category_stats(unit_stats, True, [], [])
+    assert achievements(army(survived=True, unit_stats=unit_stats), "category") == [
+        rules.Update(rules.INCREMENT, ach.ACH_LANDLUBBER, 1),
+        rules.Update(rules.INCREMENT, ach.ACH_SEAMAN, 1),
+        rules.Update(rules.INCREMENT, ach.ACH_ADMIRAL_OF_THE_FLEET, 1),
+        rules.Update(rules.INCREMENT, ach.ACH_DR_EVIL, 3),
+        rules.Update(rules.INCREMENT, ach.ACH_TECHIE, 1),
+        rules.Update(rules.INCREMENT, ach.ACH_I_LOVE_BIG_TOYS, 1),
+        rules.Update(rules.INCREMENT, ach.ACH_EXPERIMENTALIST, 1)
+    ]
 
-    achievement_service.increment.assert_any_call(ach.ACH_LANDLUBBER, 1, [])
-    achievement_service.increment.assert_any_call(ach.ACH_SEAMAN, 1, [])
-    achievement_service.increment.assert_any_call(
-        ach.ACH_ADMIRAL_OF_THE_FLEET, 1, []
-    )
-
-    achievement_service.increment.assert_any_call(ach.ACH_DR_EVIL, 3, [])
-    achievement_service.increment.assert_any_call(ach.ACH_TECHIE, 1, [])
-    achievement_service.increment.assert_any_call(
-        ach.ACH_I_LOVE_BIG_TOYS, 1, []
-    )
-    achievement_service.increment.assert_any_call(
-        ach.ACH_EXPERIMENTALIST, 1, []
-    )
-    assert len(achievement_service.mock_calls) == 7
-
-
-async def test_faction_played_gok_survived(
-    game_stats_service, achievement_service, event_service
-):
-    game_stats_service._faction_played(Faction.gok, True, [], [])
-
-    event_service.record_event.assert_any_call(ev.EVENT_GOK_PLAYS, 1, [])
-    event_service.record_event.assert_any_call(ev.EVENT_GOK_WINS, 1, [])
-    achievement_service.increment.assert_any_call(ach.ACH_AURORA, 1, [])
-    achievement_service.increment.assert_any_call(ach.ACH_BLAZE, 1, [])
-    achievement_service.increment.assert_any_call(ach.ACH_SERENITY, 1, [])
-    assert len(event_service.mock_calls) == 2
-    assert len(achievement_service.mock_calls) == 3
-
-
-async def test_faction_played_gok_died(game_stats_service, event_service):
-    game_stats_service._faction_played(Faction.gok, False, [], [])
-
-    event_service.record_event.assert_called_once_with(
-        ev.EVENT_GOK_PLAYS, 1, []
-    )
-    assert len(event_service.mock_calls) == 1
-
-
-async def test_faction_played_arm_survived(
-    game_stats_service, achievement_service, event_service
-):
-    game_stats_service._faction_played(Faction.arm, True, [], [])
-
-    event_service.record_event.assert_any_call(ev.EVENT_ARM_PLAYS, 1, [])
-    event_service.record_event.assert_any_call(ev.EVENT_ARM_WINS, 1, [])
-    achievement_service.increment.assert_any_call(ach.ACH_MANTIS, 1, [])
-    achievement_service.increment.assert_any_call(ach.ACH_WAGNER, 1, [])
-    achievement_service.increment.assert_any_call(ach.ACH_TREBUCHET, 1, [])
-    assert len(event_service.mock_calls) == 2
-    assert len(achievement_service.mock_calls) == 3
-
-
-async def test_faction_played_arm_died(game_stats_service, event_service):
-    game_stats_service._faction_played(Faction.arm, False, [], [])
-
-    event_service.record_event.assert_called_once_with(
-        ev.EVENT_ARM_PLAYS, 1, []
-    )
-    assert len(event_service.mock_calls) == 1
-
-
-async def test_faction_played_core_survived(
-    game_stats_service, achievement_service, event_service
-):
-    game_stats_service._faction_played(Faction.core, True, [], [])
-
-    event_service.record_event.assert_any_call(ev.EVENT_CORE_PLAYS, 1, [])
-    event_service.record_event.assert_any_call(ev.EVENT_CORE_WINS, 1, [])
-    achievement_service.increment.assert_any_call(ach.ACH_MA12_STRIKER, 1, [])
-    achievement_service.increment.assert_any_call(ach.ACH_RIPTIDE, 1, [])
-    achievement_service.increment.assert_any_call(ach.ACH_DEMOLISHER, 1, [])
-    assert len(event_service.mock_calls) == 2
-    assert len(achievement_service.mock_calls) == 3
-
-
-async def test_faction_played_core_died(game_stats_service, event_service):
-    game_stats_service._faction_played(Faction.core, False, [], [])
-
-    event_service.record_event.assert_called_once_with(
-        ev.EVENT_CORE_PLAYS, 1, []
-    )
-    assert len(event_service.mock_calls) == 1
 
+async def test_category_stats_died(unit_stats):
+    unit_stats["air"]["built"] = 3
+    unit_stats["experimental"]["built"] = 3
 
-async def test_killed_acus_none_and_survived(
-    game_stats_service, achievement_service, event_service, unit_stats
-):
+    assert achievements(army(survived=False, unit_stats=unit_stats), "category") == []
+
+
+@pytest.mark.parametrize("faction,plays,wins,faction_achievements", [
+    (Faction.gok, ev.EVENT_GOK_PLAYS, ev.EVENT_GOK_WINS,
+     [ach.ACH_AURORA, ach.ACH_BLAZE, ach.ACH_SERENITY]),
+    (Faction.arm, ev.EVENT_ARM_PLAYS, ev.EVENT_ARM_WINS,
+     [ach.ACH_MANTIS, ach.ACH_WAGNER, ach.ACH_TREBUCHET]),
+    (Faction.core, ev.EVENT_CORE_PLAYS, ev.EVENT_CORE_WINS,
+     [ach.ACH_MA12_STRIKER, ach.ACH_RIPTIDE, ach.ACH_DEMOLISHER]),
+])
+async def test_faction_played(faction, plays, wins, faction_achievements):
+    survived = army(survived=True, faction=faction)
+    assert events(survived, "faction") == [
+        rules.Update(rules.RECORD_EVENT, plays, 1),
+        rules.Update(rules.RECORD_EVENT, wins, 1)
+    ]
+    assert achievements(survived, "faction") == [
+        rules.Update(rules.INCREMENT, achievement, 1)
+        for achievement in faction_achievements
+    ]
+
+    died = army(survived=False, faction=faction)
+    assert rules.evaluate(died, ["faction"]) == [
+        rules.Update(rules.RECORD_EVENT, plays, 1)
+    ]
+
+
+async def test_killed_acus_none_and_survived(unit_stats):
     unit_stats["cdr"]["kills"] = 0
 
-    game_stats_service._killed_acus(unit_stats, True, [])
-
-    assert len(achievement_service.mock_calls) == 0
-    assert len(event_service.mock_calls) == 0
+    assert rules.evaluate(army(survived=True, unit_stats=unit_stats), ["killed_acus"]) == []
 
 
-async def test_killed_acus_one_and_survived(
-    game_stats_service, achievement_service, event_service, unit_stats
-):
+async def test_killed_acus_one_and_survived(unit_stats):
     unit_stats["cdr"]["kills"] = 1
-    game_stats_service._killed_acus(unit_stats, True, [])
 
-    achievement_service.increment.assert_called_once_with(
-        ach.ACH_DONT_MESS_WITH_ME, 1, []
-    )
-    assert len(achievement_service.mock_calls) == 1
-    assert len(event_service.mock_calls) == 0
+    assert rules.evaluate(army(survived=True, unit_stats=unit_stats), ["killed_acus"]) == [
+        rules.Update(rules.INCREMENT, ach.ACH_DONT_MESS_WITH_ME, 1)
+    ]
 
 
-async def test_killed_acus_three_and_survived(
-    game_stats_service, achievement_service, event_service, unit_stats
-):
+async def test_killed_acus_three_and_survived(unit_stats):
     unit_stats["cdr"]["kills"] = 3
-    game_stats_service._killed_acus(unit_stats, True, [])
 
-    achievement_service.increment.assert_called_once_with(
-        ach.ACH_DONT_MESS_WITH_ME, 3, []
-    )
-    achievement_service.unlock.assert_called_once_with(ach.ACH_HATTRICK, [])
-    assert len(achievement_service.mock_calls) == 2
-    assert len(event_service.mock_calls) == 0
+    assert rules.evaluate(army(survived=True, unit_stats=unit_stats), ["killed_acus"]) == [
+        rules.Update(rules.INCREMENT, ach.ACH_DONT_MESS_WITH_ME, 3),
+        rules.Update(rules.UNLOCK, ach.ACH_HATTRICK, 1)
+    ]
 
 
-async def test_killed_acus_one_and_died(
-    game_stats_service, achievement_service, event_service, unit_stats
-):
+async def test_killed_acus_one_and_died(unit_stats):
     unit_stats["cdr"]["kills"] = 1
     unit_stats["cdr"]["lost"] = 1
-    game_stats_service._killed_acus(unit_stats, False, [])
 
-    achievement_service.increment.assert_called_once_with(
-        ach.ACH_DONT_MESS_WITH_ME, 1, []
-    )
-    assert len(achievement_service.mock_calls) == 1
-    assert len(event_service.mock_calls) == 0
+    assert rules.evaluate(army(survived=False, unit_stats=unit_stats), ["killed_acus"]) == [
+        rules.Update(rules.INCREMENT, ach.ACH_DONT_MESS_WITH_ME, 1)
+    ]
 
 
-async def test_killed_acus_three_and_died(
-    game_stats_service, achievement_service, event_service, unit_stats
-):
+async def test_killed_acus_three_and_died(unit_stats):
     unit_stats["cdr"]["kills"] = 3
     unit_stats["cdr"]["lost"] = 1
 
-    game_stats_service._killed_acus(unit_stats, False, [])
-    achievement_service.increment.assert_called_once_with(
-        ach.ACH_DONT_MESS_WITH_ME, 3, [])
-
-    assert len(achievement_service.mock_calls) == 1
-    assert len(event_service.mock_calls) == 0
-
-
-async def test_built_salvations_one_and_died(
-    game_stats_service, achievement_service, event_service
-):
-    game_stats_service._built_salvations(1, False, [])
-    assert len(achievement_service.mock_calls) == 0
-    assert len(event_service.mock_calls) == 0
-
-
-async def test_built_salvations_one_and_survived(
-    game_stats_service, achievement_service, event_service
-):
-    game_stats_service._built_salvations(1, True, [])
-    achievement_service.unlock.assert_called_once_with(ach.ACH_RAINMAKER, [])
-    assert len(event_service.mock_calls) == 0
-
-
-async def test_built_yolona_oss_one_and_died(
-    game_stats_service, achievement_service, event_service
-):
-    game_stats_service._built_yolona_oss(1, False, [])
-    assert len(achievement_service.mock_calls) == 0
-    assert len(event_service.mock_calls) == 0
-
-
-async def test_built_yolona_oss_one_and_survived(
-    game_stats_service, achievement_service, event_service
-):
-    game_stats_service._built_yolona_oss(1, True, [])
-    achievement_service.unlock.assert_called_once_with(ach.ACH_NUCLEAR_WAR, [])
-    assert len(event_service.mock_calls) == 0
-
-
-async def test_built_paragons_one_and_died(
-    game_stats_service, achievement_service, event_service
-):
-    game_stats_service._built_paragons(1, False, [])
-    assert len(achievement_service.mock_calls) == 0
-    assert len(event_service.mock_calls) == 0
-
+    assert rules.evaluate(army(survived=False, unit_stats=unit_stats), ["killed_acus"]) == [
+        rules.Update(rules.INCREMENT, ach.ACH_DONT_MESS_WITH_ME, 3)
+    ]
 
-async def test_built_paragons_one_and_survived(
-    game_stats_service, achievement_service, event_service
-):
-    game_stats_service._built_paragons(1, True, [])
-    achievement_service.unlock.assert_called_once_with(
-        ach.ACH_SO_MUCH_RESOURCES, []
-    )
-    assert len(event_service.mock_calls) == 0
 
+@pytest.mark.parametrize("counter,achievement", [
+    ("built_salvations", ach.ACH_RAINMAKER),
+    ("built_yolona_oss", ach.ACH_NUCLEAR_WAR),
+    ("built_paragons", ach.ACH_SO_MUCH_RESOURCES),
+    ("built_scathis", ach.ACH_MAKE_IT_HAIL),
+    ("built_mavors", ach.ACH_I_HAVE_A_CANON),
+])
+async def test_built_one_unlocks_only_if_survived(counter, achievement):
+    assert unlocked(army(survived=False, **{counter: 1})) == []
+    assert unlocked(army(survived=True, **{counter: 1})) == [achievement]
+    assert unlocked(army(survived=True, **{counter: 0})) == []
 
-async def test_built_scathis_one_and_died(
-    game_stats_service, achievement_service, event_service
-):
-    game_stats_service._built_scathis(1, False, [])
-    assert len(achievement_service.mock_calls) == 0
-    assert len(event_service.mock_calls) == 0
 
+async def test_lowest_acu_health_zero_died():
+    assert unlocked(army(survived=False, acu_lowest_health=0)) == []
 
-async def test_built_scathis_one_and_survived(
-    game_stats_service, achievement_service, event_service
-):
-    game_stats_service._built_scathis(1, True, [])
-    achievement_service.unlock.assert_called_once_with(
-        ach.ACH_MAKE_IT_HAIL, []
-    )
-    assert len(event_service.mock_calls) == 0
 
+async def test_lowest_acu_health_499_survived():
+    assert unlocked(army(survived=True, acu_lowest_health=499)) == [ach.ACH_THAT_WAS_CLOSE]
 
-async def test_built_mavors_one_and_died(
-    game_stats_service, achievement_service, event_service
-):
-    game_stats_service._built_mavors(1, False, [])
-    assert len(achievement_service.mock_calls) == 0
-    assert len(event_service.mock_calls) == 0
 
+async def test_lowest_acu_health_500_survived():
+    assert unlocked(army(survived=True, acu_lowest_health=500)) == []
 
-async def test_built_mavors_one_and_survived(
-    game_stats_service, achievement_service, event_service
-):
-    game_stats_service._built_mavors(1, True, [])
-    achievement_service.unlock.assert_called_once_with(
-        ach.ACH_I_HAVE_A_CANON, []
-    )
-    assert len(event_service.mock_calls) == 0
-
-
-async def test_lowest_acu_health_zero_died(
-    game_stats_service, achievement_service, event_service
-):
-    game_stats_service._lowest_acu_health(0, False, [])
-    assert len(achievement_service.mock_calls) == 0
-    assert len(event_service.mock_calls) == 0
-
-
-async def test_lowest_acu_health_499_survived(
-    game_stats_service, achievement_service, event_service
-):
-    game_stats_service._lowest_acu_health(499, True, [])
-    achievement_service.unlock.assert_called_once_with(
-        ach.ACH_THAT_WAS_CLOSE, []
-    )
-    assert len(event_service.mock_calls) == 0
-
-
-async def test_lowest_acu_health_500_survived(
-    game_stats_service, achievement_service, event_service
-):
-    game_stats_service._lowest_acu_health(500, True, [])
-    assert len(achievement_service.mock_calls) == 0
-    assert len(event_service.mock_calls) == 0
-
-
-async def test_top_score_7_players(game_stats_service, achievement_service):
-    game_stats_service._highscore(True, 7, [])
-
-    assert len(achievement_service.mock_calls) == 0
 
+async def test_top_score_7_players():
+    assert rules.evaluate(army(scored_highest=True, humans=7), ["score"]) == []
 
-async def test_top_score_8_players(game_stats_service, achievement_service):
-    game_stats_service._highscore(True, 8, [])
 
-    achievement_service.unlock.assert_any_call(ach.ACH_TOP_SCORE, [])
-    achievement_service.increment.assert_any_call(ach.ACH_UNBEATABLE, 1, [])
-    assert len(achievement_service.mock_calls) == 2
+async def test_top_score_8_players():
+    assert rules.evaluate(army(scored_highest=True, humans=8), ["score"]) == [
+        rules.Update(rules.UNLOCK, ach.ACH_TOP_SCORE, 1),
+        rules.Update(rules.INCREMENT, ach.ACH_UNBEATABLE, 1)
+    ]
 
 
 async def test_process_game_stats_abort_processing_if_no_army_result(
@@ -493,14 +493,15 @@ async def test_handle_action_IceMsg(
     player_factory
 ):
     peer = player_factory(player_id=2)
-    peer.game_connection = asynctest.create_autospec(GameConnection)
+    # Keep a reference, the player only holds a weak one
+    peer_connection = mock.Mock()
+    peer.game_connection = peer_connection
     player_service[peer.id] = peer
     await game_connection.handle_action("IceMsg", [2, "the message"])
 
-    peer.game_connection.send.assert_called_once_with({
-        "command": "IceMsg",
-        "args": [game_connection.player.id, "the message"]
-    })
+    peer_connection.ice_relay.relay.assert_called_once_with(
+        game_connection.player.id, "the message"
+    )
 
 
 async def test_handle_action_IceMsg_for_non_existent_player(
@@ -1,6 +1,17 @@
+import json
+import os
+
 import pytest
 
-from server.games import CustomGame, Game, LadderGame, VisibilityState
+from server.config import config
+from server.game_service import read_replay_metadata
+from server.games import (
+    CustomGame,
+    Game,
+    LadderGame,
+    ValidityState,
+    VisibilityState
+)
 from server.players import PlayerState
 
 pytestmark = pytest.mark.asyncio
@@ -66,3 +77,158 @@ async def test_create_game_other_gamemode(players, game_service):
     assert game in game_service.dirty_games
     assert isinstance(game, Game)
     assert game.game_mode == "labwars"
+
+
+def write_replay_metadata(replay_dir, game_id, **kwargs):
+    data = {
+        "gameId": game_id,
+        "taVersionMajor": 3,
+        "taVersionMinor": 1,
+        "unitsHash": "units_hash",
+        "taMapHash": "map_hash",
+        "players": [],
+        **kwargs
+    }
+    path = replay_dir / f"{game_id}.json"
+    path.write_text(json.dumps(data))
+    return path
+
+
+@pytest.fixture
+def replay_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(config, "REPLAY_DIR", str(tmp_path))
+    return tmp_path
+
+
+async def test_process_replay_metadata(game_service, database, replay_dir):
+    paths = [
+        write_replay_metadata(replay_dir, game_id)
+        for game_id in (1, 41935, 41936)
+    ]
+
+    await game_service.process_replay_metadata()
+
+    assert not any(path.exists() for path in paths)
+    assert game_service._pending_replay_metadata == {}
+
+    async with database.acquire() as conn:
+        result = await conn.execute(
+            "SELECT id, replay_meta FROM game_stats WHERE id IN (1, 41935)"
+        )
+        for row in result:
+            assert json.loads(row.replay_meta)["gameId"] == row.id
+
+        result = await conn.execute(
+            "SELECT observation_count FROM game_featuredMods_version "
+            "WHERE game_featuredMods_id = 6 AND ta_hash = 'units_hash'"
+        )
+        # Game 41935 has no map so only two games were counted
+        assert result.scalar() == 2
+
+        result = await conn.execute(
+            "SELECT ta_hash FROM map_version WHERE id = 1"
+        )
+        assert result.scalar() == "map_hash"
+
+
+async def test_process_replay_metadata_retries_running_games(
+    game_service,
+    players,
+    replay_dir
+):
+    game = game_service.create_game(
+        visibility=VisibilityState.PUBLIC,
+        game_mode="faf",
+        host=players.hosting,
+        name="Test",
+        mapname="SCMP_007",
+        password=None
+    )
+    pending = write_replay_metadata(replay_dir, game.id)
+    unknown = write_replay_metadata(replay_dir, 999999)
+    done = write_replay_metadata(replay_dir, 1)
+
+    await game_service.process_replay_metadata()
+
+    # The unknown game does not hold up the rest of the backlog
+    assert not unknown.exists()
+    assert not done.exists()
+    assert pending.exists()
+    assert list(game_service._pending_replay_metadata) == [str(pending)]
+    assert game_service._pending_replay_metadata[str(pending)].attempts == 1
+
+    await game_service.process_replay_metadata()
+    assert game_service._pending_replay_metadata[str(pending)].attempts == 2
+
+
+async def test_process_replay_metadata_invalid_file(game_service, replay_dir):
+    path = replay_dir / "1.json"
+    path.write_text("{not json")
+
+    await game_service.process_replay_metadata()
+
+    # Might still be in the process of being written
+    assert path.exists()
+    assert game_service._pending_replay_metadata == {}
+
+
+def test_read_replay_metadata_rejects_old_unreadable_files(tmp_path):
+    good = write_replay_metadata(tmp_path, 1)
+    fresh = tmp_path / "2.json"
+    fresh.write_text("{not json")
+    old = tmp_path / "3.json"
+    old.write_text(json.dumps({"players": []}))
+    os.utime(old, (0, 0))
+
+    result = read_replay_metadata(str(tmp_path), set(), reject_age=60)
+
+    assert [metadata.path for metadata in result.metadata] == [str(good)]
+    assert [path for path, _ in result.errors] == [str(fresh)]
+    assert [path for path, _ in result.rejected] == [str(old)]
+
+
+async def test_process_replay_metadata_rejects_unreadable_file(game_service, replay_dir):
+    path = replay_dir / "1.json"
+    path.write_text("{not json")
+    os.utime(path, (0, 0))
+
+    await game_service.process_replay_metadata()
+
+    assert not path.exists()
+    assert (replay_dir / "rejected" / "1.json").exists()
+
+
+async def test_process_replay_metadata_rejects_unwritable_file(game_service, replay_dir, mocker):
+    write = game_service._write_replay_metadata
+
+    async def write_replay_metadata_unless_bad(conn, writes):
+        if any(w.metadata.game_id == 41935 for w in writes):
+            raise ValueError("bad row")
+        await write(conn, writes)
+
+    mocker.patch.object(game_service, "_write_replay_metadata", write_replay_metadata_unless_bad)
+    good = write_replay_metadata(replay_dir, 1)
+    bad = write_replay_metadata(replay_dir, 41935)
+
+    await game_service.process_replay_metadata()
+
+    assert not good.exists()
+    assert not bad.exists()
+    assert (replay_dir / "rejected" / "41935.json").exists()
+    assert game_service._pending_replay_metadata == {}
+
+
+async def test_process_replay_metadata_cheats(game_service, players, replay_dir):
+    game = game_service.create_game(
+        visibility=VisibilityState.PUBLIC,
+        game_mode="faf",
+        host=players.hosting,
+        name="Test",
+        mapname="SCMP_007",
+        password=None
+    )
+    write_replay_metadata(replay_dir, game.id, cheatsEnabled=True)
+
+    await game_service.process_replay_metadata()
+
+    assert game.validity is ValidityState.CHEATS_ENABLED
@@ -0,0 +1,96 @@
+import aiohttp
+import pytest
+from aiohttp import web
+
+from server.http_client_service import USER_AGENT, HttpClientService
+
+pytestmark = pytest.mark.asyncio
+
+PORT = 8138
+
+
+@pytest.fixture
+async def fake_upstream():
+    app = web.Application()
+    peers = set()
+
+    async def echo(request):
+        peers.add(request.transport.get_extra_info("peername"))
+        return web.json_response({
+            "method": request.method,
+            "user_agent": request.headers.get("User-Agent")
+        })
+
+    async def fail(request):
+        return web.Response(status=503)
+
+    app.add_routes([
+        web.route("*", "/echo", echo),
+        web.get("/fail", fail)
+    ])
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "localhost", PORT)
+    await site.start()
+
+    yield peers
+
+    await runner.cleanup()
+
+
+@pytest.fixture
+async def http_client_service():
+    service = HttpClientService()
+    await service.initialize()
+
+    yield service
+
+    await service.shutdown()
+
+
+async def test_session_is_shared_per_upstream(http_client_service):
+    session = http_client_service.session("api")
+
+    assert http_client_service.session("api") is session
+    assert http_client_service.session("tada") is not session
+
+
+async def test_request(http_client_service, fake_upstream):
+    url = f"http://localhost:{PORT}/echo"
+    async with http_client_service.request("api", "PATCH", url) as resp:
+        data = await resp.json()
+
+    assert data == {"method": "PATCH", "user_agent": USER_AGENT}
+
+
+async def test_connections_are_reused(http_client_service, fake_upstream):
+    url = f"http://localhost:{PORT}/echo"
+    for _ in range(5):
+        async with http_client_service.request("api", "GET", url) as resp:
+            await resp.json()
+
+    # All requests went over the same keep-alive connection
+    assert len(fake_upstream) == 1
+
+
+async def test_raise_for_status(http_client_service, fake_upstream):
+    url = f"http://localhost:{PORT}/fail"
+    with pytest.raises(aiohttp.ClientResponseError):
+        async with http_client_service.request(
+            "api", "GET", url, raise_for_status=True
+        ):
+            pass  # pragma: no cover
+
+    async with http_client_service.request("api", "GET", url) as resp:
+        assert resp.status == 503
+
+
+async def test_shutdown_closes_sessions():
+    service = HttpClientService()
+    session = service.session("api")
+
+    await service.shutdown()
+
+    assert session.closed
+    assert service.session("api") is not session
+    await service.shutdown()
@@ -0,0 +1,105 @@
+import asyncio
+import json
+from unittest import mock
+
+import pytest
+
+from server.config import config
+from server.ice_relay import IceRelay, IceRelayStats
+from server.protocol import DisconnectedError, QDataStreamProtocol
+
+pytestmark = pytest.mark.asyncio
+
+
+@pytest.fixture
+def connection():
+    connection = mock.Mock()
+    connection.player.id = 2
+    connection.game.ice_relay_stats = IceRelayStats()
+    connection.protocol.is_connected.return_value = True
+    connection.protocol.buffered_bytes.return_value = 0
+    connection.protocol.encode_json = QDataStreamProtocol.encode_json
+    return connection
+
+
+@pytest.fixture
+def relay(connection, monkeypatch):
+    monkeypatch.setattr(config, "ICE_RELAY_BATCH_WINDOW", 0)
+    return IceRelay(connection)
+
+
+def written_messages(connection):
+    data = b"".join(c.args[0] for c in connection.protocol.write_raw.call_args_list)
+    messages = []
+    while data:
+        size = int.from_bytes(data[:4], "big")
+        messages.extend(QDataStreamProtocol.read_block(data[4:4 + size]))
+        data = data[4 + size:]
+    return [json.loads(m) for m in messages]
+
+
+async def test_relay_same_message_as_send(relay, connection):
+    payload = {"type": "candidate", "candidate": {"foundation": "1", "port": 6112}}
+
+    assert relay.relay(1, payload)
+    await asyncio.sleep(0)
+
+    assert written_messages(connection) == [{
+        "command": "IceMsg",
+        "args": [1, payload],
+        "target": "game"
+    }]
+    connection.protocol.drain.assert_not_called()
+
+
+async def test_relay_batches_within_window(relay, connection, monkeypatch):
+    monkeypatch.setattr(config, "ICE_RELAY_BATCH_WINDOW", 0.01)
+
+    for i in range(3):
+        relay.relay(1, i)
+    relay.relay(3, "x")
+    assert relay.pending == 4
+    connection.protocol.write_raw.assert_not_called()
+
+    await asyncio.sleep(0.02)
+
+    connection.protocol.write_raw.assert_called_once()
+    assert [m["args"] for m in written_messages(connection)] == [
+        [1, 0], [1, 1], [1, 2], [3, "x"]
+    ]
+    stats = connection.game.ice_relay_stats
+    assert stats.relayed == 4
+    assert stats.batches == 1
+    assert stats.busiest_pairs() == [(1, 2, 3), (3, 2, 1)]
+
+
+async def test_relay_drops_when_peer_is_behind(relay, connection, monkeypatch):
+    monkeypatch.setattr(config, "ICE_RELAY_MAX_BUFFERED_BYTES", 100)
+    connection.protocol.buffered_bytes.return_value = 101
+
+    assert not relay.relay(1, "candidate")
+    await asyncio.sleep(0)
+
+    connection.protocol.write_raw.assert_not_called()
+    assert connection.game.ice_relay_stats.dropped == 1
+
+
+async def test_relay_drops_on_disconnect(relay, connection):
+    connection.protocol.write_raw.side_effect = DisconnectedError()
+
+    relay.relay(1, "a")
+    relay.relay(1, "b")
+    await asyncio.sleep(0)
+
+    stats = connection.game.ice_relay_stats
+    assert stats.dropped == 2
+    assert stats.batches == 0
+
+
+async def test_cancel(relay, connection):
+    relay.relay(1, "candidate")
+    relay.cancel()
+    await asyncio.sleep(0)
+
+    assert relay.pending == 0
+    connection.protocol.write_raw.assert_not_called()
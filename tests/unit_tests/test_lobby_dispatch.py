@@ -0,0 +1,111 @@
+from unittest import mock
+
+import pytest
+from asynctest import CoroutineMock
+
+from server.decorators import command, with_dispatch_table
+from server.lobbyconnection import LobbyConnection
+
+pytestmark = pytest.mark.asyncio
+
+
+@pytest.fixture
+def lobbyconnection():
+    lc = LobbyConnection(
+        database=mock.Mock(),
+        game_service=mock.Mock(),
+        players=mock.Mock(),
+        nts_client=mock.Mock(),
+        geoip=mock.Mock(),
+        ladder_service=mock.Mock(),
+        party_service=mock.Mock(),
+        tada_service=mock.Mock()
+    )
+    lc.protocol = mock.Mock()
+    lc.send = CoroutineMock()
+    lc.abort = CoroutineMock()
+    return lc
+
+
+@pytest.fixture
+def authenticated(lobbyconnection):
+    lobbyconnection._authenticated = True
+    lobbyconnection.player = mock.Mock()
+    return lobbyconnection
+
+
+def test_dispatch_table():
+    @with_dispatch_table
+    class Handlers:
+        async def command_a(self, message):
+            pass
+
+        @command(requires_auth=False, b=int, c=None)
+        async def command_b(self, message):
+            pass
+
+        async def not_a_command(self, message):
+            pass
+
+    assert set(Handlers._dispatch_table) == {"a", "b"}
+    a, b = Handlers._dispatch_table["a"], Handlers._dispatch_table["b"]
+    assert a.func is Handlers.command_a
+    assert a.requires_auth
+    assert not b.requires_auth
+    assert b.invalid_field({"b": 1, "c": "x"}) is None
+    assert b.invalid_field({"b": "1", "c": "x"}) == "b"
+    assert b.invalid_field({"b": 1}) == "c"
+
+
+async def test_unauthenticated_ping(lobbyconnection):
+    await lobbyconnection.on_message_received({"command": "ping"})
+
+    lobbyconnection.send.assert_called_once_with({"command": "pong"})
+    lobbyconnection.abort.assert_not_called()
+
+
+@pytest.mark.parametrize("message", [
+    {"command": "game_host", "visibility": "public"},
+    {"command": "not_a_command"},
+    {"command": "IceMsg", "target": "game", "args": []},
+])
+async def test_unauthenticated_rejected(lobbyconnection, message):
+    await lobbyconnection.on_message_received(message)
+
+    lobbyconnection.abort.assert_called_once()
+    assert "unauthenticated" in lobbyconnection.abort.call_args[0][0]
+
+
+async def test_unauthenticated_game_metrics(lobbyconnection):
+    await lobbyconnection.on_message_received(
+        {"command": "GameMetrics", "target": "game", "args": []}
+    )
+
+    lobbyconnection.abort.assert_not_called()
+
+
+async def test_game_message_fast_path(authenticated):
+    authenticated.game_connection = mock.Mock()
+    authenticated.game_connection.handle_action = CoroutineMock()
+
+    await authenticated.on_message_received(
+        {"command": "IceMsg", "target": "game", "args": [2, "candidate"]}
+    )
+
+    authenticated.game_connection.handle_action.assert_awaited_once_with(
+        "IceMsg", [2, "candidate"]
+    )
+
+
+async def test_missing_field_is_garbage(authenticated):
+    await authenticated.on_message_received({"command": "avatar"})
+
+    authenticated.abort.assert_called_once()
+    assert "Garbage command" in authenticated.abort.call_args[0][0]
+
+
+async def test_unknown_command(authenticated):
+    await authenticated.on_message_received({"command": "not_a_command"})
+
+    authenticated.send.assert_called_once_with({"command": "invalid"})
+    authenticated.abort.assert_called_once_with("Error processing command")
@@ -0,0 +1,137 @@
+import asyncio
+
+import pytest
+from asynctest import CoroutineMock
+
+from server.exceptions import ClientError
+from server.login_admission import LoginAdmissionController
+
+pytestmark = pytest.mark.asyncio
+
+
+async def test_admit_immediately():
+    controller = LoginAdmissionController(max_concurrent=2, max_queued=10)
+    on_queued = CoroutineMock()
+
+    async with controller.admit(on_queued):
+        assert controller.active == 1
+        assert len(controller) == 0
+
+    assert controller.active == 0
+    on_queued.assert_not_awaited()
+
+
+async def test_concurrency_is_bounded():
+    controller = LoginAdmissionController(max_concurrent=3, max_queued=100)
+    running = 0
+    max_running = 0
+
+    async def handshake():
+        nonlocal running, max_running
+        async with controller.admit():
+            running += 1
+            max_running = max(running, max_running)
+            await asyncio.sleep(0.01)
+            running -= 1
+
+    await asyncio.gather(*(handshake() for _ in range(20)))
+
+    assert max_running == 3
+    assert controller.active == 0
+    assert len(controller) == 0
+
+
+async def test_queue_is_fifo_and_reports_position():
+    controller = LoginAdmissionController(max_concurrent=1, max_queued=100)
+    release = asyncio.Event()
+    order = []
+    positions = []
+
+    async def on_queued(position):
+        positions.append(position)
+
+    async def first():
+        async with controller.admit():
+            await release.wait()
+
+    async def queued(i):
+        async with controller.admit(on_queued):
+            order.append(i)
+
+    first_task = asyncio.create_task(first())
+    await asyncio.sleep(0)
+    tasks = [asyncio.create_task(queued(i)) for i in range(5)]
+    await asyncio.sleep(0)
+
+    assert len(controller) == 5
+    assert positions == [1, 2, 3, 4, 5]
+
+    release.set()
+    await asyncio.gather(first_task, *tasks)
+
+    assert order == [0, 1, 2, 3, 4]
+
+
+async def test_queue_full_rejects():
+    controller = LoginAdmissionController(max_concurrent=1, max_queued=1)
+    release = asyncio.Event()
+
+    async def handshake():
+        async with controller.admit():
+            await release.wait()
+
+    tasks = [asyncio.create_task(handshake()) for _ in range(2)]
+    await asyncio.sleep(0)
+
+    with pytest.raises(ClientError) as e:
+        async with controller.admit():
+            pass  # pragma: no cover
+    assert e.value.recoverable is False
+
+    release.set()
+    await asyncio.gather(*tasks)
+
+
+async def test_cancelled_waiter_is_removed():
+    controller = LoginAdmissionController(max_concurrent=1, max_queued=10)
+    release = asyncio.Event()
+
+    async def handshake():
+        async with controller.admit():
+            await release.wait()
+
+    holder = asyncio.create_task(handshake())
+    await asyncio.sleep(0)
+    waiter = asyncio.create_task(handshake())
+    await asyncio.sleep(0)
+    assert len(controller) == 1
+
+    waiter.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await waiter
+
+    assert len(controller) == 0
+    release.set()
+    await holder
+    assert controller.active == 0
+
+
+async def test_failing_queued_callback_does_not_leak_slot():
+    controller = LoginAdmissionController(max_concurrent=1, max_queued=10)
+    release = asyncio.Event()
+
+    async def holder():
+        async with controller.admit():
+            await release.wait()
+
+    task = asyncio.create_task(holder())
+    await asyncio.sleep(0)
+
+    with pytest.raises(ConnectionError):
+        async with controller.admit(CoroutineMock(side_effect=ConnectionError)):
+            pass  # pragma: no cover
+
+    assert len(controller) == 0
+    release.set()
+    await task
+    assert controller.active == 0
@@ -0,0 +1,90 @@
+import asyncio
+import functools
+import time
+
+import pytest
+from prometheus_client import REGISTRY
+
+from server.config import config
+from server.loop_monitor import LoopMonitor, describe_callback
+
+pytestmark = pytest.mark.asyncio
+
+
+@pytest.fixture
+async def loop_monitor(monkeypatch):
+    monkeypatch.setattr(config, "LOOP_MONITOR_INTERVAL", 0.01)
+    monkeypatch.setattr(config, "LOOP_MONITOR_SLOW_CALLBACK_THRESHOLD", 0.05)
+    monkeypatch.setattr(config, "LOOP_MONITOR_SLOW_CALLBACK_COUNT", 3)
+    monitor = LoopMonitor()
+    monitor.refresh()
+
+    yield monitor
+
+    monitor.stop()
+
+
+async def blocking_coroutine(seconds):
+    await asyncio.sleep(0)
+    time.sleep(seconds)
+    await asyncio.sleep(0)
+
+
+async def test_lag_measured(loop_monitor):
+    before = REGISTRY.get_sample_value("server_event_loop_lag_seconds_sum")
+
+    await asyncio.sleep(0.02)
+    time.sleep(0.1)
+    await asyncio.sleep(0.02)
+
+    after = REGISTRY.get_sample_value("server_event_loop_lag_seconds_sum")
+    assert after - before >= 0.05
+
+
+async def test_slow_task_step_recorded(loop_monitor):
+    await asyncio.create_task(blocking_coroutine(0.06))
+
+    slow = [c for c in loop_monitor.slowest() if c.name == "blocking_coroutine"]
+    assert len(slow) == 1
+    assert slow[0].duration >= 0.06
+    assert "in blocking_coroutine" in slow[0].stack[0]
+    assert REGISTRY.get_sample_value(
+        "server_event_loop_slow_callback_seconds_count",
+        {"name": "blocking_coroutine"}
+    ) >= 1
+
+
+async def test_slow_callbacks_bounded_and_sorted(loop_monitor):
+    def block(seconds):
+        time.sleep(seconds)
+
+    loop = asyncio.get_running_loop()
+    for seconds in (0.05, 0.08, 0.06, 0.07):
+        loop.call_soon(block, seconds)
+    await asyncio.sleep(0.05)
+
+    slowest = loop_monitor.slowest()
+    assert len(slowest) == 3
+    assert [c.duration for c in slowest] == sorted((c.duration for c in slowest), reverse=True)
+    assert slowest[0].name.endswith("block")
+
+
+async def test_stop_restores_handle(loop_monitor):
+    assert loop_monitor.running
+    loop_monitor.stop()
+    assert not loop_monitor.running
+    unpatched = asyncio.events.Handle._run
+
+    loop_monitor.start()
+    assert asyncio.events.Handle._run is not unpatched
+
+    loop_monitor.stop()
+    assert asyncio.events.Handle._run is unpatched
+
+
+async def test_describe_callback():
+    def callback():
+        pass
+
+    assert describe_callback(callback) == "test_describe_callback.<locals>.callback"
+    assert describe_callback(functools.partial(callback, 1)) == "test_describe_callback.<locals>.callback"
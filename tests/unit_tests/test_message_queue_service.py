@@ -1,11 +1,17 @@
 import asyncio
+import json
 from unittest import mock
 
 import aio_pika
 import pytest
+from aio_pika.exceptions import DeliveryError
 from asynctest import CoroutineMock
 
-from server.message_queue_service import MessageQueueService
+from server.config import config
+from server.message_queue_service import (
+    ConnectionAttemptFailed,
+    MessageQueueService
+)
 
 pytestmark = pytest.mark.asyncio
 
@@ -65,3 +71,181 @@ async def test_several_initializations_connect_only_once():
     )
 
     service._connect.assert_called_once()
+
+
+class FakeExchange:
+    def __init__(self, broker, name):
+        self.broker = broker
+        self.name = name
+
+    async def publish(self, message, routing_key):
+        broker = self.broker
+        broker.in_flight += 1
+        broker.max_in_flight = max(broker.max_in_flight, broker.in_flight)
+        try:
+            # Wait for the confirm
+            await asyncio.sleep(0.01)
+            if broker.failures:
+                raise broker.failures.pop(0)
+            broker.received.append(
+                (self.name, routing_key, json.loads(message.body))
+            )
+        finally:
+            broker.in_flight -= 1
+
+
+class FakeBroker:
+    """
+    Stands in for RabbitMQ: confirms messages after a short delay unless a
+    failure has been queued up.
+    """
+
+    def __init__(self):
+        self.received = []
+        self.failures = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.available = True
+
+    def connect(self, service):
+        async def _connect():
+            if not self.available:
+                raise ConnectionAttemptFailed()
+
+            async def declare_exchange(name, exchange_type):
+                return FakeExchange(self, name)
+
+            service._connection = mock.Mock(close=CoroutineMock())
+            service._channel = mock.Mock(
+                declare_exchange=declare_exchange,
+                close=CoroutineMock()
+            )
+        service._connect = _connect
+
+
+@pytest.fixture
+def broker(monkeypatch):
+    monkeypatch.setattr(config, "MQ_PUBLISH_RETRY_DELAY", 0)
+    return FakeBroker()
+
+
+@pytest.fixture
+async def fake_mq_service(broker):
+    service = MessageQueueService()
+    broker.connect(service)
+    await service.initialize()
+    await service.declare_exchange("test_exchange")
+
+    yield service
+
+    await service.shutdown()
+
+
+async def test_publish_resolves_on_confirm(fake_mq_service, broker):
+    confirmed = await fake_mq_service.publish(
+        "test_exchange", "test.key", {"msg": 1}
+    )
+
+    assert await confirmed is True
+    assert broker.received == [("test_exchange", "test.key", {"msg": 1})]
+
+
+async def test_publish_unknown_exchange(fake_mq_service):
+    with pytest.raises(KeyError):
+        await fake_mq_service.publish("missing", "test.key", {})
+
+
+async def test_publish_batches(fake_mq_service, broker, monkeypatch):
+    monkeypatch.setattr(config, "MQ_PUBLISH_BATCH_SIZE", 3)
+
+    futures = [
+        await fake_mq_service.publish("test_exchange", "test.key", {"msg": i})
+        for i in range(10)
+    ]
+    await asyncio.gather(*futures)
+
+    assert broker.max_in_flight == 3
+    assert [payload["msg"] for _, _, payload in broker.received] == list(range(10))
+
+
+async def test_publish_retries_failed_messages(fake_mq_service, broker):
+    broker.failures = [ConnectionError("connection lost")]
+
+    futures = [
+        await fake_mq_service.publish("test_exchange", "test.key", {"msg": i})
+        for i in range(3)
+    ]
+
+    assert await asyncio.gather(*futures) == [True, True, True]
+    assert sorted(payload["msg"] for _, _, payload in broker.received) == [0, 1, 2]
+
+
+async def test_publish_rejected(fake_mq_service, broker):
+    broker.failures = [DeliveryError(None, None)]
+
+    confirmed = await fake_mq_service.publish("test_exchange", "test.key", {})
+
+    assert await confirmed is False
+    assert broker.received == []
+
+
+async def test_publish_buffers_until_reconnect(broker):
+    broker.available = False
+    service = MessageQueueService()
+    broker.connect(service)
+    await service.declare_exchange("test_exchange")
+
+    confirmed = await service.publish("test_exchange", "test.key", {"msg": 1})
+    await asyncio.sleep(0.05)
+    assert not confirmed.done()
+
+    broker.available = True
+    await service.reconnect()
+
+    assert await confirmed is True
+    assert broker.received == [("test_exchange", "test.key", {"msg": 1})]
+    await service.shutdown()
+
+
+async def test_publish_drops_oldest_when_full(broker, monkeypatch):
+    monkeypatch.setattr(config, "MQ_PUBLISH_BUFFER_SIZE", 2)
+    broker.available = False
+    service = MessageQueueService()
+    broker.connect(service)
+    await service.declare_exchange("test_exchange")
+
+    futures = [
+        await service.publish("test_exchange", "test.key", {"msg": i})
+        for i in range(3)
+    ]
+
+    assert await futures[0] is False
+    broker.available = True
+    await service.reconnect()
+    assert await asyncio.gather(*futures[1:]) == [True, True]
+    assert [payload["msg"] for _, _, payload in broker.received] == [1, 2]
+    await service.shutdown()
+
+
+async def test_unpublished_messages_are_spooled(broker, tmp_path, monkeypatch):
+    monkeypatch.setattr(
+        config, "MQ_PUBLISH_SPOOL_FILE", str(tmp_path / "spool.jsonl")
+    )
+    broker.available = False
+    service = MessageQueueService()
+    broker.connect(service)
+    await service.declare_exchange("test_exchange")
+    confirmed = await service.publish("test_exchange", "test.key", {"msg": 1})
+    await service.shutdown()
+
+    assert await confirmed is False
+    assert (tmp_path / "spool.jsonl").exists()
+
+    broker.available = True
+    service = MessageQueueService()
+    broker.connect(service)
+    await service.declare_exchange("test_exchange")
+    await service.shutdown()
+
+    assert broker.received == [("test_exchange", "test.key", {"msg": 1})]
+    assert not (tmp_path / "spool.jsonl").exists()
@@ -0,0 +1,156 @@
+from unittest import mock
+
+import pytest
+from aiohttp import web
+
+from server.config import config
+from server.exceptions import ClientError
+from server.http_client_service import HttpClientService
+from server.policy_service import CircuitBreaker, CircuitState, PolicyService
+
+pytestmark = pytest.mark.asyncio
+
+PORT = 6081
+
+
+@pytest.fixture
+async def policy_server(monkeypatch):
+    monkeypatch.setattr(
+        config, "FAF_POLICY_SERVER_BASE_URL", f"http://localhost:{PORT}"
+    )
+    app = web.Application()
+    handle = mock.Mock(status=200)
+
+    async def verify(request):
+        data = await request.json()
+        handle.verify(data)
+        if handle.status != 200:
+            return web.Response(status=handle.status)
+        return web.json_response({"result": data["uid_hash"]})
+
+    app.add_routes([web.post("/verify", verify)])
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "localhost", PORT)
+    await site.start()
+
+    yield handle
+
+    await runner.cleanup()
+
+
+@pytest.fixture
+async def policy_service():
+    http_client_service = HttpClientService()
+    service = PolicyService(http_client_service)
+    await service.initialize()
+
+    yield service
+
+    await http_client_service.shutdown()
+
+
+async def test_verify(policy_service, policy_server):
+    assert await policy_service.verify(1, "honest", 100) == "honest"
+    assert await policy_service.verify(1, "vm", 100) == "vm"
+
+    policy_server.verify.assert_called_with({
+        "player_id": 1,
+        "uid_hash": "vm",
+        "session": 100
+    })
+
+
+async def test_honest_verdicts_are_cached(policy_service, policy_server):
+    for _ in range(3):
+        assert await policy_service.verify(1, "honest", 100) == "honest"
+
+    assert policy_server.verify.call_count == 1
+
+    # Different uid hash is a different machine
+    await policy_service.verify(1, "honest_too", 100)
+    assert policy_server.verify.call_count == 2
+
+
+async def test_other_verdicts_are_not_cached(policy_service, policy_server):
+    for _ in range(3):
+        assert await policy_service.verify(1, "fraudulent", 100) == "fraudulent"
+
+    assert policy_server.verify.call_count == 3
+
+
+async def test_cached_verdicts_expire(policy_service, policy_server, monkeypatch):
+    monkeypatch.setattr(config, "POLICY_VERDICT_CACHE_TTL", 0)
+
+    await policy_service.verify(1, "honest", 100)
+    await policy_service.verify(1, "honest", 100)
+
+    assert policy_server.verify.call_count == 2
+
+
+async def test_cache_size_is_bounded(policy_service, policy_server, monkeypatch):
+    monkeypatch.setattr(config, "POLICY_VERDICT_CACHE_SIZE", 2)
+
+    for player_id in range(3):
+        await policy_service.verify(player_id, "honest", 100)
+
+    # Player 0 was evicted
+    await policy_service.verify(0, "honest", 100)
+    assert policy_server.verify.call_count == 4
+
+
+async def test_fail_open(policy_service, policy_server, monkeypatch):
+    monkeypatch.setattr(config, "POLICY_SERVER_FAIL_OPEN", True)
+    policy_server.status = 500
+
+    assert await policy_service.verify(1, "vm", 100) == "honest"
+
+
+async def test_fail_closed(policy_service, policy_server, monkeypatch):
+    monkeypatch.setattr(config, "POLICY_SERVER_FAIL_OPEN", False)
+    policy_server.status = 500
+
+    with pytest.raises(ClientError):
+        await policy_service.verify(1, "honest", 100)
+
+
+async def test_circuit_opens(policy_service, policy_server, monkeypatch):
+    monkeypatch.setattr(config, "POLICY_SERVER_FAIL_OPEN", True)
+    policy_service.circuit_breaker = CircuitBreaker(
+        failure_threshold=2,
+        reset_timeout=60
+    )
+    policy_server.status = 500
+
+    for player_id in range(5):
+        assert await policy_service.verify(player_id, "vm", 100) == "honest"
+
+    assert policy_server.verify.call_count == 2
+    assert policy_service.circuit_breaker.state is CircuitState.OPEN
+
+
+def test_circuit_breaker_recovers():
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0)
+    assert breaker.allow_request()
+
+    breaker.record_failure()
+    assert breaker.state is CircuitState.OPEN
+
+    # Reset timeout has passed so a trial request is allowed
+    assert breaker.allow_request()
+    assert breaker.state is CircuitState.HALF_OPEN
+
+    breaker.record_success()
+    assert breaker.state is CircuitState.CLOSED
+
+
+def test_circuit_breaker_trial_failure_reopens():
+    breaker = CircuitBreaker(failure_threshold=3, reset_timeout=1000)
+    for _ in range(3):
+        breaker.record_failure()
+    assert not breaker.allow_request()
+
+    breaker.reset_timeout = 0
+    assert breaker.allow_request()
+    breaker.record_failure()
+    assert breaker.state is CircuitState.OPEN
@@ -1,151 +1,86 @@
-import asyncio
-from unittest import mock
+import threading
+import time
 
 import pytest
-from asynctest import CoroutineMock
 
 from server.config import config
-from server.profiler import Profiler
-from tests.utils import fast_forward
+from server.profiler import OTHER_STACKS, Profiler
 
 pytestmark = pytest.mark.asyncio
 
 
-@fast_forward(10)
-async def test_profiler_scheduling():
-    mock_player_service = []
-    profiler = Profiler(
-        mock_player_service, interval=0.1, duration=0.1, max_count=10, outfile=None
-    )
+def busy_function(seconds):
+    end = time.perf_counter() + seconds
+    while time.perf_counter() < end:
+        pass
 
-    profiler._start()
-    profiler.profiler.enable = mock.Mock()
-    await asyncio.sleep(2)
 
-    assert profiler.profile_count == 10
-    assert profiler.profiler.enable.call_count == 10
+async def test_profiler_samples_blocked_loop():
+    profiler = Profiler(hz=500, max_stacks=100)
 
+    profiler.start()
+    busy_function(0.3)
+    profiler.stop()
 
-@fast_forward(20)
-async def test_profiler_cancel():
-    mock_player_service = []
-    profiler = Profiler(mock_player_service, interval=0.1, max_count=1000, outfile=None)
-    profiler._run = CoroutineMock()
+    assert profiler.samples > 0
+    lines = profiler.folded().splitlines()
+    stack, count = lines[0].rsplit(" ", 1)
+    assert "busy_function (test_profiler.py)" in stack.split(";")
+    assert stack.index("test_profiler_samples_blocked_loop") < stack.index("busy_function")
+    assert int(count) > 0
 
-    profiler._start()
-    await asyncio.sleep(1)
-    profiler.cancel()
-    await asyncio.sleep(10)
 
-    assert profiler.profile_count < 20
-    assert profiler._run.await_count < 20
+async def test_profiler_samples_other_thread():
+    profiler = Profiler(hz=500, max_stacks=100)
+    thread = threading.Thread(target=busy_function, args=(0.3,))
+    thread.start()
 
+    profiler.start(thread.ident)
+    thread.join()
+    profiler.stop()
 
-@fast_forward(20)
-async def test_profiler_immediately_cancelled():
-    mock_player_service = []
-    profiler = Profiler(mock_player_service, interval=1, max_count=10, outfile=None)
-    profiler._run = CoroutineMock()
+    assert "busy_function" in profiler.folded()
+    assert "test_profiler_samples_other_thread" not in profiler.folded()
 
-    profiler._start()
-    await asyncio.sleep(0)
-    profiler.cancel()
-    await asyncio.sleep(10)
 
-    assert profiler.profile_count == 0
-    profiler._run.assert_not_awaited()
+async def test_profiler_max_stacks():
+    profiler = Profiler(hz=1, max_stacks=2)
 
+    for stack in ("a;b", "a;c", "a;b", "a;d", "a;e"):
+        profiler._record(stack)
 
-@fast_forward(10)
-async def test_profiler():
-    mock_player_service = []
-    profiler = Profiler(
-        mock_player_service,
-        interval=0.1,
-        duration=0.1,
-        max_count=10,
-        outfile="mock.file",
-    )
+    assert profiler.folded() == f"a;b 2\n{OTHER_STACKS} 2\na;c 1\n"
+    assert profiler.samples == 5
 
-    profiler._start()
-    profiler.profiler.dump_stats = mock.Mock()
-    await asyncio.sleep(2)
 
-    profiler.profiler.dump_stats.assert_called()
+async def test_profiler_reset():
+    profiler = Profiler(hz=1, max_stacks=2)
+    profiler._record("a;b")
 
-    profiler.cancel()
-    assert profiler.profiler is None
+    assert profiler.folded(reset=True) == "a;b 1\n"
+    assert profiler.folded() == ""
+    assert profiler.samples == 0
 
 
-@fast_forward(10)
-async def test_profiler_not_running_under_high_load():
-    mock_player_service = mock.MagicMock()
-    mock_player_service.__len__.return_value = 2000
-    profiler = Profiler(
-        mock_player_service,
-        interval=0.1,
-        duration=0.1,
-        max_count=30,
-        outfile="mock.file",
-    )
+async def test_profiler_snapshot_is_a_copy():
+    profiler = Profiler(hz=1, max_stacks=2)
+    profiler._record("a;b")
 
-    profiler._start()
-    profiler.profiler.dump_stats = mock.Mock()
-    await asyncio.sleep(2)
+    folded, samples = profiler.snapshot()
+    profiler._record("a;b")
 
-    profiler.profiler.dump_stats.assert_not_called()
+    assert (folded, samples) == ("a;b 1\n", 1)
+    assert profiler.snapshot() == ("a;b 2\n", 2)
 
-    profiler.cancel()
-    assert profiler.profiler is None
 
+async def test_profiler_refresh(monkeypatch):
+    profiler = Profiler()
 
-@fast_forward(10)
-async def test_profiler_deleted_when_done():
-    mock_player_service = []
-    profiler = Profiler(
-        mock_player_service, interval=0.1, duration=0.1, max_count=10, outfile=None
-    )
-
-    profiler._start()
-    await asyncio.sleep(5)
-
-    assert profiler.profiler is None
-
-
-@fast_forward(20)
-async def test_profiler_refreshing():
-    config.PROFILING_COUNT = 10
-    config.PROFILING_DURATION = 0.1
-    config.PROFILING_INTERVAL = 0.1
-    mock_player_service = []
-    profiler = Profiler(mock_player_service, outfile=None)
-
+    monkeypatch.setattr(config, "PROFILING_HZ", 100)
     profiler.refresh()
-    await asyncio.sleep(5)
+    assert profiler.running
 
+    monkeypatch.setattr(config, "PROFILING_HZ", 0)
     profiler.refresh()
-    await asyncio.sleep(5)
-
-
-@fast_forward(30)
-async def test_profiler_refresh_cancels():
-    config.PROFILING_COUNT = 100
-    config.PROFILING_DURATION = 0.5
-    config.PROFILING_INTERVAL = 0.5
-    mock_player_service = []
-    profiler = Profiler(mock_player_service, outfile=None)
-
-    enable_mock = mock.Mock()
-
-    profiler.refresh()
-    profiler.profiler.enable = enable_mock
-    await asyncio.sleep(10)
-
-    config.PROFILING_INTERVAL = -1
-    profiler.refresh()
-    await asyncio.sleep(10)
-
-    assert profiler._running == False
-    assert profiler.profile_count == 0
-    assert profiler.profiler is None
-    assert enable_mock.call_count < 12
+    assert not profiler.running
+    assert not any(t.name == "profiler" for t in threading.enumerate())
@@ -101,6 +101,7 @@ async def test_QDataStreamProtocol_recv_small_message(protocol, reader):
     message = await protocol.read_message()
 
     assert message == {"some_header": True, "legacy": ["Goodbye"]}
+    assert protocol.received_bytes == len(data)
 
 
 async def test_QDataStreamProtocol_recv_malformed_message(protocol, reader):
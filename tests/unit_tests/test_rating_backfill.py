@@ -0,0 +1,133 @@
+import pytest
+from trueskill import Rating
+
+from server.config import config
+from server.games.game_results import GameOutcome
+from server.rating_service.backfill import (
+    HistoryRow,
+    LeaderboardBackfill,
+    PlayerStats
+)
+
+pytestmark = pytest.mark.asyncio
+
+
+def game_rows(game_id, *results):
+    return [
+        HistoryRow(game_id, player_id, team, result, "tacc")
+        for player_id, team, result in results
+    ]
+
+
+def test_player_stats_record():
+    stats = PlayerStats(Rating(1500, 500))
+    outcomes = [
+        GameOutcome.VICTORY,
+        GameOutcome.VICTORY,
+        GameOutcome.DRAW,
+        GameOutcome.VICTORY,
+        GameOutcome.DEFEAT,
+        GameOutcome.DEFEAT
+    ]
+    for outcome in outcomes:
+        stats.record(outcome, Rating(1600, 400), "tacc")
+
+    assert stats.rating == Rating(1600, 400)
+    assert stats.total_games == 6
+    assert (stats.won_games, stats.drawn_games, stats.lost_games) == (3, 1, 2)
+    assert stats.streak == -2
+    assert stats.best_streak == 3
+    assert stats.recent_scores == "002122"
+    assert stats.recent_mod == "tacc"
+
+
+def test_player_stats_recent_scores_truncated():
+    stats = PlayerStats(Rating(1500, 500))
+    for _ in range(12):
+        stats.record(GameOutcome.VICTORY, Rating(1500, 500), "tacc")
+
+    assert stats.recent_scores == "2" * 10
+    assert stats.streak == stats.best_streak == 12
+
+
+def test_invalid_shadow_table():
+    with pytest.raises(ValueError):
+        LeaderboardBackfill(None, "global", "leaderboard_rating")
+    with pytest.raises(ValueError):
+        LeaderboardBackfill(None, "global", "shadow; DROP TABLE login")
+
+
+def test_rate_rows_groups_games_across_chunks():
+    backfill = LeaderboardBackfill(None, "global")
+    rows = (
+        game_rows(1, (1, 2, "VICTORY"), (2, 3, "DEFEAT")) +
+        game_rows(2, (1, 2, "DEFEAT"), (3, 3, "VICTORY"))
+    )
+
+    backfill.rate_rows(rows[:3])
+    assert backfill.games == 1
+    backfill.rate_rows(rows[3:])
+    assert backfill.games == 1
+    backfill.flush()
+
+    assert backfill.games == 2
+    assert backfill.skipped == 0
+    assert backfill.players[1].total_games == 2
+    assert backfill.players[1].streak == -1
+    assert backfill.players[2].rating.mu < config.START_RATING_MEAN
+    assert backfill.players[3].rating.mu > config.START_RATING_MEAN
+
+
+def test_ratings_carry_over_between_games():
+    backfill = LeaderboardBackfill(None, "global")
+
+    backfill.rate_rows(game_rows(1, (1, 2, "VICTORY"), (2, 3, "DEFEAT")))
+    backfill.flush()
+    first = backfill.players[1].rating
+    backfill.rate_rows(game_rows(2, (1, 2, "VICTORY"), (2, 3, "DEFEAT")))
+    backfill.flush()
+
+    assert backfill.players[1].rating.mu > first.mu
+    assert backfill.players[1].rating.sigma < first.sigma
+
+
+def test_unratable_games_skipped():
+    backfill = LeaderboardBackfill(None, "global")
+
+    backfill.rate_rows(
+        game_rows(1, (1, 2, None), (2, 3, "DEFEAT")) +
+        game_rows(2, (1, 2, "VICTORY"), (2, 2, "DEFEAT")) +
+        game_rows(3, (1, 2, "VICTORY"), (2, 3, "VICTORY"))
+    )
+    backfill.flush()
+
+    assert backfill.games == 0
+    assert backfill.skipped == 3
+    assert all(stats.total_games == 0 for stats in backfill.players.values())
+
+
+async def test_backfill_writes_shadow_table(database):
+    backfill = LeaderboardBackfill(
+        database, "global", "leaderboard_rating_test_shadow", batch_size=1
+    )
+    backfill.rate_rows(game_rows(1, (1, 2, "VICTORY"), (2, 3, "DEFEAT")))
+    backfill.flush()
+
+    async with database.acquire() as conn:
+        await backfill._write_shadow(conn, 1)
+        await backfill._write_shadow(conn, 1)
+
+        result = await conn.execute(
+            "SELECT login_id, mean, deviation, total_games, won_games "
+            "FROM leaderboard_rating_test_shadow "
+            "WHERE leaderboard_id = 1 ORDER BY login_id"
+        )
+        rows = result.fetchall()
+        await conn.execute("DROP TABLE leaderboard_rating_test_shadow")
+
+    assert [(row.login_id, row.total_games, row.won_games) for row in rows] == [
+        (1, 1, 1),
+        (2, 1, 0)
+    ]
+    assert rows[0].mean == pytest.approx(backfill.players[1].rating.mu)
+    assert rows[1].deviation == pytest.approx(backfill.players[2].rating.sigma)
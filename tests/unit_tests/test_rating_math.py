@@ -0,0 +1,109 @@
+import scipy.stats
+import trueskill
+from hypothesis import assume, given
+from hypothesis import strategies as st
+from trueskill import Rating
+
+from server.factions import Faction
+from server.games.game_results import GameOutcome
+from server.games.typedefs import EndedGamePlayerSummary
+from server.rating_service import rating_math
+from server.rating_service.game_rater import GameRater
+
+# trueskill's own erfc is only accurate to about 1e-7
+RATING_TOLERANCE = 0.01
+
+ratings = st.builds(
+    Rating,
+    mu=st.floats(min_value=-1000, max_value=4000),
+    sigma=st.floats(min_value=20, max_value=500)
+)
+teams = st.lists(ratings, min_size=1, max_size=8)
+
+
+def assert_ratings_close(actual, expected):
+    assert len(actual) == len(expected)
+    for a, e in zip(actual, expected):
+        assert abs(a.mu - e.mu) < RATING_TOLERANCE
+        assert abs(a.sigma - e.sigma) < RATING_TOLERANCE
+
+
+@given(x=st.floats(min_value=-30, max_value=30))
+def test_norm_cdf(x):
+    assert abs(rating_math.norm_cdf(x) - scipy.stats.norm.cdf(x)) < 1e-12
+    assert abs(rating_math.norm_pdf(x) - scipy.stats.norm.pdf(x)) < 1e-12
+
+
+@given(p=st.floats(min_value=1e-9, max_value=1 - 1e-9))
+def test_norm_ppf(p):
+    assert abs(rating_math.norm_ppf(p) - scipy.stats.norm.ppf(p)) < 1e-6
+
+
+def test_draw_margin():
+    env = trueskill.global_env()
+    for size in (2, 4, 16):
+        expected = scipy.stats.norm.ppf(0.5 * (env.draw_probability + 1)) \
+            * size ** 0.5 * env.beta
+        assert abs(rating_math.draw_margin(size) - expected) < 1e-9
+
+
+@given(team1=teams, team2=teams, drawn=st.booleans())
+def test_rate_two_teams_matches_trueskill(team1, team2, drawn):
+    try:
+        expected1, expected2 = trueskill.rate(
+            [team1, team2], [0, 0 if drawn else 1]
+        )
+    except FloatingPointError:
+        assume(False)
+
+    new1, new2 = rating_math.rate_two_teams(team1, team2, drawn)
+
+    assert_ratings_close(new1, expected1)
+    assert_ratings_close(new2, expected2)
+
+
+@given(
+    team1=teams,
+    team2=teams,
+    outcome=st.sampled_from([
+        (GameOutcome.VICTORY, GameOutcome.DEFEAT),
+        (GameOutcome.DEFEAT, GameOutcome.VICTORY),
+        (GameOutcome.DRAW, GameOutcome.DRAW)
+    ])
+)
+def test_compute_rating_matches_trueskill(team1, team2, outcome):
+    player_data = [
+        EndedGamePlayerSummary(i, 1, Faction.arm, outcome[0])
+        for i in range(len(team1))
+    ] + [
+        EndedGamePlayerSummary(100 + i, 2, Faction.core, outcome[1])
+        for i in range(len(team2))
+    ]
+    old_ratings = {
+        **{i: r for i, r in enumerate(team1)},
+        **{100 + i: r for i, r in enumerate(team2)}
+    }
+    ranks = GameRater._ranks_from_two_team_outcomes(list(outcome))
+    try:
+        expected1, expected2 = trueskill.rate([team1, team2], ranks)
+    except FloatingPointError:
+        assume(False)
+
+    new_ratings, likelihoods = GameRater.compute_rating(player_data, old_ratings)
+
+    # Victorious players never lose displayed rating and draws are not rated
+    for pd, expected in zip(player_data, expected1 + expected2):
+        old = old_ratings[pd.player_id]
+        if pd.outcome is GameOutcome.DRAW:
+            expected = old
+        elif pd.outcome is GameOutcome.VICTORY:
+            delta = (expected.mu - 3 * expected.sigma) - (old.mu - 3 * old.sigma)
+            # Too close to zero to tell which side trueskill is on
+            assume(abs(delta) > RATING_TOLERANCE * 4)
+            if delta < 0:
+                expected = old
+        assert_ratings_close([new_ratings[pd.player_id]], [expected])
+
+    for team_likelihoods in likelihoods.values():
+        total = team_likelihoods.pwin + team_likelihoods.pdraw + team_likelihoods.plose
+        assert abs(total - 1) < 1e-9
@@ -0,0 +1,141 @@
+import os
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from server.config import config
+from server.replay_archive_service import (
+    ReplayArchiveService,
+    archive_replay,
+    get_archive_dir,
+    scan_replays
+)
+from server.replay_store import ReplayStore
+
+pytestmark = pytest.mark.asyncio
+
+
+@pytest.fixture
+def replay_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(config, "REPLAY_DIR", str(tmp_path))
+    return tmp_path
+
+
+@pytest.fixture
+def replay_archive_service(database):
+    service = ReplayArchiveService(database)
+    service._executor = ThreadPoolExecutor()
+    yield service
+    service._executor.shutdown()
+
+
+def test_get_archive_dir():
+    assert get_archive_dir("/replays", 1234567890) == "/replays/12/34/56/78"
+    assert get_archive_dir("/replays", 100) == "/replays/0/0/0/1"
+
+
+def test_scan_replays(replay_dir):
+    (replay_dir / "100.tad").write_bytes(b"replay")
+    (replay_dir / "101.json").write_bytes(b"{}")
+    (replay_dir / "garbage.tad").write_bytes(b"")
+    (replay_dir / "102.tad").mkdir()
+
+    assert scan_replays(str(replay_dir)) == [(100, str(replay_dir / "100.tad"))]
+
+
+def test_scan_replays_missing_dir(tmp_path):
+    assert scan_replays(str(tmp_path / "missing")) == []
+
+
+def test_archive_replay(tmp_path):
+    replay = tmp_path / "1234.tad"
+    replay.write_bytes(b"replay data")
+    archive_dir = str(tmp_path / "0" / "0" / "0" / "12")
+
+    assert archive_replay(str(replay), archive_dir, 1234) == 1234
+
+    assert not replay.exists()
+    assert os.listdir(archive_dir) == ["1234.zip"]
+    with zipfile.ZipFile(os.path.join(archive_dir, "1234.zip")) as archive:
+        assert archive.read("1234.tad") == b"replay data"
+
+
+async def test_archive_new_replays(replay_archive_service, replay_dir):
+    for game_id in (1, 41935):
+        (replay_dir / f"{game_id}.tad").write_bytes(b"replay")
+
+    await replay_archive_service.archive_new_replays()
+
+    assert (replay_dir / "0" / "0" / "0" / "0" / "1.zip").exists()
+    assert (replay_dir / "0" / "0" / "4" / "19" / "41935.zip").exists()
+    assert not list(replay_dir.glob("*.tad"))
+
+    async with replay_archive_service._db.acquire() as conn:
+        result = await conn.execute(
+            "SELECT replay_available FROM game_stats WHERE id = 41935"
+        )
+        assert result.scalar() == 1
+
+
+async def test_archive_new_replays_skips_failures(
+    replay_archive_service,
+    replay_dir,
+    mocker
+):
+    (replay_dir / "1.tad").write_bytes(b"replay")
+    mocker.patch(
+        "server.replay_archive_service.archive_replay",
+        side_effect=OSError
+    )
+    replay_archive_service._db = mocker.Mock(acquire=mocker.Mock())
+
+    await replay_archive_service.archive_new_replays()
+
+    assert (replay_dir / "1.tad").exists()
+    replay_archive_service._db.acquire.assert_not_called()
+
+
+async def test_archive_new_replays_nothing_to_do(
+    replay_archive_service,
+    replay_dir,
+    mocker
+):
+    replay_archive_service._db = mocker.Mock(acquire=mocker.Mock())
+
+    await replay_archive_service.archive_new_replays()
+
+    replay_archive_service._db.acquire.assert_not_called()
+
+
+async def test_archive_new_replays_to_store(
+    replay_archive_service,
+    replay_dir
+):
+    replay_archive_service._store = ReplayStore(str(replay_dir / "store"))
+    replay_archive_service._compression = "zlib"
+    (replay_dir / "41935.tad").write_bytes(b"replay")
+
+    await replay_archive_service.archive_new_replays()
+
+    assert not (replay_dir / "41935.tad").exists()
+    assert not (replay_dir / "0").exists()
+    replay = await replay_archive_service.open_replay(41935)
+    with replay.file:
+        assert replay.file.read() == b"replay"
+    assert replay.size == 6
+
+
+async def test_open_replay_zip_archive(replay_archive_service, replay_dir):
+    replay = replay_dir / "1234.tad"
+    replay.write_bytes(b"replay data")
+    archive_replay(str(replay), get_archive_dir(str(replay_dir), 1234), 1234)
+
+    replay = await replay_archive_service.open_replay(1234)
+    with replay.file:
+        assert replay.file.read() == b"replay data"
+    assert replay.size == 11
+
+
+async def test_open_replay_missing(replay_archive_service, replay_dir):
+    assert await replay_archive_service.open_replay(1234) is None
@@ -0,0 +1,119 @@
+import os
+import random
+
+import pytest
+
+from server.replay_store import (
+    COMPRESSION_ZLIB,
+    COMPRESSION_ZSTD,
+    ReplayStore,
+    compress_replay,
+    get_compression,
+    zstandard
+)
+
+compressions = [COMPRESSION_ZLIB]
+if zstandard is not None:
+    compressions.append(COMPRESSION_ZSTD)
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = ReplayStore(str(tmp_path / "store"))
+    yield store
+    store.close()
+
+
+@pytest.fixture
+def make_replay(tmp_path):
+    def make(name, data):
+        path = tmp_path / name
+        path.write_bytes(data)
+        return str(path)
+    return make
+
+
+def replay_data(seed: int) -> bytes:
+    # Partly compressible, like a real replay
+    return random.Random(seed).randbytes(10000) + bytes([seed]) * 200000
+
+
+@pytest.mark.parametrize("compression", compressions)
+def test_add_and_open(store, make_replay, compression):
+    data = replay_data(1)
+    replay = compress_replay(make_replay("1.tad", data), compression)
+    assert len(replay.data) < len(data)
+
+    entry = store.add(1, replay)
+
+    assert entry.game_id == 1
+    assert entry.size == len(data)
+    assert entry.compression == compression
+    assert store.get(1) == entry
+    with store.open(entry) as f:
+        assert f.read() == data
+
+
+def test_get_missing(store):
+    assert store.get(1) is None
+    assert 1 not in store
+
+
+def test_identical_replays_are_deduplicated(store, make_replay):
+    data = replay_data(1)
+    first = store.add(1, compress_replay(make_replay("1.tad", data), "zlib"))
+    second = store.add(2, compress_replay(make_replay("2.tad", data), "zlib"))
+
+    assert 1 in store and 2 in store
+    assert (second.pack, second.offset) == (first.pack, first.offset)
+    assert os.path.getsize(store.pack_path(0)) == first.length
+
+
+def test_replays_are_read_by_range(store, make_replay):
+    entries = [
+        store.add(game_id, compress_replay(
+            make_replay(f"{game_id}.tad", replay_data(game_id)),
+            "zlib"
+        ))
+        for game_id in range(3)
+    ]
+
+    assert [entry.offset for entry in entries] == [
+        0,
+        entries[0].length,
+        entries[0].length + entries[1].length
+    ]
+    for entry in reversed(entries):
+        with store.open(entry) as f:
+            assert f.read() == replay_data(entry.game_id)
+
+
+def test_packs_roll_over(tmp_path, make_replay):
+    store = ReplayStore(str(tmp_path / "store"), max_pack_size=1)
+    for game_id in range(3):
+        store.add(game_id, compress_replay(
+            make_replay(f"{game_id}.tad", replay_data(game_id)),
+            "zlib"
+        ))
+
+    assert [store.get(game_id).pack for game_id in range(3)] == [0, 1, 2]
+    store.close()
+
+    # The index survives reopening the store
+    store = ReplayStore(str(tmp_path / "store"), max_pack_size=1)
+    with store.open(store.get(1)) as f:
+        assert f.read() == replay_data(1)
+    store.close()
+
+
+def test_get_compression():
+    assert get_compression(COMPRESSION_ZLIB) == COMPRESSION_ZLIB
+    if zstandard is None:
+        assert get_compression(COMPRESSION_ZSTD) == COMPRESSION_ZLIB
+    else:
+        assert get_compression(COMPRESSION_ZSTD) == COMPRESSION_ZSTD
+
+
+def test_unknown_compression(make_replay):
+    with pytest.raises(ValueError):
+        compress_replay(make_replay("1.tad", b"data"), "lzma")
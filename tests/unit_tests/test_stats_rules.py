@@ -0,0 +1,46 @@
+from server.stats import rules
+from server.stats.achievement_service import ACH_NO_MERCY, ACH_WHAT_A_SWARM
+from server.stats.unit import ACUS, ASFS, Unit
+
+
+def test_unit_index_covers_counted_units():
+    for unit in ASFS + ACUS + [Unit.MERCY]:
+        assert unit.value in rules.UNIT_INDEX
+
+    assert rules.UNIT_INDEX[Unit.MERCY.value] == [("built_mercies", "built")]
+
+
+def test_rules_use_known_counters():
+    counters = set(rules.UNIT_COUNTERS) | set(rules.CATEGORY_COUNTERS)
+    for group in rules.RULES.values():
+        for rule in group:
+            assert isinstance(rule.amount, int) or rule.amount in counters
+
+
+def test_count_sums_units_of_a_counter():
+    blueprint_stats = {
+        ASFS[0].value: {"built": 3},
+        ASFS[1].value: {"built": 2, "lost": 1},
+        ACUS[0].value: {"lowest_health": 400},
+        "unknown": {"built": 50}
+    }
+
+    counters = rules.count(blueprint_stats, {"air": {"built": 5}})
+
+    assert counters["built_asfs"] == 5
+    assert counters["acu_lowest_health"] == 400
+    assert counters["built_mercies"] == 0
+    assert counters["built_air"] == 5
+    # categories missing from the unit stats count as zero
+    assert counters["built_land"] == 0
+
+
+def test_evaluate_uses_counter_amounts():
+    counters = rules.count({Unit.MERCY.value: {"built": 4}, ASFS[0].value: {"built": 7}}, {})
+    ctx = rules.ArmyContext(counters, None, False, False, False, 2)
+
+    updates = rules.evaluate(ctx, ["units"])
+
+    assert rules.Update(rules.INCREMENT, ACH_NO_MERCY, 4) in updates
+    assert rules.Update(rules.SET_STEPS_AT_LEAST, ACH_WHAT_A_SWARM, 7) in updates
+    assert all(update.action != rules.UNLOCK for update in updates)
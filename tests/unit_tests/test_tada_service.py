@@ -0,0 +1,327 @@
+import asyncio
+import html
+import io
+import re
+import time
+from contextlib import asynccontextmanager
+from urllib.parse import unquote
+
+import pytest
+from aiohttp import web
+
+from server.config import config
+from server.games.typedefs import ReplayInfo
+from server.http_client_service import HttpClientService
+from server.replay_archive_service import ArchivedReplay
+from server.tada_service import TadaFileTooLargeException, TadaService
+
+pytestmark = pytest.mark.asyncio
+
+PORT = 6082
+
+REPLAY_META = {
+    "mapName": "SHERWOOD",
+    "players": [
+        {"name": "Alice", "side": 0},
+        {"name": "Bob", "side": 1},
+        {"name": "Eve", "side": 2}
+    ],
+    "datestamp": "2021-05-01",
+    "file_extension": "tad"
+}
+
+
+class FakeTada(object):
+    def __init__(self):
+        self.games = [[1, "2021-04-30 - Comet Catcher - Carol, Dave"]]
+        self.uploads = []
+        self.list_requests = 0
+        self.upload_status = 200
+
+    async def list_games(self, request):
+        self.list_requests += 1
+        links = "".join(
+            f'<li><a href="/demos/{id}">{html.escape(name)}</a></li>'
+            for id, name in self.games
+        )
+        return web.Response(
+            text=f"<html><body><ul>{links}</ul></body></html>",
+            content_type="text/html"
+        )
+
+    async def upload(self, request):
+        if self.upload_status != 200:
+            return web.Response(status=self.upload_status)
+
+        # The replay part is sent with a multipart content type, which
+        # aiohttp's MultipartReader would try to parse as a nested body
+        boundary = request.headers["Content-Type"].split("boundary=")[1]
+        body = await request.read()
+        part = body.split(f"--{boundary}".encode())[1]
+        headers, data = part.split(b"\r\n\r\n", 1)
+        filename = unquote(re.search(rb'filename="([^"]*)"', headers).group(1).decode())
+        self.uploads.append((filename, data[:-2]))
+        name = filename.rsplit(".", 1)[0]
+        self.games.append([self.games[-1][0] + 1, name])
+        return web.Response(text="ok")
+
+
+@pytest.fixture
+async def tada_server(monkeypatch):
+    monkeypatch.setattr(config, "TADA_API_URL", f"http://localhost:{PORT}")
+    monkeypatch.setattr(config, "TADA_UPLOAD_ENABLE", True)
+    monkeypatch.setattr(config, "TADA_FIND_UPLOAD_DELAY", 0)
+    fake = FakeTada()
+    app = web.Application()
+    app.add_routes([
+        web.get("/demos", fake.list_games),
+        web.post("/demos", fake.upload)
+    ])
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "localhost", PORT)
+    await site.start()
+
+    yield fake
+
+    await runner.cleanup()
+
+
+@pytest.fixture
+def fake_db(mocker):
+    conn = mocker.AsyncMock()
+
+    @asynccontextmanager
+    async def acquire():
+        yield conn
+
+    return mocker.Mock(acquire=mocker.Mock(wraps=acquire), conn=conn)
+
+
+@pytest.fixture
+async def tada_service(tada_server, fake_db, mocker):
+    http_client_service = HttpClientService()
+    replay_archive_service = mocker.Mock()
+    replay_archive_service.open_replay = mocker.AsyncMock(
+        side_effect=lambda game_id: ArchivedReplay(
+            io.BytesIO(b"replay data"), 11, time.time()
+        )
+    )
+    game_service = mocker.Mock()
+    game_service.get_replay_info = mocker.AsyncMock(
+        return_value=ReplayInfo(tada_available=1, replay_meta=dict(REPLAY_META))
+    )
+    service = TadaService(
+        fake_db,
+        http_client_service,
+        replay_archive_service,
+        game_service
+    )
+
+    yield service
+
+    await http_client_service.shutdown()
+
+
+async def test_upload_streams_replay(tada_service, tada_server):
+    await tada_service._upload(41935)
+
+    assert tada_server.uploads == [
+        ("2021-05-01 - SHERWOOD - Alice, Bob, Eve.tad", b"replay data")
+    ]
+    assert tada_service.dirty_uploads == [(41935, {
+        "party": 2,
+        "mapName": "SHERWOOD",
+        "date": "2021-05-01",
+        "players": [
+            {"name": "Alice", "side": "ARM"},
+            {"name": "Bob", "side": "ARM"},
+            {"name": "Eve", "side": "ARM"}
+        ]
+    })]
+
+
+async def test_upload_replay_not_archived(tada_service, tada_server):
+    tada_service._replay_archive.open_replay.side_effect = None
+    tada_service._replay_archive.open_replay.return_value = None
+
+    with pytest.raises(FileNotFoundError):
+        await tada_service._upload(41935)
+
+    assert tada_server.uploads == []
+
+
+async def test_upload_failure_raises(tada_service, tada_server):
+    tada_server.upload_status = 500
+
+    with pytest.raises(Exception):
+        await tada_service._upload(41935)
+
+    assert tada_service.dirty_uploads == []
+
+
+async def test_concurrent_uploads_share_games_list(
+    tada_service,
+    tada_server,
+    monkeypatch
+):
+    monkeypatch.setattr(config, "TADA_LATEST_GAMES_CACHE_TTL", 60)
+
+    await asyncio.gather(*(
+        tada_service._get_latest_games() for _ in range(5)
+    ))
+
+    assert tada_server.list_requests == 1
+
+
+async def test_latest_games_fetched_after_upload(
+    tada_service,
+    tada_server,
+    monkeypatch
+):
+    monkeypatch.setattr(config, "TADA_LATEST_GAMES_CACHE_TTL", 60)
+
+    await tada_service._get_latest_games()
+    await tada_service._get_latest_games()
+    assert tada_server.list_requests == 1
+
+    games = await tada_service._get_latest_games(fetched_after=time.monotonic())
+    assert tada_server.list_requests == 2
+    assert games == tada_server.games
+
+
+async def test_latest_games_cache_expires(tada_service, tada_server, monkeypatch):
+    monkeypatch.setattr(config, "TADA_LATEST_GAMES_CACHE_TTL", 0)
+
+    await tada_service._get_latest_games()
+    await tada_service._get_latest_games()
+
+    assert tada_server.list_requests == 2
+
+
+async def test_process_upload_success(tada_service, tada_server, mocker):
+    tada_service._in_flight.add(41935)
+    reschedule = mocker.patch.object(tada_service, "_reschedule")
+
+    await tada_service._process_upload(41935, 0)
+
+    reschedule.assert_not_called()
+    assert 41935 not in tada_service._in_flight
+    assert tada_service._wakeup.is_set()
+    tada_service._db.conn.execute.assert_called_once()
+
+
+async def test_shutdown_cancels_uploads(tada_service, mocker):
+    started = asyncio.Event()
+
+    async def upload(taf_replay_id):
+        started.set()
+        await asyncio.sleep(60)
+
+    tada_service._upload = upload
+    tada_service._db.conn.scalar.return_value = 1
+    tada_service._db.conn.execute.return_value = mocker.Mock(
+        fetchall=mocker.Mock(return_value=[mocker.Mock(game_id=41935, requester_id=None, attempts=0)])
+    )
+    await tada_service._start_due_uploads()
+    await started.wait()
+
+    await tada_service.shutdown()
+
+    assert not tada_service._upload_tasks
+    assert not tada_service._in_flight
+    # The upload stays queued for the next start
+    tada_service._db.conn.execute.assert_called_once()
+
+
+async def test_process_upload_backs_off(
+    tada_service,
+    tada_server,
+    mocker,
+    monkeypatch
+):
+    monkeypatch.setattr(config, "TADA_UPLOAD_MAX_ATTEMPTS", 10)
+    monkeypatch.setattr(config, "TADA_UPLOAD_RETRY_DELAY", 60)
+    monkeypatch.setattr(config, "TADA_UPLOAD_MAX_RETRY_DELAY", 600)
+    tada_server.upload_status = 503
+    reschedule = mocker.patch.object(tada_service, "_reschedule")
+    give_up = mocker.patch.object(tada_service, "_give_up")
+
+    delays = []
+    for attempts in range(5):
+        await tada_service._process_upload(41935, attempts)
+        game_id, new_attempts, delay = reschedule.call_args.args
+        assert (game_id, new_attempts) == (41935, attempts + 1)
+        delays.append(delay)
+
+    assert 60 <= delays[0] <= 72
+    assert 120 <= delays[1] <= 144
+    assert 240 <= delays[2] <= 288
+    assert 480 <= delays[3] <= 576
+    assert 600 <= delays[4] <= 720
+    give_up.assert_not_called()
+
+
+async def test_process_upload_gives_up(
+    tada_service,
+    tada_server,
+    mocker,
+    monkeypatch
+):
+    monkeypatch.setattr(config, "TADA_UPLOAD_MAX_ATTEMPTS", 5)
+    tada_server.upload_status = 503
+    reschedule = mocker.patch.object(tada_service, "_reschedule")
+    give_up = mocker.patch.object(tada_service, "_give_up")
+
+    await tada_service._process_upload(41935, 4, 42)
+
+    reschedule.assert_not_called()
+    give_up.assert_called_once_with(41935, 42)
+
+
+async def test_give_up_tells_requester(tada_service):
+    await tada_service._give_up(41935, 42)
+    await tada_service._give_up(41936)
+
+    assert tada_service.failed_uploads == [(41935, 42)]
+    assert tada_service._db.conn.execute.call_count == 4
+
+    tada_service.clear_dirty()
+    assert tada_service.failed_uploads == []
+
+
+async def test_upload_too_large(tada_service, mocker, monkeypatch):
+    monkeypatch.setattr(config, "TADA_UPLOAD_MAX_SIZE_MB", 1)
+    tada_service._replay_archive.open_replay.side_effect = None
+    tada_service._replay_archive.open_replay.return_value = ArchivedReplay(
+        io.BytesIO(b""), 2 * 1024 * 1024, time.time()
+    )
+    give_up = mocker.patch.object(tada_service, "_give_up")
+
+    with pytest.raises(TadaFileTooLargeException):
+        await tada_service.upload(41935)
+
+    give_up.assert_called_once_with(41935)
+    tada_service._db.conn.execute.assert_not_called()
+
+
+async def test_upload_queues_replay(database, mocker):
+    service = TadaService(
+        database,
+        mocker.Mock(),
+        mocker.Mock(open_replay=mocker.AsyncMock(return_value=None)),
+        mocker.Mock()
+    )
+    mocker.patch.object(service, "_run_worker")
+    await service.initialize()
+
+    await service.upload(41935, 1)
+    await service.upload(41935, 2)
+
+    async with database.acquire() as conn:
+        result = await conn.execute(
+            "SELECT requester_id FROM tada_upload_queue WHERE game_id = 41935"
+        )
+        assert result.fetchall() == [(1,)]
+    assert service._wakeup.is_set()
+    await service.shutdown()
@@ -0,0 +1,136 @@
+import asyncio
+from unittest import mock
+
+import pytest
+
+from server.protocol import QDataStreamProtocol, SimpleJsonProtocol
+from server.protocol.transport import MAX_PENDING_MESSAGES, MessageReader
+from server.servercontext import ServerContext
+
+pytestmark = pytest.mark.asyncio
+
+
+@pytest.mark.parametrize("protocol_class", (QDataStreamProtocol, SimpleJsonProtocol))
+def test_decode_frame(protocol_class):
+    first = protocol_class.encode_message({"command": "hello", "n": 1})
+    second = protocol_class.encode_message({"command": "hello", "n": 2})
+    buffer = bytearray(first + second)
+
+    assert protocol_class.decode_frame(buffer[:len(first) - 1]) == (None, 0)
+    assert protocol_class.decode_frame(buffer) == (
+        {"command": "hello", "n": 1}, len(first)
+    )
+    del buffer[:len(first)]
+    assert protocol_class.decode_frame(buffer) == (
+        {"command": "hello", "n": 2}, len(second)
+    )
+
+
+def test_decode_frame_ping():
+    data = QDataStreamProtocol.encode_message({"command": "ping"})
+
+    assert QDataStreamProtocol.decode_frame(bytearray(data)) == (
+        {"command": "ping"}, len(data)
+    )
+
+
+def test_decode_frame_too_long():
+    with pytest.raises(ValueError):
+        QDataStreamProtocol.decode_frame(bytearray(b"\xff\xff\xff\xff"))
+    with pytest.raises(ValueError):
+        SimpleJsonProtocol.decode_frame(bytearray(b"x" * (2 ** 16 + 1)))
+
+
+async def test_reader_split_messages():
+    reader = MessageReader(SimpleJsonProtocol.decode_frame, mock.Mock())
+    reader.feed_data(b'{"command": "a"}\n{"comm')
+    reader.feed_data(b'and": "b"}\n')
+    reader.feed_eof()
+
+    assert await reader.read_decoded_message() == ({"command": "a"}, 17)
+    assert await reader.read_decoded_message() == ({"command": "b"}, 17)
+    assert reader.at_eof()
+    with pytest.raises(asyncio.IncompleteReadError):
+        await reader.read_decoded_message()
+
+
+async def test_reader_error_after_messages():
+    reader = MessageReader(SimpleJsonProtocol.decode_frame, mock.Mock())
+    reader.feed_data(b'{"command": "a"}\nnot json\n')
+
+    assert (await reader.read_decoded_message())[0] == {"command": "a"}
+    with pytest.raises(ValueError):
+        await reader.read_decoded_message()
+
+
+async def test_reader_pauses_reading():
+    transport = mock.Mock()
+    reader = MessageReader(SimpleJsonProtocol.decode_frame, transport)
+    reader.feed_data(b'{"command": "a"}\n' * MAX_PENDING_MESSAGES)
+
+    transport.pause_reading.assert_called_once_with()
+
+    for _ in range(MAX_PENDING_MESSAGES // 2):
+        await reader.read_decoded_message()
+    transport.resume_reading.assert_called_once_with()
+
+
+class EchoConnection(object):
+    user_agent = None
+    version = None
+
+    def __init__(self):
+        self.protocol = None
+        self.lost = False
+
+    async def on_connection_made(self, protocol, peername):
+        self.protocol = protocol
+
+    def command_label(self, message):
+        return "lobby", message.get("command")
+
+    async def on_message_received(self, message):
+        await self.protocol.send_message(
+            {"command": "echo", "n": message["n"]}
+        )
+
+    async def on_connection_lost(self):
+        self.lost = True
+
+
+@pytest.mark.parametrize("protocol_class", (QDataStreamProtocol, SimpleJsonProtocol))
+async def test_server_context_protocol_transport(protocol_class):
+    connections = []
+
+    def make_connection():
+        connections.append(EchoConnection())
+        return connections[-1]
+
+    ctx = ServerContext(
+        "Test", make_connection, [], protocol_class, transport="protocol"
+    )
+    await ctx.listen("127.0.0.1", 0)
+    port = ctx.sockets[0].getsockname()[1]
+
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    proto = protocol_class(reader, writer)
+    # Several messages in one write are decoded from the same chunk
+    await proto.send_messages([{"command": "echo", "n": n} for n in range(3)])
+    for n in range(3):
+        assert await proto.read_message() == {"command": "echo", "n": n}
+
+    await proto.close()
+    for _ in range(100):
+        if connections[0].lost:
+            break
+        await asyncio.sleep(0.01)
+    assert connections[0].lost
+    assert not ctx.connections
+
+    ctx.close()
+    await ctx.wait_closed()
+
+
+async def test_server_context_unknown_transport():
+    with pytest.raises(ValueError):
+        ServerContext("Test", mock.Mock(), [], transport="carrier pigeon")
@@ -0,0 +1,171 @@
+import asyncio
+
+import pytest
+from aiohttp import web
+
+from server.api.api_accessor import ApiAccessor
+from server.config import config
+from server.http_client_service import HttpClientService
+from server.stats.achievement_service import AchievementService
+from server.stats.event_service import EventService
+from server.stats.update_batcher import UpdateBatcher
+
+pytestmark = pytest.mark.asyncio
+
+PORT = 6083
+
+
+class FakeApi(object):
+    def __init__(self):
+        self.achievement_requests = []
+        self.event_requests = []
+        self.steps = {}
+        self.counts = {}
+
+    async def token(self, request):
+        return web.json_response({"access_token": "token", "expires_in": 3600})
+
+    async def update_achievements(self, request):
+        updates = await request.json()
+        self.achievement_requests.append(updates)
+        data = []
+        for update in updates:
+            key = (update["playerId"], update["achievementId"])
+            self.steps[key] = self.steps.get(key, 0) + update.get("steps", 0)
+            data.append({"attributes": {
+                "achievementId": update["achievementId"],
+                "state": "REVEALED",
+                "steps": self.steps[key],
+                "newlyUnlocked": False
+            }})
+        return web.json_response({"data": data})
+
+    async def update_events(self, request):
+        updates = await request.json()
+        self.event_requests.append(updates)
+        data = []
+        for update in updates:
+            key = (update["playerId"], update["eventId"])
+            self.counts[key] = self.counts.get(key, 0) + update["count"]
+            data.append({"attributes": {
+                "eventId": update["eventId"],
+                "currentCount": self.counts[key]
+            }})
+        return web.json_response({"data": data})
+
+
+@pytest.fixture
+async def fake_api(monkeypatch):
+    monkeypatch.setenv("OAUTHLIB_INSECURE_TRANSPORT", "1")
+    monkeypatch.setattr(config, "API_BASE_URL", f"http://localhost:{PORT}/")
+    monkeypatch.setattr(config, "API_TOKEN_URI", f"http://localhost:{PORT}/oauth/token")
+    monkeypatch.setattr(config, "API_UPDATE_BATCH_WINDOW", 0.05)
+    fake = FakeApi()
+    app = web.Application()
+    app.add_routes([
+        web.post("/oauth/token", fake.token),
+        web.patch("/achievements/update", fake.update_achievements),
+        web.patch("/events/update", fake.update_events)
+    ])
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "localhost", PORT)
+    await site.start()
+
+    yield fake
+
+    await runner.cleanup()
+
+
+@pytest.fixture
+async def api_accessor(fake_api):
+    http_client_service = HttpClientService()
+    yield ApiAccessor(http_client_service)
+    await http_client_service.shutdown()
+
+
+async def test_game_sends_one_request_per_window(fake_api, api_accessor):
+    achievement_service = AchievementService(api_accessor)
+    event_service = EventService(api_accessor)
+
+    async def process_player(player_id):
+        a_queue, e_queue = [], []
+        achievement_service.increment("novice", 1, a_queue)
+        achievement_service.increment("dr-evil", player_id, a_queue)
+        achievement_service.increment("dr-evil", 1, a_queue)
+        event_service.record_event("games-played", 1, e_queue)
+        achievements = await achievement_service.execute_batch_update(player_id, a_queue)
+        events = await event_service.execute_batch_update(player_id, e_queue)
+        return achievements, events
+
+    results = await asyncio.gather(*(process_player(i) for i in range(1, 9)))
+
+    assert len(fake_api.achievement_requests) == 1
+    assert len(fake_api.event_requests) == 1
+    assert len(fake_api.achievement_requests[0]) == 16
+    assert len(fake_api.event_requests[0]) == 8
+
+    for player_id, (achievements, events) in enumerate(results, start=1):
+        assert achievements == [
+            dict(achievement_id="novice", current_state="REVEALED", current_steps=1, newly_unlocked=False),
+            dict(achievement_id="dr-evil", current_state="REVEALED", current_steps=player_id + 1, newly_unlocked=False)
+        ]
+        assert events == [dict(event_id="games-played", count=1)]
+
+
+async def test_updates_in_later_window_sent_separately(fake_api, api_accessor):
+    service = EventService(api_accessor)
+
+    first = await service.execute_batch_update(1, [dict(event_id="games-played", count=1)])
+    second = await service.execute_batch_update(1, [dict(event_id="games-played", count=1)])
+
+    assert first == [dict(event_id="games-played", count=1)]
+    assert second == [dict(event_id="games-played", count=2)]
+    assert len(fake_api.event_requests) == 2
+
+
+async def test_shutdown_flushes_pending_updates(fake_api, api_accessor, monkeypatch):
+    monkeypatch.setattr(config, "API_UPDATE_BATCH_WINDOW", 60)
+    service = EventService(api_accessor)
+
+    update = asyncio.create_task(
+        service.execute_batch_update(1, [dict(event_id="games-played", count=1)])
+    )
+    await asyncio.sleep(0)
+    await service.shutdown()
+
+    assert await update == [dict(event_id="games-played", count=1)]
+
+
+async def test_batcher_exception_raised_to_callers(monkeypatch):
+    monkeypatch.setattr(config, "API_UPDATE_BATCH_WINDOW", 0)
+
+    async def send_batch(updates):
+        raise RuntimeError("broken")
+
+    batcher = UpdateBatcher(send_batch, key="event_id")
+    results = await asyncio.gather(
+        batcher.submit(1, [{}]),
+        batcher.submit(2, [{}]),
+        return_exceptions=True
+    )
+
+    assert [type(r) for r in results] == [RuntimeError, RuntimeError]
+
+
+async def test_batcher_results_split_between_callers(monkeypatch):
+    monkeypatch.setattr(config, "API_UPDATE_BATCH_WINDOW", 0)
+
+    async def send_batch(updates):
+        return {1: [{"event_id": "a"}, {"event_id": "b"}, {"event_id": "c"}]}
+
+    batcher = UpdateBatcher(send_batch, key="event_id")
+    results = await asyncio.gather(
+        batcher.submit(1, [{"event_id": "a"}, {"event_id": "b"}]),
+        batcher.submit(1, [{"event_id": "b"}, {"event_id": "c"}])
+    )
+
+    assert results == [
+        [{"event_id": "a"}, {"event_id": "b"}],
+        [{"event_id": "c"}]
+    ]